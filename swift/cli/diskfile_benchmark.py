@@ -0,0 +1,146 @@
+#! /usr/bin/env python
+# Copyright (c) 2015 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This is a tool for comparing the on-disk layout of replicated and packed
+storage policies with many small objects. It PUTs a number of objects through
+each policy's DiskFile implementation into a scratch devices directory, then
+GETs them all back, for example::
+
+    swift-diskfile-benchmark --objects 10000 --size 4096 replication packed
+
+For each policy type it reports the PUT and GET rates and the number of
+files and directories left on the device. Pass ``--devices`` to benchmark on
+a real filesystem rather than under the system's temporary directory.
+"""
+
+import argparse
+import os
+import time
+from hashlib import md5
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from swift.common.storage_policy import StoragePolicy, PackedStoragePolicy
+from swift.common.utils import Timestamp, mkdirs
+from swift.obj.diskfile import DiskFileManager
+from swift.obj.packed_diskfile import PackedDiskFileManager
+
+
+ARG_PARSER = argparse.ArgumentParser(
+    description='Compare replicated and packed on-disk layouts')
+ARG_PARSER.add_argument(
+    '--objects', type=int, default=1000,
+    help='Number of objects to PUT (default: %(default)s)')
+ARG_PARSER.add_argument(
+    '--size', type=int, default=4096,
+    help='Size of each object in bytes (default: %(default)s)')
+ARG_PARSER.add_argument(
+    '--partitions', type=int, default=16,
+    help='Number of partitions to spread the objects over '
+    '(default: %(default)s)')
+ARG_PARSER.add_argument(
+    '--devices', default=None,
+    help='Directory to create the scratch devices directory in '
+    '(default: the system temporary directory)')
+ARG_PARSER.add_argument(
+    'policy_types', nargs='*', default=['replication', 'packed'],
+    help='Policy types to benchmark (default: replication packed)')
+
+BENCHMARKS = {
+    'replication': (DiskFileManager, StoragePolicy(0, 'bench')),
+    'packed': (PackedDiskFileManager, PackedStoragePolicy(1, 'bench')),
+}
+
+
+def count_entries(path):
+    """
+    Returns the number of files and directories below path.
+    """
+    files = dirs = 0
+    for _junk, dirnames, filenames in os.walk(path):
+        dirs += len(dirnames)
+        files += len(filenames)
+    return files, dirs
+
+
+def run(policy_type, objects, size, partitions, devices=None):
+    """
+    PUTs and GETs the objects through one policy type's DiskFile.
+
+    :returns: a dict with the seconds spent PUTting ('put_elapsed') and
+              GETting ('get_elapsed') the objects, and the number of files
+              ('files') and directories ('dirs') on the device afterwards
+    :raises ValueError: if the policy type is unknown
+    """
+    try:
+        manager_cls, policy = BENCHMARKS[policy_type]
+    except KeyError:
+        raise ValueError('unknown policy type %r' % policy_type)
+    tmpdir = mkdtemp(dir=devices)
+    try:
+        device = os.path.join(tmpdir, 'sda1')
+        mkdirs(device)
+        df_mgr = manager_cls({'devices': tmpdir, 'mount_check': 'false'},
+                             None)
+        body = 'x' * size
+        etag = md5(body).hexdigest()
+
+        def get_diskfile(i):
+            return df_mgr.get_diskfile('sda1', str(i % partitions), 'AUTH_b',
+                                       'c', 'o%d' % i, policy=policy)
+
+        begin = time.time()
+        for i in range(objects):
+            with get_diskfile(i).create(size=size) as writer:
+                writer.write(body)
+                writer.put({'X-Timestamp': Timestamp(time.time()).internal,
+                            'Content-Length': str(size), 'ETag': etag})
+        put_elapsed = time.time() - begin
+
+        begin = time.time()
+        for i in range(objects):
+            df = get_diskfile(i)
+            with df.open():
+                reader = df.reader()
+            for _chunk in reader:
+                pass
+        get_elapsed = time.time() - begin
+
+        files, dirs = count_entries(device)
+    finally:
+        rmtree(tmpdir, ignore_errors=True)
+    return {'put_elapsed': put_elapsed, 'get_elapsed': get_elapsed,
+            'files': files, 'dirs': dirs}
+
+
+def main(argv=None):
+    args = ARG_PARSER.parse_args(argv)
+    print 'Writing %d objects of %d bytes over %d partitions' % (
+        args.objects, args.size, args.partitions)
+    for policy_type in args.policy_types:
+        try:
+            result = run(policy_type, args.objects, args.size,
+                         args.partitions, devices=args.devices)
+        except ValueError as err:
+            print 'Skipping %s: %s' % (policy_type, err)
+            continue
+        print '%s: %.1f PUT/s, %.1f GET/s, %d files, %d dirs' % (
+            policy_type,
+            args.objects / max(result['put_elapsed'], 1e-6),
+            args.objects / max(result['get_elapsed'], 1e-6),
+            result['files'], result['dirs'])
+    return 0
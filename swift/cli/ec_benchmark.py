@@ -0,0 +1,110 @@
+#! /usr/bin/env python
+# Copyright (c) 2015 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This is a tool for measuring how fast a single proxy core can erasure code
+object data. It pushes data through the same segment assembly and encoding
+code the proxy uses for EC PUTs (``chunk_transformer``), in chunks the size
+of the proxy's ``client_chunk_size``, and reports MB/s for each scheme.
+
+Schemes are given as ``<ndata>+<nparity>``, for example::
+
+    swift-ec-benchmark --ec-type jerasure_rs_vand --size 512 10+4 4+2 8+3
+
+The numbers are per core: the benchmark runs in one thread of one process.
+"""
+
+import argparse
+import time
+
+from swift.common.storage_policy import ECStoragePolicy, \
+    DEFAULT_EC_OBJECT_SEGMENT_SIZE, PolicyError
+from swift.proxy.controllers.obj import chunk_transformer
+
+
+ARG_PARSER = argparse.ArgumentParser(
+    description='Measure erasure code encoding throughput')
+ARG_PARSER.add_argument(
+    '--ec-type', default='jerasure_rs_vand',
+    help='PyECLib ec_type to benchmark (default: %(default)s)')
+ARG_PARSER.add_argument(
+    '--segment-size', type=int, default=DEFAULT_EC_OBJECT_SEGMENT_SIZE,
+    help='EC segment size in bytes (default: %(default)s)')
+ARG_PARSER.add_argument(
+    '--chunk-size', type=int, default=65536,
+    help='Size of the chunks fed to the encoder, like the proxy '
+    'client_chunk_size (default: %(default)s)')
+ARG_PARSER.add_argument(
+    '--size', type=int, default=256,
+    help='MB of data to encode per scheme (default: %(default)s)')
+ARG_PARSER.add_argument(
+    'schemes', nargs='*', default=['10+4', '4+2', '8+3'],
+    help='Schemes as <ndata>+<nparity> (default: 10+4 4+2 8+3)')
+
+
+def parse_scheme(scheme):
+    """
+    Parses a scheme like "10+4" into (ndata, nparity).
+
+    :raises ValueError: if the scheme is malformed
+    """
+    try:
+        ndata, nparity = [int(x) for x in scheme.split('+')]
+    except ValueError:
+        raise ValueError('Invalid scheme %r; expected <ndata>+<nparity>' %
+                         scheme)
+    return ndata, nparity
+
+
+def benchmark_encode(policy, total_bytes, chunk_size):
+    """
+    Feeds total_bytes of data through chunk_transformer in chunk_size
+    pieces.
+
+    :returns: the elapsed time in seconds
+    """
+    chunk = 'x' * chunk_size
+    nchunks, remainder = divmod(total_bytes, chunk_size)
+    transform = chunk_transformer(policy,
+                                  policy.ec_ndata + policy.ec_nparity)
+    transform.send(None)
+    start = time.time()
+    for _junk in range(nchunks):
+        transform.send(chunk)
+    if remainder:
+        transform.send(chunk[:remainder])
+    transform.send('')
+    return time.time() - start
+
+
+def main(argv=None):
+    args = ARG_PARSER.parse_args(argv)
+    total_bytes = args.size * 1024 * 1024
+    print 'Encoding %d MB with %s, segment size %d, chunk size %d' % (
+        args.size, args.ec_type, args.segment_size, args.chunk_size)
+    for index, scheme in enumerate(args.schemes):
+        try:
+            ndata, nparity = parse_scheme(scheme)
+            policy = ECStoragePolicy(
+                index, name='bench-%d' % index, ec_type=args.ec_type,
+                ec_ndata=ndata, ec_nparity=nparity,
+                ec_segment_size=args.segment_size)
+        except (ValueError, PolicyError) as err:
+            print 'Skipping %s: %s' % (scheme, err)
+            continue
+        elapsed = benchmark_encode(policy, total_bytes, args.chunk_size)
+        print '%s: %.2f MB/s' % (scheme, args.size / max(elapsed, 1e-6))
+    return 0
@@ -0,0 +1,202 @@
+#! /usr/bin/env python
+# Copyright (c) 2015 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This is a tool for comparing the ratelimit middleware's engines. It simulates
+a number of proxy workers sharing one memcache, each serving a number of
+clients that send requests to a single ratelimited key as fast as they are
+allowed to, and runs the workers' ``_get_sleep_time`` against a simulated
+clock. For example::
+
+    swift-ratelimit-benchmark --workers 8 --clients 4 --rate 100 memcache local
+
+For each engine it reports the rate actually let through (and how far that is
+off the limit), the busiest one second window, the memcache round trips per
+request and the real time spent in the ratelimiter per request.
+"""
+
+import argparse
+import heapq
+import logging
+import time
+
+from swift.common.middleware.ratelimit import RateLimitMiddleware, \
+    MaxSleepTimeHitError
+
+
+ARG_PARSER = argparse.ArgumentParser(
+    description='Compare ratelimit engines in a simulated cluster')
+ARG_PARSER.add_argument(
+    '--workers', type=int, default=8,
+    help='Number of proxy workers (default: %(default)s)')
+ARG_PARSER.add_argument(
+    '--clients', type=int, default=4,
+    help='Number of clients per worker (default: %(default)s)')
+ARG_PARSER.add_argument(
+    '--rate', type=float, default=100,
+    help='Ratelimit in requests per second (default: %(default)s)')
+ARG_PARSER.add_argument(
+    '--duration', type=float, default=60,
+    help='Simulated seconds to run for (default: %(default)s)')
+ARG_PARSER.add_argument(
+    '--latency', type=float, default=0.01,
+    help='Seconds a client waits between one request being let through and '
+    'sending the next (default: %(default)s)')
+ARG_PARSER.add_argument(
+    '--sync-interval', type=float, default=1,
+    help='sync_interval_seconds for the local engine (default: %(default)s)')
+ARG_PARSER.add_argument(
+    '--max-sleep', type=float, default=60,
+    help='max_sleep_time_seconds (default: %(default)s)')
+ARG_PARSER.add_argument(
+    'engines', nargs='*', default=['memcache', 'local'],
+    help='Engines to simulate (default: memcache local)')
+
+SIMULATED_KEY = 'ratelimit/AUTH_bench/bench'
+
+
+class SimulatedMemcache(object):
+    """
+    Just enough of MemcacheRing for the ratelimiter, counting round trips.
+    """
+
+    def __init__(self):
+        self.store = {}
+        self.ops = 0
+
+    def incr(self, key, delta=1, time=0):
+        self.ops += 1
+        value = max(int(self.store.get(key, 0)) + int(delta), 0)
+        self.store[key] = value
+        return value
+
+    def decr(self, key, delta=1, time=0):
+        return self.incr(key, delta=-delta, time=time)
+
+    def set(self, key, value, serialize=True, time=0):
+        self.ops += 1
+        self.store[key] = value
+
+
+class SimulatedClock(object):
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def peak_rate(times, window=1.0):
+    """
+    Returns the largest number of the (sorted) times that fall in any one
+    window.
+    """
+    peak = first = 0
+    for last, t in enumerate(times):
+        while t - times[first] >= window:
+            first += 1
+        peak = max(peak, last - first + 1)
+    return peak
+
+
+def simulate(engine, workers, clients, rate, duration, latency=0.01,
+             sync_interval=1, max_sleep=60):
+    """
+    Runs one engine through the simulation.
+
+    :returns: a dict with the number of requests let through ('allowed') and
+              rejected with a 498 ('rejected'), the busiest one second window
+              ('peak'), the number of memcache round trips ('memcache_ops')
+              and the real time spent in the ratelimiter ('elapsed')
+    :raises ValueError: if the engine is unknown
+    """
+    memcache = SimulatedMemcache()
+    conf = {'engine': engine,
+            'sync_interval_seconds': sync_interval,
+            'max_sleep_time_seconds': max_sleep}
+    logger = logging.getLogger('swift-ratelimit-benchmark')
+    limiters = []
+    for _junk in range(workers):
+        limiter = RateLimitMiddleware(None, conf, logger=logger)
+        limiter.memcache_client = memcache
+        limiters.append(limiter)
+
+    clock = SimulatedClock(1000000000.0)
+    start = clock.now
+    end = start + duration
+    # (time the client sends its next request, client, worker)
+    events = [(start, client, client % workers)
+              for client in range(workers * clients)]
+    heapq.heapify(events)
+    allowed = []
+    rejected = 0
+    elapsed = 0.0
+
+    # the ratelimiter reads the clock with time.time()
+    real_time = time.time
+    time.time = clock
+    try:
+        while events:
+            sent, client, worker = heapq.heappop(events)
+            if sent >= end:
+                break
+            clock.now = sent
+            begin = real_time()
+            try:
+                sleep = limiters[worker]._get_sleep_time(SIMULATED_KEY, rate)
+            except MaxSleepTimeHitError:
+                sleep = None
+            elapsed += real_time() - begin
+            if sleep is None:
+                rejected += 1
+                done = sent
+            else:
+                done = sent + sleep
+                if done < end:
+                    allowed.append(done)
+            heapq.heappush(events, (done + latency, client, worker))
+    finally:
+        time.time = real_time
+
+    allowed.sort()
+    return {'allowed': len(allowed), 'rejected': rejected,
+            'peak': peak_rate(allowed), 'memcache_ops': memcache.ops,
+            'elapsed': elapsed}
+
+
+def main(argv=None):
+    args = ARG_PARSER.parse_args(argv)
+    print 'Simulating %d workers x %d clients for %gs against a limit of ' \
+        '%g req/s' % (args.workers, args.clients, args.duration, args.rate)
+    for engine in args.engines:
+        try:
+            result = simulate(engine, args.workers, args.clients, args.rate,
+                              args.duration, latency=args.latency,
+                              sync_interval=args.sync_interval,
+                              max_sleep=args.max_sleep)
+        except ValueError as err:
+            print 'Skipping %s: %s' % (engine, err)
+            continue
+        requests = max(result['allowed'] + result['rejected'], 1)
+        achieved = result['allowed'] / args.duration
+        print '%s: %.2f req/s (%+.1f%%), peak %d req/s, %d rejected, ' \
+            '%.2f memcache ops/req, %.1f us/req' % (
+                engine, achieved, 100.0 * (achieved - args.rate) / args.rate,
+                result['peak'], result['rejected'],
+                float(result['memcache_ops']) / requests,
+                1000000.0 * result['elapsed'] / requests)
+    return 0
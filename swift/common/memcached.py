@@ -51,9 +51,10 @@ from bisect import bisect
 from swift import gettext_ as _
 from hashlib import md5
 
+from eventlet.event import Event
 from eventlet.green import socket
 from eventlet.pools import Pool
-from eventlet import Timeout
+from eventlet import GreenPile, Timeout, spawn
 from six.moves import range
 
 from swift.common.utils import json
@@ -131,12 +132,16 @@ class MemcacheConnPool(Pool):
 class MemcacheRing(object):
     """
     Simple, consistent-hashed memcache client.
+
+    If coalesce_gets is True, concurrent calls to get() from different
+    greenthreads are batched into a single multi-get per server instead of
+    each checking out a connection for its own request/response.
     """
 
     def __init__(self, servers, connect_timeout=CONN_TIMEOUT,
                  io_timeout=IO_TIMEOUT, pool_timeout=POOL_TIMEOUT,
                  tries=TRY_COUNT, allow_pickle=False, allow_unpickle=False,
-                 max_conns=2):
+                 max_conns=2, coalesce_gets=False):
         self._ring = {}
         self._errors = dict(((serv, []) for serv in servers))
         self._error_limited = dict(((serv, 0) for serv in servers))
@@ -154,6 +159,8 @@ class MemcacheRing(object):
         self._pool_timeout = pool_timeout
         self._allow_pickle = allow_pickle
         self._allow_unpickle = allow_unpickle or allow_pickle
+        self._coalesce_gets = coalesce_gets
+        self._pending_gets = {}
 
     def _exception_occurred(self, server, e, action='talking',
                             sock=None, fp=None, got_connection=True):
@@ -188,10 +195,10 @@ class MemcacheRing(object):
                 self._error_limited[server] = now + ERROR_LIMIT_DURATION
                 logging.error(_('Error limiting server %s'), server)
 
-    def _get_conns(self, key):
+    def _get_servers(self, key):
         """
-        Retrieves a server conn from the pool, or connects a new one.
-        Chooses the server based on a consistent hash of "key".
+        Yields the servers to try for a hashed key, in the key's ring order,
+        skipping any server that is currently error limited.
         """
         pos = bisect(self._sorted, key)
         served = []
@@ -203,6 +210,21 @@ class MemcacheRing(object):
             served.append(server)
             if self._error_limited[server] > time.time():
                 continue
+            yield server
+
+    def _get_conns(self, key):
+        """
+        Retrieves a server conn from the pool, or connects a new one.
+        Chooses the server based on a consistent hash of "key".
+        """
+        return self._get_server_conns(self._get_servers(key))
+
+    def _get_server_conns(self, servers):
+        """
+        Retrieves a conn to each of the given servers in turn, from the pool
+        or by connecting a new one.
+        """
+        for server in servers:
             sock = None
             try:
                 with MemcachePoolTimeout(self._pool_timeout):
@@ -223,6 +245,19 @@ class MemcacheRing(object):
         """Returns a server connection to the pool."""
         self._client_cache[server].put((fp, sock))
 
+    def _decode_value(self, flags, value):
+        """
+        Unserializes a value read from memcache according to its flags.
+        Pickled values are only loaded if unpickling is allowed.
+        """
+        if flags & PICKLE_FLAG:
+            if self._allow_unpickle:
+                return pickle.loads(value)
+            return None
+        elif flags & JSON_FLAG:
+            return json.loads(value)
+        return value
+
     def set(self, key, value, serialize=True, timeout=0, time=0,
             min_compress_len=0):
         """
@@ -278,6 +313,15 @@ class MemcacheRing(object):
         :returns: value of the key in memcache
         """
         key = md5hash(key)
+        if self._coalesce_gets:
+            return self._coalesced_get(key)
+        return self._get_hashed(key)
+
+    def _get_hashed(self, key):
+        """
+        Gets the value for an already hashed key, trying the servers in the
+        key's own ring order.
+        """
         value = None
         for (server, fp, sock) in self._get_conns(key):
             try:
@@ -287,14 +331,8 @@ class MemcacheRing(object):
                     while line[0].upper() != 'END':
                         if line[0].upper() == 'VALUE' and line[1] == key:
                             size = int(line[3])
-                            value = fp.read(size)
-                            if int(line[2]) & PICKLE_FLAG:
-                                if self._allow_unpickle:
-                                    value = pickle.loads(value)
-                                else:
-                                    value = None
-                            elif int(line[2]) & JSON_FLAG:
-                                value = json.loads(value)
+                            value = self._decode_value(int(line[2]),
+                                                       fp.read(size))
                             fp.readline()
                         line = fp.readline().strip().split()
                     self._return_conn(server, fp, sock)
@@ -461,7 +499,64 @@ class MemcacheRing(object):
         """
         server_key = md5hash(server_key)
         keys = [md5hash(key) for key in keys]
-        for (server, fp, sock) in self._get_conns(server_key):
+        return self._get_multi_hashed(keys, self._get_conns(server_key))
+
+    def get_many(self, keys):
+        """
+        Gets multiple values from memcache for the given keys, regardless of
+        which servers in the ring they hash to.  Keys are grouped by the
+        server a get would use for each of them, and each group is fetched
+        with a single multi-get; the groups are fetched concurrently.  The
+        keys of a group whose server fails are then fetched one by one.
+
+        :param keys: keys for values to be retrieved from memcache
+        :returns: list of values, in the same order as keys
+        """
+        keys = [md5hash(key) for key in keys]
+        groups = {}
+        for key in keys:
+            server = self._get_server(key)
+            if server:
+                groups.setdefault(server, []).append(key)
+        groups = list(groups.items())
+        pile = GreenPile(len(groups) or 1)
+        for server, group in groups:
+            pile.spawn(self._get_from_server, group, server)
+        responses = {}
+        for (server, group), values in zip(groups, pile):
+            responses.update(zip(group, values))
+        return [responses.get(key) for key in keys]
+
+    def _get_server(self, key):
+        """
+        Returns the first server that _get_conns would try for a hashed key,
+        or None if every server for the key is error limited.
+        """
+        for server in self._get_servers(key):
+            return server
+
+    def _get_from_server(self, keys, server):
+        """
+        Gets the values for already hashed keys with a single multi-get on
+        server.  If that fails, each key is fetched on its own from the
+        servers in its own ring order, as a get of that key would.
+
+        :returns: list of values
+        """
+        values = self._get_multi_hashed(
+            keys, self._get_server_conns([server]))
+        if values is None:
+            values = [self._get_hashed(key) for key in keys]
+        return values
+
+    def _get_multi_hashed(self, keys, conns):
+        """
+        Gets multiple values for already hashed keys with a single multi-get
+        on the first of conns that succeeds.
+
+        :returns: list of values, or None if no server could be reached
+        """
+        for (server, fp, sock) in conns:
             try:
                 with Timeout(self._io_timeout):
                     sock.sendall('get %s\r\n' % ' '.join(keys))
@@ -470,14 +565,8 @@ class MemcacheRing(object):
                     while line[0].upper() != 'END':
                         if line[0].upper() == 'VALUE':
                             size = int(line[3])
-                            value = fp.read(size)
-                            if int(line[2]) & PICKLE_FLAG:
-                                if self._allow_unpickle:
-                                    value = pickle.loads(value)
-                                else:
-                                    value = None
-                            elif int(line[2]) & JSON_FLAG:
-                                value = json.loads(value)
+                            value = self._decode_value(int(line[2]),
+                                                       fp.read(size))
                             responses[line[1]] = value
                             fp.readline()
                         line = fp.readline().strip().split()
@@ -491,3 +580,35 @@ class MemcacheRing(object):
                     return values
             except (Exception, Timeout) as e:
                 self._exception_occurred(server, e, sock=sock, fp=fp)
+
+    def _coalesced_get(self, key):
+        """
+        Queues a hashed key to be fetched along with any other keys requested
+        for the same server before the hub next runs, and waits for its
+        value.  The first caller for a server schedules the flush.
+        """
+        server = self._get_server(key)
+        if server is None:
+            return None
+        batch = self._pending_gets.get(server)
+        if batch is None:
+            batch = self._pending_gets[server] = {}
+            spawn(self._flush_gets, server)
+        if key not in batch:
+            batch[key] = Event()
+        return batch[key].wait()
+
+    def _flush_gets(self, server):
+        """
+        Fetches every key queued for server with one multi-get and wakes up
+        the greenthreads waiting on them.
+        """
+        batch = self._pending_gets.pop(server, {})
+        keys = list(batch)
+        values = None
+        try:
+            values = self._get_from_server(keys, server)
+        finally:
+            values = values or [None] * len(keys)
+            for key, value in zip(keys, values):
+                batch[key].send(value)
@@ -16,14 +16,16 @@
 from six.moves.urllib.parse import quote, unquote
 import tarfile
 from xml.sax import saxutils
-from time import time
-from eventlet import sleep
+from six import BytesIO
+from eventlet import sleep, spawn, Timeout
+from eventlet.event import Event
 import zlib
 from swift.common.swob import Request, HTTPBadGateway, \
     HTTPCreated, HTTPBadRequest, HTTPNotFound, HTTPUnauthorized, HTTPOk, \
     HTTPPreconditionFailed, HTTPRequestEntityTooLarge, HTTPNotAcceptable, \
     HTTPLengthRequired, HTTPException, HTTPServerError, wsgify
-from swift.common.utils import json, get_logger, register_swift_info
+from swift.common.utils import json, get_logger, register_swift_info, \
+    ContextPool, GreenAsyncPile
 from swift.common import constraints
 from swift.common.http import HTTP_UNAUTHORIZED, HTTP_NOT_FOUND, HTTP_CONFLICT
 
@@ -121,6 +123,9 @@ class Bulk(object):
     Only regular files will be uploaded. Empty directories, symlinks, etc will
     not be uploaded.
 
+    Up to extract_concurrency files are PUT at once; the archive is read
+    ahead of the PUTs into a buffer of at most extract_buffer_size bytes.
+
     The response from bulk operations functions differently from other swift
     responses. This is because a short request body sent from the client could
     result in many operations on the proxy server and precautions need to be
@@ -170,6 +175,9 @@ class Bulk(object):
 
     /container_name
 
+    Up to delete_concurrency objects are deleted at once. A container in the
+    list is only deleted once the deletes listed before it have finished.
+
     The response is similar to extract archive as in every response will be a
     200 OK and you must parse the response body for actual results. An example
     response is:
@@ -200,7 +208,8 @@ class Bulk(object):
     def __init__(self, app, conf, max_containers_per_extraction=10000,
                  max_failed_extractions=1000, max_deletes_per_request=10000,
                  max_failed_deletes=1000, yield_frequency=10, retry_count=0,
-                 retry_interval=1.5, logger=None):
+                 retry_interval=1.5, logger=None, delete_concurrency=2,
+                 extract_concurrency=2, extract_buffer_size=8388608):
         self.app = app
         self.logger = logger or get_logger(conf, log_route='bulk')
         self.max_containers = max_containers_per_extraction
@@ -210,6 +219,9 @@ class Bulk(object):
         self.yield_frequency = yield_frequency
         self.retry_count = retry_count
         self.retry_interval = retry_interval
+        self.delete_concurrency = delete_concurrency
+        self.extract_concurrency = extract_concurrency
+        self.extract_buffer_size = extract_buffer_size
         self.max_path_length = constraints.MAX_OBJECT_NAME_LENGTH \
             + constraints.MAX_CONTAINER_NAME_LENGTH + 2
 
@@ -294,7 +306,6 @@ class Bulk(object):
             objects to be deleted. If None, uses self.get_objs_to_delete to
             query request.
         """
-        last_yield = time()
         separator = ''
         failed_files = []
         resp_dict = {'Response Status': HTTPOk().status,
@@ -321,15 +332,68 @@ class Bulk(object):
             if objs_to_delete is None:
                 objs_to_delete = self.get_objs_to_delete(req)
             failed_file_response = {'type': HTTPBadRequest}
+            listed_order = {}
             req.environ['eventlet.minimum_write_chunk_size'] = 0
-            for obj_to_delete in objs_to_delete:
-                if last_yield + self.yield_frequency < time():
+            deleter = spawn(
+                self._delete_objs, req, vrs, account, objs_to_delete,
+                user_agent, swift_source, resp_dict, failed_files,
+                failed_file_response, listed_order)
+            try:
+                while True:
+                    with Timeout(self.yield_frequency, False):
+                        deleter.wait()
+                        break
                     separator = '\r\n\r\n'
-                    last_yield = time()
                     yield ' '
+            finally:
+                deleter.kill()
+                # deletes finish in any order; report failures in the order
+                # they were asked for
+                failed_files.sort(key=lambda f: listed_order.get(f[0], 0))
+
+            if failed_files:
+                resp_dict['Response Status'] = \
+                    failed_file_response['type']().status
+            elif not (resp_dict['Number Deleted'] or
+                      resp_dict['Number Not Found']):
+                resp_dict['Response Status'] = HTTPBadRequest().status
+                resp_dict['Response Body'] = 'Invalid bulk delete.'
+
+        except HTTPException as err:
+            resp_dict['Response Status'] = err.status
+            resp_dict['Response Body'] = err.body
+        except Exception:
+            self.logger.exception('Error in bulk delete.')
+            resp_dict['Response Status'] = HTTPServerError().status
+
+        yield separator + get_response_body(out_content_type,
+                                            resp_dict, failed_files)
+
+    def _delete_objs(self, req, vrs, account, objs_to_delete, user_agent,
+                     swift_source, resp_dict, failed_files,
+                     failed_file_response, listed_order):
+        """
+        Deletes objs_to_delete, up to self.delete_concurrency at a time,
+        recording the results in resp_dict and failed_files, and the position
+        of each object name in objs_to_delete in listed_order. objs_to_delete
+        is only iterated over once, so it may be a generator.
+
+        Objects are grouped by container: the first delete in each container
+        goes ahead on its own and the container info it looks up is handed
+        on to the rest, so they don't each have to look it up again. A
+        container delete waits for all of the deletes before it to finish.
+        """
+        containers = {}
+        with ContextPool(self.delete_concurrency) as pool:
+            for index, obj_to_delete in enumerate(objs_to_delete):
                 obj_name = obj_to_delete['name']
                 if not obj_name:
                     continue
+                listed_order.setdefault(quote(obj_name), index)
+                if len(failed_files) + pool.running() >= \
+                        self.max_failed_deletes:
+                    # the deletes in flight might take us over the limit
+                    pool.waitall()
                 if len(failed_files) >= self.max_failed_deletes:
                     raise HTTPBadRequest('Max delete failures exceeded')
                 if obj_to_delete.get('error'):
@@ -353,26 +417,40 @@ class Bulk(object):
                 new_env['HTTP_USER_AGENT'] = \
                     '%s %s' % (req.environ.get('HTTP_USER_AGENT'), user_agent)
                 new_env['swift.source'] = swift_source
-                self._process_delete(delete_path, obj_name, new_env, resp_dict,
-                                     failed_files, failed_file_response)
-
-            if failed_files:
-                resp_dict['Response Status'] = \
-                    failed_file_response['type']().status
-            elif not (resp_dict['Number Deleted'] or
-                      resp_dict['Number Not Found']):
-                resp_dict['Response Status'] = HTTPBadRequest().status
-                resp_dict['Response Body'] = 'Invalid bulk delete.'
-
-        except HTTPException as err:
-            resp_dict['Response Status'] = err.status
-            resp_dict['Response Body'] = err.body
+                container, _junk, obj = obj_name.lstrip('/').partition('/')
+                if not obj:
+                    pool.waitall()
+                    self._process_delete(delete_path, obj_name, new_env,
+                                         resp_dict, failed_files,
+                                         failed_file_response)
+                    continue
+                first_in_container = container not in containers
+                if first_in_container:
+                    containers[container] = Event()
+                pool.spawn(self._delete_in_container, containers[container],
+                           first_in_container, delete_path, obj_name,
+                           new_env, resp_dict, failed_files,
+                           failed_file_response)
+            pool.waitall()
+
+    def _delete_in_container(self, primed, first_in_container, delete_path,
+                             obj_name, env, resp_dict, failed_files,
+                             failed_file_response):
+        if not first_in_container:
+            env.update(primed.wait())
+        try:
+            self._process_delete(delete_path, obj_name, env, resp_dict,
+                                 failed_files, failed_file_response)
         except Exception:
             self.logger.exception('Error in bulk delete.')
-            resp_dict['Response Status'] = HTTPServerError().status
-
-        yield separator + get_response_body(out_content_type,
-                                            resp_dict, failed_files)
+            failed_file_response['type'] = HTTPServerError
+            failed_files.append([quote(obj_name), HTTPServerError().status])
+        finally:
+            if first_in_container:
+                primed.send(dict(
+                    (key, val) for key, val in env.items()
+                    if key.startswith(('swift.account/',
+                                       'swift.container/'))))
 
     def handle_extract_iter(self, req, compress_type,
                             out_content_type='text/plain'):
@@ -391,9 +469,7 @@ class Bulk(object):
         resp_dict = {'Response Status': HTTPCreated().status,
                      'Response Body': '', 'Number Files Created': 0}
         failed_files = []
-        last_yield = time()
         separator = ''
-        containers_accessed = set()
         try:
             if not out_content_type:
                 raise HTTPNotAcceptable(request=req)
@@ -412,19 +488,81 @@ class Bulk(object):
             extract_base = extract_base.rstrip('/')
             tar = tarfile.open(mode='r|' + compress_type,
                                fileobj=req.body_file)
-            failed_response_type = HTTPBadRequest
+            failed_response = {'type': HTTPBadRequest}
             req.environ['eventlet.minimum_write_chunk_size'] = 0
-            containers_created = 0
-            while True:
-                if last_yield + self.yield_frequency < time():
+            extractor = spawn(
+                self._extract_objs, req, tar, vrs, account, extract_base,
+                resp_dict, failed_files, failed_response)
+            try:
+                while True:
+                    with Timeout(self.yield_frequency, False):
+                        extractor.wait()
+                        break
                     separator = '\r\n\r\n'
-                    last_yield = time()
                     yield ' '
-                tar_info = next(tar)
-                if tar_info is None or \
-                        len(failed_files) >= self.max_failed_extractions:
-                    break
-                if tar_info.isfile():
+            finally:
+                extractor.kill()
+
+            if failed_files:
+                resp_dict['Response Status'] = \
+                    failed_response['type']().status
+            elif not resp_dict['Number Files Created']:
+                resp_dict['Response Status'] = HTTPBadRequest().status
+                resp_dict['Response Body'] = 'Invalid Tar File: No Valid Files'
+
+        except HTTPException as err:
+            resp_dict['Response Status'] = err.status
+            resp_dict['Response Body'] = err.body
+        except (tarfile.TarError, zlib.error) as tar_error:
+            resp_dict['Response Status'] = HTTPBadRequest().status
+            resp_dict['Response Body'] = 'Invalid Tar File: %s' % tar_error
+        except Exception:
+            self.logger.exception('Error in extract archive.')
+            resp_dict['Response Status'] = HTTPServerError().status
+
+        yield separator + get_response_body(
+            out_content_type, resp_dict, failed_files)
+
+    def _extract_objs(self, req, tar, vrs, account, extract_base, resp_dict,
+                      failed_files, failed_response):
+        """
+        PUTs the regular files in tar, up to self.extract_concurrency at a
+        time, recording the results in resp_dict and failed_files.
+
+        Reading the archive runs ahead of the PUTs: each file is read into
+        memory, up to self.extract_buffer_size bytes in all, so its PUT can
+        go on while the next files are read. A file too big to buffer is
+        PUT straight from the archive once the PUTs before it are done.
+        Each container is created at most once per request, before the
+        first PUT into it. Failures are recorded in archive order.
+        """
+        failures = []
+        containers = set()
+        containers_created = 0
+        buffered = [0]
+        index = 0
+        with ContextPool(self.extract_concurrency) as pool:
+            pile = GreenAsyncPile(pool)
+            try:
+                while True:
+                    for result in pile.waitall(0):
+                        self._handle_extract_result(
+                            result, resp_dict, failures, failed_response,
+                            buffered)
+                    if len(failures) + pool.running() >= \
+                            self.max_failed_extractions:
+                        # the PUTs in flight might take us over the limit
+                        for result in pile:
+                            self._handle_extract_result(
+                                result, resp_dict, failures,
+                                failed_response, buffered)
+                    tar_info = next(tar)
+                    if tar_info is None or \
+                            len(failures) >= self.max_failed_extractions:
+                        break
+                    index += 1
+                    if not tar_info.isfile():
+                        continue
                     obj_path = tar_info.name
                     if obj_path.startswith('./'):
                         obj_path = obj_path[2:]
@@ -438,17 +576,17 @@ class Bulk(object):
                         ['', vrs, account, obj_path])
                     container = obj_path.split('/', 1)[0]
                     if not constraints.check_utf8(destination):
-                        failed_files.append(
-                            [quote(obj_path[:self.max_path_length]),
-                             HTTPPreconditionFailed().status])
+                        failures.append((index, [
+                            quote(obj_path[:self.max_path_length]),
+                            HTTPPreconditionFailed().status]))
                         continue
                     if tar_info.size > constraints.MAX_FILE_SIZE:
-                        failed_files.append([
+                        failures.append((index, [
                             quote(obj_path[:self.max_path_length]),
-                            HTTPRequestEntityTooLarge().status])
+                            HTTPRequestEntityTooLarge().status]))
                         continue
                     container_failure = None
-                    if container not in containers_accessed:
+                    if container not in containers:
                         cont_path = '/'.join(['', vrs, account, container])
                         try:
                             if self.create_container(req, cont_path):
@@ -466,72 +604,98 @@ class Bulk(object):
                             if err.status_int == HTTP_UNAUTHORIZED:
                                 raise HTTPUnauthorized(request=req)
                         except ValueError:
-                            failed_files.append([
+                            failures.append((index, [
                                 quote(obj_path[:self.max_path_length]),
-                                HTTPBadRequest().status])
+                                HTTPBadRequest().status]))
                             continue
+                        containers.add(container)
 
                     tar_file = tar.extractfile(tar_info)
-                    new_env = req.environ.copy()
-                    new_env['REQUEST_METHOD'] = 'PUT'
-                    new_env['wsgi.input'] = tar_file
-                    new_env['PATH_INFO'] = destination
-                    new_env['CONTENT_LENGTH'] = tar_info.size
-                    new_env['swift.source'] = 'EA'
-                    new_env['HTTP_USER_AGENT'] = \
-                        '%s BulkExpand' % req.environ.get('HTTP_USER_AGENT')
-                    create_obj_req = Request.blank(destination, new_env)
-
-                    for pax_key, pax_value in tar_info.pax_headers.items():
-                        header_name = pax_key_to_swift_header(pax_key)
-                        if header_name:
-                            # Both pax_key and pax_value are unicode
-                            # strings; the key is already UTF-8 encoded, but
-                            # we still have to encode the value.
-                            create_obj_req.headers[header_name] = \
-                                pax_value.encode("utf-8")
-
-                    resp = create_obj_req.get_response(self.app)
-                    containers_accessed.add(container)
-                    if resp.is_success:
-                        resp_dict['Number Files Created'] += 1
-                    else:
-                        if container_failure:
-                            failed_files.append(container_failure)
-                        if resp.status_int == HTTP_UNAUTHORIZED:
-                            failed_files.append([
-                                quote(obj_path[:self.max_path_length]),
-                                HTTPUnauthorized().status])
-                            raise HTTPUnauthorized(request=req)
-                        if resp.status_int // 100 == 5:
-                            failed_response_type = HTTPBadGateway
-                        failed_files.append([
-                            quote(obj_path[:self.max_path_length]),
-                            resp.status])
-
-            if failed_files:
-                resp_dict['Response Status'] = failed_response_type().status
-            elif not resp_dict['Number Files Created']:
-                resp_dict['Response Status'] = HTTPBadRequest().status
-                resp_dict['Response Body'] = 'Invalid Tar File: No Valid Files'
+                    if tar_info.size > self.extract_buffer_size:
+                        # too big to buffer; PUT it straight from the archive
+                        for result in pile:
+                            self._handle_extract_result(
+                                result, resp_dict, failures,
+                                failed_response, buffered)
+                        self._handle_extract_result(
+                            self._put_extracted(
+                                req, destination, tar_info, tar_file, index,
+                                obj_path, container_failure, 0),
+                            resp_dict, failures, failed_response, buffered)
+                        continue
+                    while pool.running() and buffered[0] + tar_info.size > \
+                            self.extract_buffer_size:
+                        self._handle_extract_result(
+                            next(pile), resp_dict, failures, failed_response,
+                            buffered)
+                    body = BytesIO(tar_file.read())
+                    buffered[0] += tar_info.size
+                    pile.spawn(self._put_extracted, req, destination,
+                               tar_info, body, index, obj_path,
+                               container_failure, tar_info.size)
+
+                for result in pile:
+                    self._handle_extract_result(
+                        result, resp_dict, failures, failed_response,
+                        buffered)
+            finally:
+                failures.sort(key=lambda f: f[0])
+                failed_files.extend(entry for _index, entry in failures)
+
+    def _put_extracted(self, req, destination, tar_info, body_file, index,
+                       obj_path, container_failure, buffered_size):
+        new_env = req.environ.copy()
+        new_env['REQUEST_METHOD'] = 'PUT'
+        new_env['wsgi.input'] = body_file
+        new_env['PATH_INFO'] = destination
+        new_env['CONTENT_LENGTH'] = tar_info.size
+        new_env['swift.source'] = 'EA'
+        new_env['HTTP_USER_AGENT'] = \
+            '%s BulkExpand' % req.environ.get('HTTP_USER_AGENT')
+        create_obj_req = Request.blank(destination, new_env)
+
+        for pax_key, pax_value in tar_info.pax_headers.items():
+            header_name = pax_key_to_swift_header(pax_key)
+            if header_name:
+                # Both pax_key and pax_value are unicode
+                # strings; the key is already UTF-8 encoded, but
+                # we still have to encode the value.
+                create_obj_req.headers[header_name] = \
+                    pax_value.encode("utf-8")
 
-        except HTTPException as err:
-            resp_dict['Response Status'] = err.status
-            resp_dict['Response Body'] = err.body
-        except (tarfile.TarError, zlib.error) as tar_error:
-            resp_dict['Response Status'] = HTTPBadRequest().status
-            resp_dict['Response Body'] = 'Invalid Tar File: %s' % tar_error
+        try:
+            resp = create_obj_req.get_response(self.app)
         except Exception:
             self.logger.exception('Error in extract archive.')
-            resp_dict['Response Status'] = HTTPServerError().status
+            resp = HTTPServerError(request=create_obj_req)
+        return index, obj_path, container_failure, resp, buffered_size
 
-        yield separator + get_response_body(
-            out_content_type, resp_dict, failed_files)
+    def _handle_extract_result(self, result, resp_dict, failures,
+                               failed_response, buffered):
+        index, obj_path, container_failure, resp, buffered_size = result
+        buffered[0] -= buffered_size
+        if resp.is_success:
+            resp_dict['Number Files Created'] += 1
+            return
+        if container_failure:
+            failures.append((index, container_failure))
+        if resp.status_int == HTTP_UNAUTHORIZED:
+            failures.append((index, [
+                quote(obj_path[:self.max_path_length]),
+                HTTPUnauthorized().status]))
+            raise HTTPUnauthorized(request=resp.request)
+        if resp.status_int // 100 == 5:
+            failed_response['type'] = HTTPBadGateway
+        failures.append((index, [
+            quote(obj_path[:self.max_path_length]), resp.status]))
 
     def _process_delete(self, delete_path, obj_name, env, resp_dict,
                         failed_files, failed_file_response, retry=0):
         delete_obj_req = Request.blank(delete_path, env)
         resp = delete_obj_req.get_response(self.app)
+        # hang on to any account and container info the delete looked up
+        env.update((key, val) for key, val in delete_obj_req.environ.items()
+                   if key.startswith(('swift.account/', 'swift.container/')))
         if resp.status_int // 100 == 2:
             resp_dict['Number Deleted'] += 1
         elif resp.status_int == HTTP_NOT_FOUND:
@@ -591,6 +755,9 @@ def filter_factory(global_conf, **local_conf):
     yield_frequency = int(conf.get('yield_frequency', 10))
     retry_count = int(conf.get('delete_container_retry_count', 0))
     retry_interval = 1.5
+    delete_concurrency = int(conf.get('delete_concurrency', 2))
+    extract_concurrency = int(conf.get('extract_concurrency', 2))
+    extract_buffer_size = int(conf.get('extract_buffer_size', 8388608))
 
     register_swift_info(
         'bulk_upload',
@@ -610,5 +777,8 @@ def filter_factory(global_conf, **local_conf):
             max_failed_deletes=max_failed_deletes,
             yield_frequency=yield_frequency,
             retry_count=retry_count,
-            retry_interval=retry_interval)
+            retry_interval=retry_interval,
+            delete_concurrency=delete_concurrency,
+            extract_concurrency=extract_concurrency,
+            extract_buffer_size=extract_buffer_size)
     return bulk_filter
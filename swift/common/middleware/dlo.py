@@ -114,6 +114,7 @@ Here's an example using ``curl`` with tiny 1-byte segments::
         http://<storage_url>/container/myobject
 """
 
+import itertools
 import os
 
 import six
@@ -240,7 +241,15 @@ class GetContext(WSGIContext):
         first_byte = last_byte = None
         actual_content_length = None
         content_length_for_swob_range = None
-        if req.range and len(req.range.ranges) == 1:
+        byteranges = None
+        if req.range and len(req.range.ranges) > 1 and have_complete_listing:
+            # swob sends these as a multipart/byteranges response, taking
+            # each part from the SegmentedIterable in turn
+            byteranges = req.range.ranges_for_length(
+                sum(o['bytes'] for o in segments))
+            if byteranges == []:
+                return HTTPRequestedRangeNotSatisfiable(request=req)
+        elif req.range and len(req.range.ranges) == 1:
             content_length_for_swob_range = sum(o['bytes'] for o in segments)
 
             # This is a hack to handle suffix byte ranges (e.g. "bytes=-5"),
@@ -304,10 +313,20 @@ class GetContext(WSGIContext):
 
         app_iter = None
         if req.method == 'GET':
-            listing_iter = RateLimitedIterator(
-                self._segment_listing_iterator(
+            if byteranges:
+                plain_listing_iter = itertools.chain.from_iterable(
+                    self._segment_listing_iterator(
+                        req, version, account, container, obj_prefix,
+                        segments, first_byte=start, last_byte=end - 1)
+                    for start, end in byteranges)
+                actual_content_length = sum(
+                    end - start for start, end in byteranges)
+            else:
+                plain_listing_iter = self._segment_listing_iterator(
                     req, version, account, container, obj_prefix, segments,
-                    first_byte=first_byte, last_byte=last_byte),
+                    first_byte=first_byte, last_byte=last_byte)
+            listing_iter = RateLimitedIterator(
+                plain_listing_iter,
                 self.dlo.rate_limit_segments_per_sec,
                 limit_after=self.dlo.rate_limit_after_segment)
 
@@ -315,7 +334,9 @@ class GetContext(WSGIContext):
                 req, self.dlo.app, listing_iter, ua_suffix="DLO MultipartGET",
                 swift_source="DLO", name=req.path, logger=self.logger,
                 max_get_time=self.dlo.max_get_time,
-                response_body_length=actual_content_length)
+                response_body_length=actual_content_length,
+                prefetch_segments=self.dlo.prefetch_segments,
+                prefetch_buffer_size=self.dlo.prefetch_buffer_size)
 
             try:
                 app_iter.validate_first_segment()
@@ -366,6 +387,9 @@ class DynamicLargeObject(object):
             'rate_limit_after_segment', '10'))
         self.rate_limit_segments_per_sec = int(conf.get(
             'rate_limit_segments_per_sec', '1'))
+        self.prefetch_segments = int(conf.get('prefetch_segments', 0))
+        self.prefetch_buffer_size = int(conf.get(
+            'prefetch_buffer_size', 8388608))
 
     def _populate_config_from_old_location(self, conf):
         if ('rate_limit_after_segment' in conf or
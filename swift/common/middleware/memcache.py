@@ -19,6 +19,7 @@ from six.moves.configparser import ConfigParser, NoSectionError, NoOptionError
 
 from swift.common.memcached import (MemcacheRing, CONN_TIMEOUT, POOL_TIMEOUT,
                                     IO_TIMEOUT, TRY_COUNT)
+from swift.common.utils import config_true_value
 
 
 class MemcacheMiddleware(object):
@@ -84,6 +85,8 @@ class MemcacheMiddleware(object):
             'pool_timeout', POOL_TIMEOUT))
         tries = int(memcache_options.get('tries', TRY_COUNT))
         io_timeout = float(memcache_options.get('io_timeout', IO_TIMEOUT))
+        coalesce_gets = config_true_value(memcache_options.get(
+            'coalesce_gets', 'false'))
 
         if not self.memcache_servers:
             self.memcache_servers = '127.0.0.1:11211'
@@ -102,7 +105,8 @@ class MemcacheMiddleware(object):
             io_timeout=io_timeout,
             allow_pickle=(serialization_format == 0),
             allow_unpickle=(serialization_format <= 1),
-            max_conns=max_conns)
+            max_conns=max_conns,
+            coalesce_gets=coalesce_gets)
 
     def __call__(self, env, start_response):
         env['swift.cache'] = self.memcache
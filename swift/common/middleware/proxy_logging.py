@@ -74,8 +74,11 @@ bandwidth usage will want to only sum up logs with no swift.source.
 import sys
 import time
 
+import eventlet
+from eventlet.queue import Full, LightQueue
 import six
 from six.moves.urllib.parse import quote, unquote
+from swift import gettext_ as _
 from swift.common.swob import Request
 from swift.common.utils import (get_logger, get_remote_client,
                                 get_valid_utf8_str, config_true_value,
@@ -114,7 +117,8 @@ class ProxyLoggingMiddleware(object):
                     'log_udp_port', 'log_statsd_host', 'log_statsd_port',
                     'log_statsd_default_sample_rate',
                     'log_statsd_sample_rate_factor',
-                    'log_statsd_metric_prefix'):
+                    'log_statsd_metric_prefix', 'log_statsd_flush_interval',
+                    'log_statsd_timing_percentiles'):
             value = conf.get('access_' + key, conf.get(key, None))
             if value:
                 access_log_conf[key] = value
@@ -123,6 +127,32 @@ class ProxyLoggingMiddleware(object):
         self.access_logger.set_statsd_prefix('proxy-server')
         self.reveal_sensitive_prefix = int(
             conf.get('reveal_sensitive_prefix', 16))
+        log_queue_size = int(conf.get('access_log_queue_size', 0))
+        self.log_queue = LightQueue(log_queue_size) \
+            if log_queue_size > 0 else None
+        self.background_started = False
+
+    def start_background(self):
+        """
+        Starts the greenthread that writes queued access log lines, if the
+        queue is in use. This is done on the first request rather than at
+        startup so that it runs in the worker process serving requests.
+        """
+        self.background_started = True
+        if self.log_queue is not None:
+            eventlet.spawn_n(self._drain_log_queue)
+
+    def _drain_log_queue(self):
+        while True:
+            log_fields = self.log_queue.get()
+            try:
+                self._log_line(log_fields)
+            except Exception:
+                self.access_logger.exception(_('Error writing access log'))
+
+    def _log_line(self, log_fields):
+        self.access_logger.info(' '.join(
+            quote(str(x) if x else '-', QUOTE_SAFE) for x in log_fields))
 
     def method_from_req(self, req):
         return req.environ.get('swift.orig_req_method', req.method)
@@ -173,31 +203,37 @@ class ProxyLoggingMiddleware(object):
         start_time_str = "%.9f" % start_time
         end_time_str = "%.9f" % end_time
         policy_index = get_policy_index(req.headers, resp_headers)
-        self.access_logger.info(' '.join(
-            quote(str(x) if x else '-', QUOTE_SAFE)
-            for x in (
-                get_remote_client(req),
-                req.remote_addr,
-                end_gmtime_str,
-                method,
-                the_request,
-                req.environ.get('SERVER_PROTOCOL'),
-                status_int,
-                req.referer,
-                req.user_agent,
-                self.obscure_sensitive(req.headers.get('x-auth-token')),
-                bytes_received,
-                bytes_sent,
-                req.headers.get('etag', None),
-                req.environ.get('swift.trans_id'),
-                logged_headers,
-                duration_time_str,
-                req.environ.get('swift.source'),
-                ','.join(req.environ.get('swift.log_info') or ''),
-                start_time_str,
-                end_time_str,
-                policy_index
-            )))
+        log_fields = (
+            get_remote_client(req),
+            req.remote_addr,
+            end_gmtime_str,
+            method,
+            the_request,
+            req.environ.get('SERVER_PROTOCOL'),
+            status_int,
+            req.referer,
+            req.user_agent,
+            self.obscure_sensitive(req.headers.get('x-auth-token')),
+            bytes_received,
+            bytes_sent,
+            req.headers.get('etag', None),
+            req.environ.get('swift.trans_id'),
+            logged_headers,
+            duration_time_str,
+            req.environ.get('swift.source'),
+            ','.join(req.environ.get('swift.log_info') or ''),
+            start_time_str,
+            end_time_str,
+            policy_index
+        )
+        if self.log_queue is None:
+            self._log_line(log_fields)
+        else:
+            try:
+                self.log_queue.put_nowait(log_fields)
+            except Full:
+                # better late than never
+                self._log_line(log_fields)
 
         # Log timing and bytes-transferred data to StatsD
         metric_name = self.statsd_metric_name(req, status_int, method)
@@ -259,6 +295,8 @@ class ProxyLoggingMiddleware(object):
             return self.app(env, start_response)
 
         self.mark_req_logged(env)
+        if not self.background_started:
+            self.start_background()
 
         start_response_args = [None]
         input_proxy = InputProxy(env['wsgi.input'])
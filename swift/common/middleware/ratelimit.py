@@ -84,6 +84,23 @@ class MaxSleepTimeHitError(Exception):
     pass
 
 
+class RateLimitBucket(object):
+    """
+    A proxy worker's local view of one ratelimit key, used by the ``local``
+    engine.
+
+    ``running_time_m`` plays the part of the memcache value in the
+    ``memcache`` engine: the time (in clock_accuracy units) at which the key
+    will next have capacity. ``unsynced_m`` is the part of it this worker
+    has used up since it last reconciled with memcache.
+    """
+
+    def __init__(self):
+        self.running_time_m = 0
+        self.unsynced_m = 0
+        self.synced_at_m = None
+
+
 class RateLimitMiddleware(object):
     """
     Rate limiting middleware
@@ -116,6 +133,14 @@ class RateLimitMiddleware(object):
             conf, 'container_ratelimit_')
         self.container_listing_ratelimits = interpret_conf_limits(
             conf, 'container_listing_ratelimit_')
+        self.engine = conf.get('engine', 'memcache').strip().lower()
+        if self.engine not in ('memcache', 'local'):
+            raise ValueError('Invalid ratelimit engine %r; expected '
+                             'memcache or local' % self.engine)
+        self.sync_interval_seconds = \
+            float(conf.get('sync_interval_seconds', 1))
+        self.buckets = {}
+        self.pruned_at_m = 0
 
     def get_container_size(self, env):
         rv = 0
@@ -191,6 +216,8 @@ class RateLimitMiddleware(object):
         :param max_rate: maximum rate allowed in requests per second
         :raises: MaxSleepTimeHitError if max sleep time is exceeded.
         '''
+        if self.engine == 'local':
+            return self._get_local_sleep_time(key, max_rate)
         try:
             now_m = int(round(time.time() * self.clock_accuracy))
             time_per_request_m = int(round(self.clock_accuracy / max_rate))
@@ -218,6 +245,84 @@ class RateLimitMiddleware(object):
         except MemcacheConnectionError:
             return 0
 
+    def _prune_buckets(self, now_m):
+        """
+        Forgets buckets that have been idle long enough that their next
+        request would start afresh anyway.
+        """
+        idle_m = self.rate_buffer_seconds * self.clock_accuracy
+        for key, bucket in list(self.buckets.items()):
+            if now_m - bucket.running_time_m > idle_m:
+                del self.buckets[key]
+        self.pruned_at_m = now_m
+
+    def _get_local_sleep_time(self, key, max_rate):
+        '''
+        Same as _get_sleep_time, but paces requests against a local
+        RateLimitBucket and only goes to memcache once every
+        sync_interval_seconds per key. When it does, it adds the time this
+        worker has used up since the last sync and gets back the running
+        time of every worker combined.
+
+        Between syncs a worker cannot see what the others are doing, so
+        across W workers a key can get at most
+        (W - 1) * max_rate * sync_interval_seconds requests more than its
+        limit in any sync interval.
+
+        :param key: a memcache key
+        :param max_rate: maximum rate allowed in requests per second
+        :raises: MaxSleepTimeHitError if max sleep time is exceeded.
+        '''
+        now_m = int(round(time.time() * self.clock_accuracy))
+        time_per_request_m = int(round(self.clock_accuracy / max_rate))
+        sync_interval_m = self.sync_interval_seconds * self.clock_accuracy
+        if now_m - self.pruned_at_m > sync_interval_m:
+            self._prune_buckets(now_m)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = RateLimitBucket()
+
+        synced = False
+        if bucket.synced_at_m is None or \
+                now_m - bucket.synced_at_m >= sync_interval_m:
+            try:
+                bucket.running_time_m = self.memcache_client.incr(
+                    key, delta=bucket.unsynced_m)
+                bucket.unsynced_m = 0
+                synced = True
+            except MemcacheConnectionError:
+                # keep pacing against what this worker knows
+                pass
+            bucket.synced_at_m = now_m
+
+        bucket.running_time_m += time_per_request_m
+        bucket.unsynced_m += time_per_request_m
+        need_to_sleep_m = 0
+        if (now_m - bucket.running_time_m >
+                self.rate_buffer_seconds * self.clock_accuracy):
+            bucket.running_time_m = int(now_m + time_per_request_m)
+            if synced:
+                try:
+                    self.memcache_client.set(
+                        key, str(bucket.running_time_m), serialize=False)
+                    bucket.unsynced_m = 0
+                except MemcacheConnectionError:
+                    pass
+        else:
+            need_to_sleep_m = max(
+                bucket.running_time_m - now_m - time_per_request_m, 0)
+
+        max_sleep_m = self.max_sleep_time_seconds * self.clock_accuracy
+        if max_sleep_m - need_to_sleep_m <= self.clock_accuracy * 0.01:
+            # treat as no-op; give the time back
+            bucket.running_time_m -= time_per_request_m
+            bucket.unsynced_m = max(bucket.unsynced_m - time_per_request_m, 0)
+            raise MaxSleepTimeHitError(
+                "Max Sleep Time Exceeded: %.2f" %
+                (float(need_to_sleep_m) / self.clock_accuracy))
+
+        return float(need_to_sleep_m) / self.clock_accuracy
+
     def handle_ratelimit(self, req, account_name, container_name, obj_name):
         '''
         Performs rate limiting and account white/black listing.  Sleeps
@@ -159,6 +159,8 @@ from datetime import datetime
 import mimetypes
 import re
 import six
+import time
+from eventlet import Timeout
 from six import BytesIO
 from hashlib import md5
 from swift.common.exceptions import ListingIterError, SegmentError
@@ -170,7 +172,7 @@ from swift.common.swob import Request, HTTPBadRequest, HTTPServerError, \
 from swift.common.utils import json, get_logger, config_true_value, \
     get_valid_utf8_str, override_bytes_from_content_type, split_path, \
     register_swift_info, RateLimitedIterator, quote, close_if_possible, \
-    closing_if_possible
+    closing_if_possible, ContextPool
 from swift.common.request_helpers import SegmentedIterable
 from swift.common.constraints import check_utf8, MAX_BUFFERED_SLO_SEGMENTS
 from swift.common.http import HTTP_NOT_FOUND, HTTP_UNAUTHORIZED, is_success
@@ -341,6 +343,9 @@ class SloGetContext(WSGIContext):
         self.slo = slo
         self.first_byte = None
         self.last_byte = None
+        # Submanifests already fetched, by path, while listing the segments
+        # for more than one byte range; None when not doing so.
+        self.sub_slo_cache = None
         super(SloGetContext, self).__init__(slo.app)
 
     def _fetch_sub_slo_segments(self, req, version, acc, con, obj):
@@ -436,8 +441,14 @@ class SloGetContext(WSGIContext):
                 sub_path = get_valid_utf8_str(seg_dict['name'])
                 sub_cont, sub_obj = split_path(sub_path, 2, 2, True)
                 if last_sub_path != sub_path:
-                    sub_segments = self._fetch_sub_slo_segments(
-                        req, version, account, sub_cont, sub_obj)
+                    if self.sub_slo_cache is not None and \
+                            sub_path in self.sub_slo_cache:
+                        sub_segments = self.sub_slo_cache[sub_path]
+                    else:
+                        sub_segments = self._fetch_sub_slo_segments(
+                            req, version, account, sub_cont, sub_obj)
+                        if self.sub_slo_cache is not None:
+                            self.sub_slo_cache[sub_path] = sub_segments
                 last_sub_path = sub_path
 
                 # Use the existing machinery to slice into the sub-SLO.
@@ -464,6 +475,27 @@ class SloGetContext(WSGIContext):
             self.first_byte -= seg_length
             self.last_byte -= seg_length
 
+    def _byteranges_listing_iterator(self, req, version, account, segments,
+                                     byteranges):
+        """
+        Yields the segment subranges for each of several byte ranges in turn,
+        so that the SegmentedIterable's body is the parts of a
+        multipart/byteranges response one after another. Segments wholly
+        outside a range are skipped, the SegmentedIterable fetches
+        consecutive subranges of one segment (such as overlapping or nearby
+        ranges) with a single GET, and each submanifest is fetched once.
+
+        :param byteranges: (first byte, last byte + 1) pairs, as given by
+                           swob.Range.ranges_for_length()
+        """
+        self.sub_slo_cache = {}
+        for first_byte, stop_byte in byteranges:
+            self.first_byte, self.last_byte = first_byte, stop_byte - 1
+            for seg_dict, start_byte, end_byte in \
+                    self._segment_listing_iterator(req, version, account,
+                                                   segments):
+                yield seg_dict, start_byte, end_byte
+
     def _need_to_refetch_manifest(self, req):
         """
         Just because a response shows that an object is a SLO manifest does not
@@ -604,9 +636,13 @@ class SloGetContext(WSGIContext):
     def _manifest_get_response(self, req, content_length, response_headers,
                                segments):
         self.first_byte, self.last_byte = None, None
+        byteranges = None
+        response_body_length = None
         if req.range:
             byteranges = req.range.ranges_for_length(content_length)
-            if len(byteranges) == 0:
+            if byteranges is None:
+                req.range = None
+            elif len(byteranges) == 0:
                 return HTTPRequestedRangeNotSatisfiable(request=req)
             elif len(byteranges) == 1:
                 self.first_byte, self.last_byte = byteranges[0]
@@ -614,11 +650,18 @@ class SloGetContext(WSGIContext):
                 # last byte's position.
                 self.last_byte -= 1
             else:
-                req.range = None
+                # swob sends these as a multipart/byteranges response, taking
+                # each part from the SegmentedIterable in turn
+                response_body_length = sum(
+                    end - start for start, end in byteranges)
 
         ver, account, _junk = req.split_path(3, 3, rest_with_last=True)
-        plain_listing_iter = self._segment_listing_iterator(
-            req, ver, account, segments)
+        if response_body_length is None:
+            plain_listing_iter = self._segment_listing_iterator(
+                req, ver, account, segments)
+        else:
+            plain_listing_iter = self._byteranges_listing_iterator(
+                req, ver, account, segments, byteranges)
 
         ratelimited_listing_iter = RateLimitedIterator(
             plain_listing_iter,
@@ -640,7 +683,10 @@ class SloGetContext(WSGIContext):
             name=req.path, logger=self.slo.logger,
             ua_suffix="SLO MultipartGET",
             swift_source="SLO",
-            max_get_time=self.slo.max_get_time)
+            max_get_time=self.slo.max_get_time,
+            response_body_length=response_body_length,
+            prefetch_segments=self.slo.prefetch_segments,
+            prefetch_buffer_size=self.slo.prefetch_buffer_size)
 
         try:
             segmented_iter.validate_first_segment()
@@ -688,6 +734,12 @@ class StaticLargeObject(object):
             'rate_limit_after_segment', '10'))
         self.rate_limit_segments_per_sec = int(self.conf.get(
             'rate_limit_segments_per_sec', '0'))
+        self.prefetch_segments = int(self.conf.get('prefetch_segments', 0))
+        self.prefetch_buffer_size = int(self.conf.get(
+            'prefetch_buffer_size', 8388608))
+        self.concurrency = int(self.conf.get('concurrency', 2))
+        self.max_manifest_validation_time = float(self.conf.get(
+            'max_manifest_validation_time', 0))
         self.bulk_deleter = Bulk(app, {}, logger=self.logger)
 
     def handle_multipart_get_or_head(self, req, start_response):
@@ -754,28 +806,21 @@ class StaticLargeObject(object):
             out_content_type = 'text/plain'
         data_for_storage = []
         slo_etag = md5()
-        last_obj_path = None
-        for index, seg_dict in enumerate(parsed_data):
+        obj_names = []
+        for seg_dict in parsed_data:
             obj_name = seg_dict['path']
             if isinstance(obj_name, six.text_type):
                 obj_name = obj_name.encode('utf-8')
-            obj_path = '/'.join(['', vrs, account, obj_name.lstrip('/')])
-
-            new_env = req.environ.copy()
-            new_env['PATH_INFO'] = obj_path
-            new_env['REQUEST_METHOD'] = 'HEAD'
-            new_env['swift.source'] = 'SLO'
-            del(new_env['wsgi.input'])
-            del(new_env['QUERY_STRING'])
-            new_env['CONTENT_LENGTH'] = 0
-            new_env['HTTP_USER_AGENT'] = \
-                '%s MultipartPUT' % req.environ.get('HTTP_USER_AGENT')
-            if obj_path != last_obj_path:
-                last_obj_path = obj_path
-                head_seg_resp = \
-                    Request.blank(obj_path, new_env).get_response(self)
-
-            if head_seg_resp.is_success:
+            obj_names.append(obj_name)
+        head_seg_resps = self._head_segments(
+            req, ['/'.join(['', vrs, account, obj_name.lstrip('/')])
+                  for obj_name in obj_names])
+
+        for index, (seg_dict, obj_name, head_seg_resp) in enumerate(
+                zip(parsed_data, obj_names, head_seg_resps)):
+            if head_seg_resp is None:
+                problem_segments.append([quote(obj_name), 'Timed Out'])
+            elif head_seg_resp.is_success:
                 segment_length = head_seg_resp.content_length
                 if seg_dict.get('range'):
                     # Since we now know the length, we can normalize the
@@ -862,6 +907,63 @@ class StaticLargeObject(object):
         slo_put_context = SloPutContext(self, slo_etag)
         return slo_put_context.handle_slo_put(req, start_response)
 
+    def _head_segment(self, req, obj_path):
+        new_env = req.environ.copy()
+        new_env['PATH_INFO'] = obj_path
+        new_env['REQUEST_METHOD'] = 'HEAD'
+        new_env['swift.source'] = 'SLO'
+        del(new_env['wsgi.input'])
+        del(new_env['QUERY_STRING'])
+        new_env['CONTENT_LENGTH'] = 0
+        new_env['HTTP_USER_AGENT'] = \
+            '%s MultipartPUT' % req.environ.get('HTTP_USER_AGENT')
+        return Request.blank(obj_path, new_env).get_response(self)
+
+    def _head_segments(self, req, obj_paths):
+        """
+        HEADs the segments of a manifest being PUT, up to self.concurrency at
+        a time. Each distinct path is only HEADed once; sub-SLO manifests are
+        HEADed in the same pool as plain segments.
+
+        :params req: the manifest PUT request
+        :params obj_paths: the segment paths, in manifest order
+        :returns: a list of HEAD responses in the same order as obj_paths;
+                  an entry is None if its HEAD had not finished within
+                  self.max_manifest_validation_time seconds
+        """
+        resps = {}
+        deadline = None
+        if self.max_manifest_validation_time:
+            deadline = time.time() + self.max_manifest_validation_time
+        with ContextPool(self.concurrency) as pool:
+            heads = {}
+            for obj_path in obj_paths:
+                if obj_path in heads:
+                    continue
+                timeout = None
+                if deadline is not None:
+                    timeout = deadline - time.time()
+                    if timeout <= 0:
+                        break
+                # spawn waits for a free slot once the pool is full; segments
+                # not spawned by the deadline are left timed out
+                with Timeout(timeout, False):
+                    heads[obj_path] = pool.spawn(
+                        self._head_segment, req, obj_path)
+                if obj_path not in heads:
+                    break
+            for obj_path in obj_paths:
+                if obj_path in resps or obj_path not in heads:
+                    continue
+                timeout = None
+                if deadline is not None:
+                    # once past the deadline, still pick up any HEADs that
+                    # have already finished
+                    timeout = max(deadline - time.time(), 0)
+                with Timeout(timeout, False):
+                    resps[obj_path] = heads[obj_path].wait()
+        return [resps.get(obj_path) for obj_path in obj_paths]
+
     def get_segments_to_delete_iter(self, req):
         """
         A generator function to be used to delete all the segments and
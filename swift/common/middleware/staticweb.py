@@ -113,18 +113,42 @@ Example usage of this middleware via ``swift``:
 
     Now 0-byte objects with a content-type of text/directory will be treated
     as directories rather than objects.
+
+Rendered listings and the way paths resolve (to an index file, a listing, a
+redirect or a 404) can be cached by setting ``cache_ttl`` in the filter's
+configuration section::
+
+    [filter:staticweb]
+    use = egg:swift#staticweb
+    cache_ttl = 60
+    cache_size = 100
+
+Results are kept in memcache, if the ``cache`` middleware is in the pipeline,
+and in each proxy worker, for up to ``cache_ttl`` seconds. They are keyed on
+the container's web-* metadata and on a per-container generation that any
+successful object PUT, POST, DELETE or COPY passing through this middleware
+changes, so most page views then cost just the one request for the object or
+index file served. Objects written some other way, for instance by the object
+expirer, may be missing from listings until their results expire.
+Cached results are only served to clients the auth middleware would let read
+the requested path; anyone else is handled as if nothing were cached.
 """
 
 
 import cgi
+from hashlib import md5
 import json
 import time
+from uuid import uuid4
+
+from six.moves.urllib.parse import unquote
 
 from swift.common.utils import human_readable, split_path, config_true_value, \
-    quote, register_swift_info
+    quote, register_swift_info, cache_from_env, LRUCache
 from swift.common.wsgi import make_pre_authed_env, WSGIContext
 from swift.common.http import is_success, is_redirection, HTTP_NOT_FOUND
-from swift.common.swob import Response, HTTPMovedPermanently, HTTPNotFound
+from swift.common.swob import Request, Response, HTTPMovedPermanently, \
+    HTTPNotFound
 from swift.proxy.controllers.base import get_container_info
 
 
@@ -141,6 +165,7 @@ class _StaticWebContext(WSGIContext):
 
     def __init__(self, staticweb, version, account, container, obj):
         WSGIContext.__init__(self, staticweb.app)
+        self.staticweb = staticweb
         self.version = version
         self.account = account
         self.container = container
@@ -149,7 +174,11 @@ class _StaticWebContext(WSGIContext):
         self.agent = '%(orig)s StaticWeb'
         # Results from the last call to self._get_container_info.
         self._index = self._error = self._listings = self._listings_css = \
-            self._dir_type = None
+            self._dir_type = self._read_acl = None
+        # Whether the client may be served cached results, once checked.
+        self._cache_authorized = None
+        # The container's cache generation, once looked up.
+        self._generation = None
 
     def _error_response(self, response, env, start_response):
         """
@@ -191,9 +220,10 @@ class _StaticWebContext(WSGIContext):
         :param env: The WSGI environment dict.
         """
         self._index = self._error = self._listings = self._listings_css = \
-            self._dir_type = None
+            self._dir_type = self._read_acl = None
         container_info = get_container_info(env, self.app, swift_source='SW')
         if is_success(container_info['status']):
+            self._read_acl = container_info.get('read_acl')
             meta = container_info.get('meta', {})
             self._index = meta.get('web-index', '').strip()
             self._error = meta.get('web-error', '').strip()
@@ -201,6 +231,63 @@ class _StaticWebContext(WSGIContext):
             self._listings_css = meta.get('web-listings-css', '').strip()
             self._dir_type = meta.get('web-directory-type', '').strip()
 
+    def _cache_key(self, env, kind):
+        """
+        Returns the key to cache a kind of result for the requested path
+        under, given the container's web-* metadata and cache generation.
+
+        :param env: The original WSGI environment dict.
+        :param kind: The kind of result; 'listing' or 'resolved'.
+        """
+        if self._generation is None:
+            self._generation = self.staticweb.get_generation(
+                env, self.account, self.container)
+        meta_hash = md5(repr((
+            self._index, self._error, self._listings, self._listings_css,
+            self._dir_type))).hexdigest()
+        return 'staticweb/%s/%s/%s%s' % (
+            kind, self._generation, meta_hash, env['PATH_INFO'])
+
+    def _get_cached(self, env, kind):
+        """
+        Returns the cached result of a kind for the requested path, or None
+        if there is none or caching is off.
+        """
+        if not self.staticweb.cache_ttl or not self._authorized(env):
+            return None
+        return self.staticweb.get_cached(env, self._cache_key(env, kind))
+
+    def _authorized(self, env):
+        """
+        Returns whether the client may read the requested path, checked the
+        way the proxy checks the GET made for it when nothing is cached.
+        Cached results are only served to clients that may read them.
+
+        :param env: The original WSGI environment dict.
+        """
+        if self._cache_authorized is None:
+            authorize = env.get('swift.authorize')
+            if not authorize:
+                self._cache_authorized = True
+            elif not self.obj and not self._index:
+                # Uncached, the listing is made without the client's auth.
+                self._cache_authorized = True
+            else:
+                tmp_env = dict(env)
+                if not self.obj:
+                    tmp_env['PATH_INFO'] += self._index
+                req = Request(tmp_env)
+                req.acl = self._read_acl
+                self._cache_authorized = not authorize(req)
+        return self._cache_authorized
+
+    def _set_cached(self, env, kind, value):
+        """
+        Caches a result of a kind for the requested path, if caching is on.
+        """
+        if self.staticweb.cache_ttl:
+            self.staticweb.set_cached(env, self._cache_key(env, kind), value)
+
     def _listing(self, env, start_response, prefix=None):
         """
         Sends an HTML object listing to the remote client.
@@ -236,6 +323,10 @@ class _StaticWebContext(WSGIContext):
             body += ' </body>\n</html>\n'
             resp = HTTPNotFound(body=body)(env, self._start_response)
             return self._error_response(resp, env, start_response)
+        headers = {'Content-Type': 'text/html; charset=UTF-8'}
+        body = self._get_cached(env, 'listing')
+        if body is not None:
+            return Response(headers=headers, body=body)(env, start_response)
         tmp_env = make_pre_authed_env(
             env, 'GET', '/%s/%s/%s' % (
                 self.version, self.account, self.container),
@@ -255,7 +346,6 @@ class _StaticWebContext(WSGIContext):
         if not listing:
             resp = HTTPNotFound()(env, self._start_response)
             return self._error_response(resp, env, start_response)
-        headers = {'Content-Type': 'text/html; charset=UTF-8'}
         body = '<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 4.01 ' \
                'Transitional//EN" "http://www.w3.org/TR/html4/loose.dtd">\n' \
                '<html>\n' \
@@ -321,6 +411,7 @@ class _StaticWebContext(WSGIContext):
         body += '  </table>\n' \
                 ' </body>\n' \
                 '</html>\n'
+        self._set_cached(env, 'listing', body)
         resp = Response(headers=headers, body=body)
         return resp(env, start_response)
 
@@ -353,7 +444,7 @@ class _StaticWebContext(WSGIContext):
             resp = HTTPMovedPermanently(
                 location=(env['PATH_INFO'] + '/'))
             return resp(env, start_response)
-        if not self._index:
+        if not self._index or self._get_cached(env, 'resolved') == 'listing':
             return self._listing(env, start_response)
         tmp_env = dict(env)
         tmp_env['HTTP_USER_AGENT'] = \
@@ -363,6 +454,7 @@ class _StaticWebContext(WSGIContext):
         resp = self._app_call(tmp_env)
         status_int = self._get_status_int()
         if status_int == HTTP_NOT_FOUND:
+            self._set_cached(env, 'resolved', 'listing')
             return self._listing(env, start_response)
         elif not is_success(self._get_status_int()) and \
                 not is_redirection(self._get_status_int()):
@@ -379,6 +471,15 @@ class _StaticWebContext(WSGIContext):
         :param env: The original WSGI environment dict.
         :param start_response: The original WSGI start_response hook.
         """
+        if self.staticweb.cache_ttl:
+            self._get_container_info(env)
+            if self._listings or self._index:
+                resolved = self._get_cached(env, 'resolved')
+                if resolved:
+                    resp = self._handle_resolved(env, start_response,
+                                                 resolved)
+                    if resp is not None:
+                        return resp
         tmp_env = dict(env)
         tmp_env['HTTP_USER_AGENT'] = \
             '%s StaticWeb' % env.get('HTTP_USER_AGENT')
@@ -421,9 +522,11 @@ class _StaticWebContext(WSGIContext):
             status_int = self._get_status_int()
             if is_success(status_int) or is_redirection(status_int):
                 if env['PATH_INFO'][-1] != '/':
+                    self._set_cached(env, 'resolved', 'redirect')
                     resp = HTTPMovedPermanently(
                         location=env['PATH_INFO'] + '/')
                     return resp(env, start_response)
+                self._set_cached(env, 'resolved', 'index')
                 start_response(self._response_status, self._response_headers,
                                self._response_exc_info)
                 return resp
@@ -437,14 +540,53 @@ class _StaticWebContext(WSGIContext):
                     '=/&limit=1&prefix=%s' % quote(self.obj + '/')
                 resp = self._app_call(tmp_env)
                 body = ''.join(resp)
-                if not is_success(self._get_status_int()) or not body or \
-                        not json.loads(body):
+                if not is_success(self._get_status_int()):
                     resp = HTTPNotFound()(env, self._start_response)
                     return self._error_response(resp, env, start_response)
+                if not body or not json.loads(body):
+                    self._set_cached(env, 'resolved', 'not_found')
+                    resp = HTTPNotFound()(env, self._start_response)
+                    return self._error_response(resp, env, start_response)
+                self._set_cached(env, 'resolved', 'redirect')
                 resp = HTTPMovedPermanently(location=env['PATH_INFO'] + '/')
                 return resp(env, start_response)
+            self._set_cached(env, 'resolved', 'listing')
             return self._listing(env, start_response, self.obj)
 
+    def _handle_resolved(self, env, start_response, resolved):
+        """
+        Handles a request for an object path that was cached as resolving to
+        an index file, a listing, a redirect or a 404, without looking the
+        object up first.
+
+        :param env: The original WSGI environment dict.
+        :param start_response: The original WSGI start_response hook.
+        :param resolved: What the path was cached as resolving to.
+        :returns: The response, or None if the cached index file could not
+                  be served and the request should be handled afresh.
+        """
+        if resolved == 'redirect':
+            resp = HTTPMovedPermanently(location=env['PATH_INFO'] + '/')
+            return resp(env, start_response)
+        if resolved == 'listing':
+            return self._listing(env, start_response, self.obj)
+        if resolved == 'not_found':
+            resp = HTTPNotFound()(env, self._start_response)
+            return self._error_response(resp, env, start_response)
+        if resolved == 'index':
+            tmp_env = dict(env)
+            tmp_env['HTTP_USER_AGENT'] = \
+                '%s StaticWeb' % env.get('HTTP_USER_AGENT')
+            tmp_env['swift.source'] = 'SW'
+            tmp_env['PATH_INFO'] += self._index
+            resp = self._app_call(tmp_env)
+            status_int = self._get_status_int()
+            if is_success(status_int) or is_redirection(status_int):
+                start_response(self._response_status, self._response_headers,
+                               self._response_exc_info)
+                return resp
+        return None
+
 
 class StaticWeb(object):
     """
@@ -463,6 +605,12 @@ class StaticWeb(object):
         self.app = app
         #: The filter configuration dict.
         self.conf = conf
+        #: Seconds to cache listings and path resolutions for; 0 is off.
+        self.cache_ttl = float(conf.get('cache_ttl', 0))
+        #: Listings, path resolutions and, without memcache, container
+        #: generations kept in this worker.
+        self.local_cache = LRUCache(maxsize=int(conf.get('cache_size', 100)),
+                                    maxtime=self.cache_ttl)
 
     def __call__(self, env, start_response):
         """
@@ -478,6 +626,9 @@ class StaticWeb(object):
         except ValueError:
             return self.app(env, start_response)
         if env['REQUEST_METHOD'] not in ('HEAD', 'GET'):
+            if self.cache_ttl and container and obj:
+                return self._handle_write(env, start_response, account,
+                                          container)
             return self.app(env, start_response)
         if env.get('REMOTE_USER') and \
                 not config_true_value(env.get('HTTP_X_WEB_MODE', 'f')):
@@ -489,6 +640,94 @@ class StaticWeb(object):
             return context.handle_object(env, start_response)
         return context.handle_container(env, start_response)
 
+    def _handle_write(self, env, start_response, account, container):
+        """
+        Passes an object write on, changing the cache generation of the
+        container written to once it has succeeded.
+
+        :param env: The WSGI environment dict.
+        :param start_response: The WSGI start_response hook.
+        :param account: The account of the object written to.
+        :param container: The container of the object written to.
+        """
+        if env['REQUEST_METHOD'] == 'COPY' and env.get('HTTP_DESTINATION'):
+            account = unquote(env.get('HTTP_DESTINATION_ACCOUNT', account))
+            container = unquote(
+                env['HTTP_DESTINATION'].lstrip('/').split('/', 1)[0])
+
+        def write_start_response(status, headers, exc_info=None):
+            if is_success(int(status.split(' ', 1)[0])):
+                self.set_generation(env, account, container)
+            return start_response(status, headers, exc_info)
+
+        return self.app(env, write_start_response)
+
+    def _generation_key(self, account, container):
+        return 'staticweb/generation/%s/%s' % (account, container)
+
+    def get_generation(self, env, account, container):
+        """
+        Returns the container's cache generation, starting a new one if it
+        has none.
+
+        :param env: The WSGI environment dict.
+        :param account: The account name.
+        :param container: The container name.
+        """
+        key = self._generation_key(account, container)
+        memcache_client = cache_from_env(env, True)
+        if memcache_client:
+            generation = memcache_client.get(key)
+        else:
+            generation = self.local_cache.get(key)
+        if generation is None:
+            generation = self.set_generation(env, account, container)
+        return generation
+
+    def set_generation(self, env, account, container):
+        """
+        Starts a new cache generation for the container, so that whatever was
+        cached for it before is no longer used.
+
+        :param env: The WSGI environment dict.
+        :param account: The account name.
+        :param container: The container name.
+        :returns: The new generation.
+        """
+        key = self._generation_key(account, container)
+        generation = uuid4().hex
+        memcache_client = cache_from_env(env, True)
+        if memcache_client:
+            memcache_client.set(key, generation, serialize=False)
+        else:
+            self.local_cache.set(key, generation)
+        return generation
+
+    def get_cached(self, env, key):
+        """
+        Returns the value cached under key in this worker or in memcache, or
+        None.
+        """
+        value = self.local_cache.get(key)
+        if value is None:
+            memcache_client = cache_from_env(env, True)
+            if memcache_client:
+                value = memcache_client.get(key)
+                if value is not None:
+                    self.local_cache.set(key, value)
+        return value
+
+    def set_cached(self, env, key, value):
+        """
+        Caches value under key in this worker and in memcache for cache_ttl
+        seconds.
+        """
+        self.local_cache.set(key, value)
+        memcache_client = cache_from_env(env, True)
+        if memcache_client:
+            memcache_client.set(key, value, serialize=False,
+                                time=self.cache_ttl)
+
 
 def filter_factory(global_conf, **local_conf):
     """Returns a Static Web WSGI filter for use with paste.deploy."""
@@ -33,7 +33,7 @@ from swift.common.request_helpers import get_sys_meta_prefix
 from swift.common.middleware.acl import (
     clean_acl, parse_acl, referrer_allowed, acls_from_account_info)
 from swift.common.utils import cache_from_env, get_logger, \
-    split_path, config_true_value, register_swift_info
+    split_path, config_true_value, register_swift_info, LRUCache
 from swift.common.utils import config_read_reseller_options
 from swift.proxy.controllers.base import get_account_info
 
@@ -182,6 +182,12 @@ class TempAuth(object):
         if self.auth_prefix[-1] != '/':
             self.auth_prefix += '/'
         self.token_life = int(conf.get('token_life', 86400))
+        self.token_cache_ttl = float(conf.get('token_cache_ttl', 0))
+        self.invalid_token_cache_ttl = \
+            float(conf.get('invalid_token_cache_ttl', 0))
+        self.token_cache = LRUCache(
+            maxsize=int(conf.get('token_cache_size', 1000)),
+            maxtime=max(self.token_cache_ttl, self.invalid_token_cache_ttl))
         self.allow_overrides = config_true_value(
             conf.get('allow_overrides', 't'))
         self.storage_url_scheme = conf.get('storage_url_scheme', 'default')
@@ -384,14 +390,23 @@ class TempAuth(object):
         memcache_client = cache_from_env(env)
         if not memcache_client:
             raise Exception('Memcache required')
+        s3 = env.get('HTTP_AUTHORIZATION')
+        if not s3:
+            locally_cached = self.token_cache.get(token)
+            if locally_cached and locally_cached[0] > time():
+                return locally_cached[1]
         memcache_token_key = '%s/token/%s' % (self.reseller_prefix, token)
         cached_auth_data = memcache_client.get(memcache_token_key)
         if cached_auth_data:
             expires, groups = cached_auth_data
             if expires < time():
                 groups = None
+            elif not s3:
+                self._cache_token(token, groups, expires)
+        if not groups and not s3:
+            self._cache_token(token, None)
 
-        if env.get('HTTP_AUTHORIZATION'):
+        if s3:
             account_user, sign = \
                 env['HTTP_AUTHORIZATION'].split(' ')[1].rsplit(':', 1)
             if account_user not in self.users:
@@ -409,6 +424,31 @@ class TempAuth(object):
 
         return groups
 
+    def _cache_token(self, token, groups, expires=None):
+        """
+        Remembers what memcache said about a token in this worker, so that
+        the next requests with the same token needn't ask again.
+
+        Valid tokens are kept for up to token_cache_ttl seconds (but never
+        past their expiry) and invalid ones for invalid_token_cache_ttl
+        seconds. Memcache stays the source of truth: all the local cache can
+        do is answer for it a little longer.
+
+        :param token: the token looked up
+        :param groups: the group string memcache had for the token, or None
+                       if the token is invalid
+        :param expires: when the token expires, if it is valid
+        """
+        if groups:
+            if not self.token_cache_ttl:
+                return
+            cache_until = min(time() + self.token_cache_ttl, expires)
+        else:
+            if not self.invalid_token_cache_ttl:
+                return
+            cache_until = time() + self.invalid_token_cache_ttl
+        self.token_cache.set(token, (cache_until, groups))
+
     def account_acls(self, req):
         """
         Return a dict of ACL data from the account server via get_account_info.
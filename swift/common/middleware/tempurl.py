@@ -116,6 +116,8 @@ __all__ = ['TempURL', 'filter_factory',
            'DEFAULT_OUTGOING_ALLOW_HEADERS']
 
 
+from hashlib import sha1
+import hmac
 from os.path import basename
 from time import time
 
@@ -125,7 +127,7 @@ from six.moves.urllib.parse import urlencode
 from swift.proxy.controllers.base import get_account_info, get_container_info
 from swift.common.swob import HeaderKeyDict, HTTPUnauthorized, HTTPBadRequest
 from swift.common.utils import split_path, get_valid_utf8_str, \
-    register_swift_info, get_hmac, streq_const_time, quote
+    register_swift_info, streq_const_time, quote, LRUCache
 
 
 DISALLOWED_INCOMING_HEADERS = 'x-object-manifest'
@@ -325,6 +327,20 @@ class TempURL(object):
         #: HTTP user agent to use for subrequests.
         self.agent = '%(orig)s TempURL'
 
+        cache_size = int(conf.get('cache_size', 1000))
+        #: HMAC-SHA1 objects already keyed with a temp URL key, to be copied
+        #: for each signature checked rather than set up from scratch.
+        self.hmac_cache = LRUCache(maxsize=cache_size)
+        #: Seconds to keep an account's and container's keys in this worker.
+        self.key_cache_ttl = float(conf.get('key_cache_ttl', 0))
+        self.key_cache = LRUCache(maxsize=cache_size,
+                                  maxtime=self.key_cache_ttl)
+        #: Seconds to remember that a signature didn't match in this worker.
+        self.invalid_signature_cache_ttl = \
+            float(conf.get('invalid_signature_cache_ttl', 0))
+        self.invalid_signature_cache = LRUCache(
+            maxsize=cache_size, maxtime=self.invalid_signature_cache_ttl)
+
     def __call__(self, env, start_response):
         """
         Main hook into the WSGI paste.deploy filter/app pipeline.
@@ -344,32 +360,41 @@ class TempURL(object):
         account, container = self._get_account_and_container(env)
         if not account:
             return self._invalid(env, start_response)
-        keys = self._get_keys(env)
+        signature = (env['REQUEST_METHOD'], env['PATH_INFO'],
+                     temp_url_expires, temp_url_sig)
+        if self.invalid_signature_cache_ttl and \
+                self.invalid_signature_cache.get(signature):
+            return self._invalid(env, start_response)
+        if self.key_cache_ttl:
+            keys = self.key_cache.get((account, container))
+            if keys is None:
+                keys = self.key_cache.set((account, container),
+                                          self._get_keys(env))
+        else:
+            keys = self._get_keys(env)
         if not keys:
             return self._invalid(env, start_response)
         if env['REQUEST_METHOD'] == 'HEAD':
-            hmac_vals = (
-                self._get_hmacs(env, temp_url_expires, keys) +
-                self._get_hmacs(env, temp_url_expires, keys,
-                                request_method='GET') +
-                self._get_hmacs(env, temp_url_expires, keys,
-                                request_method='POST') +
-                self._get_hmacs(env, temp_url_expires, keys,
-                                request_method='PUT'))
+            request_methods = ('HEAD', 'GET', 'POST', 'PUT')
         else:
-            hmac_vals = self._get_hmacs(env, temp_url_expires, keys)
+            request_methods = (env['REQUEST_METHOD'],)
 
-        is_valid_hmac = False
         hmac_scope = None
-        for hmac, scope in hmac_vals:
-            # While it's true that we short-circuit, this doesn't affect the
-            # timing-attack resistance since the only way this will
-            # short-circuit is when a valid signature is passed in.
-            if streq_const_time(temp_url_sig, hmac):
-                is_valid_hmac = True
-                hmac_scope = scope
+        for request_method in request_methods:
+            for hmac_val, scope in self._get_hmacs(
+                    env, temp_url_expires, keys,
+                    request_method=request_method):
+                # While it's true that we short-circuit, this doesn't affect
+                # the timing-attack resistance since the only way this will
+                # short-circuit is when a valid signature is passed in.
+                if streq_const_time(temp_url_sig, hmac_val):
+                    hmac_scope = scope
+                    break
+            if hmac_scope:
                 break
-        if not is_valid_hmac:
+        if not hmac_scope:
+            if self.invalid_signature_cache_ttl:
+                self.invalid_signature_cache.set(signature, True)
             return self._invalid(env, start_response)
         # disallowed headers prevent accidently allowing upload of a pointer
         # to data that the PUT tempurl would not otherwise allow access for.
@@ -515,9 +540,17 @@ class TempURL(object):
         """
         if not request_method:
             request_method = env['REQUEST_METHOD']
-        return [
-            (get_hmac(request_method, env['PATH_INFO'], expires, key), scope)
-            for (key, scope) in scoped_keys]
+        hmac_body = '%s\n%s\n%s' % (request_method, expires, env['PATH_INFO'])
+        hmacs = []
+        for key, scope in scoped_keys:
+            keyed_hmac = self.hmac_cache.get(key)
+            if keyed_hmac is None:
+                keyed_hmac = self.hmac_cache.set(
+                    key, hmac.new(key, digestmod=sha1))
+            hmac_val = keyed_hmac.copy()
+            hmac_val.update(hmac_body)
+            hmacs.append((hmac_val.hexdigest(), scope))
+        return hmacs
 
     def _invalid(self, env, start_response):
         """
@@ -20,11 +20,14 @@ Why not swift.common.utils, you ask? Because this way we can import things
 from swob in here without creating circular imports.
 """
 
+from collections import deque
 import hashlib
 import itertools
 import sys
 import time
 
+import eventlet
+from eventlet.event import Event
 import six
 from six.moves.urllib.parse import unquote
 
@@ -34,7 +37,8 @@ from swift.common.constraints import FORMAT2CONTENT_TYPE
 from swift.common.exceptions import ListingIterError, SegmentError
 from swift.common.http import is_success
 from swift.common.swob import (HTTPBadRequest, HTTPNotAcceptable,
-                               HTTPServiceUnavailable, Range)
+                               HTTPServiceUnavailable, Range,
+                               multi_range_iterator)
 from swift.common.utils import split_path, validate_device_partition, \
     close_if_possible, maybe_multipart_byteranges_to_document_iters
 
@@ -272,11 +276,17 @@ class SegmentedIterable(object):
     :param name: name of manifest (used in logging only)
     :param response_body_length: optional response body length for
                                  the response being sent to the client.
+    :param prefetch_segments: number of segment GETs to keep in flight ahead
+                              of the segment currently being sent to the
+                              client; 0 fetches segments one at a time.
+    :param prefetch_buffer_size: maximum number of bytes of segment data to
+                                 read ahead across all prefetched segments.
     """
 
     def __init__(self, req, app, listing_iter, max_get_time,
                  logger, ua_suffix, swift_source,
-                 name='<not specified>', response_body_length=None):
+                 name='<not specified>', response_body_length=None,
+                 prefetch_segments=0, prefetch_buffer_size=0):
         self.req = req
         self.app = app
         self.listing_iter = listing_iter
@@ -290,6 +300,11 @@ class SegmentedIterable(object):
         self.app_iter = self._internal_iter()
         self.validated_first_segment = False
         self.current_resp = None
+        self.prefetch_segments = prefetch_segments
+        self.prefetch_buffer_size = prefetch_buffer_size
+        self.prefetched_bytes = 0
+        self.prefetch_buffer_freed = None
+        self.prefetches = deque()
 
     def _coalesce_requests(self):
         start_time = time.time()
@@ -360,12 +375,79 @@ class SegmentedIterable(object):
         if pending_req:
             yield pending_req, pending_etag, pending_size
 
+    def _segment_responses(self):
+        """
+        Yields (seg_req, seg_etag, seg_size, seg_resp, seg_body) for each
+        segment request in order, where seg_body iterates over the segment's
+        response body.
+
+        If prefetching is enabled, up to prefetch_segments GETs are kept in
+        flight ahead of the segment being yielded. An error from the listing
+        is only raised once the segments ahead of it have been yielded, just
+        as it would have been without prefetching.
+        """
+        if not self.prefetch_segments:
+            for seg_req, seg_etag, seg_size in self._coalesce_requests():
+                seg_resp = seg_req.get_response(self.app)
+                yield (seg_req, seg_etag, seg_size, seg_resp,
+                       seg_resp.app_iter)
+            return
+
+        requests_iter = self._coalesce_requests()
+        listing_exc_info = None
+        try:
+            while True:
+                while (listing_exc_info is None and
+                       len(self.prefetches) <= self.prefetch_segments):
+                    try:
+                        seg_req, seg_etag, seg_size = next(requests_iter)
+                    except StopIteration:
+                        break
+                    except (ListingIterError, SegmentError):
+                        listing_exc_info = sys.exc_info()
+                        break
+                    self.prefetches.append(
+                        PrefetchedSegment(self, seg_req, seg_etag, seg_size))
+                if not self.prefetches:
+                    break
+                prefetch = self.prefetches.popleft()
+                seg_resp, seg_body = prefetch.take()
+                yield (prefetch.seg_req, prefetch.seg_etag, prefetch.seg_size,
+                       seg_resp, seg_body)
+        finally:
+            self._abandon_prefetches()
+        if listing_exc_info:
+            six.reraise(*listing_exc_info)
+
+    def _abandon_prefetches(self):
+        while self.prefetches:
+            self.prefetches.popleft().abandon()
+
+    def _wait_for_prefetch_buffer(self):
+        """
+        Waits until some of the prefetch buffer is freed, or until a
+        prefetched segment is taken.
+        """
+        if self.prefetch_buffer_freed is None:
+            self.prefetch_buffer_freed = Event()
+        self.prefetch_buffer_freed.wait()
+
+    def _free_prefetch_buffer(self, nbytes):
+        """
+        Returns nbytes to the prefetch buffer and wakes up the prefetched
+        segments that are waiting for room in it.
+        """
+        self.prefetched_bytes -= nbytes
+        if self.prefetch_buffer_freed is not None:
+            self.prefetch_buffer_freed.send()
+            self.prefetch_buffer_freed = None
+
     def _internal_iter(self):
         bytes_left = self.response_body_length
 
         try:
-            for seg_req, seg_etag, seg_size in self._coalesce_requests():
-                seg_resp = seg_req.get_response(self.app)
+            for seg_req, seg_etag, seg_size, seg_resp, seg_body in \
+                    self._segment_responses():
                 if not is_success(seg_resp.status_int):
                     close_if_possible(seg_resp.app_iter)
                     raise SegmentError(
@@ -401,8 +483,7 @@ class SegmentedIterable(object):
                     seg_hash = hashlib.md5()
 
                 document_iters = maybe_multipart_byteranges_to_document_iters(
-                    seg_resp.app_iter,
-                    seg_resp.headers['Content-Type'])
+                    seg_body, seg_resp.headers['Content-Type'])
 
                 for chunk in itertools.chain.from_iterable(document_iters):
                     if seg_hash:
@@ -449,6 +530,43 @@ class SegmentedIterable(object):
         """
         return self
 
+    def app_iter_ranges(self, ranges, content_type, boundary, size):
+        """
+        swob.Response calls this to send a multipart/byteranges response for
+        a request with several byte ranges.
+
+        The listing iter must yield the segment subranges for each of those
+        byte ranges in turn, so that each part is just the next
+        (stop - start) bytes of this object's body.
+        """
+        body_iter = iter(self)
+        leftover = []
+
+        def part_iter(start, stop):
+            length = stop - start
+            while length > 0:
+                if leftover:
+                    chunk = leftover.pop()
+                else:
+                    try:
+                        chunk = next(body_iter)
+                    except StopIteration:
+                        raise SegmentError(
+                            'Not enough bytes for %s; closing connection' %
+                            self.name)
+                if len(chunk) > length:
+                    leftover.append(chunk[length:])
+                    chunk = chunk[:length]
+                length -= len(chunk)
+                yield chunk
+
+        try:
+            for chunk in multi_range_iterator(ranges, content_type, boundary,
+                                              size, part_iter):
+                yield chunk
+        finally:
+            self.close()
+
     def validate_first_segment(self):
         """
         Start fetching object data to ensure that the first segment (if any) is
@@ -482,3 +600,85 @@ class SegmentedIterable(object):
         """
         if self.current_resp:
             close_if_possible(self.current_resp.app_iter)
+        self._abandon_prefetches()
+
+
+class PrefetchedSegment(object):
+    """
+    A segment GET started by a SegmentedIterable ahead of the segment it is
+    currently sending to the client.
+
+    The GET runs in its own greenthread, which goes on to read the response
+    body into the SegmentedIterable's prefetch buffer, waiting whenever that
+    buffer is full for the segments ahead to free some of it.  Whatever is
+    not read ahead is read straight from the response once the segment's
+    turn comes.
+
+    :param seg_iter: the SegmentedIterable this segment belongs to
+    :param seg_req: the segment's subrequest
+    :param seg_etag: the segment's expected etag, or None
+    :param seg_size: the segment's expected size, or None
+    """
+
+    def __init__(self, seg_iter, seg_req, seg_etag, seg_size):
+        self.seg_iter = seg_iter
+        self.seg_req = seg_req
+        self.seg_etag = seg_etag
+        self.seg_size = seg_size
+        self.resp = None
+        self.resp_iter = None
+        self.chunks = deque()
+        self.stopping = False
+        self.thread = eventlet.spawn(self._run)
+
+    def _run(self):
+        self.resp = self.seg_req.get_response(self.seg_iter.app)
+        if not is_success(self.resp.status_int):
+            return
+        self.resp_iter = iter(self.resp.app_iter)
+        while not self.stopping:
+            if (self.seg_iter.prefetched_bytes >=
+                    self.seg_iter.prefetch_buffer_size):
+                self.seg_iter._wait_for_prefetch_buffer()
+                continue
+            try:
+                chunk = next(self.resp_iter)
+            except StopIteration:
+                break
+            self.chunks.append(chunk)
+            self.seg_iter.prefetched_bytes += len(chunk)
+
+    def _body_iter(self):
+        while self.chunks:
+            chunk = self.chunks.popleft()
+            self.seg_iter._free_prefetch_buffer(len(chunk))
+            yield chunk
+        for chunk in self.resp_iter:
+            yield chunk
+
+    def take(self):
+        """
+        Stops reading ahead, waiting for the GET if it is still in flight.
+
+        :returns: a tuple of (response, body iterable); the body iterable
+                  yields whatever was read ahead followed by the rest of the
+                  response body
+        :raises: whatever the GET raised
+        """
+        self.stopping = True
+        # wake the greenthread up if it is waiting for room in the buffer
+        self.seg_iter._free_prefetch_buffer(0)
+        self.thread.wait()
+        if self.resp_iter is None:
+            return self.resp, self.resp.app_iter
+        return self.resp, self._body_iter()
+
+    def abandon(self):
+        """
+        Stops the GET and closes its response, if any.
+        """
+        self.thread.kill()
+        if self.resp is not None:
+            close_if_possible(self.resp.app_iter)
+        while self.chunks:
+            self.seg_iter._free_prefetch_buffer(len(self.chunks.popleft()))
@@ -31,6 +31,7 @@ VALID_CHARS = '-' + string.ascii_letters + string.digits
 
 DEFAULT_POLICY_TYPE = REPL_POLICY = 'replication'
 EC_POLICY = 'erasure_coding'
+PACKED_POLICY = 'packed'
 
 DEFAULT_EC_OBJECT_SEGMENT_SIZE = 1048576
 
@@ -320,6 +321,20 @@ class StoragePolicy(BaseStoragePolicy):
         return quorum_size(self.object_ring.replica_count)
 
 
+@BaseStoragePolicy.register(PACKED_POLICY)
+class PackedStoragePolicy(StoragePolicy):
+    """
+    Represents a storage policy of type 'packed'.  Objects are replicated
+    just as they are for a 'replication' policy, but the object servers pack
+    them into large volume files rather than keeping a directory and a file
+    per object; see :mod:`swift.obj.packed_diskfile`.
+
+    Not meant to be instantiated directly; use
+    :func:`~swift.common.storage_policy.reload_storage_policies` to load
+    POLICIES from ``swift.conf``.
+    """
+
+
 @BaseStoragePolicy.register(EC_POLICY)
 class ECStoragePolicy(BaseStoragePolicy):
     """
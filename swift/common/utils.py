@@ -17,6 +17,8 @@
 
 from __future__ import print_function
 
+import atexit
+from bisect import bisect_left
 import errno
 import fcntl
 import grp
@@ -89,6 +91,7 @@ SysLogHandler.priority_map['NOTICE'] = 'notice'
 # These are lazily pulled from libc elsewhere
 _sys_fallocate = None
 _posix_fadvise = None
+_sync_file_range = None
 _libc_socket = None
 _libc_bind = None
 _libc_accept = None
@@ -691,6 +694,44 @@ def drop_buffer_cache(fd, offset, length):
                                     'length': length, 'ret': ret})
 
 
+def prefetch_buffer_cache(fd, offset, length):
+    """
+    Start reading the given range of the given file into the 'buffer' cache,
+    ahead of the reads that will want it.
+
+    :param fd: file descriptor
+    :param offset: start offset
+    :param length: length
+    """
+    global _posix_fadvise
+    if _posix_fadvise is None:
+        _posix_fadvise = load_libc_function('posix_fadvise64')
+    # 3 means "POSIX_FADV_WILLNEED"
+    ret = _posix_fadvise(fd, ctypes.c_uint64(offset),
+                         ctypes.c_uint64(length), 3)
+    if ret != 0:
+        logging.warn("posix_fadvise64(%(fd)s, %(offset)s, %(length)s, 3) "
+                     "-> %(ret)s", {'fd': fd, 'offset': offset,
+                                    'length': length, 'ret': ret})
+
+
+def start_writeback(fd):
+    """
+    Start writing the dirty pages of a file out to disk without waiting for
+    them. This is only a hint that lets the writes of several files be issued
+    together; the file still has to be fsync'd to be durable.
+
+    :param fd: file descriptor
+    """
+    global _sync_file_range
+    if _sync_file_range is None:
+        _sync_file_range = load_libc_function('sync_file_range',
+                                              log_error=False)
+    # 2 means "SYNC_FILE_RANGE_WRITE"; offset 0 and length 0 cover the whole
+    # file
+    _sync_file_range(fd, ctypes.c_uint64(0), ctypes.c_uint64(0), 2)
+
+
 NORMAL_FORMAT = "%016.05f"
 INTERNAL_FORMAT = NORMAL_FORMAT + '_%016x'
 MAX_OFFSET = (16 ** 16) - 1
@@ -951,6 +992,7 @@ def renamer(old, new, fsync=True):
     :param new: new path to be renamed to
     :param fsync: fsync on containing directory of new and also all
                   the newly created directories.
+    :returns: the number of directories created above new
     """
     dirpath = os.path.dirname(new)
     try:
@@ -967,6 +1009,7 @@ def renamer(old, new, fsync=True):
         for i in range(0, count + 1):
             fsync_dir(dirpath)
             dirpath = os.path.dirname(dirpath)
+    return count
 
 
 def split_path(path, minsegs=1, maxsegs=None, rest_with_last=False):
@@ -1203,6 +1246,199 @@ class StatsdClient(object):
                                sample_rate)
 
 
+class BufferedStatsdClient(StatsdClient):
+    """
+    A StatsdClient that aggregates metrics in memory and sends them once
+    every flush_interval seconds, packed several to a UDP packet, rather
+    than sending a packet for every call.
+
+    Counters are summed per metric. Since every call is counted, counters
+    are not sampled. Timings are subject to the usual sample rates; at most
+    max_timings of them are kept per metric and flush, after which a random
+    sample of them is kept and sent with a sample rate that accounts for
+    the rest.
+
+    If percentiles are given, timings are instead counted into the fixed
+    timing_buckets, and for each timing metric the client sends a
+    ``<metric>.count`` counter along with ``<metric>.p<N>`` gauges for the
+    percentiles and a ``<metric>.max`` gauge. Sampled timings are counted
+    as 1 / sample rate timings each.
+
+    Metrics are sent by the first call made once flush_interval has passed,
+    by a greenthread once flush_interval has passed if no call comes, at
+    exit, or by calling flush().
+    """
+
+    #: Packets are filled up to this many bytes.
+    max_packet_size = 1400
+    #: Upper bounds, in milliseconds, of the buckets timings are counted
+    #: into when percentiles are reported. Longer timings go into a last,
+    #: unbounded bucket.
+    timing_buckets = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000,
+                      10000, 20000, 50000, 100000)
+
+    def __init__(self, host, port, base_prefix='', tail_prefix='',
+                 default_sample_rate=1, sample_rate_factor=1, logger=None,
+                 flush_interval=1, max_timings=100, percentiles=None):
+        super(BufferedStatsdClient, self).__init__(
+            host, port, base_prefix, tail_prefix, default_sample_rate,
+            sample_rate_factor, logger=logger)
+        self.flush_interval = flush_interval
+        self.max_timings = max_timings
+        self.percentiles = percentiles
+        self._counters = {}
+        # (metric, sample rate) -> [timings seen, timings kept], or with
+        # percentiles, metric -> [count per bucket, longest timing]
+        self._timings = {}
+        self._next_flush = time.time() + flush_interval
+        # the greenthread that flushes what has been collected if no call
+        # does first
+        self._flusher = None
+        _buffered_statsd_clients.add(self)
+
+    def _maybe_flush(self):
+        now = time.time()
+        if now >= self._next_flush:
+            self.flush()
+        elif self._flusher is None:
+            self._flusher = greenthread.spawn_after(
+                self._next_flush - now, self._timed_flush)
+
+    def _timed_flush(self):
+        self._flusher = None
+        self.flush()
+
+    def update_stats(self, m_name, m_value, sample_rate=None):
+        m_name = self._prefix + m_name
+        self._counters[m_name] = self._counters.get(m_name, 0) + m_value
+        self._maybe_flush()
+
+    def timing(self, metric, timing_ms, sample_rate=None):
+        if sample_rate is None:
+            sample_rate = self._default_sample_rate
+        sample_rate = sample_rate * self._sample_rate_factor
+        if sample_rate < 1 and self.random() >= sample_rate:
+            return
+        if self.percentiles:
+            self._count_timing(self._prefix + metric, timing_ms, sample_rate)
+            self._maybe_flush()
+            return
+        key = (self._prefix + metric, sample_rate)
+        entry = self._timings.get(key)
+        if entry is None:
+            entry = self._timings[key] = [0, []]
+        entry[0] += 1
+        if len(entry[1]) < self.max_timings:
+            entry[1].append(timing_ms)
+        else:
+            # reservoir sampling: every timing seen is equally likely kept
+            index = int(self.random() * entry[0])
+            if index < self.max_timings:
+                entry[1][index] = timing_ms
+        self._maybe_flush()
+
+    def _count_timing(self, m_name, timing_ms, sample_rate):
+        histogram = self._timings.get(m_name)
+        if histogram is None:
+            histogram = self._timings[m_name] = [
+                [0.0] * (len(self.timing_buckets) + 1), timing_ms]
+        histogram[0][bisect_left(self.timing_buckets, timing_ms)] += \
+            1.0 / sample_rate
+        histogram[1] = max(histogram[1], timing_ms)
+
+    def _get_percentile(self, counts, longest, percentile):
+        """
+        Estimates a percentile of the timings counted into buckets, assuming
+        that the timings in a bucket are spread evenly across it.
+        """
+        target = sum(counts) * percentile / 100.0
+        seen = 0.0
+        for index, count in enumerate(counts):
+            if count and seen + count >= target:
+                lower = self.timing_buckets[index - 1] if index else 0
+                if index < len(self.timing_buckets):
+                    upper = min(self.timing_buckets[index], longest)
+                else:
+                    upper = longest
+                return lower + (upper - lower) * (target - seen) / count
+            seen += count
+        return longest
+
+    def _get_histogram_lines(self, timings):
+        lines = []
+        for m_name, (counts, longest) in timings.items():
+            lines.append('%s.count:%d|c' % (m_name, round(sum(counts))))
+            for percentile in self.percentiles:
+                lines.append('%s.p%s:%s|g' % (
+                    m_name, ('%g' % percentile).replace('.', '_'),
+                    self._get_percentile(counts, longest, percentile)))
+            lines.append('%s.max:%s|g' % (m_name, longest))
+        return lines
+
+    def _get_lines(self, counters, timings):
+        lines = ['%s:%s|c' % (m_name, value)
+                 for m_name, value in counters.items()]
+        if self.percentiles:
+            return lines + self._get_histogram_lines(timings)
+        for (m_name, sample_rate), (seen, kept) in timings.items():
+            sample_rate = sample_rate * len(kept) / float(seen)
+            if sample_rate < 1:
+                suffix = '|ms|@%s' % (sample_rate,)
+            else:
+                suffix = '|ms'
+            lines.extend('%s:%s%s' % (m_name, timing_ms, suffix)
+                         for timing_ms in kept)
+        return lines
+
+    def flush(self):
+        """
+        Sends everything collected since the last flush.
+        """
+        counters, self._counters = self._counters, {}
+        timings, self._timings = self._timings, {}
+        self._next_flush = time.time() + self.flush_interval
+        flusher, self._flusher = self._flusher, None
+        if flusher is not None:
+            flusher.cancel()
+        packets = []
+        packet = []
+        packet_size = 0
+        for line in self._get_lines(counters, timings):
+            if packet and packet_size + len(line) >= self.max_packet_size:
+                packets.append('\n'.join(packet))
+                packet = []
+                packet_size = 0
+            packet.append(line)
+            packet_size += len(line) + 1
+        if packet:
+            packets.append('\n'.join(packet))
+        if not packets:
+            return
+        with closing(self._open_socket()) as sock:
+            for packet in packets:
+                try:
+                    sock.sendto(packet, self._target)
+                except IOError as err:
+                    if self.logger:
+                        self.logger.warn(
+                            'Error sending UDP message to %r: %s',
+                            self._target, err)
+                    return
+
+
+_buffered_statsd_clients = weakref.WeakSet()
+
+
+@atexit.register
+def flush_buffered_statsd_clients():
+    """
+    Sends whatever every :class:`BufferedStatsdClient` still has collected.
+    Called at exit, so that a process's last metrics are not lost.
+    """
+    for client in list(_buffered_statsd_clients):
+        client.flush()
+
+
 def server_handled_successfully(status_int):
     """
     True for successful responses *or* error codes that are not Swift's fault,
@@ -1384,8 +1620,9 @@ class LogAdapter(logging.LoggerAdapter, object):
 
         @functools.wraps(func)
         def wrapped(self, *a, **kw):
-            if getattr(self.logger, 'statsd_client'):
-                return func(self.logger.statsd_client, *a, **kw)
+            statsd_client = getattr(self.logger, 'statsd_client')
+            if statsd_client:
+                return getattr(statsd_client, statsd_func_name)(*a, **kw)
         return wrapped
 
     update_stats = statsd_delegate('update_stats')
@@ -1540,9 +1777,19 @@ def get_logger(conf, name=None, log_to_console=False, log_route=None,
             'log_statsd_default_sample_rate', 1))
         sample_rate_factor = float(conf.get(
             'log_statsd_sample_rate_factor', 1))
-        statsd_client = StatsdClient(statsd_host, statsd_port, base_prefix,
-                                     name, default_sample_rate,
-                                     sample_rate_factor, logger=logger)
+        flush_interval = float(conf.get('log_statsd_flush_interval', 0))
+        if flush_interval > 0:
+            percentiles = [float(p) for p in list_from_csv(
+                conf.get('log_statsd_timing_percentiles'))]
+            statsd_client = BufferedStatsdClient(
+                statsd_host, statsd_port, base_prefix, name,
+                default_sample_rate, sample_rate_factor, logger=logger,
+                flush_interval=flush_interval, percentiles=percentiles)
+        else:
+            statsd_client = StatsdClient(statsd_host, statsd_port,
+                                         base_prefix, name,
+                                         default_sample_rate,
+                                         sample_rate_factor, logger=logger)
         logger.statsd_client = statsd_client
     else:
         logger.statsd_client = None
@@ -2890,6 +3137,10 @@ class LRUCache(object):
         self.head[self.NEXT] = self.tail
 
     def set_cache(self, value, *key):
+        link = self.mapping.pop(key, None)
+        if link is not None:
+            link[self.PREV][self.NEXT] = link[self.NEXT]
+            link[self.NEXT][self.PREV] = link[self.PREV]
         while len(self.mapping) >= self.maxsize:
             old_next, old_key = self.head[self.NEXT][self.NEXT:self.NEXT + 2]
             self.head[self.NEXT], old_next[self.PREV] = old_next, self.head
@@ -2911,6 +3162,37 @@ class LRUCache(object):
         link[self.NEXT] = self.tail
         return value
 
+    def get(self, key, default=None):
+        """
+        Returns the value cached for key, or default if there isn't one or it
+        has timed out.
+
+        This, along with set, allows an LRUCache to be used directly rather
+        than as a decorator.
+        """
+        link = self.mapping.get((key,))
+        if link is None:
+            return default
+        try:
+            return self.get_cached(link, key)
+        except KeyError:
+            return default
+
+    def set(self, key, value):
+        """
+        Caches value for key and returns it.
+        """
+        return self.set_cache(value, key)
+
+    def delete(self, key):
+        """
+        Removes any value cached for key.
+        """
+        link = self.mapping.pop((key,), None)
+        if link is not None:
+            link[self.PREV][self.NEXT] = link[self.NEXT]
+            link[self.NEXT][self.PREV] = link[self.PREV]
+
     def __call__(self, f):
 
         class LRUCacheWrapped(object):
@@ -531,6 +531,69 @@ class ContainerController(BaseStorageServer):
         ret.request = req
         return ret
 
+    @public
+    @timing_stats()
+    def UPDATE(self, req):
+        """
+        Handle HTTP UPDATE request (a json-encoded list of object PUTs and
+        DELETEs to merge into the container, as batched by the
+        object-updater.)
+
+        Each item has the 'name', 'created_at', 'size', 'content_type',
+        'etag', 'deleted' and 'storage_policy_index' of an object row.
+        """
+        drive, part, account, container = split_and_validate_path(req, 4)
+        if self.mount_check and not check_mount(self.root, drive):
+            return HTTPInsufficientStorage(drive=drive, request=req)
+        try:
+            items = json.load(req.environ['wsgi.input'])
+            if not isinstance(items, list):
+                raise ValueError('expected a list of items')
+            items = [self._make_update_item(item) for item in items]
+        except (AttributeError, KeyError, TypeError, ValueError) as err:
+            return HTTPBadRequest(body='Invalid UPDATE: %s' % err,
+                                  content_type='text/plain', request=req)
+        if not items:
+            return HTTPNoContent(request=req)
+        broker = self._get_container_broker(drive, part, account, container)
+        if account.startswith(self.auto_create_account_prefix) and \
+                not os.path.exists(broker.db_file):
+            first = min(items, key=lambda item: item['created_at'])
+            try:
+                broker.initialize(first['created_at'],
+                                  first['storage_policy_index'])
+            except DatabaseAlreadyExists:
+                pass
+        if not os.path.exists(broker.db_file):
+            return HTTPNotFound()
+        broker.merge_items(items)
+        return HTTPNoContent(request=req)
+
+    def _make_update_item(self, item):
+        """
+        Validate an item of an UPDATE request and make an object row of it.
+
+        :raises ValueError: if the item is not valid
+        """
+        name = item['name'].encode('utf-8')
+        if not name or not check_utf8(name) or \
+                len(name) > constraints.MAX_OBJECT_NAME_LENGTH:
+            raise ValueError('invalid object name %r' % name)
+        policy_index = int(item['storage_policy_index'])
+        if POLICIES.get_by_index(policy_index) is None:
+            raise ValueError('invalid storage policy index %r' %
+                             policy_index)
+        deleted = int(item['deleted'])
+        if deleted not in (0, 1):
+            raise ValueError('invalid deleted value %r' % deleted)
+        return {'name': name,
+                'created_at': Timestamp(item['created_at']).internal,
+                'size': int(item['size']),
+                'content_type': item['content_type'].encode('utf-8'),
+                'etag': item['etag'].encode('utf-8'),
+                'deleted': deleted,
+                'storage_policy_index': policy_index}
+
     @public
     @timing_stats()
     def POST(self, req):
@@ -0,0 +1,225 @@
+# Copyright (c) 2015 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+An append-only journal of async pending container updates.
+
+By default each container update that the object server fails to make is
+pickled to a file of its own under ``async_pending/<suffix>/``, so an outage
+of a container server turns into an inode for every object written during it.
+With ``async_pending_journal`` set, the updates are instead appended to one
+``journal`` file per policy in the device's async pending directory.
+
+Each record is framed by a magic, the length of its payload and the CRC32 of
+its payload, so that a record torn by a crash is skipped rather than breaking
+the records after it. Object servers append under a shared lock, relying on
+``O_APPEND`` to keep their records apart. To process the journal, the
+updater renames it aside to ``journal.<timestamp>`` and takes an exclusive
+lock on it, which waits out appends already under way; appenders notice that
+the file they locked is no longer the journal and start a new one. The
+updater then streams through the segment twice: once to index the newest
+update of each object hash, and once to send those updates. Updates that
+fail are appended to the new journal and the segment is unlinked, so each
+sweep compacts the journal down to the updates still outstanding.
+"""
+
+import errno
+import fcntl
+import os
+import six.moves.cPickle as pickle
+import struct
+import time
+import zlib
+
+from swift import gettext_ as _
+from swift.common.utils import Timestamp, fdatasync, fsync_dir, listdir, \
+    mkdirs
+
+JOURNAL_FILE = 'journal'
+RECORD_MAGIC = 'SAJ1'
+# magic, length of the payload, CRC32 of the payload
+RECORD_HEADER = struct.Struct('!4sII')
+MAX_RECORD_SIZE = 1 << 20
+PICKLE_PROTOCOL = 2
+READ_CHUNK_SIZE = 65536
+
+
+def is_journal_file(filename):
+    """
+    Returns True if filename is the name of a journal or of a journal segment
+    set aside for the updater.
+    """
+    return filename == JOURNAL_FILE or filename.startswith(JOURNAL_FILE + '.')
+
+
+class AsyncPendingJournal(object):
+    """
+    The journal of async pending updates of one policy on one device.
+
+    :param async_dir: the policy's async pending directory on the device
+    :param logger: a logger to report corrupt records to
+    """
+
+    def __init__(self, async_dir, logger=None):
+        self.async_dir = async_dir
+        self.path = os.path.join(async_dir, JOURNAL_FILE)
+        self.logger = logger
+
+    def append(self, obj_hash, timestamp, update):
+        """
+        Append an update to the journal and fdatasync it. This blocks, so the
+        object server calls it in a thread pool.
+
+        :param obj_hash: the hash of the object the update is for
+        :param timestamp: the internal form of the update's timestamp
+        :param update: the update, as pickled to an async pending file
+        """
+        payload = pickle.dumps((obj_hash, timestamp, update), PICKLE_PROTOCOL)
+        record = RECORD_HEADER.pack(
+            RECORD_MAGIC, len(payload),
+            zlib.crc32(payload) & 0xffffffff) + payload
+        mkdirs(self.async_dir)
+        while True:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_SH)
+                try:
+                    is_journal = (os.stat(self.path).st_ino ==
+                                  os.fstat(fd).st_ino)
+                except OSError as err:
+                    if err.errno != errno.ENOENT:
+                        raise
+                    is_journal = False
+                if not is_journal:
+                    # the updater set this file aside before we locked it
+                    continue
+                created = os.fstat(fd).st_size == 0
+                while record:
+                    record = record[os.write(fd, record):]
+                fdatasync(fd)
+                if created:
+                    fsync_dir(self.async_dir)
+                return
+            finally:
+                os.close(fd)
+
+    def rotate(self):
+        """
+        Set the journal aside so that updates appended from now on go to a
+        new one.
+
+        :returns: the paths of the journal segments to process, oldest first,
+                  including any left behind by an earlier sweep
+        """
+        segment = '%s.%s' % (self.path, Timestamp(time.time()).internal)
+        try:
+            os.rename(self.path, segment)
+        except OSError as err:
+            if err.errno != errno.ENOENT:
+                raise
+        else:
+            # wait for appends to the set aside journal to finish
+            fd = os.open(segment, os.O_RDONLY)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            finally:
+                os.close(fd)
+        return [os.path.join(self.async_dir, filename)
+                for filename in sorted(listdir(self.async_dir))
+                if filename.startswith(JOURNAL_FILE + '.')]
+
+    def _corrupt(self, segment, offset):
+        if self.logger:
+            self.logger.increment('errors')
+            self.logger.error(
+                _('ERROR skipping corrupt async pending journal data in '
+                  '%(segment)s at offset %(offset)d'),
+                {'segment': segment, 'offset': offset})
+
+    def _iter_payloads(self, segment):
+        """
+        Stream the intact payloads out of a journal segment.
+
+        :returns: an iterator of (offset, payload) tuples
+        """
+        with open(segment, 'rb') as fp:
+            offset = 0
+            while True:
+                header = fp.read(RECORD_HEADER.size)
+                if not header:
+                    return
+                if len(header) == RECORD_HEADER.size:
+                    magic, length, crc = RECORD_HEADER.unpack(header)
+                    if magic == RECORD_MAGIC and length <= MAX_RECORD_SIZE:
+                        payload = fp.read(length)
+                        if len(payload) == length and \
+                                zlib.crc32(payload) & 0xffffffff == crc:
+                            yield offset, payload
+                            offset += RECORD_HEADER.size + length
+                            continue
+                self._corrupt(segment, offset)
+                # look for the next record after the bad one's magic
+                offset = self._find_magic(fp, offset + 1)
+                if offset is None:
+                    return
+                fp.seek(offset)
+
+    def _find_magic(self, fp, offset):
+        fp.seek(offset)
+        data = ''
+        while True:
+            chunk = fp.read(READ_CHUNK_SIZE)
+            if not chunk:
+                return None
+            data = data[-(len(RECORD_MAGIC) - 1):] + chunk
+            found = data.find(RECORD_MAGIC)
+            if found >= 0:
+                return fp.tell() - len(data) + found
+
+    def iter_records(self, segment):
+        """
+        Stream the records out of a journal segment, skipping corrupt ones.
+
+        :returns: an iterator of (offset, obj_hash, timestamp, update) tuples
+        """
+        for offset, payload in self._iter_payloads(segment):
+            try:
+                obj_hash, timestamp, update = pickle.loads(payload)
+            except Exception:
+                self._corrupt(segment, offset)
+                continue
+            yield offset, obj_hash, timestamp, update
+
+    def index(self, segment):
+        """
+        Index the newest update of each object in a journal segment.
+
+        :returns: a dict mapping each object hash to the offset of its newest
+                  update; where an object has several updates with the same
+                  timestamp, the last appended wins
+        """
+        newest = {}
+        for offset, obj_hash, timestamp, _junk in self.iter_records(segment):
+            if obj_hash not in newest or timestamp >= newest[obj_hash][0]:
+                newest[obj_hash] = (timestamp, offset)
+        return dict((obj_hash, offset)
+                    for obj_hash, (_junk, offset) in newest.items())
+
+    def count(self, segment):
+        """
+        Count the intact records in a journal segment without unpickling
+        them.
+        """
+        return sum(1 for _junk in self._iter_payloads(segment))
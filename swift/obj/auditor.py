@@ -17,18 +17,186 @@ import os
 import sys
 import time
 import signal
+import sqlite3
+from itertools import chain
 from random import shuffle
 from swift import gettext_ as _
 from contextlib import closing
-from eventlet import Timeout
+from eventlet import GreenPool, Timeout
+from eventlet.semaphore import Semaphore
 
 from swift.obj import diskfile
+from swift.common.db import get_db_connection
 from swift.common.utils import get_logger, ratelimit_sleep, dump_recon_cache, \
-    list_from_csv, json, listdir
+    list_from_csv, json, listdir, config_true_value, ismount
 from swift.common.exceptions import DiskFileQuarantined, DiskFileNotExist
 from swift.common.daemon import Daemon
+from swift.common.storage_policy import POLICIES, PACKED_POLICY
 
 SLEEP_BETWEEN_AUDITS = 30
+AUDIT_INDEX_FILE = 'object_audit.db'
+# number of audits recorded in the audit index at a time
+AUDIT_INDEX_BATCH_SIZE = 100
+# size of the reads of objects checksummed in threads, unless
+# disk_chunk_size is set
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+
+
+class AuditIndex(object):
+    """
+    A persistent index of when each object on a device was last audited,
+    kept in a SQLite database at the root of the device.
+
+    It is what lets the auditor audit the objects that were never audited,
+    or have changed since, before those audited longest ago; and lets it
+    pick up a pass that was interrupted where it left off, rather than
+    auditing the objects it already got to again.
+
+    :param devices: parent directory of the devices
+    :param device: the device the index is of
+    """
+
+    def __init__(self, devices, device):
+        self.device = device
+        self.device_path = os.path.join(devices, device)
+        self.db_file = os.path.join(self.device_path, AUDIT_INDEX_FILE)
+        self.conn = get_db_connection(self.db_file, okay_to_create=True)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS audited (
+                path TEXT PRIMARY KEY,
+                partition TEXT,
+                storage_policy_index INTEGER,
+                timestamp TEXT,
+                etag TEXT,
+                last_audited REAL
+            );
+            CREATE INDEX IF NOT EXISTS ix_audited_last_audited
+                ON audited (last_audited, path);
+            CREATE TABLE IF NOT EXISTS audit_pass (
+                started REAL,
+                completed REAL
+            );
+        """)
+        self.conn.commit()
+        self.pass_started = None
+        self.pending = []
+
+    def close(self):
+        self.conn.close()
+
+    def _relpath(self, location):
+        return os.path.relpath(location.path, self.device_path)
+
+    def begin_pass(self):
+        """
+        Begins a pass over the device, or resumes the last pass if it was
+        not completed.
+
+        :returns: the time the pass began if it is being resumed, else None
+        """
+        row = self.conn.execute(
+            'SELECT started, completed FROM audit_pass').fetchone()
+        if row and not row['completed']:
+            self.pass_started = row['started']
+            return self.pass_started
+        self.pass_started = time.time()
+        self.conn.execute('DELETE FROM audit_pass')
+        self.conn.execute('INSERT INTO audit_pass (started) VALUES (?)',
+                          (self.pass_started,))
+        self.conn.commit()
+
+    def complete_pass(self):
+        """
+        Records that the pass over the device has been completed.
+        """
+        self.flush()
+        self.conn.execute('UPDATE audit_pass SET completed = ?',
+                          (time.time(),))
+        self.conn.commit()
+
+    def needs_audit(self, location):
+        """
+        Returns True if the object at location has not been audited since
+        it last changed, nor yet in this pass.
+        """
+        row = self.conn.execute(
+            'SELECT last_audited FROM audited WHERE path = ?',
+            (self._relpath(location),)).fetchone()
+        if not row:
+            return True
+        if row['last_audited'] >= self.pass_started:
+            return False
+        try:
+            return os.stat(location.path).st_mtime > row['last_audited']
+        except OSError:
+            # let the audit find out what is wrong
+            return True
+
+    def record(self, location, metadata):
+        """
+        Records that the object at location has just been audited.
+
+        :param location: the object's audit location
+        :param metadata: the object's metadata
+        """
+        self.pending.append((
+            'INSERT OR REPLACE INTO audited (path, partition, '
+            'storage_policy_index, timestamp, etag, last_audited) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (self._relpath(location), str(location.partition),
+             int(location.policy), metadata.get('X-Timestamp'),
+             metadata.get('ETag'), time.time())))
+        if len(self.pending) >= AUDIT_INDEX_BATCH_SIZE:
+            self.flush()
+
+    def forget(self, location):
+        """
+        Removes the object at location, which is gone, from the index.
+        """
+        self.pending.append(('DELETE FROM audited WHERE path = ?',
+                             (self._relpath(location),)))
+        if len(self.pending) >= AUDIT_INDEX_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """
+        Commits the audits recorded so far to the database.
+        """
+        if not self.pending:
+            return
+        for query, args in self.pending:
+            self.conn.execute(query, args)
+        self.conn.commit()
+        self.pending = []
+
+    def iter_least_recently_audited(self):
+        """
+        Yields the audit locations of the objects not yet audited in this
+        pass, least recently audited first.
+        """
+        self.flush()
+        last_audited, path = -1, ''
+        while True:
+            rows = self.conn.execute(
+                'SELECT path, partition, storage_policy_index, last_audited '
+                'FROM audited WHERE last_audited < ? AND '
+                '(last_audited > ? OR (last_audited = ? AND path > ?)) '
+                'ORDER BY last_audited, path LIMIT ?',
+                (self.pass_started, last_audited, last_audited, path,
+                 AUDIT_INDEX_BATCH_SIZE)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                policy = POLICIES.get_by_index(row['storage_policy_index'])
+                location = diskfile.AuditLocation(
+                    os.path.join(self.device_path, row['path']),
+                    self.device, row['partition'], policy)
+                if policy is None:
+                    self.forget(location)
+                    continue
+                yield location
+            last_audited, path = rows[-1]['last_audited'], rows[-1]['path']
+            self.flush()
 
 
 class AuditorWorker(object):
@@ -38,7 +206,6 @@ class AuditorWorker(object):
         self.conf = conf
         self.logger = logger
         self.devices = devices
-        self.diskfile_mgr = diskfile.DiskFileManager(conf, self.logger)
         self.max_files_per_second = float(conf.get('files_per_second', 20))
         self.max_bytes_per_second = float(conf.get('bytes_per_second',
                                                    10000000))
@@ -47,6 +214,22 @@ class AuditorWorker(object):
         if self.zero_byte_only_at_fps:
             self.max_files_per_second = float(self.zero_byte_only_at_fps)
             self.auditor_type = 'ZBF'
+        # objects are only checksummed by the ALL auditor
+        self.checksum_threads = 0
+        if self.auditor_type == 'ALL':
+            self.checksum_threads = int(conf.get('checksum_threads', 0))
+        diskfile_conf = conf
+        if self.checksum_threads > 0:
+            # each object being audited gets a thread of its device's pool
+            diskfile_conf = dict(conf,
+                                 threads_per_disk=self.checksum_threads)
+            diskfile_conf.setdefault('disk_chunk_size', CHECKSUM_CHUNK_SIZE)
+        self.diskfile_mgr = diskfile.DiskFileManager(diskfile_conf,
+                                                     self.logger)
+        self.diskfile_router = diskfile.DiskFileRouter(diskfile_conf,
+                                                       self.logger)
+        self.pool = None
+        self.bytes_rate_lock = Semaphore()
         self.log_time = int(conf.get('log_time', 3600))
         self.last_logged = 0
         self.files_running_time = 0
@@ -62,6 +245,11 @@ class AuditorWorker(object):
             [int(s) for s in list_from_csv(conf.get('object_size_stats'))])
         self.stats_buckets = dict(
             [(s, 0) for s in self.stats_sizes + ['OVER']])
+        # the zero byte files auditor does not read objects, so gains
+        # nothing from putting some before others
+        self.use_audit_index = self.auditor_type == 'ALL' and \
+            config_true_value(conf.get('audit_index', 'false'))
+        self.audit_indexes = {}
 
     def create_recon_nested_dict(self, top_level_key, device_list, item):
         if device_list:
@@ -86,12 +274,29 @@ class AuditorWorker(object):
         total_quarantines = 0
         total_errors = 0
         time_auditing = 0
-        all_locs = self.diskfile_mgr.object_audit_location_generator(
-            device_dirs=device_dirs)
+        if self.use_audit_index:
+            all_locs = self.indexed_audit_location_generator(
+                device_dirs=device_dirs)
+        else:
+            all_locs = self.diskfile_mgr.object_audit_location_generator(
+                device_dirs=device_dirs)
+        packed_policies = [policy for policy in POLICIES
+                           if policy.policy_type == PACKED_POLICY]
+        if packed_policies:
+            # objects of packed policies have no hash dirs to be found by
+            # walking the devices; their manager lists them from its index
+            all_locs = chain(all_locs, self.diskfile_router[
+                packed_policies[0]].object_audit_location_generator(
+                    device_dirs=device_dirs))
+        if self.checksum_threads > 0:
+            self.pool = GreenPool(self.checksum_threads)
         for location in all_locs:
             loop_time = time.time()
-            self.failsafe_object_audit(location)
-            self.logger.timing_since('timing', loop_time)
+            if self.pool:
+                # waits while checksum_threads objects are being audited
+                self.pool.spawn_n(self.timed_object_audit, location)
+            else:
+                self.timed_object_audit(location)
             self.files_running_time = ratelimit_sleep(
                 self.files_running_time, self.max_files_per_second)
             self.total_files_processed += 1
@@ -129,6 +334,8 @@ class AuditorWorker(object):
                 self.bytes_processed = 0
                 self.last_logged = now
             time_auditing += (now - loop_time)
+        self.wait_for_audits()
+        self.pool = None
         # Avoid divide by zero during very short runs
         elapsed = (time.time() - begin) or 0.000001
         self.logger.info(_(
@@ -148,6 +355,68 @@ class AuditorWorker(object):
             self.logger.info(
                 _('Object audit stats: %s') % json.dumps(self.stats_buckets))
 
+    def indexed_audit_location_generator(self, device_dirs=None):
+        """
+        Like diskfile.object_audit_location_generator, but yields the
+        locations of each device in the order of its audit index: first the
+        objects never audited or changed since they were, then the others
+        least recently audited first, skipping those already audited in an
+        interrupted pass that is being resumed.
+
+        :param device_dirs: a list of directories under devices to traverse
+        """
+        mgr = self.diskfile_mgr
+        if not device_dirs:
+            device_dirs = listdir(self.devices)
+        else:
+            device_dirs = list(
+                set(listdir(self.devices)).intersection(set(device_dirs)))
+        shuffle(device_dirs)
+        for device in device_dirs:
+            locations = diskfile.object_audit_location_generator(
+                self.devices, mgr.mount_check, self.logger,
+                device_dirs=[device])
+            if mgr.mount_check and not \
+                    ismount(os.path.join(self.devices, device)):
+                # let the generator skip it
+                for location in locations:
+                    yield location
+                continue
+            try:
+                index = AuditIndex(self.devices, device)
+            except sqlite3.Error:
+                self.logger.exception(
+                    _('ERROR opening the audit index of %s'), device)
+                for location in locations:
+                    yield location
+                continue
+            self.audit_indexes[device] = index
+            try:
+                resumed = index.begin_pass()
+                if resumed:
+                    self.logger.info(
+                        _('Resuming audit pass of %(device)s begun '
+                          '%(start_time)s'),
+                        {'device': device, 'start_time': time.ctime(resumed)})
+                for location in locations:
+                    if index.needs_audit(location):
+                        yield location
+                for location in index.iter_least_recently_audited():
+                    yield location
+                self.wait_for_audits()
+                index.complete_pass()
+            finally:
+                # audits still in flight record themselves in the index
+                self.wait_for_audits()
+                del self.audit_indexes[device]
+                index.flush()
+                index.close()
+
+    def _audit_index_for(self, location):
+        if location.policy.policy_type == PACKED_POLICY:
+            return None
+        return self.audit_indexes.get(location.device)
+
     def record_stats(self, obj_size):
         """
         Based on config's object_size_stats will keep track of how many objects
@@ -165,6 +434,18 @@ class AuditorWorker(object):
         else:
             self.stats_buckets["OVER"] += 1
 
+    def wait_for_audits(self):
+        """
+        Waits for the objects being audited concurrently to be done with.
+        """
+        if self.pool:
+            self.pool.waitall()
+
+    def timed_object_audit(self, location):
+        start_time = time.time()
+        self.failsafe_object_audit(location)
+        self.logger.timing_since('timing', start_time)
+
     def failsafe_object_audit(self, location):
         """
         Entrypoint to object_audit, with a failsafe generic exception handler.
@@ -187,7 +468,10 @@ class AuditorWorker(object):
             raise DiskFileQuarantined(msg)
 
         try:
-            df = self.diskfile_mgr.get_diskfile_from_audit_location(location)
+            diskfile_mgr = self.diskfile_mgr
+            if location.policy.policy_type == PACKED_POLICY:
+                diskfile_mgr = self.diskfile_router[location.policy]
+            df = diskfile_mgr.get_diskfile_from_audit_location(location)
             with df.open():
                 metadata = df.get_metadata()
                 obj_size = int(metadata['Content-Length'])
@@ -196,23 +480,40 @@ class AuditorWorker(object):
                 if self.zero_byte_only_at_fps and obj_size:
                     self.passes += 1
                     return
-                reader = df.reader(_quarantine_hook=raise_dfq)
+                if self.checksum_threads > 0:
+                    reader = df.reader(_quarantine_hook=raise_dfq,
+                                       _readahead=True, _hash_in_thread=True)
+                else:
+                    reader = df.reader(_quarantine_hook=raise_dfq)
             with closing(reader):
                 for chunk in reader:
                     chunk_len = len(chunk)
-                    self.bytes_running_time = ratelimit_sleep(
-                        self.bytes_running_time,
-                        self.max_bytes_per_second,
-                        incr_by=chunk_len)
+                    # objects audited concurrently take turns to sleep, so
+                    # that they share bytes_per_second between them
+                    with self.bytes_rate_lock:
+                        self.bytes_running_time = ratelimit_sleep(
+                            self.bytes_running_time,
+                            self.max_bytes_per_second,
+                            incr_by=chunk_len)
                     self.bytes_processed += chunk_len
                     self.total_bytes_processed += chunk_len
         except DiskFileNotExist:
+            index = self._audit_index_for(location)
+            if index:
+                index.forget(location)
             return
         except DiskFileQuarantined as err:
             self.quarantines += 1
             self.logger.error(_('ERROR Object %(obj)s failed audit and was'
                                 ' quarantined: %(err)s'),
                               {'obj': location, 'err': err})
+            index = self._audit_index_for(location)
+            if index:
+                index.forget(location)
+        else:
+            index = self._audit_index_for(location)
+            if index:
+                index.record(location, metadata)
         self.passes += 1
 
 
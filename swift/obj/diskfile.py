@@ -38,15 +38,17 @@ import time
 import uuid
 import hashlib
 import logging
+import struct
 import traceback
 import xattr
 from os.path import basename, dirname, exists, getmtime, join, splitext
 from random import shuffle
 from tempfile import mkstemp
 from contextlib import contextmanager
-from collections import defaultdict
+from collections import defaultdict, deque
 
-from eventlet import Timeout
+from eventlet import Timeout, sleep, spawn_n
+from eventlet.event import Event
 from eventlet.hubs import trampoline
 
 from swift import gettext_ as _
@@ -56,7 +58,8 @@ from swift.common.utils import mkdirs, Timestamp, \
     storage_directory, hash_path, renamer, fallocate, fsync, fdatasync, \
     fsync_dir, drop_buffer_cache, ThreadPool, lock_path, write_pickle, \
     config_true_value, listdir, split_path, ismount, remove_file, \
-    get_md5_socket, F_SETPIPE_SZ
+    get_md5_socket, F_SETPIPE_SZ, start_writeback, LRUCache, \
+    prefetch_buffer_cache
 from swift.common.splice import splice, tee
 from swift.common.exceptions import DiskFileQuarantined, DiskFileNotExist, \
     DiskFileCollision, DiskFileNoSpace, DiskFileDeviceUnavailable, \
@@ -65,7 +68,8 @@ from swift.common.exceptions import DiskFileQuarantined, DiskFileNotExist, \
 from swift.common.swob import multi_range_iterator
 from swift.common.storage_policy import (
     get_policy_string, split_policy_string, PolicyError, POLICIES,
-    REPL_POLICY, EC_POLICY)
+    REPL_POLICY, EC_POLICY, PACKED_POLICY)
+from swift.obj.async_journal import AsyncPendingJournal
 from functools import partial
 
 
@@ -73,7 +77,17 @@ PICKLE_PROTOCOL = 2
 ONE_WEEK = 604800
 HASH_FILE = 'hashes.pkl'
 METADATA_KEY = 'user.swift.metadata'
+# Metadata written in the compact encoding starts with this magic (which no
+# pickle of a dict starts with) and a version byte, then has a bitmask of the
+# hot keys present and their length-prefixed values; the remaining keys, if
+# any, follow as a pickled dict.
+COMPACT_METADATA_MAGIC = '\x00swm'
+COMPACT_METADATA_VERSION = 1
+HOT_METADATA_KEYS = ('name', 'X-Timestamp', 'Content-Length', 'ETag',
+                     'Content-Type')
 DROP_CACHE_WINDOW = 1024 * 1024
+# how far ahead of its reads a reader asked to read ahead keeps the kernel
+READAHEAD_WINDOW = 8 * 1024 * 1024
 # These are system-set metadata keys that cannot be changed with a POST.
 # They should be lowercase.
 DATAFILE_SYSTEM_META = set('content-length content-type deleted etag'.split())
@@ -84,6 +98,17 @@ get_data_dir = partial(get_policy_string, DATADIR_BASE)
 get_async_dir = partial(get_policy_string, ASYNCDIR_BASE)
 get_tmp_dir = partial(get_policy_string, TMP_BASE)
 MD5_OF_EMPTY_STRING = 'd41d8cd98f00b204e9800998ecf8427e'
+# Classes of I/O the operations on a device are scheduled in, in order of
+# priority, and their default weights
+CLIENT_IO = 'client'
+REPLICATION_IO = 'replication'
+AUDIT_IO = 'audit'
+IO_CLASSES = (CLIENT_IO, REPLICATION_IO, AUDIT_IO)
+DEFAULT_IO_WEIGHTS = {CLIENT_IO: 8, REPLICATION_IO: 2, AUDIT_IO: 1}
+# Files and directories changed less than this many seconds ago are not
+# cached, as a further change within the filesystem's timestamp granularity
+# would go unnoticed
+METADATA_CACHE_RACY_WINDOW = 1
 
 
 def _get_filename(fd):
@@ -102,11 +127,95 @@ def _get_filename(fd):
     return fd
 
 
-def read_metadata(fd):
+def _metadata_cache_key(statbuf):
     """
-    Helper function to read the pickled metadata from an object file.
+    Helper function to identify the version of a file or directory that an
+    entry in a metadata cache was made from.
+
+    :param statbuf: the result of stat()ing the file or directory
+    :returns: a tuple that changes whenever the file or directory does, or
+              None if it changed too recently to be cached
+    """
+    if time.time() - max(statbuf.st_mtime, statbuf.st_ctime) < \
+            METADATA_CACHE_RACY_WINDOW:
+        return None
+    return (statbuf.st_ino, statbuf.st_size, statbuf.st_mtime,
+            statbuf.st_ctime)
+
+
+def encode_compact_metadata(metadata):
+    """
+    Helper function to encode metadata in the compact encoding.
+
+    Values of the hot keys go in the header when they are byte strings short
+    enough for it; everything else is pickled after it, so that the metadata
+    decodes to exactly the same dict.
+
+    :param metadata: dictionary of metadata
+    :returns: the encoded metadata
+    """
+    rest = dict(metadata)
+    mask = 0
+    values = []
+    for i, key in enumerate(HOT_METADATA_KEYS):
+        value = rest.get(key)
+        if isinstance(value, str) and len(value) <= 0xffff:
+            mask |= 1 << i
+            values.append(struct.pack('!H', len(value)) + value)
+            del rest[key]
+    encoded = COMPACT_METADATA_MAGIC + struct.pack(
+        '!BB', COMPACT_METADATA_VERSION, mask) + ''.join(values)
+    if rest:
+        encoded += pickle.dumps(rest, PICKLE_PROTOCOL)
+    return encoded
+
+
+def decode_compact_metadata(encoded, hot_only=False):
+    """
+    Helper function to decode metadata in the compact encoding.
+
+    :param encoded: the encoded metadata, or a prefix of it
+    :param hot_only: if True, only decode the hot keys in the header
+    :returns: dictionary of metadata, or None if encoded ends before the
+              header does
+    :raises ValueError: if the metadata is in an unknown version of the
+                        encoding
+    """
+    offset = len(COMPACT_METADATA_MAGIC)
+    if len(encoded) < offset + 2:
+        return None
+    version, mask = struct.unpack_from('!BB', encoded, offset)
+    if version != COMPACT_METADATA_VERSION:
+        raise ValueError('Unknown metadata encoding version %d' % version)
+    offset += 2
+    metadata = {}
+    for i, key in enumerate(HOT_METADATA_KEYS):
+        if not mask & (1 << i):
+            continue
+        if len(encoded) < offset + 2:
+            return None
+        length, = struct.unpack_from('!H', encoded, offset)
+        offset += 2
+        if len(encoded) < offset + length:
+            return None
+        metadata[key] = encoded[offset:offset + length]
+        offset += length
+    if not hot_only and offset < len(encoded):
+        metadata.update(pickle.loads(encoded[offset:]))
+    return metadata
+
+
+def read_metadata(fd, hot_only=False):
+    """
+    Helper function to read the metadata from an object file, whether it was
+    pickled or written in the compact encoding.
 
     :param fd: file descriptor or filename to load the metadata from
+    :param hot_only: if True and the metadata is in the compact encoding,
+                     only the keys in :data:`HOT_METADATA_KEYS` are returned,
+                     read from as few xattrs as hold them and without
+                     unpickling anything; pickled metadata is always
+                     returned in full
 
     :returns: dictionary of metadata
     """
@@ -117,6 +226,10 @@ def read_metadata(fd):
             metadata += xattr.getxattr(fd, '%s%s' % (METADATA_KEY,
                                                      (key or '')))
             key += 1
+            if hot_only and metadata.startswith(COMPACT_METADATA_MAGIC):
+                hot_metadata = decode_compact_metadata(metadata, True)
+                if hot_metadata is not None:
+                    return hot_metadata
     except (IOError, OSError) as e:
         for err in 'ENOTSUP', 'EOPNOTSUPP':
             if hasattr(errno, err) and e.errno == getattr(errno, err):
@@ -128,17 +241,27 @@ def read_metadata(fd):
             raise DiskFileNotExist()
         # TODO: we might want to re-raise errors that don't denote a missing
         # xattr here.  Seems to be ENODATA on linux and ENOATTR on BSD/OSX.
+    if metadata.startswith(COMPACT_METADATA_MAGIC):
+        decoded = decode_compact_metadata(metadata)
+        if decoded is None:
+            raise EOFError()
+        return decoded
     return pickle.loads(metadata)
 
 
-def write_metadata(fd, metadata, xattr_size=65536):
+def write_metadata(fd, metadata, xattr_size=65536, compact=False):
     """
     Helper function to write pickled metadata for an object file.
 
     :param fd: file descriptor or filename to write the metadata
     :param metadata: metadata to write
+    :param compact: if True, write the metadata in the compact encoding
+                    rather than pickling it
     """
-    metastr = pickle.dumps(metadata, PICKLE_PROTOCOL)
+    if compact:
+        metastr = encode_compact_metadata(metadata)
+    else:
+        metastr = pickle.dumps(metadata, PICKLE_PROTOCOL)
     key = 0
     while metastr:
         try:
@@ -306,6 +429,10 @@ def object_audit_location_generator(devices, mount_check=True, logger=None,
                     logger.warn(_('Directory %r does not map '
                                   'to a valid policy (%s)') % (dir_, e))
                 continue
+            if policy.policy_type == PACKED_POLICY:
+                # no hash dirs to walk; the locations of packed objects are
+                # yielded by their own manager, from the partition indexes
+                continue
             datadir_path = os.path.join(devices, device, dir_)
             partitions = listdir(datadir_path)
             for partition in partitions:
@@ -339,6 +466,231 @@ def strip_self(f):
     return wrapper
 
 
+class GroupCommitter(object):
+    """
+    Batches the durability barriers of the PUTs finalized in one thread pool
+    of a device.
+
+    The first writer to be finalized opens a window of ``window`` seconds and
+    every writer finalized before it closes joins the batch. The batch is then
+    committed in one call into the thread pool: the metadata of each
+    object is written and writeback of every temporary file is started, then
+    each file is fsync'd back to back (by when most of their data is on its
+    way and the filesystem can fold them into one journal commit), the files
+    are renamed into place and each directory that needs it is fsync'd once.
+    Only then are the writers woken up, so no PUT returns before its object is
+    as durable as it would have been on its own. Writers finalized while a
+    batch is being committed form the next batch, which is committed straight
+    after.
+
+    :param threadpool: the thread pool of the device, or of one class of I/O
+                       on it
+    :param window: seconds to wait for more writers after the first
+    """
+
+    def __init__(self, threadpool, window):
+        self.threadpool = threadpool
+        self.window = window
+        self.pending = []
+        self.committing = False
+
+    def commit(self, writer, metadata, target_path, cleanup):
+        """
+        Finalize a PUT as part of the next batch, returning once the batch
+        has been committed.
+
+        :param writer: the :class:`BaseDiskFileWriter` to finalize
+        :param metadata: dictionary of metadata to be associated with the
+                         object
+        :param target_path: the path to rename the temporary file to
+        :param cleanup: whether to clean up the object's directory afterwards
+        :raises: whatever finalizing this PUT raised
+        """
+        event = Event()
+        self.pending.append((event, writer, metadata, target_path, cleanup))
+        if not self.committing:
+            self.committing = True
+            spawn_n(self._run)
+        event.wait()
+
+    def _run(self):
+        try:
+            sleep(self.window)
+            while self.pending:
+                batch, self.pending = self.pending, []
+                try:
+                    errors = self.threadpool.force_run_in_thread(
+                        self._commit_batch, batch)
+                except (Exception, Timeout) as err:
+                    errors = [err] * len(batch)
+                for (event, _w, _m, _t, _c), error in zip(batch, errors):
+                    if error is None:
+                        event.send(None)
+                    else:
+                        event.send_exception(error)
+        finally:
+            self.committing = False
+
+    def _commit_batch(self, batch):
+        # Runs in the device's thread pool; returns the error, if any, of
+        # each writer in the batch. A writer that fails at one stage is left
+        # out of the later ones.
+        errors = [None] * len(batch)
+        dirs = []
+
+        def stage(func):
+            for i, (_event, writer, metadata, target_path, cleanup) in \
+                    enumerate(batch):
+                if errors[i] is None:
+                    try:
+                        func(writer, metadata, target_path, cleanup)
+                    except Exception as err:
+                        errors[i] = err
+
+        def write(writer, metadata, target_path, cleanup):
+            write_metadata(writer._fd, metadata,
+                           compact=writer.manager.compact_metadata)
+            start_writeback(writer._fd)
+
+        def sync(writer, metadata, target_path, cleanup):
+            fsync(writer._fd)
+
+        def rename(writer, metadata, target_path, cleanup):
+            created = writer._finalize_rename(target_path, fsync_dirs=False)
+            # the same directories renamer() would have fsync'd
+            dirpath = dirname(target_path)
+            for _junk in range(created + 1):
+                if dirpath not in dirs:
+                    dirs.append(dirpath)
+                dirpath = dirname(dirpath)
+
+        def clean(writer, metadata, target_path, cleanup):
+            writer._finalize_cleanup(cleanup)
+
+        stage(write)
+        stage(sync)
+        stage(rename)
+        for dirpath in dirs:
+            fsync_dir(dirpath)
+        stage(clean)
+        return errors
+
+
+class IOScheduler(object):
+    """
+    Shares the thread pool of a device between classes of I/O.
+
+    At most ``concurrency`` operations run on the device at once, and at most
+    ``caps[io_class]`` of them (unless that is 0) for each class. When an
+    operation finishes, the next one to start is taken from the class that
+    has had the least of its share, as set by ``weights[io_class]``, so
+    classes get the device in proportion to their weights for as long as they
+    all have operations waiting; a class that has been idle does not get to
+    catch up on the turns it missed. Ties go to the class listed first in
+    :data:`IO_CLASSES`.
+
+    :param threadpool: the thread pool of the device
+    :param concurrency: the number of operations to run at once
+    :param weights: a dict of weights, one for each class of I/O
+    :param caps: a dict of the number of operations of each class of I/O to
+                 run at once, where 0 means no more than ``concurrency``
+    """
+
+    def __init__(self, threadpool, concurrency, weights, caps):
+        self.threadpool = threadpool
+        self.concurrency = concurrency
+        self.weights = weights
+        self.caps = caps
+        self.running = 0
+        self.class_running = dict((io_class, 0) for io_class in weights)
+        self.queues = dict((io_class, deque()) for io_class in weights)
+        self.vtimes = dict((io_class, 0.0) for io_class in weights)
+        self.vclock = 0.0
+        self.threadpools = {}
+
+    def get_threadpool(self, io_class):
+        """
+        Returns a :class:`IOClassThreadPool` running operations of a class of
+        I/O on the device.
+        """
+        if io_class not in self.weights:
+            raise ValueError('Unknown class of I/O %r' % io_class)
+        threadpool = self.threadpools.get(io_class)
+        if threadpool is None:
+            threadpool = self.threadpools[io_class] = IOClassThreadPool(
+                self, io_class)
+        return threadpool
+
+    def run(self, io_class, run_func, func, *args, **kwargs):
+        """
+        Waits for the turn of an operation of a class of I/O, then runs
+        ``run_func(func, *args, **kwargs)``.
+        """
+        self._acquire(io_class)
+        try:
+            return run_func(func, *args, **kwargs)
+        finally:
+            self._release(io_class)
+
+    def _acquire(self, io_class):
+        queue = self.queues[io_class]
+        if not queue:
+            self.vtimes[io_class] = max(self.vtimes[io_class], self.vclock)
+        turn = Event()
+        queue.append(turn)
+        self._dispatch()
+        try:
+            turn.wait()
+        except BaseException:
+            # e.g. a Timeout while waiting
+            if turn.ready():
+                self._release(io_class)
+            else:
+                queue.remove(turn)
+            raise
+
+    def _release(self, io_class):
+        self.running -= 1
+        self.class_running[io_class] -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.running < self.concurrency:
+            ready = [io_class for io_class in IO_CLASSES
+                     if io_class in self.queues and self.queues[io_class] and
+                     not (self.caps[io_class] and
+                          self.class_running[io_class] >= self.caps[io_class])]
+            if not ready:
+                break
+            io_class = min(ready, key=lambda io_class: self.vtimes[io_class])
+            self.vclock = self.vtimes[io_class]
+            self.vtimes[io_class] += 1.0 / self.weights[io_class]
+            self.running += 1
+            self.class_running[io_class] += 1
+            self.queues[io_class].popleft().send(None)
+
+
+class IOClassThreadPool(object):
+    """
+    The :class:`~swift.common.utils.ThreadPool` interface of one class of I/O
+    on a device, scheduled by the device's :class:`IOScheduler`.
+    """
+
+    def __init__(self, scheduler, io_class):
+        self.scheduler = scheduler
+        self.io_class = io_class
+
+    def run_in_thread(self, func, *args, **kwargs):
+        return self.scheduler.run(
+            self.io_class, self.scheduler.threadpool.run_in_thread,
+            func, *args, **kwargs)
+
+    def force_run_in_thread(self, func, *args, **kwargs):
+        return self.scheduler.run(
+            self.io_class, self.scheduler.threadpool.force_run_in_thread,
+            func, *args, **kwargs)
+
+
 class DiskFileRouter(object):
 
     policy_type_to_manager_cls = {}
@@ -360,6 +712,9 @@ class DiskFileRouter(object):
         return register_wrapper
 
     def __init__(self, *args, **kwargs):
+        # the packed implementation builds on the classes of this module, so
+        # it can only be imported, and so registered, once this one is loaded
+        from swift.obj import packed_diskfile  # noqa
         self.policy_to_manager = {}
         for policy in POLICIES:
             manager_cls = self.policy_type_to_manager_cls[policy.policy_type]
@@ -412,6 +767,28 @@ class BaseDiskFileManager(object):
         threads_per_disk = int(conf.get('threads_per_disk', '0'))
         self.threadpools = defaultdict(
             lambda: ThreadPool(nthreads=threads_per_disk))
+        self.group_commit_window = float(
+            conf.get('group_commit_window', 0))
+        self.group_committers = {}
+        self.io_scheduler_concurrency = int(
+            conf.get('io_scheduler_concurrency', 0))
+        self.io_weights = {}
+        self.io_caps = {}
+        for io_class in IO_CLASSES:
+            self.io_weights[io_class] = float(conf.get(
+                '%s_io_weight' % io_class, DEFAULT_IO_WEIGHTS[io_class]))
+            if self.io_weights[io_class] <= 0:
+                raise ValueError('%s_io_weight must be greater than 0' %
+                                 io_class)
+            self.io_caps[io_class] = int(conf.get(
+                '%s_io_concurrency' % io_class, 0))
+        self.io_schedulers = {}
+        self.metadata_cache_size = int(conf.get('metadata_cache_size', 0))
+        self.compact_metadata = config_true_value(
+            conf.get('compact_metadata', 'false'))
+        self.async_pending_journal = config_true_value(
+            conf.get('async_pending_journal', 'false'))
+        self.metadata_caches = {}
 
         self.use_splice = False
         self.pipe_size = None
@@ -442,6 +819,73 @@ class BaseDiskFileManager(object):
                     max_pipe_size = int(f.read())
                 self.pipe_size = min(max_pipe_size, self.disk_chunk_size)
 
+    def get_threadpool(self, device, io_class=CLIENT_IO):
+        """
+        Returns the thread pool to run a class of I/O on a device in: the
+        device's :class:`~swift.common.utils.ThreadPool`, or, if
+        io_scheduler_concurrency is set, a view of it scheduled by the
+        device's :class:`IOScheduler`.
+
+        :param device: the name of the device
+        :param io_class: one of :data:`IO_CLASSES`
+        """
+        threadpool = self.threadpools[device]
+        if self.io_scheduler_concurrency <= 0:
+            return threadpool
+        scheduler = self.io_schedulers.get(device)
+        if scheduler is None:
+            scheduler = self.io_schedulers[device] = IOScheduler(
+                threadpool, self.io_scheduler_concurrency, self.io_weights,
+                self.io_caps)
+        return scheduler.get_threadpool(io_class)
+
+    def get_group_committer(self, device_path, threadpool):
+        """
+        Returns the :class:`GroupCommitter` for the PUTs run in a thread pool
+        of a device, or None if PUTs are not to be batched. With an
+        :class:`IOScheduler`, each class of I/O has its own thread pool and
+        so its own batches, committed as that class.
+
+        :param device_path: the path of the device
+        :param threadpool: the thread pool the PUTs run in, as returned by
+                           :meth:`get_threadpool`
+        """
+        if self.group_commit_window <= 0:
+            return None
+        key = (device_path, threadpool)
+        committer = self.group_committers.get(key)
+        if committer is None:
+            committer = self.group_committers[key] = GroupCommitter(
+                threadpool, self.group_commit_window)
+        return committer
+
+    def get_metadata_cache(self, device_path):
+        """
+        Returns the :class:`~swift.common.utils.LRUCache` of the listings and
+        metadata of a device's hash dirs, or None if they are not to be
+        cached.
+
+        :param device_path: the path of the device
+        """
+        if self.metadata_cache_size <= 0:
+            return None
+        cache = self.metadata_caches.get(device_path)
+        if cache is None:
+            cache = self.metadata_caches[device_path] = LRUCache(
+                maxsize=self.metadata_cache_size)
+        return cache
+
+    def invalidate_cached_metadata(self, device_path, hash_dir):
+        """
+        Drops a hash dir from its device's metadata cache, if it is in it.
+
+        :param device_path: the path of the device
+        :param hash_dir: the path of the hash dir
+        """
+        cache = self.metadata_caches.get(device_path)
+        if cache is not None:
+            cache.delete(hash_dir)
+
     def parse_on_disk_filename(self, filename):
         """
         Parse an on disk file name.
@@ -769,20 +1213,26 @@ class BaseDiskFileManager(object):
         device_path = self.construct_dev_path(device)
         async_dir = os.path.join(device_path, get_async_dir(policy))
         ohash = hash_path(account, container, obj)
-        self.threadpools[device].run_in_thread(
-            write_pickle,
-            data,
-            os.path.join(async_dir, ohash[-3:], ohash + '-' +
-                         Timestamp(timestamp).internal),
-            os.path.join(device_path, get_tmp_dir(policy)))
+        if self.async_pending_journal:
+            self.get_threadpool(device).run_in_thread(
+                AsyncPendingJournal(async_dir).append,
+                ohash, Timestamp(timestamp).internal, data)
+        else:
+            self.get_threadpool(device).run_in_thread(
+                write_pickle,
+                data,
+                os.path.join(async_dir, ohash[-3:], ohash + '-' +
+                             Timestamp(timestamp).internal),
+                os.path.join(device_path, get_tmp_dir(policy)))
         self.logger.increment('async_pendings')
 
     def get_diskfile(self, device, partition, account, container, obj,
-                     policy, **kwargs):
+                     policy, io_class=CLIENT_IO, **kwargs):
         dev_path = self.get_dev_path(device)
         if not dev_path:
             raise DiskFileDeviceUnavailable()
-        return self.diskfile_cls(self, dev_path, self.threadpools[device],
+        return self.diskfile_cls(self, dev_path,
+                                 self.get_threadpool(device, io_class),
                                  partition, account, container, obj,
                                  policy=policy, use_splice=self.use_splice,
                                  pipe_size=self.pipe_size, **kwargs)
@@ -795,10 +1245,11 @@ class BaseDiskFileManager(object):
         dev_path = self.get_dev_path(audit_location.device, mount_check=False)
         return self.diskfile_cls.from_hash_dir(
             self, audit_location.path, dev_path,
-            audit_location.partition, policy=audit_location.policy)
+            audit_location.partition, policy=audit_location.policy,
+            threadpool=self.get_threadpool(audit_location.device, AUDIT_IO))
 
     def get_diskfile_from_hash(self, device, partition, object_hash,
-                               policy, **kwargs):
+                               policy, io_class=CLIENT_IO, **kwargs):
         """
         Returns a DiskFile instance for an object at the given
         object_hash. Just in case someone thinks of refactoring, be
@@ -831,7 +1282,8 @@ class BaseDiskFileManager(object):
         if not filenames:
             raise DiskFileNotExist()
         try:
-            metadata = read_metadata(os.path.join(object_path, filenames[-1]))
+            metadata = read_metadata(os.path.join(object_path, filenames[-1]),
+                                     hot_only=True)
         except EOFError:
             raise DiskFileNotExist()
         try:
@@ -839,7 +1291,8 @@ class BaseDiskFileManager(object):
                 metadata.get('name', ''), 3, 3, True)
         except ValueError:
             raise DiskFileNotExist()
-        return self.diskfile_cls(self, dev_path, self.threadpools[device],
+        return self.diskfile_cls(self, dev_path,
+                                 self.get_threadpool(device, io_class),
                                  partition, account, container, obj,
                                  policy=policy, **kwargs)
 
@@ -851,8 +1304,9 @@ class BaseDiskFileManager(object):
                                       partition)
         if not os.path.exists(partition_path):
             mkdirs(partition_path)
-        _junk, hashes = self.threadpools[device].force_run_in_thread(
-            self._get_hashes, partition_path, recalculate=suffixes)
+        _junk, hashes = self.get_threadpool(
+            device, REPLICATION_IO).force_run_in_thread(
+                self._get_hashes, partition_path, recalculate=suffixes)
         return hashes
 
     def _listdir(self, path):
@@ -1029,7 +1483,8 @@ class BaseDiskFileWriter(object):
     def _finalize_put(self, metadata, target_path, cleanup):
         # Write the metadata before calling fsync() so that both data and
         # metadata are flushed to disk.
-        write_metadata(self._fd, metadata)
+        write_metadata(self._fd, metadata,
+                       compact=self.manager.compact_metadata)
         # We call fsync() before calling drop_cache() to lower the amount of
         # redundant work the drop cache code will perform on the pages (now
         # that after fsync the pages will be all clean).
@@ -1037,21 +1492,48 @@ class BaseDiskFileWriter(object):
         # From the Department of the Redundancy Department, make sure we call
         # drop_cache() after fsync() to avoid redundant work (pages all
         # clean).
+        self._finalize_rename(target_path)
+        self._finalize_cleanup(cleanup)
+
+    def _finalize_rename(self, target_path, fsync_dirs=True):
+        """
+        Rename the synced temporary file into place.
+
+        :returns: the number of directories created above target_path
+        """
         drop_buffer_cache(self._fd, 0, self._upload_size)
         self.manager.invalidate_hash(dirname(self._datadir))
         # After the rename completes, this object will be available for other
         # requests to reference.
-        renamer(self._tmppath, target_path)
+        created = renamer(self._tmppath, target_path, fsync=fsync_dirs)
         # If rename is successful, flag put as succeeded. This is done to avoid
         # unnecessary os.unlink() of tempfile later. As renamer() has
         # succeeded, the tempfile would no longer exist at its original path.
         self._put_succeeded = True
+        return created
+
+    def _finalize_cleanup(self, cleanup):
         if cleanup:
             try:
                 self.manager.hash_cleanup_listdir(self._datadir)
             except OSError:
                 logging.exception(_('Problem cleaning up %s'), self._datadir)
 
+    def _run_finalize_put(self, metadata, target_path, cleanup):
+        """
+        Finalize the PUT in the thread pool, or as part of a batch if the
+        device has a :class:`GroupCommitter`.
+        """
+        committer = self.manager.get_group_committer(
+            self._diskfile._device_path, self._threadpool)
+        if committer:
+            committer.commit(self, metadata, target_path, cleanup)
+        else:
+            self._threadpool.force_run_in_thread(
+                self._finalize_put, metadata, target_path, cleanup)
+        self.manager.invalidate_cached_metadata(
+            self._diskfile._device_path, self._datadir)
+
     def put(self, metadata):
         """
         Finalize writing the file on disk.
@@ -1103,11 +1585,14 @@ class BaseDiskFileReader(object):
     :param pipe_size: size of pipe buffer used in zero-copy operations
     :param diskfile: the diskfile creating this DiskFileReader instance
     :param keep_cache: should resulting reads be kept in the buffer cache
+    :param readahead: ask the kernel to read the file ahead of the reads
+    :param hash_in_thread: compute the md5 of each chunk in the thread pool,
+                           along with the read of the chunk
     """
     def __init__(self, fp, data_file, obj_size, etag, threadpool,
                  disk_chunk_size, keep_cache_size, device_path, logger,
                  quarantine_hook, use_splice, pipe_size, diskfile,
-                 keep_cache=False):
+                 keep_cache=False, readahead=False, hash_in_thread=False):
         # Parameter tracking
         self._fp = fp
         self._data_file = data_file
@@ -1121,6 +1606,8 @@ class BaseDiskFileReader(object):
         self._quarantine_hook = quarantine_hook
         self._use_splice = use_splice
         self._pipe_size = pipe_size
+        self._readahead = readahead
+        self._hash_in_thread = hash_in_thread
         if keep_cache:
             # Caller suggests we keep this in cache, only do it if the
             # object's size is less than the maximum.
@@ -1148,15 +1635,25 @@ class BaseDiskFileReader(object):
             self._bytes_read = 0
             self._started_at_0 = False
             self._read_to_eof = False
+            prefetched = 0
             if self._fp.tell() == 0:
                 self._started_at_0 = True
                 self._iter_etag = hashlib.md5()
             while True:
-                chunk = self._threadpool.run_in_thread(
-                    self._fp.read, self._disk_chunk_size)
-                if chunk:
-                    if self._iter_etag:
+                if self._readahead and prefetched < self._obj_size and \
+                        prefetched - self._bytes_read < READAHEAD_WINDOW // 2:
+                    self._prefetch_cache(self._fp.fileno(), prefetched,
+                                         READAHEAD_WINDOW)
+                    prefetched += READAHEAD_WINDOW
+                if self._hash_in_thread:
+                    chunk = self._threadpool.run_in_thread(
+                        self._read_and_hash, self._iter_etag)
+                else:
+                    chunk = self._threadpool.run_in_thread(
+                        self._fp.read, self._disk_chunk_size)
+                    if chunk and self._iter_etag:
                         self._iter_etag.update(chunk)
+                if chunk:
                     self._bytes_read += len(chunk)
                     if self._bytes_read - dropped_cache > DROP_CACHE_WINDOW:
                         self._drop_cache(self._fp.fileno(), dropped_cache,
@@ -1172,6 +1669,14 @@ class BaseDiskFileReader(object):
             if not self._suppress_file_closing:
                 self.close()
 
+    def _read_and_hash(self, etag):
+        chunk = self._fp.read(self._disk_chunk_size)
+        if chunk and etag:
+            # hashlib releases the GIL while it hashes a large chunk, so
+            # several threads can hash at once
+            etag.update(chunk)
+        return chunk
+
     def can_zero_copy_send(self):
         return self._use_splice
 
@@ -1319,10 +1824,15 @@ class BaseDiskFileReader(object):
         if not self._keep_cache:
             drop_buffer_cache(fd, offset, length)
 
+    def _prefetch_cache(self, fd, offset, length):
+        prefetch_buffer_cache(fd, offset, length)
+
     def _quarantine(self, msg):
         self._quarantined_dir = self._threadpool.run_in_thread(
             self.manager.quarantine_renamer, self._device_path,
             self._data_file)
+        self.manager.invalidate_cached_metadata(
+            self._device_path, dirname(self._data_file))
         self._logger.warn("Quarantined object %s: %s" % (
             self._data_file, msg))
         self._logger.increment('quarantines')
@@ -1435,6 +1945,7 @@ class BaseDiskFile(object):
         self._fp = None
         self._quarantined_dir = None
         self._content_length = None
+        self._metadata_cache_entry = None
         if _datadir:
             self._datadir = _datadir
         else:
@@ -1478,9 +1989,10 @@ class BaseDiskFile(object):
         return Timestamp(self._datafile_metadata.get('X-Timestamp'))
 
     @classmethod
-    def from_hash_dir(cls, mgr, hash_dir_path, device_path, partition, policy):
-        return cls(mgr, device_path, None, partition, _datadir=hash_dir_path,
-                   policy=policy)
+    def from_hash_dir(cls, mgr, hash_dir_path, device_path, partition, policy,
+                      threadpool=None):
+        return cls(mgr, device_path, threadpool, partition,
+                   _datadir=hash_dir_path, policy=policy)
 
     def open(self):
         """
@@ -1503,6 +2015,61 @@ class BaseDiskFile(object):
                                      some data did pass cross checks
         :returns: itself for use as a context manager
         """
+        cache = self._manager.get_metadata_cache(self._device_path)
+        if cache is not None:
+            self._metadata_cache_entry = self._get_metadata_cache_entry(cache)
+        entry = self._metadata_cache_entry
+        if entry is not None and entry['files'] is not None:
+            # the hash dir hasn't changed since it was last listed
+            files = entry['files']
+        else:
+            files = self._list_datadir()
+            if entry is not None:
+                entry['files'] = files
+
+        # gather info about the valid files to us to open the DiskFile
+        file_info = self._get_ondisk_file(files)
+
+        self._data_file = file_info.get('data_file')
+        if not self._data_file:
+            raise self._construct_exception_from_ts_file(**file_info)
+        self._fp = self._construct_from_data_file(**file_info)
+        # This method must populate the internal _metadata attribute.
+        self._metadata = self._metadata or {}
+        return self
+
+    def _get_metadata_cache_entry(self, cache):
+        """
+        Look up the object's hash dir in the device's metadata cache, making
+        a new entry for it if it has changed since it was cached.
+
+        :param cache: the device's metadata cache
+        :returns: a dict with the hash dir's listing ('files', None until it
+                  is listed) and the metadata of its files ('metadata',
+                  mapping each file's path to its cache key and metadata), or
+                  None if the hash dir cannot be cached
+        """
+        try:
+            dir_key = _metadata_cache_key(os.stat(self._datadir))
+        except OSError:
+            # leave it to _list_datadir to deal with
+            return None
+        if dir_key is None:
+            return None
+        entry = cache.get(self._datadir)
+        if entry is None or entry['dir_key'] != dir_key:
+            entry = {'dir_key': dir_key, 'files': None, 'metadata': {}}
+            cache.set(self._datadir, entry)
+        return entry
+
+    def _list_datadir(self):
+        """
+        List the files in the object's hash dir.
+
+        :returns: a list of file names, empty if the hash dir does not exist
+        :raises DiskFileQuarantined: if the hash dir is a file
+        :raises DiskFileError: if the hash dir cannot be listed
+        """
         # First figure out if the data directory exists
         try:
             files = os.listdir(self._datadir)
@@ -1521,17 +2088,7 @@ class BaseDiskFile(object):
                     "Error listing directory %s: %s" % (self._datadir, err))
             # The data directory does not exist, so the object cannot exist.
             files = []
-
-        # gather info about the valid files to us to open the DiskFile
-        file_info = self._get_ondisk_file(files)
-
-        self._data_file = file_info.get('data_file')
-        if not self._data_file:
-            raise self._construct_exception_from_ts_file(**file_info)
-        self._fp = self._construct_from_data_file(**file_info)
-        # This method must populate the internal _metadata attribute.
-        self._metadata = self._metadata or {}
-        return self
+        return files
 
     def __enter__(self):
         """
@@ -1572,6 +2129,8 @@ class BaseDiskFile(object):
         """
         self._quarantined_dir = self._threadpool.run_in_thread(
             self.manager.quarantine_renamer, self._device_path, data_file)
+        self.manager.invalidate_cached_metadata(
+            self._device_path, self._datadir)
         self._logger.warn("Quarantined object %s: %s" % (
             data_file, msg))
         self._logger.increment('quarantines')
@@ -1675,33 +2234,68 @@ class BaseDiskFile(object):
             raise self._quarantine(
                 data_file, "bad metadata content-length value %s" % (
                     self._metadata['Content-Length']))
-        fd = fp.fileno()
-        try:
-            statbuf = os.fstat(fd)
-        except OSError as err:
-            # Quarantine, we can't successfully stat the file.
-            raise self._quarantine(data_file, "not stat-able: %s" % err)
-        else:
-            obj_size = statbuf.st_size
+        obj_size = self._get_data_file_size(data_file, fp)
         if obj_size != metadata_size:
             raise self._quarantine(
                 data_file, "metadata content-length %s does"
                 " not match actual object size %s" % (
-                    metadata_size, statbuf.st_size))
+                    metadata_size, obj_size))
         self._content_length = obj_size
         return obj_size
 
+    def _get_data_file_size(self, data_file, fp):
+        """
+        Return the size of the object's data as it is stored on disk.
+
+        :param data_file: data file name being consider, used when quarantines
+                          occur
+        :param fp: open file pointer of the data file
+        :raises DiskFileQuarantined: if the data file can not be stat'ed
+        """
+        fd = fp.fileno()
+        try:
+            statbuf = os.fstat(fd)
+        except OSError as err:
+            # Quarantine, we can't successfully stat the file.
+            raise self._quarantine(data_file, "not stat-able: %s" % err)
+        return statbuf.st_size
+
     def _failsafe_read_metadata(self, source, quarantine_filename=None):
         # Takes source and filename separately so we can read from an open
         # file if we have one
+        entry = self._metadata_cache_entry
+        file_key = None
+        if entry is not None:
+            try:
+                if hasattr(source, 'fileno'):
+                    file_key = _metadata_cache_key(os.fstat(source.fileno()))
+                else:
+                    file_key = _metadata_cache_key(os.stat(source))
+            except OSError:
+                pass
+            cached = entry['metadata'].get(quarantine_filename)
+            if file_key is not None and cached and cached[0] == file_key:
+                return dict(cached[1])
         try:
-            return read_metadata(source)
+            metadata = read_metadata(source)
         except (DiskFileXattrNotSupported, DiskFileNotExist):
             raise
         except Exception as err:
             raise self._quarantine(
                 quarantine_filename,
                 "Exception reading metadata: %s" % err)
+        if file_key is not None:
+            entry['metadata'][quarantine_filename] = (file_key, dict(metadata))
+        return metadata
+
+    def _open_data_file(self, data_file):
+        """
+        Open the on-disk data file of the object for reading.
+
+        :param data_file: on-disk `.data` file being considered
+        :returns: an opened data file pointer
+        """
+        return open(data_file, 'rb')
 
     def _construct_from_data_file(self, data_file, meta_file, **kwargs):
         """
@@ -1715,7 +2309,7 @@ class BaseDiskFile(object):
         :raises DiskFileError: various exceptions from
                     :func:`swift.obj.diskfile.DiskFile._verify_data_file`
         """
-        fp = open(data_file, 'rb')
+        fp = self._open_data_file(data_file)
         self._datafile_metadata = self._failsafe_read_metadata(fp, data_file)
         self._metadata = {}
         if meta_file:
@@ -1797,7 +2391,8 @@ class BaseDiskFile(object):
             return self.get_metadata()
 
     def reader(self, keep_cache=False,
-               _quarantine_hook=lambda m: None):
+               _quarantine_hook=lambda m: None, _readahead=False,
+               _hash_in_thread=False):
         """
         Return a :class:`swift.common.swob.Response` class compatible
         "`app_iter`" object as defined by
@@ -1812,6 +2407,10 @@ class BaseDiskFile(object):
                                  the arg is the reason for quarantine.
                                  Default is to ignore it.
                                  Not needed by the REST layer.
+        :param _readahead: ask the kernel to read the file ahead of the
+                           reads. Not needed by the REST layer.
+        :param _hash_in_thread: compute the md5 of the data read in the
+                                thread pool. Not needed by the REST layer.
         :returns: a :class:`swift.obj.diskfile.DiskFileReader` object
         """
         dr = self.reader_cls(
@@ -1819,7 +2418,8 @@ class BaseDiskFile(object):
             self._metadata['ETag'], self._threadpool, self._disk_chunk_size,
             self._manager.keep_cache_size, self._device_path, self._logger,
             use_splice=self._use_splice, quarantine_hook=_quarantine_hook,
-            pipe_size=self._pipe_size, diskfile=self, keep_cache=keep_cache)
+            pipe_size=self._pipe_size, diskfile=self, keep_cache=keep_cache,
+            readahead=_readahead, hash_in_thread=_hash_in_thread)
         # At this point the reader object is now responsible for closing
         # the file pointer.
         self._fp = None
@@ -1940,8 +2540,7 @@ class DiskFileWriter(BaseDiskFileWriter):
         target_path = join(self._datadir, timestamp + self._extension)
         cleanup = True
 
-        self._threadpool.force_run_in_thread(
-            self._finalize_put, metadata, target_path, cleanup)
+        self._run_finalize_put(metadata, target_path, cleanup)
 
 
 class DiskFile(BaseDiskFile):
@@ -2111,6 +2710,8 @@ class ECDiskFileWriter(BaseDiskFileWriter):
             self._datadir, timestamp.internal + '.durable')
         self._threadpool.force_run_in_thread(
             self._finalize_durable, durable_file_path)
+        self.manager.invalidate_cached_metadata(
+            self._diskfile._device_path, self._datadir)
 
     def put(self, metadata):
         """
@@ -2135,8 +2736,7 @@ class ECDiskFileWriter(BaseDiskFileWriter):
         metadata['name'] = self._name
         target_path = join(self._datadir, filename)
 
-        self._threadpool.force_run_in_thread(
-            self._finalize_put, metadata, target_path, cleanup)
+        self._run_finalize_put(metadata, target_path, cleanup)
 
 
 class ECDiskFile(BaseDiskFile):
@@ -2187,6 +2787,8 @@ class ECDiskFile(BaseDiskFile):
                 timestamp, ext=ext, frag_index=frag_index)
             remove_file(os.path.join(self._datadir, purge_file))
         self.manager.invalidate_hash(dirname(self._datadir))
+        self.manager.invalidate_cached_metadata(
+            self._device_path, self._datadir)
 
 
 @DiskFileRouter.register(EC_POLICY)
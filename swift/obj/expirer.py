@@ -21,18 +21,22 @@ from os.path import join
 from swift import gettext_ as _
 import hashlib
 
-from eventlet import sleep, Timeout
+from eventlet import sleep, spawn, Timeout
 from eventlet.greenpool import GreenPool
+from eventlet.queue import LightQueue
 
 from swift.common.daemon import Daemon
 from swift.common.internal_client import InternalClient, UnexpectedResponse
-from swift.common.utils import get_logger, dump_recon_cache, split_path
+from swift.common.utils import get_logger, dump_recon_cache, split_path, \
+    config_true_value
 from swift.common.http import HTTP_NOT_FOUND, HTTP_CONFLICT, \
     HTTP_PRECONDITION_FAILED
 
 from swift.container.reconciler import direct_delete_container_entry
 
 MAX_OBJECTS_TO_CACHE = 100000
+# The most queue entries listed ahead of the deletes for each queue container
+MAX_OBJECTS_TO_PREFETCH = 10000
 
 
 class ObjectExpirer(Daemon):
@@ -57,6 +61,8 @@ class ObjectExpirer(Daemon):
         self.report_interval = int(conf.get('report_interval') or 300)
         self.report_first_time = self.report_last_time = time()
         self.report_objects = 0
+        self.report_listed = 0
+        self.report_errors = 0
         self.recon_cache_path = conf.get('recon_cache_path',
                                          '/var/cache/swift')
         self.rcache = join(self.recon_cache_path, 'object.recon')
@@ -66,6 +72,28 @@ class ObjectExpirer(Daemon):
         self.processes = int(self.conf.get('processes', 0))
         self.process = int(self.conf.get('process', 0))
         self.reclaim_age = int(conf.get('reclaim_age', 86400 * 7))
+        self.listing_concurrency = int(conf.get('listing_concurrency', 1))
+        if self.listing_concurrency < 1:
+            raise ValueError("listing_concurrency must be set to at least 1")
+        self.shard_queue_containers = config_true_value(
+            conf.get('shard_queue_containers', 'false'))
+
+    def get_progress(self):
+        """
+        Returns the progress of the current pass.
+
+        :returns: a dict with the seconds since the pass began ('elapsed'),
+                  the queue entries listed for this process so far
+                  ('listed'), the objects expired ('expired'), the objects
+                  that could not be expired ('errors') and the entries listed
+                  that are still to be handled ('pending')
+        """
+        return {'elapsed': time() - self.report_first_time,
+                'listed': self.report_listed,
+                'expired': self.report_objects,
+                'errors': self.report_errors,
+                'pending': self.report_listed - self.report_objects -
+                self.report_errors}
 
     def report(self, final=False):
         """
@@ -75,36 +103,126 @@ class ObjectExpirer(Daemon):
         :param final: Set to True for the last report once the expiration pass
                       has completed.
         """
+        progress = self.get_progress()
         if final:
-            elapsed = time() - self.report_first_time
             self.logger.info(_('Pass completed in %ds; %d objects expired') %
-                             (elapsed, self.report_objects))
-            dump_recon_cache({'object_expiration_pass': elapsed,
-                              'expired_last_pass': self.report_objects},
+                             (progress['elapsed'], self.report_objects))
+            dump_recon_cache({'object_expiration_pass': progress['elapsed'],
+                              'expired_last_pass': self.report_objects,
+                              'expiration_errors_last_pass':
+                              self.report_errors,
+                              'object_expiration_progress': progress},
                              self.rcache, self.logger)
         elif time() - self.report_last_time >= self.report_interval:
-            elapsed = time() - self.report_first_time
-            self.logger.info(_('Pass so far %ds; %d objects expired') %
-                             (elapsed, self.report_objects))
+            self.logger.info(
+                _('Pass so far %(elapsed)ds; %(expired)d objects expired, '
+                  '%(errors)d errors, %(pending)d of %(listed)d listed '
+                  'pending') % progress)
+            dump_recon_cache({'object_expiration_progress': progress},
+                             self.rcache, self.logger)
             self.report_last_time = time()
 
-    def iter_cont_objs_to_expire(self):
-        """
-        Yields (container, obj) tuples to be deleted
+    def is_my_work(self, name):
         """
-        obj_cache = {}
-        cnt = 0
+        Returns True if the work named is for this process to do.
 
-        all_containers = set()
+        :param name: the queue container, or '<container>/<entry>' of the
+                     queue entry, to check
+        """
+        if self.processes <= 0:
+            return True
+        return int(hashlib.md5(name).hexdigest(), 16) % self.processes == \
+            self.process
 
+    def iter_containers_to_expire(self):
+        """
+        Yields the queue containers whose entries may be due, that this
+        process is to work through.
+        """
         for c in self.swift.iter_containers(self.expiring_objects_account):
             container = str(c['name'])
             timestamp = int(container)
             if timestamp > int(time()):
                 break
-            all_containers.add(container)
+            if self.shard_queue_containers and not self.is_my_work(container):
+                continue
+            yield container
+
+    def _list_objects(self, container, queue):
+        try:
             for o in self.swift.iter_objects(self.expiring_objects_account,
                                              container):
+                queue.put(o)
+                try:
+                    if int(o['name'].split('-', 1)[0]) > int(time()):
+                        # the entries after this are not due yet either
+                        break
+                except ValueError:
+                    pass
+        except (Exception, Timeout) as err:
+            queue.put(err)
+        queue.put(None)
+
+    def _iter_queue(self, queue):
+        while True:
+            o = queue.get()
+            if o is None:
+                return
+            if isinstance(o, BaseException):
+                raise o
+            yield o
+
+    def iter_listings(self, containers):
+        """
+        Lists queue containers, with the listings of up to
+        listing_concurrency containers paged in at once.
+
+        :param containers: an iterable of queue containers
+        :returns: an iterator of (container, listing) tuples, where each
+                  listing iterates the container's objects
+        """
+        if self.listing_concurrency <= 1:
+            for container in containers:
+                yield container, self.swift.iter_objects(
+                    self.expiring_objects_account, container)
+            return
+        containers = iter(containers)
+        queues = []
+        listers = []
+        prefetch = max(MAX_OBJECTS_TO_PREFETCH // self.listing_concurrency,
+                       1)
+        try:
+            while True:
+                for container in containers:
+                    queue = LightQueue(prefetch)
+                    queues.append((container, queue))
+                    listers.append(spawn(self._list_objects, container,
+                                         queue))
+                    if len(queues) >= self.listing_concurrency:
+                        break
+                if not queues:
+                    return
+                container, queue = queues.pop(0)
+                yield container, self._iter_queue(queue)
+        finally:
+            # stop any listing left unread, including those read only up to
+            # an entry not due yet
+            for lister in listers:
+                lister.kill()
+
+    def iter_cont_objs_to_expire(self):
+        """
+        Yields (container, obj) tuples to be deleted
+        """
+        obj_cache = {}
+        cnt = 0
+
+        all_containers = set()
+
+        for container, objects in self.iter_listings(
+                self.iter_containers_to_expire()):
+            all_containers.add(container)
+            for o in objects:
                 obj = o['name'].encode('utf8')
                 timestamp, actual_obj = obj.split('-', 1)
                 timestamp = int(timestamp)
@@ -117,17 +235,15 @@ class ObjectExpirer(Daemon):
                 except ValueError:
                     cache_key = None
 
-                if self.processes > 0:
-                    obj_process = int(
-                        hashlib.md5('%s/%s' % (container, obj)).
-                        hexdigest(), 16)
-                    if obj_process % self.processes != self.process:
-                        continue
+                if not self.shard_queue_containers and \
+                        not self.is_my_work('%s/%s' % (container, obj)):
+                    continue
 
                 if cache_key not in obj_cache:
                     obj_cache[cache_key] = []
                 obj_cache[cache_key].append((container, obj))
                 cnt += 1
+                self.report_listed += 1
 
                 if cnt > MAX_OBJECTS_TO_CACHE:
                     while obj_cache:
@@ -164,6 +280,8 @@ class ObjectExpirer(Daemon):
         containers_to_delete = set([])
         self.report_first_time = self.report_last_time = time()
         self.report_objects = 0
+        self.report_listed = 0
+        self.report_errors = 0
         try:
             self.logger.debug('Run begin')
             containers, objects = \
@@ -264,6 +382,7 @@ class ObjectExpirer(Daemon):
             self.report_objects += 1
             self.logger.increment('objects')
         except (Exception, Timeout) as err:
+            self.report_errors += 1
             self.logger.increment('errors')
             self.logger.exception(
                 _('Exception while deleting object %s %s %s') %
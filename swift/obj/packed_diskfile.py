@@ -0,0 +1,1148 @@
+# Copyright (c) 2015 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Disk File Interface for the Swift Object Server that packs objects into
+volume files, used by storage policies of type ``packed``.
+
+The reference implementation costs every object a hash directory, a file,
+its xattrs and the fsyncs and renames needed to make them durable.  For
+clusters holding billions of small objects it is the inode and dentry
+overhead of that layout which limits a disk.  This implementation instead
+appends each object (and each tombstone and fast-POST metadata update) as a
+record to a volume file, so that a disk only holds a handful of files per
+partition::
+
+    <devices>/<device>/objects-N/<partition>/packed-00000000.vol
+                                             packed-00000001.vol
+                                             packed.idx
+
+Each record holds the name of the file the reference implementation would
+have written (``<hash>/<timestamp>.data``, ``.ts`` or ``.meta``), its
+pickled metadata and its data.  Records are never rewritten in place; a
+record replacing or deleting another is simply appended, as is a drop record
+whenever a file becomes obsolete, is reclaimed or is quarantined.  An index
+mapping each object hash and file name to the volume, offset, length and
+metadata of its record is kept in memory by every process, checkpointed to
+``packed.idx`` by the replicator from time to time, and brought up to date
+with what other processes appended by reading the tail of the volumes.  An
+index takes about 1.2 KiB of memory per object (more for objects with a lot
+of user metadata), and each process keeps up to ``packed_index_cache_size``
+of them.  Volumes are rotated
+once they reach ``packed_volume_size`` bytes, and a partition whose volumes
+hold more than ``packed_compact_ratio`` dead bytes is compacted by copying
+its live records into a new volume when the replicator (or a REPLICATE
+request) hashes it.
+
+Keeping the volumes of each partition in the partition's own directory means
+that the replicator still moves and removes whole partitions as it always
+has.  Since the index lists the same file names the reference
+implementation keeps on disk, the suffix hashes exchanged by REPLICATE are
+identical to those of a replicated policy, and ``yield_hashes`` and the
+audit location generator serve ssync and the auditor from the index.
+Volumes can not be merged by rsync, so partitions of packed policies are
+always replicated with ssync.
+
+All of this is specific to this implementation and not part of the
+pluggable on-disk backend API.
+"""
+
+import errno
+import hashlib
+import os
+import struct
+import time
+import uuid
+import zlib
+from collections import namedtuple
+from contextlib import contextmanager
+from os.path import basename, dirname, exists, join
+from random import shuffle
+from tempfile import SpooledTemporaryFile
+
+import six.moves.cPickle as pickle
+
+from swift import gettext_ as _
+from swift.common.exceptions import DiskFileNoSpace, DiskFileNotExist, \
+    DiskFileDeviceUnavailable, PathNotDir
+from swift.common.storage_policy import PACKED_POLICY, PolicyError, \
+    POLICIES, split_policy_string
+from swift.common.utils import LRUCache, Timestamp, drop_buffer_cache, \
+    fdatasync, fsync_dir, ismount, listdir, lock_path, mkdirs, split_path, \
+    write_pickle, prefetch_buffer_cache
+from swift.obj.diskfile import AuditLocation, BaseDiskFile, \
+    BaseDiskFileReader, BaseDiskFileWriter, DiskFileManager, DiskFileRouter, \
+    CLIENT_IO, DATADIR_BASE, ONE_WEEK, PICKLE_PROTOCOL, extract_policy, \
+    get_data_dir, write_metadata
+
+
+VOLUME_PREFIX = 'packed-'
+VOLUME_EXT = '.vol'
+INDEX_FILE = 'packed.idx'
+# volumes being written by a compaction, until they are renamed into place
+COMPACT_PREFIX = 'compacting-'
+COMPACT_EXT = '.tmp'
+# seconds after which what a compaction left behind is taken to be from one
+# that crashed, and removed
+STALE_COMPACT_AGE = 86400
+# a record is a header, the (<hash>/<filename>) name and pickled metadata of
+# the file it stores or drops, and the file's data; the crc covers all but
+# the data, which is covered by the ETag as it is for the reference layout
+RECORD_MAGIC = 'SPK1'
+RECORD_PREFIX = struct.Struct('!4sBHIQ')
+RECORD_CRC = struct.Struct('!I')
+RECORD_HEADER_SIZE = RECORD_PREFIX.size + RECORD_CRC.size
+PUT_RECORD = 1
+DROP_RECORD = 2
+# number of records read from the volumes since the index was last
+# checkpointed before the replicator checkpoints it again
+CHECKPOINT_INTERVAL = 1000
+# partitions with fewer dead bytes than this are never compacted
+MIN_COMPACT_BYTES = 1024 * 1024
+COPY_CHUNK_SIZE = 65536
+
+PackedRecord = namedtuple('PackedRecord',
+                          'volume offset data_offset length metadata')
+
+
+class PackedRecordError(Exception):
+    pass
+
+
+def record_size(record):
+    """
+    Returns the number of bytes a :class:`PackedRecord` takes in its volume.
+    """
+    return record.data_offset + record.length - record.offset
+
+
+def _crc(prefix, body):
+    return zlib.crc32(body, zlib.crc32(prefix)) & 0xffffffff
+
+
+def pack_record_header(kind, name, metadata, length):
+    """
+    Returns the bytes of a record up to (but not including) its data.
+
+    :param kind: PUT_RECORD or DROP_RECORD
+    :param name: the record's <hash>/<filename> name
+    :param metadata: the file's metadata dict, or None for a drop record
+    :param length: the number of data bytes that will follow
+    """
+    meta = pickle.dumps(metadata, PICKLE_PROTOCOL) if metadata else ''
+    prefix = RECORD_PREFIX.pack(RECORD_MAGIC, kind, len(name), len(meta),
+                                length)
+    body = name + meta
+    return prefix + RECORD_CRC.pack(_crc(prefix, body)) + body
+
+
+class VolumeSlice(object):
+    """
+    A read-only file-like view of the data of one record in a volume file,
+    which is all :class:`~swift.obj.diskfile.BaseDiskFileReader` needs.
+
+    :param fp: the volume file, opened for reading; closed by close()
+    :param start: offset of the data in the volume
+    :param length: length of the data
+    """
+
+    def __init__(self, fp, start, length):
+        self._fp = fp
+        self.start = start
+        self.length = length
+        self._pos = 0
+        fp.seek(start)
+
+    def read(self, size=-1):
+        remaining = self.length - self._pos
+        if size < 0 or size > remaining:
+            size = remaining
+        chunk = self._fp.read(size) if size else ''
+        self._pos += len(chunk)
+        return chunk
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos):
+        self._pos = min(max(pos, 0), self.length)
+        self._fp.seek(self.start + self._pos)
+
+    def fileno(self):
+        return self._fp.fileno()
+
+    def close(self):
+        self._fp.close()
+
+
+class PackedPartition(object):
+    """
+    The volume files and index of one partition of a packed policy.
+
+    The index, ``suffixes``, maps suffix -> object hash -> file name ->
+    :class:`PackedRecord`; ``suffix_hashes`` caches the suffix hashes
+    computed from it until a record for the suffix is read.  Everything that
+    reads or appends to the volumes does so holding the partition's lock, so
+    the index is shared safely by threads and processes alike.
+
+    :param path: path of the partition directory
+    :param volume_size: size at which a new volume is started
+    :param logger: logger for torn and corrupt volumes
+    """
+
+    def __init__(self, path, volume_size, logger):
+        self.path = path
+        self.volume_size = volume_size
+        self.logger = logger
+        self._reset()
+
+    def _reset(self):
+        self.suffixes = {}
+        self.suffix_hashes = {}
+        # volume -> bytes read from it, and the inode that was read
+        self.positions = {}
+        self.inodes = {}
+        self.damaged = set()
+        self.live_bytes = 0
+        self.unsaved = 0
+
+    def volume_path(self, volume):
+        return join(self.path, '%s%08d%s' % (VOLUME_PREFIX, volume,
+                                             VOLUME_EXT))
+
+    def _list_volumes(self):
+        try:
+            names = os.listdir(self.path)
+        except OSError as err:
+            if err.errno not in (errno.ENOENT, errno.ENOTDIR):
+                raise
+            return []
+        volumes = []
+        for name in names:
+            if name.startswith(VOLUME_PREFIX) and name.endswith(VOLUME_EXT):
+                try:
+                    volumes.append(
+                        int(name[len(VOLUME_PREFIX):-len(VOLUME_EXT)]))
+                except ValueError:
+                    continue
+        return sorted(volumes)
+
+    def _stat_volumes(self, volumes):
+        stats = {}
+        for volume in volumes:
+            try:
+                stats[volume] = os.stat(self.volume_path(volume))
+            except OSError as err:
+                if err.errno != errno.ENOENT:
+                    raise
+        return stats
+
+    @property
+    def total_bytes(self):
+        return sum(self.positions.values())
+
+    def _is_current(self, stats):
+        if set(stats) != set(self.positions):
+            return False
+        return all(st.st_ino == self.inodes[volume] and
+                   st.st_size == self.positions[volume]
+                   for volume, st in stats.items())
+
+    def refresh(self):
+        """
+        Bring the index up to date with what has been appended to the
+        volumes since they were last read.
+        """
+        if self._is_current(self._stat_volumes(self._list_volumes())):
+            return
+        with lock_path(self.path):
+            self._refresh()
+
+    def _refresh(self):
+        # must be called holding the partition's lock
+        stats = self._stat_volumes(self._list_volumes())
+        if any(volume not in stats or
+               stats[volume].st_ino != self.inodes[volume]
+               for volume in self.positions):
+            # compacted or removed (and maybe recreated) under us
+            self._reset()
+        if not self.positions:
+            self._load_checkpoint(stats)
+        for volume in sorted(stats):
+            self._scan(volume, stats[volume])
+
+    def _load_checkpoint(self, stats):
+        try:
+            with open(join(self.path, INDEX_FILE), 'rb') as fp:
+                checkpoint = pickle.load(fp)
+        except Exception:
+            return
+        if any(volume not in stats or stats[volume].st_ino != inode
+               for volume, inode in checkpoint['inodes'].items()):
+            return
+        self.suffixes = checkpoint['suffixes']
+        self.positions = checkpoint['positions']
+        self.inodes = checkpoint['inodes']
+        self.damaged = checkpoint['damaged']
+        self.live_bytes = checkpoint['live_bytes']
+
+    def checkpoint(self):
+        """
+        Saves the index to ``packed.idx`` if enough records have been read
+        since it was last saved.  This writes out the whole index, so it is
+        left to the replicator rather than done by the PUT that happens to
+        read the last of those records.
+        """
+        if self.unsaved < CHECKPOINT_INTERVAL:
+            return
+        with lock_path(self.path):
+            self._refresh()
+            self._save_checkpoint()
+
+    def _save_checkpoint(self):
+        checkpoint = {'suffixes': self.suffixes,
+                      'positions': self.positions,
+                      'inodes': self.inodes,
+                      'damaged': self.damaged,
+                      'live_bytes': self.live_bytes}
+        write_pickle(checkpoint, join(self.path, INDEX_FILE), self.path,
+                     PICKLE_PROTOCOL)
+        self.unsaved = 0
+
+    def _read_record(self, fp, offset, size):
+        """
+        Reads the header, name and metadata of the record at offset.
+
+        :returns: (kind, name, metadata, data_offset, length), or None if the
+                  record is incomplete
+        :raises PackedRecordError: if the record is corrupt
+        """
+        header = fp.read(RECORD_HEADER_SIZE)
+        if len(header) < RECORD_HEADER_SIZE:
+            return None
+        prefix = header[:RECORD_PREFIX.size]
+        magic, kind, name_len, meta_len, length = RECORD_PREFIX.unpack(prefix)
+        if magic != RECORD_MAGIC or kind not in (PUT_RECORD, DROP_RECORD):
+            raise PackedRecordError('bad record header')
+        data_offset = offset + RECORD_HEADER_SIZE + name_len + meta_len
+        if data_offset + length > size:
+            return None
+        body = fp.read(name_len + meta_len)
+        crc, = RECORD_CRC.unpack(header[RECORD_PREFIX.size:])
+        if len(body) != name_len + meta_len or _crc(prefix, body) != crc:
+            raise PackedRecordError('bad record checksum')
+        metadata = pickle.loads(body[name_len:]) if meta_len else None
+        return kind, body[:name_len], metadata, data_offset, length
+
+    def _scan(self, volume, st):
+        position = self.positions.get(volume, 0)
+        path = self.volume_path(volume)
+        with open(path, 'rb') as fp:
+            while position < st.st_size:
+                fp.seek(position)
+                try:
+                    record = self._read_record(fp, position, st.st_size)
+                except PackedRecordError as err:
+                    # nothing after this can be trusted to be a record;
+                    # stop appending here and let compaction rewrite the
+                    # rest, while replication restores what was lost
+                    self.logger.error(
+                        _('Skipping the rest of %(path)s from offset '
+                          '%(offset)d: %(err)s'),
+                        {'path': path, 'offset': position, 'err': err})
+                    self.damaged.add(volume)
+                    position = st.st_size
+                    break
+                if record is None:
+                    # torn by a crash part way through an append; as the
+                    # lock is held nobody is appending to it now
+                    self.logger.warning(
+                        _('Truncating incomplete record at offset '
+                          '%(offset)d of %(path)s'),
+                        {'path': path, 'offset': position})
+                    with open(path, 'r+b') as wfp:
+                        wfp.truncate(position)
+                    break
+                kind, name, metadata, data_offset, length = record
+                self._apply(kind, name, PackedRecord(
+                    volume, position, data_offset, length, metadata))
+                position = data_offset + length
+        self.positions[volume] = position
+        self.inodes[volume] = st.st_ino
+
+    def _apply(self, kind, name, record):
+        hsh, filename = name.split('/', 1)
+        suffix = hsh[-3:]
+        hashes = self.suffixes.setdefault(suffix, {})
+        files = hashes.setdefault(hsh, {})
+        old = files.pop(filename, None)
+        if old is not None:
+            self.live_bytes -= record_size(old)
+        if kind == PUT_RECORD:
+            files[filename] = record
+            self.live_bytes += record_size(record)
+        if not files:
+            del hashes[hsh]
+            if not hashes:
+                del self.suffixes[suffix]
+        self.suffix_hashes.pop(suffix, None)
+        self.unsaved += 1
+
+    def listdir(self, hsh):
+        """
+        Returns the names of the files stored for an object hash.
+        """
+        self.refresh()
+        return list(self.suffixes.get(hsh[-3:], {}).get(hsh, {}))
+
+    def hashes(self, suffix):
+        """
+        Returns the object hashes stored in a suffix.
+        """
+        return list(self.suffixes.get(suffix, {}))
+
+    def get(self, hsh, filename):
+        """
+        Returns the :class:`PackedRecord` of a file, or None.
+        """
+        return self.suffixes.get(hsh[-3:], {}).get(hsh, {}).get(filename)
+
+    def open(self, record):
+        """
+        Opens the data of a record.
+
+        :returns: a :class:`VolumeSlice`
+        :raises IOError: if the volume is gone (because it was compacted)
+        """
+        return VolumeSlice(open(self.volume_path(record.volume), 'rb'),
+                           record.data_offset, record.length)
+
+    def _write_records(self, records):
+        """
+        Appends records to the current volume, starting a new one when it is
+        full, and syncs them to disk.
+
+        :param records: a list of (kind, name, metadata, source, length)
+                        where source is a file to copy length bytes of data
+                        from
+        """
+        volumes = sorted(self.positions)
+        if volumes and volumes[-1] not in self.damaged and \
+                self.positions[volumes[-1]] < self.volume_size:
+            volume = volumes[-1]
+        else:
+            volume = volumes[-1] + 1 if volumes else 0
+        path = self.volume_path(volume)
+        new_volume = not exists(path)
+        start = position = self.positions.get(volume, 0)
+        applied = []
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND)
+        try:
+            for kind, name, metadata, source, length in records:
+                header = pack_record_header(kind, name, metadata, length)
+                chunks = [header]
+                os.write(fd, header)
+                remaining = length
+                while remaining > 0:
+                    chunk = source.read(min(remaining, COPY_CHUNK_SIZE))
+                    if not chunk:
+                        raise PackedRecordError('short data for %s' % name)
+                    remaining -= len(chunk)
+                    chunks.append(chunk)
+                    while chunk:
+                        chunk = chunk[os.write(fd, chunk):]
+                data_offset = position + len(header)
+                applied.append((kind, name, PackedRecord(
+                    volume, position, data_offset, length, metadata)))
+                position = data_offset + length
+            fdatasync(fd)
+        except Exception as err:
+            os.ftruncate(fd, start)
+            if getattr(err, 'errno', None) in (errno.ENOSPC, errno.EDQUOT):
+                raise DiskFileNoSpace()
+            raise
+        finally:
+            os.close(fd)
+        if new_volume:
+            fsync_dir(self.path)
+            # the partition directory may be new too
+            fsync_dir(dirname(self.path))
+        for kind, name, record in applied:
+            self._apply(kind, name, record)
+        self.positions[volume] = position
+        self.inodes[volume] = os.stat(path).st_ino
+
+    def append(self, hsh, filename, metadata, source, length,
+               get_obsolete):
+        """
+        Durably stores a file for an object hash.
+
+        :param hsh: the object hash
+        :param filename: the file's name, e.g. <timestamp>.data
+        :param metadata: the file's metadata
+        :param source: file to read the file's data from
+        :param length: length of the data
+        :param get_obsolete: callable returning the files that are obsolete
+                             given a list of the files of an object hash
+        :returns: False if the file itself was obsolete and so not stored
+        """
+        with lock_path(self.path):
+            self._refresh()
+            files = list(self.suffixes.get(hsh[-3:], {}).get(hsh, {}))
+            files.append(filename)
+            obsolete = get_obsolete(files)
+            if filename in obsolete:
+                # the reference implementation would write it only to clean
+                # it up straight away
+                return False
+            records = [(PUT_RECORD, '%s/%s' % (hsh, filename), metadata,
+                        source, length)]
+            records.extend((DROP_RECORD, '%s/%s' % (hsh, name), None, None,
+                            0) for name in obsolete)
+            self._write_records(records)
+            return True
+
+    def drop(self, hsh, filenames):
+        """
+        Removes files of an object hash.
+        """
+        with lock_path(self.path):
+            self._refresh()
+            files = self.suffixes.get(hsh[-3:], {}).get(hsh, {})
+            records = [(DROP_RECORD, '%s/%s' % (hsh, name), None, None, 0)
+                       for name in filenames if name in files]
+            if records:
+                self._write_records(records)
+
+    def quarantine(self, hsh, to_dir):
+        """
+        Moves all the files of an object hash out of the volumes, writing
+        them to to_dir as files with xattr metadata like the reference
+        implementation has them.
+
+        :returns: the directory the files were written to
+        """
+        with lock_path(self.path):
+            self._refresh()
+            files = dict(self.suffixes.get(hsh[-3:], {}).get(hsh, {}))
+            if exists(to_dir):
+                to_dir = '%s-%s' % (to_dir, uuid.uuid4().hex)
+            mkdirs(to_dir)
+            for filename, record in files.items():
+                with open(join(to_dir, filename), 'wb') as out:
+                    fp = self.open(record)
+                    try:
+                        chunk = fp.read(COPY_CHUNK_SIZE)
+                        while chunk:
+                            out.write(chunk)
+                            chunk = fp.read(COPY_CHUNK_SIZE)
+                    finally:
+                        fp.close()
+                    out.flush()
+                    write_metadata(out, record.metadata)
+            if files:
+                self._write_records([
+                    (DROP_RECORD, '%s/%s' % (hsh, name), None, None, 0)
+                    for name in files])
+            return to_dir
+
+    def needs_compaction(self, ratio):
+        """
+        Returns True if the volumes have enough dead bytes (of records that
+        have since been replaced or dropped) to be worth compacting.
+        """
+        if self.damaged:
+            return True
+        dead = self.total_bytes - self.live_bytes
+        return dead >= MIN_COMPACT_BYTES and dead > ratio * self.total_bytes
+
+    def compact(self):
+        """
+        Copies the live records into new volumes and removes the old ones.
+
+        The live records are copied without holding the partition's lock,
+        so that PUTs and DELETEs carry on meanwhile.  Holding the lock, the
+        records appended since are then copied after them, and the index is
+        switched over to the new volumes, but only once they have all been
+        written and synced; if anything fails before then they are removed,
+        and the index and old volumes are left as they were.
+
+        :returns: the number of bytes reclaimed
+        """
+        with lock_path(self.path):
+            self._refresh()
+            self._remove_stale_compactions()
+            if not self.positions:
+                return 0
+            positions = dict(self.positions)
+            inodes = dict(self.inodes)
+            damaged = set(self.damaged)
+            live = [('%s/%s' % (hsh, filename), record)
+                    for hashes in self.suffixes.values()
+                    for hsh, files in hashes.items()
+                    for filename, record in files.items()]
+        new_volumes = CompactedVolumes(self)
+        try:
+            copied = self._copy_live(live, new_volumes)
+        except BaseException:
+            new_volumes.remove()
+            raise
+        with lock_path(self.path):
+            try:
+                self._refresh()
+                if self.damaged - damaged or any(
+                        self.inodes.get(volume) != inode
+                        for volume, inode in inodes.items()):
+                    # compacted by another process, or found damaged, in
+                    # the meantime; leave it to the next pass
+                    new_volumes.remove()
+                    return 0
+                appended = self._copy_appended(positions, new_volumes)
+                new_volumes.sync()
+                # new volumes are numbered on from the old ones so that
+                # other processes (and a crash part way through) can not
+                # mistake them
+                old_volumes = sorted(self.positions)
+                first_volume = old_volumes[-1] + 1
+                new_volumes.install(first_volume)
+            except BaseException:
+                new_volumes.remove()
+                raise
+            before = self.total_bytes
+            suffix_hashes = self.suffix_hashes
+            self._reset()
+            for name, record in copied:
+                self._apply(PUT_RECORD, name,
+                            record._replace(volume=first_volume +
+                                            record.volume))
+            for kind, name, record in appended:
+                self._apply(kind, name,
+                            record._replace(volume=first_volume +
+                                            record.volume))
+            # the same files are listed, so the suffix hashes still hold
+            self.suffix_hashes = suffix_hashes
+            self.positions = dict(
+                (first_volume + index, size)
+                for index, size in enumerate(new_volumes.sizes))
+            self.inodes = dict(
+                (volume, st.st_ino)
+                for volume, st in self._stat_volumes(self.positions).items())
+            self._save_checkpoint()
+            for old_volume in old_volumes:
+                os.unlink(self.volume_path(old_volume))
+            fsync_dir(self.path)
+            return before - self.total_bytes
+
+    def _copy_live(self, live, new_volumes):
+        """
+        Copies the live records of the index into new_volumes.
+
+        :param live: a list of (name, record) of the live records
+        :returns: a list of (name, record) of the copies
+        """
+        copied = []
+        sources = {}
+        try:
+            for name, record in live:
+                source = sources.get(record.volume)
+                if source is None:
+                    source = sources[record.volume] = open(
+                        self.volume_path(record.volume), 'rb')
+                copied.append((name, new_volumes.copy(record, source)))
+        finally:
+            for source in sources.values():
+                source.close()
+        return copied
+
+    def _copy_appended(self, positions, new_volumes):
+        """
+        Copies the records appended to the volumes since they were read up
+        to positions into new_volumes, in the order they were appended.
+        Must be called holding the partition's lock, with the index
+        refreshed.
+
+        :returns: a list of (kind, name, record) of the copies
+        """
+        copied = []
+        for volume in sorted(self.positions):
+            position = positions.get(volume, 0)
+            end = self.positions[volume]
+            if position >= end:
+                continue
+            with open(self.volume_path(volume), 'rb') as fp:
+                while position < end:
+                    fp.seek(position)
+                    record = self._read_record(fp, position, end)
+                    if record is None:
+                        raise PackedRecordError('incomplete record')
+                    kind, name, metadata, data_offset, length = record
+                    copied.append((kind, name, new_volumes.copy(
+                        PackedRecord(volume, position, data_offset, length,
+                                     metadata), fp)))
+                    position = data_offset + length
+        return copied
+
+    def _remove_stale_compactions(self):
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            return
+        for name in names:
+            if not (name.startswith(COMPACT_PREFIX) and
+                    name.endswith(COMPACT_EXT)):
+                continue
+            path = join(self.path, name)
+            try:
+                if time.time() - os.stat(path).st_mtime > STALE_COMPACT_AGE:
+                    os.unlink(path)
+            except OSError as err:
+                if err.errno != errno.ENOENT:
+                    raise
+
+
+class CompactedVolumes(object):
+    """
+    The volumes a partition's records are copied into when it is compacted.
+    They are written as temporary files, which nothing reads, until
+    install() renames them into place.
+
+    :param partition: the :class:`PackedPartition` being compacted
+    """
+
+    def __init__(self, partition):
+        self.partition = partition
+        self.paths = []
+        self.sizes = []
+        self._fd = None
+
+    def copy(self, record, source):
+        """
+        Copies a record from the volume it is in.
+
+        :param record: the :class:`PackedRecord` to copy
+        :param source: the record's volume, opened for reading
+        :returns: the :class:`PackedRecord` of the copy, whose volume is the
+                  index of the new volume it is in
+        """
+        if self._fd is None or \
+                self.sizes[-1] >= self.partition.volume_size:
+            self._next()
+        position = self.sizes[-1]
+        source.seek(record.offset)
+        remaining = record_size(record)
+        while remaining > 0:
+            chunk = source.read(min(remaining, COPY_CHUNK_SIZE))
+            if not chunk:
+                raise PackedRecordError('short record in %s' % source.name)
+            remaining -= len(chunk)
+            while chunk:
+                chunk = chunk[os.write(self._fd, chunk):]
+        self.sizes[-1] += record_size(record)
+        return record._replace(
+            volume=len(self.paths) - 1, offset=position,
+            data_offset=position + record.data_offset - record.offset)
+
+    def _next(self):
+        self._close(sync=True)
+        path = join(self.partition.path, '%s%s%s' % (
+            COMPACT_PREFIX, uuid.uuid4().hex, COMPACT_EXT))
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+        self.paths.append(path)
+        self.sizes.append(0)
+
+    def _close(self, sync):
+        if self._fd is None:
+            return
+        try:
+            if sync:
+                fdatasync(self._fd)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    def sync(self):
+        """
+        Syncs the new volumes to disk.  There is always at least one, even
+        if there was nothing to copy, so that volume numbers are never
+        reused.
+        """
+        if not self.paths:
+            self._next()
+        self._close(sync=True)
+
+    def install(self, first_volume):
+        """
+        Renames the new volumes into place, numbered on from first_volume.
+        """
+        for index, path in enumerate(self.paths):
+            volume_path = self.partition.volume_path(first_volume + index)
+            os.rename(path, volume_path)
+            self.paths[index] = volume_path
+        fsync_dir(self.partition.path)
+
+    def remove(self):
+        """
+        Removes the new volumes, wherever they are.
+        """
+        self._close(sync=False)
+        for path in self.paths:
+            try:
+                os.unlink(path)
+            except OSError as err:
+                if err.errno != errno.ENOENT:
+                    raise
+
+
+class PackedDiskFileReader(BaseDiskFileReader):
+    def _drop_cache(self, fd, offset, length):
+        # offsets are relative to the object's data in the volume
+        if not self._keep_cache:
+            drop_buffer_cache(fd, self._fp.start + offset, length)
+
+    def _prefetch_cache(self, fd, offset, length):
+        prefetch_buffer_cache(fd, self._fp.start + offset,
+                              max(min(length, self._obj_size - offset), 0))
+
+
+class PackedDiskFileWriter(BaseDiskFileWriter):
+    """
+    Writer for a packed policy; fd is a spool file (kept in memory up to
+    ``packed_spool_size`` bytes) the data is written to until put() appends
+    it to the partition's volume.
+    """
+
+    def write(self, chunk):
+        self._threadpool.run_in_thread(self._fd.write, chunk)
+        self._upload_size += len(chunk)
+        return self._upload_size
+
+    def _finalize_put(self, metadata, filename):
+        self._fd.seek(0)
+        self._diskfile.partition.append(
+            basename(self._datadir), filename, metadata, self._fd,
+            self._upload_size, self.manager.get_obsolete_files)
+        self._put_succeeded = True
+
+    def put(self, metadata):
+        """
+        Finalize writing the object by appending it to the partition's
+        current volume.
+
+        :param metadata: dictionary of metadata to be associated with the
+                         object
+        """
+        timestamp = Timestamp(metadata['X-Timestamp']).internal
+        metadata['name'] = self._name
+        self._threadpool.force_run_in_thread(
+            self._finalize_put, metadata, timestamp + self._extension)
+
+
+class PackedDiskFile(BaseDiskFile):
+    """
+    DiskFile for a packed policy.  The hash dir and file paths it deals in
+    are those of the reference implementation, but they only exist in the
+    partition's index.
+    """
+    reader_cls = PackedDiskFileReader
+    writer_cls = PackedDiskFileWriter
+
+    @property
+    def partition(self):
+        return self._manager.get_partition(dirname(dirname(self._datadir)))
+
+    def open(self):
+        """
+        Open the object.
+
+        See :func:`swift.obj.diskfile.BaseDiskFile.open`; the files of the
+        object are looked up in the index rather than listed.
+        """
+        files = self.partition.listdir(basename(self._datadir))
+        file_info = self._get_ondisk_file(files)
+        self._data_file = file_info.get('data_file')
+        if not self._data_file:
+            raise self._construct_exception_from_ts_file(**file_info)
+        self._fp = self._construct_from_data_file(**file_info)
+        self._metadata = self._metadata or {}
+        return self
+
+    def _get_ondisk_file(self, files):
+        return self.manager.get_ondisk_files(files, self._datadir)
+
+    def _get_record(self, filename):
+        record = self.partition.get(basename(self._datadir),
+                                    basename(filename))
+        if record is None:
+            raise DiskFileNotExist()
+        return record
+
+    def _open_data_file(self, data_file):
+        try:
+            return self.partition.open(self._get_record(data_file))
+        except IOError as err:
+            if err.errno != errno.ENOENT:
+                raise
+        # the volume was compacted since we looked the record up
+        self.partition.refresh()
+        return self.partition.open(self._get_record(data_file))
+
+    def _get_data_file_size(self, data_file, fp):
+        return fp.length
+
+    def _failsafe_read_metadata(self, source, quarantine_filename=None):
+        # the metadata of every file is kept in the index
+        return dict(self._get_record(quarantine_filename).metadata)
+
+    @contextmanager
+    def create(self, size=None):
+        """
+        Context manager to create a file.  The data is spooled until the
+        PackedDiskFileWriter appends it to a volume; no space is preallocated.
+
+        :param size: ignored
+        """
+        if not exists(self._tmpdir):
+            mkdirs(self._tmpdir)
+        spool = SpooledTemporaryFile(max_size=self._manager.spool_size,
+                                     dir=self._tmpdir)
+        try:
+            yield self.writer_cls(self._name, self._datadir, spool, None,
+                                  bytes_per_sync=self._bytes_per_sync,
+                                  threadpool=self._threadpool,
+                                  diskfile=self)
+        finally:
+            spool.close()
+
+
+@DiskFileRouter.register(PACKED_POLICY)
+class PackedDiskFileManager(DiskFileManager):
+    """
+    Manager for packed policies.  File names, the on-disk file contract and
+    suffix hashing are those of :class:`~swift.obj.diskfile.DiskFileManager`;
+    what changes is where the files live.
+
+    :param conf: caller provided configuration object
+    :param logger: caller provided logger
+    """
+    diskfile_cls = PackedDiskFile
+
+    def __init__(self, conf, logger):
+        super(PackedDiskFileManager, self).__init__(conf, logger)
+        # splice() would read past the end of the object into the volume
+        self.use_splice = False
+        self.volume_size = int(conf.get('packed_volume_size', 1073741824))
+        self.spool_size = int(conf.get('packed_spool_size', 65536))
+        self.compact_ratio = float(conf.get('packed_compact_ratio', 0.5))
+        self.partitions = LRUCache(
+            maxsize=int(conf.get('packed_index_cache_size', 128)),
+            maxtime=float('inf'))
+
+    def get_partition(self, partition_path):
+        """
+        Returns the :class:`PackedPartition` for a partition directory.
+        """
+        partition = self.partitions.get(partition_path)
+        if partition is None:
+            partition = self.partitions.set(partition_path, PackedPartition(
+                partition_path, self.volume_size, self.logger))
+        return partition
+
+    def get_obsolete_files(self, files):
+        return self.gather_ondisk_files(
+            list(files), include_obsolete=True).get('obsolete', [])
+
+    def cleanup_ondisk_files(self, hsh_path, reclaim_age=ONE_WEEK, **kwargs):
+        """
+        Clean up files that are obsolete and gather the set of valid files
+        for an object; see
+        :func:`swift.obj.diskfile.BaseDiskFileManager.cleanup_ondisk_files`.
+        """
+        def is_reclaimable(filename):
+            timestamp = self.parse_on_disk_filename(filename)['timestamp']
+            return (time.time() - float(timestamp)) > reclaim_age
+
+        hsh = basename(hsh_path)
+        partition = self.get_partition(dirname(dirname(hsh_path)))
+        files = partition.listdir(hsh)
+        files.sort(reverse=True)
+        results = self.gather_ondisk_files(files, include_obsolete=True,
+                                           **kwargs)
+        if '.ts' in results and is_reclaimable(results['.ts']):
+            results.setdefault('obsolete', []).append(results.pop('.ts'))
+        if results.get('obsolete'):
+            partition.drop(hsh, results['obsolete'])
+            for filename in results['obsolete']:
+                files.remove(filename)
+        results['files'] = files
+        return results
+
+    def quarantine_renamer(self, device_path, corrupted_file_path):
+        """
+        Moves all the files of the object corrupted_file_path belongs to out
+        of the volumes and into the quarantined area.
+
+        :returns: path (str) of directory the files were moved to
+        """
+        policy = extract_policy(corrupted_file_path) or POLICIES.legacy
+        hsh_path = dirname(corrupted_file_path)
+        partition = self.get_partition(dirname(dirname(hsh_path)))
+        return partition.quarantine(basename(hsh_path), join(
+            device_path, 'quarantined', get_data_dir(policy),
+            basename(hsh_path)))
+
+    def _hash_suffix(self, path, reclaim_age):
+        """
+        Performs reclamation and returns an md5 of all (remaining) files, just
+        as :class:`~swift.obj.diskfile.DiskFileManager` would for the same
+        files.
+
+        :raises PathNotDir: if the suffix holds no files
+        """
+        partition = self.get_partition(dirname(path))
+        md5 = hashlib.md5()
+        found = False
+        for hsh in sorted(partition.hashes(basename(path))):
+            for filename in self.hash_cleanup_listdir(join(path, hsh),
+                                                      reclaim_age):
+                md5.update(filename)
+                found = True
+        if not found:
+            raise PathNotDir()
+        return md5.hexdigest()
+
+    def _get_hashes(self, partition_path, recalculate=None, do_listdir=False,
+                    reclaim_age=None):
+        """
+        Get a list of hashes for the suffixes of a partition, compacting or
+        checkpointing its index first if need be.  The suffix hashes are
+        cached with the index rather than in hashes.pkl, so there is no
+        listing for do_listdir to distrust.
+
+        :returns: tuple of (number of suffixes hashed, dictionary of hashes)
+        """
+        reclaim_age = reclaim_age or self.reclaim_age
+        recalculate = set(recalculate or [])
+        partition = self.get_partition(partition_path)
+        partition.refresh()
+        if partition.needs_compaction(self.compact_ratio):
+            reclaimed = partition.compact()
+            self.logger.info(_('Compacted %(path)s, reclaiming %(bytes)d '
+                               'bytes'), {'path': partition_path,
+                                          'bytes': reclaimed})
+        else:
+            partition.checkpoint()
+        hashed = 0
+        hashes = {}
+        for suffix in sorted(partition.suffixes):
+            hash_ = partition.suffix_hashes.get(suffix)
+            if not hash_ or suffix in recalculate:
+                try:
+                    hash_ = self._hash_suffix(join(partition_path, suffix),
+                                              reclaim_age)
+                except PathNotDir:
+                    continue
+                hashed += 1
+                partition.suffix_hashes[suffix] = hash_
+            hashes[suffix] = hash_
+        return hashed, hashes
+
+    def _listdir(self, path):
+        # only ever asked for the hashes in a suffix, by yield_hashes
+        partition = self.get_partition(dirname(path))
+        partition.refresh()
+        return partition.hashes(basename(path))
+
+    def yield_suffixes(self, device, partition, policy):
+        """
+        Yields tuples of (full_path, suffix_only) for suffixes stored
+        on the given device and partition.
+        """
+        dev_path = self.get_dev_path(device)
+        if not dev_path:
+            raise DiskFileDeviceUnavailable()
+        partition_path = join(dev_path, get_data_dir(policy), str(partition))
+        packed = self.get_partition(partition_path)
+        packed.refresh()
+        for suffix in sorted(packed.suffixes):
+            yield (join(partition_path, suffix), suffix)
+
+    def get_diskfile_from_hash(self, device, partition, object_hash,
+                               policy, io_class=CLIENT_IO, **kwargs):
+        """
+        Returns a DiskFile instance for an object at the given object_hash,
+        the way :class:`~swift.obj.diskfile.BaseDiskFileManager` does.
+
+        :raises DiskFileNotExist: if the object does not exist
+        """
+        dev_path = self.get_dev_path(device)
+        if not dev_path:
+            raise DiskFileDeviceUnavailable()
+        partition_path = join(dev_path, get_data_dir(policy), str(partition))
+        filenames = self.hash_cleanup_listdir(
+            join(partition_path, object_hash[-3:], object_hash),
+            self.reclaim_age)
+        if not filenames:
+            raise DiskFileNotExist()
+        record = self.get_partition(partition_path).get(
+            object_hash, filenames[-1])
+        if record is None:
+            raise DiskFileNotExist()
+        try:
+            account, container, obj = split_path(
+                record.metadata.get('name', ''), 3, 3, True)
+        except ValueError:
+            raise DiskFileNotExist()
+        return self.diskfile_cls(self, dev_path,
+                                 self.get_threadpool(device, io_class),
+                                 partition, account, container, obj,
+                                 policy=policy, **kwargs)
+
+    def object_audit_location_generator(self, device_dirs=None):
+        """
+        Yield an AuditLocation for every object of every packed policy on the
+        devices (or only those in device_dirs); the locations of the objects
+        of other policies are yielded by
+        :func:`swift.obj.diskfile.object_audit_location_generator`.
+        """
+        if not device_dirs:
+            device_dirs = listdir(self.devices)
+        else:
+            device_dirs = list(
+                set(listdir(self.devices)).intersection(set(device_dirs)))
+        shuffle(device_dirs)
+        for device in device_dirs:
+            if self.mount_check and not \
+                    ismount(join(self.devices, device)):
+                self.logger.debug(
+                    _('Skipping %s as it is not mounted'), device)
+                continue
+            for dir_ in listdir(join(self.devices, device)):
+                if not dir_.startswith(DATADIR_BASE):
+                    continue
+                try:
+                    _junk, policy = split_policy_string(dir_)
+                except PolicyError:
+                    continue
+                if policy.policy_type != PACKED_POLICY:
+                    continue
+                datadir_path = join(self.devices, device, dir_)
+                for partition in listdir(datadir_path):
+                    part_path = join(datadir_path, partition)
+                    packed = self.get_partition(part_path)
+                    packed.refresh()
+                    for suffix in sorted(packed.suffixes):
+                        for hsh in packed.hashes(suffix):
+                            yield AuditLocation(join(part_path, suffix, hsh),
+                                                device, partition, policy)
@@ -40,7 +40,7 @@ from swift.obj.ssync_sender import Sender as ssync_sender
 from swift.common.http import HTTP_OK, HTTP_NOT_FOUND, \
     HTTP_INSUFFICIENT_STORAGE
 from swift.obj.diskfile import DiskFileRouter, get_data_dir, \
-    get_tmp_dir
+    get_tmp_dir, REPLICATION_IO
 from swift.common.storage_policy import POLICIES, EC_POLICY
 from swift.common.exceptions import ConnectionTimeout, DiskFileError, \
     SuffixSyncError
@@ -546,7 +546,7 @@ class ObjectReconstructor(Daemon):
                 df = df_mgr.get_diskfile_from_hash(
                     job['local_dev']['device'], job['partition'],
                     object_hash, job['policy'],
-                    frag_index=frag_index)
+                    frag_index=frag_index, io_class=REPLICATION_IO)
                 df.purge(timestamps['ts_data'], frag_index)
             except DiskFileError:
                 self.logger.exception(
@@ -38,8 +38,9 @@ from swift.common.bufferedhttp import http_connect
 from swift.common.daemon import Daemon
 from swift.common.http import HTTP_OK, HTTP_INSUFFICIENT_STORAGE
 from swift.obj import ssync_sender
-from swift.obj.diskfile import DiskFileManager, get_data_dir, get_tmp_dir
-from swift.common.storage_policy import POLICIES, REPL_POLICY
+from swift.obj.diskfile import DiskFileManager, DiskFileRouter, \
+    get_data_dir, get_tmp_dir
+from swift.common.storage_policy import POLICIES, REPL_POLICY, PACKED_POLICY
 
 
 hubs.use_hub(get_hub())
@@ -114,6 +115,7 @@ class ObjectReplicator(Daemon):
                              'handoff_delete before the next '
                              'normal rebalance')
         self._diskfile_mgr = DiskFileManager(conf, self.logger)
+        self._df_router = DiskFileRouter(conf, self.logger)
 
     def _zero_stats(self):
         """Zero out the stats."""
@@ -151,6 +153,9 @@ class ObjectReplicator(Daemon):
 
         :returns: boolean and dictionary, boolean indicating success or failure
         """
+        if job['policy'].policy_type == PACKED_POLICY:
+            # rsync would overwrite the remote volumes rather than merge them
+            return self.ssync(node, job, suffixes, *args, **kwargs)
         return self.sync_method(node, job, suffixes, *args, **kwargs)
 
     def load_object_ring(self, policy):
@@ -247,8 +252,11 @@ class ObjectReplicator(Daemon):
         return self._rsync(args) == 0, {}
 
     def ssync(self, node, job, suffixes, remote_check_objs=None):
-        return ssync_sender.Sender(
-            self, node, job, suffixes, remote_check_objs)()
+        sender = ssync_sender.Sender(
+            self, node, job, suffixes, remote_check_objs)
+        if job['policy'].policy_type == PACKED_POLICY:
+            sender.df_mgr = self._df_router[job['policy']]
+        return sender()
 
     def check_ring(self, object_ring):
         """
@@ -272,6 +280,10 @@ class ObjectReplicator(Daemon):
         """
 
         def tpool_get_suffixes(path):
+            if job['policy'].policy_type == PACKED_POLICY:
+                return [suff for _junk, suff in
+                        self._df_router[job['policy']].yield_suffixes(
+                            job['device'], job['partition'], job['policy'])]
             return [suff for suff in os.listdir(path)
                     if len(suff) == 3 and isdir(join(path, suff))]
         self.replication_count += 1
@@ -328,8 +340,11 @@ class ObjectReplicator(Daemon):
                     all(responses)
             if delete_handoff:
                 self.stats['remove'] += 1
+                # the objects of a packed policy are removed with their
+                # partition, as they are after a sync with rsync
                 if (self.conf.get('sync_method', 'rsync') == 'ssync' and
-                        delete_objs is not None):
+                        delete_objs is not None and
+                        job['policy'].policy_type != PACKED_POLICY):
                     self.logger.info(_("Removing %s objects"),
                                      len(delete_objs))
                     _junk, error_paths = self.delete_handoff_objs(
@@ -396,8 +411,11 @@ class ObjectReplicator(Daemon):
         failure_devs_info = set()
         begin = time.time()
         try:
+            df_mgr = self._diskfile_mgr
+            if job['policy'].policy_type == PACKED_POLICY:
+                df_mgr = self._df_router[job['policy']]
             hashed, local_hash = tpool_reraise(
-                self._diskfile_mgr._get_hashes, job['path'],
+                df_mgr._get_hashes, job['path'],
                 do_listdir=(self.replication_count % 10) == 0,
                 reclaim_age=self.reclaim_age)
             self.suffix_hash += hashed
@@ -448,7 +466,7 @@ class ObjectReplicator(Daemon):
                         self.stats['hashmatch'] += 1
                         continue
                     hashed, recalc_hash = tpool_reraise(
-                        self._diskfile_mgr._get_hashes,
+                        df_mgr._get_hashes,
                         job['path'], recalculate=suffixes,
                         reclaim_age=self.reclaim_age)
                     self.logger.update_stats('suffix.hashes', hashed)
@@ -644,7 +662,7 @@ class ObjectReplicator(Daemon):
         jobs = []
         ips = whataremyips(self.bind_ip)
         for policy in POLICIES:
-            if policy.policy_type == REPL_POLICY:
+            if policy.policy_type in (REPL_POLICY, PACKED_POLICY):
                 if (override_policies is not None and
                         str(policy.idx) not in override_policies):
                     continue
@@ -25,6 +25,7 @@ from swift.common import swob
 from swift.common import utils
 from swift.common import request_helpers
 from swift.common.utils import Timestamp
+from swift.obj.diskfile import REPLICATION_IO
 
 
 def decode_missing(line):
@@ -252,7 +253,8 @@ class Receiver(object):
         try:
             df = self.diskfile_mgr.get_diskfile_from_hash(
                 self.device, self.partition, object_hash,
-                self.policy, frag_index=self.frag_index)
+                self.policy, frag_index=self.frag_index,
+                io_class=REPLICATION_IO)
         except exceptions.DiskFileNotExist:
             return {}
         try:
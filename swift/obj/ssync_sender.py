@@ -19,6 +19,7 @@ from six.moves import urllib
 from swift.common import bufferedhttp
 from swift.common import exceptions
 from swift.common import http
+from swift.obj.diskfile import REPLICATION_IO
 
 
 def encode_missing(object_hash, ts_data, ts_meta=None):
@@ -325,7 +326,8 @@ class Sender(object):
             try:
                 df = self.df_mgr.get_diskfile_from_hash(
                     self.job['device'], self.job['partition'], object_hash,
-                    self.job['policy'], frag_index=self.job.get('frag_index'))
+                    self.job['policy'], frag_index=self.job.get('frag_index'),
+                    io_class=REPLICATION_IO)
             except exceptions.DiskFileNotExist:
                 continue
             url_path = urllib.parse.quote(
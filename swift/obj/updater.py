@@ -18,21 +18,26 @@ import os
 import signal
 import sys
 import time
+from functools import partial
 from swift import gettext_ as _
 from random import random
 
-from eventlet import spawn, patcher, Timeout
+from eventlet import GreenPool, spawn, patcher, sleep, Timeout
 
 from swift.common.bufferedhttp import http_connect
 from swift.common.exceptions import ConnectionTimeout
 from swift.common.ring import Ring
 from swift.common.utils import get_logger, renamer, write_pickle, \
-    dump_recon_cache, config_true_value, ismount
+    dump_recon_cache, config_true_value, ismount, json, ratelimit_sleep
 from swift.common.daemon import Daemon
 from swift.common.storage_policy import split_policy_string, PolicyError
+from swift.obj.async_journal import AsyncPendingJournal
 from swift.obj.diskfile import get_tmp_dir, ASYNCDIR_BASE
 from swift.common.http import is_success, HTTP_NOT_FOUND, \
-    HTTP_INTERNAL_SERVER_ERROR
+    HTTP_INTERNAL_SERVER_ERROR, HTTP_METHOD_NOT_ALLOWED
+
+# The most updates held back in batches before they are all sent
+MAX_BATCHED_UPDATES = 10000
 
 
 class ObjectUpdater(Daemon):
@@ -50,6 +55,13 @@ class ObjectUpdater(Daemon):
         self.slowdown = float(conf.get('slowdown', 0.01))
         self.node_timeout = int(conf.get('node_timeout', 10))
         self.conn_timeout = float(conf.get('conn_timeout', 0.5))
+        self.update_concurrency = int(conf.get('update_concurrency', 1))
+        self.update_batch_size = int(conf.get('update_batch_size', 1))
+        self.updates_per_second = float(conf.get('updates_per_second', 0))
+        self.pool = GreenPool(max(self.update_concurrency, 1))
+        self.batches = {}
+        self.batched = 0
+        self.rate_running_time = 0
         self.successes = 0
         self.failures = 0
         self.recon_cache_path = conf.get('recon_cache_path',
@@ -95,6 +107,8 @@ class ObjectUpdater(Daemon):
                 else:
                     signal.signal(signal.SIGTERM, signal.SIG_DFL)
                     patcher.monkey_patch(all=False, socket=True)
+                    # share the rate limit between the devices being swept
+                    self.updates_per_second /= max(self.concurrency, 1)
                     self.successes = 0
                     self.failures = 0
                     forkbegin = time.time()
@@ -162,10 +176,12 @@ class ObjectUpdater(Daemon):
                 self.logger.warn(_('Directory %r does not map '
                                    'to a valid policy (%s)') % (asyncdir, e))
                 continue
+            prefix_paths = []
             for prefix in self._listdir(async_pending):
                 prefix_path = os.path.join(async_pending, prefix)
                 if not os.path.isdir(prefix_path):
                     continue
+                prefix_paths.append(prefix_path)
                 last_obj_hash = None
                 for update in sorted(self._listdir(prefix_path), reverse=True):
                     update_path = os.path.join(prefix_path, update)
@@ -187,13 +203,49 @@ class ObjectUpdater(Daemon):
                         self.process_object_update(update_path, device,
                                                    policy)
                         last_obj_hash = obj_hash
-                    time.sleep(self.slowdown)
+                    sleep(self.slowdown)
+            self.wait_for_updates()
+            for prefix_path in prefix_paths:
                 try:
                     os.rmdir(prefix_path)
                 except OSError:
                     pass
+            self.journal_sweep(async_pending, device, policy)
             self.logger.timing_since('timing', start_time)
 
+    def journal_sweep(self, async_pending, device, policy):
+        """
+        Process the updates in a policy's async pending journal, if it has
+        one. Only the newest update of each object in each journal segment is
+        sent; updates that fail are appended to the journal again.
+
+        :param async_pending: path to the policy's async pending directory
+        :param device: path to device
+        :param policy: storage policy of the async pending directory
+        """
+        journal = AsyncPendingJournal(async_pending, self.logger)
+        try:
+            segments = journal.rotate()
+        except OSError as e:
+            self.logger.increment('errors')
+            self.logger.error(_('ERROR: Unable to rotate async pending '
+                                'journal in %(path)s: %(error)s') %
+                              {'path': async_pending, 'error': e})
+            return
+        for segment in segments:
+            newest = journal.index(segment)
+            for offset, obj_hash, timestamp, update in \
+                    journal.iter_records(segment):
+                if newest[obj_hash] != offset:
+                    # superseded by a newer update of the same object
+                    continue
+                self.process_journaled_update(
+                    journal, obj_hash, timestamp, update, policy)
+                sleep(self.slowdown)
+            # the failed updates must be in the journal again first
+            self.wait_for_updates()
+            os.unlink(segment)
+
     def process_object_update(self, update_path, device, policy):
         """
         Process the object information to be updated and update.
@@ -212,15 +264,147 @@ class ObjectUpdater(Daemon):
                                        os.path.basename(update_path))
             renamer(update_path, target_path, fsync=False)
             return
-        successes = update.get('successes', [])
-        part, nodes = self.get_container_ring().get_nodes(
-            update['account'], update['container'])
+        self.dispatch_update(update, policy, partial(
+            self._object_update_done, update_path, device, policy, update))
+
+    def _object_update_done(self, update_path, device, policy, update,
+                            success, new_successes):
+        obj = '/%s/%s/%s' % \
+              (update['account'], update['container'], update['obj'])
+        if success:
+            self.successes += 1
+            self.logger.increment('successes')
+            self.logger.debug('Update sent for %(obj)s %(path)s',
+                              {'obj': obj, 'path': update_path})
+            self.logger.increment("unlinks")
+            os.unlink(update_path)
+        else:
+            self.failures += 1
+            self.logger.increment('failures')
+            self.logger.debug('Update failed for %(obj)s %(path)s',
+                              {'obj': obj, 'path': update_path})
+            if new_successes:
+                write_pickle(update, update_path, os.path.join(
+                    device, get_tmp_dir(policy)))
+
+    def process_journaled_update(self, journal, obj_hash, timestamp, update,
+                                 policy):
+        """
+        Update the container listings with an update read from an async
+        pending journal.
+
+        :param journal: the journal the update was read from
+        :param obj_hash: the hash of the object the update is for
+        :param timestamp: the internal form of the update's timestamp
+        :param update: the update
+        :param policy: storage policy of object update
+        """
+        self.dispatch_update(update, policy, partial(
+            self._journaled_update_done, journal, obj_hash, timestamp,
+            update))
+
+    def _journaled_update_done(self, journal, obj_hash, timestamp, update,
+                               success, new_successes):
         obj = '/%s/%s/%s' % \
               (update['account'], update['container'], update['obj'])
+        if success:
+            self.successes += 1
+            self.logger.increment('successes')
+            self.logger.debug('Journaled update sent for %s', obj)
+        else:
+            self.failures += 1
+            self.logger.increment('failures')
+            self.logger.debug('Journaled update failed for %s', obj)
+            journal.append(obj_hash, timestamp, update)
+
+    def dispatch_update(self, update, policy, done):
+        """
+        Send an update, concurrently with others if update_concurrency is
+        set, or hold it back to send in a batch with other updates of its
+        container if update_batch_size is.
+
+        :param update: the update
+        :param policy: storage policy of object update
+        :param done: called with whether the update has now succeeded on
+                     every node and whether it succeeded on any this time
+        """
+        if self.update_batch_size > 1:
+            try:
+                item = self.make_batch_item(update, policy)
+            except (KeyError, TypeError, ValueError):
+                # leave it to the container server to reject on its own
+                item = None
+            if item is not None:
+                key = (update['account'], update['container'], int(policy))
+                batch = self.batches.setdefault(key, [])
+                batch.append((update, item, done))
+                self.batched += 1
+                if len(batch) >= self.update_batch_size:
+                    self._send_batch(key)
+                elif self.batched >= max(MAX_BATCHED_UPDATES,
+                                         self.update_batch_size):
+                    self.flush_batches()
+                return
+        self._spawn(1, self._send_one, update, policy, done)
+
+    def flush_batches(self):
+        """
+        Send all the batches held back so far.
+        """
+        for key in list(self.batches):
+            self._send_batch(key)
+
+    def wait_for_updates(self):
+        """
+        Send all the batches held back so far and wait for every update to
+        be sent.
+        """
+        self.flush_batches()
+        self.pool.waitall()
+
+    def _send_batch(self, key):
+        batch = self.batches.pop(key)
+        self.batched -= len(batch)
+        self._spawn(len(batch), self.send_batch, batch, key[2])
+
+    def _spawn(self, count, func, *args):
+        self.rate_running_time = ratelimit_sleep(
+            self.rate_running_time, self.updates_per_second, incr_by=count)
+        if self.update_concurrency > 1:
+            self.pool.spawn_n(func, *args)
+        else:
+            func(*args)
+
+    def _send_one(self, update, policy, done):
+        try:
+            done(*self.send_update(update, policy))
+        except (Exception, Timeout):
+            self.logger.exception(_('ERROR sending update for %s'),
+                                  update.get('obj'))
+
+    def _update_headers(self, update, policy):
         headers_out = update['headers'].copy()
         headers_out['user-agent'] = 'object-updater %s' % os.getpid()
         headers_out.setdefault('X-Backend-Storage-Policy-Index',
                                str(int(policy)))
+        return headers_out
+
+    def send_update(self, update, policy):
+        """
+        Send an update to each of its container's nodes it has not already
+        been sent to, adding those it succeeds on to update['successes'].
+
+        :param update: the update
+        :param policy: storage policy of object update
+        :returns: a tuple of whether the update has now succeeded on every
+                  node and whether it succeeded on any this time
+        """
+        successes = update.get('successes', [])
+        part, nodes = self.get_container_ring().get_nodes(
+            update['account'], update['container'])
+        obj = '/%s/%s/%s' % \
+              (update['account'], update['container'], update['obj'])
+        headers_out = self._update_headers(update, policy)
         events = [spawn(self.object_update,
                         node, part, update['op'], obj, headers_out)
                   for node in nodes if node['id'] not in successes]
@@ -233,22 +417,113 @@ class ObjectUpdater(Daemon):
                 new_successes = True
             else:
                 success = False
-        if success:
-            self.successes += 1
-            self.logger.increment('successes')
-            self.logger.debug('Update sent for %(obj)s %(path)s',
-                              {'obj': obj, 'path': update_path})
-            self.logger.increment("unlinks")
-            os.unlink(update_path)
+        if new_successes:
+            update['successes'] = successes
+        return success, new_successes
+
+    def make_batch_item(self, update, policy):
+        """
+        Make the object row that an UPDATE request to the container server
+        merges for an update.
+
+        :param update: the update
+        :param policy: storage policy of object update
+        :returns: a dict of the object row
+        """
+        headers = dict((key.lower(), value)
+                       for key, value in update['headers'].items())
+        item = {'name': update['obj'],
+                'created_at': headers['x-timestamp'],
+                'storage_policy_index': int(headers.get(
+                    'x-backend-storage-policy-index', int(policy)))}
+        if update['op'] == 'DELETE':
+            item.update(size=0, content_type='application/deleted',
+                        etag='noetag', deleted=1)
+        elif update['op'] == 'PUT':
+            item.update(size=int(headers['x-size']),
+                        content_type=headers['x-content-type'],
+                        etag=headers['x-etag'], deleted=0)
         else:
-            self.failures += 1
-            self.logger.increment('failures')
-            self.logger.debug('Update failed for %(obj)s %(path)s',
-                              {'obj': obj, 'path': update_path})
-            if new_successes:
-                update['successes'] = successes
-                write_pickle(update, update_path, os.path.join(
-                    device, get_tmp_dir(policy)))
+            raise ValueError('unexpected op %r' % update['op'])
+        return item
+
+    def send_batch(self, batch, policy):
+        """
+        Send a batch of updates of one container in one UPDATE request to
+        each of the container's nodes that any of them have not already been
+        sent to, then call each update's done callback.
+
+        :param batch: a list of (update, item, done) tuples, as made by
+                      :meth:`dispatch_update`
+        :param policy: storage policy of the updates
+        """
+        account = batch[0][0]['account']
+        container = batch[0][0]['container']
+        part, nodes = self.get_container_ring().get_nodes(account, container)
+        events = []
+        for node in nodes:
+            pending = [(update, item) for update, item, _junk in batch
+                       if node['id'] not in update.get('successes', [])]
+            if pending:
+                events.append((node, pending, spawn(
+                    self.container_batch_update, node, part, account,
+                    container, pending, policy)))
+        failed = set()
+        succeeded = set()
+        for node, pending, event in events:
+            if event.wait():
+                for update, _junk in pending:
+                    update.setdefault('successes', []).append(node['id'])
+                    succeeded.add(id(update))
+            else:
+                failed.update(id(update) for update, _junk in pending)
+        for update, _junk, done in batch:
+            try:
+                done(id(update) not in failed, id(update) in succeeded)
+            except (Exception, Timeout):
+                self.logger.exception(_('ERROR finishing update for %s'),
+                                      update.get('obj'))
+
+    def container_batch_update(self, node, part, account, container,
+                               pending, policy):
+        """
+        Perform a batch of object updates to a container. A container server
+        too old to know UPDATE requests is sent the updates one at a time.
+
+        :param node: node dictionary from the container ring
+        :param part: partition that holds the container
+        :param account: account name of the container
+        :param container: container name
+        :param pending: a list of (update, item) tuples to send
+        :param policy: storage policy of the updates
+        :returns: True if every update succeeded
+        """
+        body = json.dumps([item for _junk, item in pending])
+        headers_out = {'user-agent': 'object-updater %s' % os.getpid(),
+                       'Content-Type': 'application/json',
+                       'Content-Length': str(len(body))}
+        try:
+            with ConnectionTimeout(self.conn_timeout):
+                conn = http_connect(node['ip'], node['port'], node['device'],
+                                    part, 'UPDATE',
+                                    '/%s/%s' % (account, container),
+                                    headers_out)
+            with Timeout(self.node_timeout):
+                conn.send(body)
+                resp = conn.getresponse()
+                resp.read()
+        except (Exception, Timeout):
+            self.logger.exception(_('ERROR with remote server '
+                                    '%(ip)s:%(port)s/%(device)s'), node)
+            return False
+        if resp.status == HTTP_METHOD_NOT_ALLOWED:
+            results = [self.object_update(
+                node, part, update['op'],
+                '/%s/%s/%s' % (account, container, update['obj']),
+                self._update_headers(update, policy))[0]
+                for update, _junk in pending]
+            return all(result is True for result in results)
+        return is_success(resp.status) or resp.status == HTTP_NOT_FOUND
 
     def object_update(self, node, part, op, obj, headers_out):
         """
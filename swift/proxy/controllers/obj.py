@@ -33,6 +33,7 @@ import mimetypes
 import time
 import math
 import random
+import sys
 from hashlib import md5
 from swift import gettext_ as _
 
@@ -62,7 +63,8 @@ from swift.common.http import (
     HTTP_INTERNAL_SERVER_ERROR, HTTP_SERVICE_UNAVAILABLE,
     HTTP_INSUFFICIENT_STORAGE, HTTP_PRECONDITION_FAILED, HTTP_CONFLICT)
 from swift.common.storage_policy import (POLICIES, REPL_POLICY, EC_POLICY,
-                                         ECDriverError, PolicyError)
+                                         PACKED_POLICY, ECDriverError,
+                                         PolicyError)
 from swift.proxy.controllers.base import Controller, delay_denial, \
     cors_validation, ResumingGetter
 from swift.common.swob import HTTPAccepted, HTTPBadRequest, HTTPNotFound, \
@@ -1077,11 +1079,15 @@ class ECAppIter(object):
         headers in the GET response from the object server.
 
     :param logger: a logger
+
+    :param threadpool: a ThreadPool to run fragment decoding in, or None to
+        decode in the calling greenthread
     """
     def __init__(self, path, policy, internal_parts_iters, range_specs,
-                 fa_length, obj_length, logger):
+                 fa_length, obj_length, logger, threadpool=None):
         self.path = path
         self.policy = policy
+        self.threadpool = threadpool
         self.internal_parts_iters = internal_parts_iters
         self.range_specs = range_specs
         self.fa_length = fa_length
@@ -1444,7 +1450,9 @@ class ECAppIter(object):
                 if not all(fragments):
                     break
                 try:
-                    segment = self.policy.pyeclib_driver.decode(fragments)
+                    segment = ec_run(self.threadpool,
+                                     self.policy.pyeclib_driver.decode,
+                                     fragments)
                 except ECDriverError:
                     self.logger.exception("Error decoding fragments for %r" %
                                           self.path)
@@ -1818,63 +1826,89 @@ class ECPutter(object):
         return cls(conn, node, resp, path, connect_duration, mime_boundary)
 
 
-def chunk_transformer(policy, nstreams):
+def ec_run(threadpool, func, *args):
+    """
+    Runs an erasure code encode or decode function, in threadpool if one is
+    given so that the eventlet hub is not blocked by it.
+    """
+    if threadpool is None:
+        return func(*args)
+    return threadpool.run_in_thread(func, *args)
+
+
+if six.PY2:
+    def segment_view(data, offset, size):
+        """
+        Returns a read-only view of size bytes of data starting at offset,
+        without copying them.  PyECLib only accepts str or old-style buffer
+        objects on py2.
+        """
+        return buffer(data, offset, size)  # noqa
+else:
+    def segment_view(data, offset, size):
+        return memoryview(data)[offset:offset + size]
+
+
+def chunk_transformer(policy, nstreams, threadpool=None):
+    """
+    A generator that takes chunks of client data via send() and erasure codes
+    them a segment at a time.
+
+    Whole segments contained in a chunk are encoded straight from a view of
+    the chunk, without copying them.  Only a segment that straddles chunks is
+    assembled, with a single join of its pieces.
+
+    Sending a chunk yields None if there was not enough data to encode yet,
+    or else a list with one list of fragments (one fragment per stream) for
+    each segment that was encoded, in byte order.  Sending an empty chunk
+    signals end-of-input and yields the fragments for any leftover bytes.
+    """
     segment_size = policy.ec_segment_size
 
-    buf = collections.deque()
-    total_buf_len = 0
+    def encode(data):
+        return ec_run(threadpool, policy.pyeclib_driver.encode, data)
+
+    # pieces of the segment that is currently being assembled
+    buf = []
+    buf_len = 0
+    # segments that are complete and waiting to be encoded
+    ready = []
 
     chunk = yield
     while chunk:
-        buf.append(chunk)
-        total_buf_len += len(chunk)
-        if total_buf_len >= segment_size:
-            chunks_to_encode = []
-            # extract as many chunks as we can from the input buffer
-            while total_buf_len >= segment_size:
-                to_take = segment_size
-                pieces = []
-                while to_take > 0:
-                    piece = buf.popleft()
-                    if len(piece) > to_take:
-                        buf.appendleft(piece[to_take:])
-                        piece = piece[:to_take]
-                    pieces.append(piece)
-                    to_take -= len(piece)
-                    total_buf_len -= len(piece)
-                chunks_to_encode.append(''.join(pieces))
-
-            frags_by_byte_order = []
-            for chunk_to_encode in chunks_to_encode:
-                frags_by_byte_order.append(
-                    policy.pyeclib_driver.encode(chunk_to_encode))
-            # Sequential calls to encode() have given us a list that
-            # looks like this:
-            #
-            # [[frag_A1, frag_B1, frag_C1, ...],
-            #  [frag_A2, frag_B2, frag_C2, ...], ...]
-            #
-            # What we need is a list like this:
-            #
-            # [(frag_A1 + frag_A2 + ...),  # destined for node A
-            #  (frag_B1 + frag_B2 + ...),  # destined for node B
-            #  (frag_C1 + frag_C2 + ...),  # destined for node C
-            #  ...]
-            obj_data = [''.join(frags)
-                        for frags in zip(*frags_by_byte_order)]
-            chunk = yield obj_data
+        chunk_len = len(chunk)
+        offset = 0
+        if buf_len:
+            # top up the partial segment we already have
+            to_take = min(segment_size - buf_len, chunk_len)
+            buf.append(chunk if to_take == chunk_len else chunk[:to_take])
+            buf_len += to_take
+            offset = to_take
+            if buf_len == segment_size:
+                ready.append(''.join(buf))
+                buf = []
+                buf_len = 0
+        while chunk_len - offset >= segment_size:
+            ready.append(segment_view(chunk, offset, segment_size))
+            offset += segment_size
+        if offset < chunk_len:
+            # buf is necessarily empty here
+            buf.append(chunk[offset:] if offset else chunk)
+            buf_len = chunk_len - offset
+
+        if ready:
+            segments, ready = ready, []
+            chunk = yield [encode(segment) for segment in segments]
         else:
             # didn't have enough data to encode
             chunk = yield None
 
     # Now we've gotten an empty chunk, which indicates end-of-input.
     # Take any leftover bytes and encode them.
-    last_bytes = ''.join(buf)
-    if last_bytes:
-        last_frags = policy.pyeclib_driver.encode(last_bytes)
-        yield last_frags
+    if buf_len:
+        yield [encode(''.join(buf))]
     else:
-        yield [''] * nstreams
+        yield [[''] * nstreams]
 
 
 def trailing_metadata(policy, client_obj_hasher,
@@ -1901,6 +1935,15 @@ def trailing_metadata(policy, client_obj_hasher,
     }
 
 
+@ObjectControllerRouter.register(PACKED_POLICY)
+class PackedObjectController(ReplicatedObjectController):
+    """
+    Objects of packed policies are replicated; only the way the object
+    servers store them differs.
+    """
+    pass
+
+
 @ObjectControllerRouter.register(EC_POLICY)
 class ECObjectController(BaseObjectController):
     def _fragment_GET_request(self, req, node_iter, partition, policy):
@@ -1987,8 +2030,13 @@ class ECObjectController(BaseObjectController):
                 orig_range = req.range
                 range_specs = self._convert_range(req, policy)
 
+            if self.app.ec_prefer_data_fragments:
+                self._prefer_data_fragments(node_iter, policy)
+            stall_timeout = self.app.ec_fragment_stall_timeout
+            extra_requests = 0
+
             safe_iter = GreenthreadSafeIterator(node_iter)
-            with ContextPool(policy.ec_ndata) as pool:
+            with ContextPool(policy.ec_ndata + policy.ec_nparity) as pool:
                 pile = GreenAsyncPile(pool)
                 for _junk in range(policy.ec_ndata):
                     pile.spawn(self._fragment_GET_request,
@@ -1998,7 +2046,28 @@ class ECObjectController(BaseObjectController):
                 bad_gets = []
                 etag_buckets = collections.defaultdict(list)
                 best_etag = None
-                for get, parts_iter in pile:
+                while True:
+                    can_hedge = (stall_timeout > 0 and
+                                 extra_requests < policy.ec_nparity and
+                                 node_iter.nodes_left > 0)
+                    result = None
+                    try:
+                        with Timeout(stall_timeout if can_hedge else None,
+                                     exception=False):
+                            result = next(pile)
+                    except StopIteration:
+                        break
+                    if result is None:
+                        # No fragment response for stall_timeout; start
+                        # another fragment request rather than wait for the
+                        # slow node(s). Whichever ec_ndata matching
+                        # responses come in first get used.
+                        extra_requests += 1
+                        self.app.logger.increment('ec_fragment_stalls')
+                        pile.spawn(self._fragment_GET_request, req,
+                                   safe_iter, partition, policy)
+                        continue
+                    get, parts_iter = result
                     if is_success(get.last_status):
                         etag = HeaderKeyDict(
                             get.last_headers)['X-Object-Sysmeta-Ec-Etag']
@@ -2018,6 +2087,15 @@ class ECObjectController(BaseObjectController):
                         # nodes in node_iter we can spawn another
                         pile.spawn(self._fragment_GET_request, req,
                                    safe_iter, partition, policy)
+                    if extra_requests and \
+                            len(etag_buckets[best_etag]) >= policy.ec_ndata:
+                        # don't wait on the stragglers once we have enough
+                        break
+
+                # close any responses that came in but won't be used; the
+                # pool kills the requests still in flight
+                for get, parts_iter in pile.waitall(0):
+                    close_if_possible(parts_iter)
 
             req.range = orig_range
             if len(etag_buckets[best_etag]) >= policy.ec_ndata:
@@ -2036,7 +2114,7 @@ class ECObjectController(BaseObjectController):
                     policy,
                     [iterator for getter, iterator in etag_buckets[best_etag]],
                     range_specs, fa_length, obj_length,
-                    self.app.logger)
+                    self.app.logger, threadpool=self.app.ec_threadpool)
                 resp = Response(
                     request=req,
                     headers=resp_headers,
@@ -2059,6 +2137,16 @@ class ECObjectController(BaseObjectController):
         self._fix_response(resp)
         return resp
 
+    def _prefer_data_fragments(self, node_iter, policy):
+        """
+        Moves the primary nodes holding data fragments ahead of those holding
+        parity fragments, keeping the order the proxy's sorting_method gave
+        them otherwise.  For a systematic code, reading only data fragments
+        means they can be decoded without any parity calculation.
+        """
+        node_iter.primary_nodes.sort(
+            key=lambda node: node.get('index', 0) >= policy.ec_ndata)
+
     def _fix_response(self, resp):
         # EC fragment archives each have different bytes, hence different
         # etags. However, they all have the original object's etag stored in
@@ -2150,31 +2238,71 @@ class ECObjectController(BaseObjectController):
         This method was added in the PUT method extraction change
         """
         bytes_transferred = 0
-        chunk_transform = chunk_transformer(policy, len(nodes))
+        threadpool = self.app.ec_threadpool
+        chunk_transform = chunk_transformer(policy, len(nodes), threadpool)
         chunk_transform.send(None)
 
         def send_chunk(chunk):
             if etag_hasher:
                 etag_hasher.update(chunk)
-            backend_chunks = chunk_transform.send(chunk)
-            if backend_chunks is None:
+            frags_by_byte_order = chunk_transform.send(chunk)
+            if frags_by_byte_order is None:
                 # If there's not enough bytes buffered for erasure-encoding
                 # or whatever we're doing, the transform will give us None.
                 return
 
-            for putter in list(putters):
-                backend_chunk = backend_chunks[chunk_index[putter]]
-                if not putter.failed:
-                    putter.chunk_hasher.update(backend_chunk)
-                    putter.send_chunk(backend_chunk)
-                else:
-                    putters.remove(putter)
+            # Each segment's fragments are sent as they are rather than
+            # joined per node, which would copy them all again.
+            for backend_chunks in frags_by_byte_order:
+                for putter in list(putters):
+                    backend_chunk = backend_chunks[chunk_index[putter]]
+                    if not putter.failed:
+                        putter.chunk_hasher.update(backend_chunk)
+                        putter.send_chunk(backend_chunk)
+                    else:
+                        putters.remove(putter)
             self._check_min_conn(
                 req, putters, min_conns, msg='Object PUT exceptions during'
                 ' send, %(conns)s/%(nodes)s required connections')
 
+        # When encoding happens in a threadpool, chunks are handed off to an
+        # encoder greenthread so that the next segment is read from the
+        # client while the current one is being encoded.
+        encode_queue = Queue(1)
+        encoder_errors = []
+
+        def encoder():
+            while True:
+                chunk = encode_queue.get()
+                try:
+                    send_chunk(chunk)
+                except BaseException:
+                    encoder_errors.append(sys.exc_info())
+                    # keep the queue drained until the pool kills us
+                    while True:
+                        encode_queue.task_done()
+                        encode_queue.get()
+                encode_queue.task_done()
+                if not chunk:
+                    return
+
+        def check_encoder():
+            if encoder_errors:
+                six.reraise(*encoder_errors[0])
+
+        def feed_chunk(chunk):
+            if threadpool is None:
+                return send_chunk(chunk)
+            check_encoder()
+            encode_queue.put(chunk)
+
+        def wait_for_encoder():
+            if threadpool is not None:
+                encode_queue.join()
+                check_encoder()
+
         try:
-            with ContextPool(len(putters)) as pool:
+            with ContextPool(len(putters) + 1) as pool:
 
                 # build our chunk index dict to place handoffs in the
                 # same part nodes index as the primaries they are covering
@@ -2184,6 +2312,8 @@ class ECObjectController(BaseObjectController):
                     putter.spawn_sender_greenthread(
                         pool, self.app.put_queue_depth, self.app.node_timeout,
                         self.app.exception_occurred)
+                if threadpool is not None:
+                    pool.spawn(encoder)
                 while True:
                     with ChunkReadTimeout(self.app.client_timeout):
                         try:
@@ -2194,8 +2324,9 @@ class ECObjectController(BaseObjectController):
                     if bytes_transferred > constraints.MAX_FILE_SIZE:
                         raise HTTPRequestEntityTooLarge(request=req)
 
-                    send_chunk(chunk)
+                    feed_chunk(chunk)
 
+                wait_for_encoder()
                 if req.content_length and (
                         bytes_transferred < req.content_length):
                     req.client_disconnect = True
@@ -2212,7 +2343,8 @@ class ECObjectController(BaseObjectController):
                    computed_etag != received_etag):
                     raise HTTPUnprocessableEntity(request=req)
 
-                send_chunk('')  # flush out any buffered data
+                feed_chunk('')  # flush out any buffered data
+                wait_for_encoder()
 
                 for putter in putters:
                     trail_md = trailing_metadata(
@@ -32,7 +32,7 @@ from swift.common.ring import Ring
 from swift.common.utils import cache_from_env, get_logger, \
     get_remote_client, split_path, config_true_value, generate_trans_id, \
     affinity_key_function, affinity_locality_predicate, list_from_csv, \
-    register_swift_info
+    register_swift_info, ThreadPool
 from swift.common.constraints import check_utf8, valid_api_version
 from swift.proxy.controllers import AccountController, ContainerController, \
     ObjectControllerRouter, InfoController
@@ -149,6 +149,12 @@ class Application(object):
         self.sorting_method = conf.get('sorting_method', 'shuffle').lower()
         self.max_large_object_get_time = float(
             conf.get('max_large_object_get_time', '86400'))
+        self.ec_encode_threads = int(conf.get('ec_encode_threads', 0))
+        self.ec_fragment_stall_timeout = float(
+            conf.get('ec_fragment_stall_timeout', 0))
+        self.ec_prefer_data_fragments = config_true_value(
+            conf.get('ec_prefer_data_fragments', 'false'))
+        self._ec_threadpool = None
         value = conf.get('request_node_count', '2 * replicas').lower().split()
         if len(value) == 1:
             rnc_value = int(value[0])
@@ -224,6 +230,17 @@ class Application(object):
             account_autocreate=self.account_autocreate,
             **constraints.EFFECTIVE_CONSTRAINTS)
 
+    @property
+    def ec_threadpool(self):
+        """
+        The ThreadPool used to run erasure code encode and decode off the
+        eventlet hub, or None if ec_encode_threads is 0.  It is created on
+        first use so its threads are only started in the worker processes.
+        """
+        if self._ec_threadpool is None and self.ec_encode_threads > 0:
+            self._ec_threadpool = ThreadPool(nthreads=self.ec_encode_threads)
+        return self._ec_threadpool
+
     def check_config(self):
         """
         Check the configuration for possible errors
@@ -0,0 +1,60 @@
+# Copyright (c) 2015 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+import os
+import unittest
+from shutil import rmtree
+from StringIO import StringIO
+from tempfile import mkdtemp
+
+from swift.cli.diskfile_benchmark import main, run
+
+
+class TestDiskFileBenchmark(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_run(self):
+        replicated = run('replication', 20, 10, 2, devices=self.tmpdir)
+        packed = run('packed', 20, 10, 2, devices=self.tmpdir)
+        # a .data file per object plus each partition's hashes.pkl
+        self.assertTrue(replicated['files'] >= 20)
+        # a volume per partition, plus maybe locks and checkpoints
+        self.assertTrue(2 <= packed['files'] <= 6)
+        self.assertTrue(packed['dirs'] < replicated['dirs'])
+        # the scratch devices are cleaned up
+        self.assertEqual([], os.listdir(self.tmpdir))
+        self.assertRaises(ValueError, run, 'bogus', 1, 1, 1)
+
+    def test_main(self):
+        with mock.patch('sys.stdout', new=StringIO()) as stdout:
+            self.assertEqual(0, main(['--objects', '5', '--devices',
+                                      self.tmpdir, 'replication', 'packed',
+                                      'bogus']))
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(4, len(lines))
+        self.assertTrue(lines[1].startswith('replication: '))
+        self.assertTrue(lines[2].startswith('packed: '))
+        self.assertTrue(lines[2].endswith(' dirs'))
+        self.assertTrue(lines[3].startswith('Skipping bogus'))
+
+
+if __name__ == '__main__':
+    unittest.main()
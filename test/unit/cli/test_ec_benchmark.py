@@ -0,0 +1,60 @@
+# Copyright (c) 2015 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+import unittest
+from StringIO import StringIO
+
+from swift.cli.ec_benchmark import benchmark_encode, main, parse_scheme
+from swift.common.storage_policy import ECStoragePolicy
+
+
+class TestECBenchmark(unittest.TestCase):
+    def test_parse_scheme(self):
+        self.assertEqual((10, 4), parse_scheme('10+4'))
+        self.assertEqual((4, 2), parse_scheme('4+2'))
+        for bad in ('10', '10+', '+4', 'a+b', '1+2+3'):
+            self.assertRaises(ValueError, parse_scheme, bad)
+
+    def test_benchmark_encode(self):
+        policy = ECStoragePolicy(0, name='bench', ec_type='jerasure_rs_vand',
+                                 ec_ndata=4, ec_nparity=2,
+                                 ec_segment_size=4096)
+        encoded = []
+        orig_encode = policy.pyeclib_driver.encode
+
+        def fake_encode(data):
+            encoded.append(len(data))
+            return orig_encode(data)
+
+        with mock.patch.object(policy.pyeclib_driver, 'encode', fake_encode):
+            elapsed = benchmark_encode(policy, 10000, 1000)
+        self.assertTrue(elapsed >= 0)
+        self.assertEqual([4096, 4096, 1808], encoded)
+
+    def test_main(self):
+        with mock.patch('sys.stdout', new=StringIO()) as stdout:
+            self.assertEqual(0, main(['--size', '1', '--segment-size', '4096',
+                                      '4+2', 'bogus', '4+0']))
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(4, len(lines))
+        self.assertTrue(lines[1].startswith('4+2: '))
+        self.assertTrue(lines[1].endswith(' MB/s'))
+        self.assertTrue(lines[2].startswith('Skipping bogus: '))
+        self.assertTrue(lines[3].startswith('Skipping 4+0: '))
+
+
+if __name__ == '__main__':
+    unittest.main()
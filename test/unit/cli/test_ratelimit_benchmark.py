@@ -0,0 +1,65 @@
+# Copyright (c) 2015 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+import time
+import unittest
+from StringIO import StringIO
+
+from swift.cli.ratelimit_benchmark import main, peak_rate, simulate
+
+
+class TestRatelimitBenchmark(unittest.TestCase):
+    def test_peak_rate(self):
+        self.assertEqual(0, peak_rate([]))
+        self.assertEqual(1, peak_rate([0, 1, 2]))
+        self.assertEqual(3, peak_rate([0, 0.5, 0.9, 1.5, 3]))
+
+    def test_simulate(self):
+        orig_time = time.time
+        memcache = simulate('memcache', 4, 2, 10, 10)
+        self.assertTrue(time.time is orig_time)
+        self.assertTrue(100 <= memcache['allowed'] <= 101)
+        self.assertEqual(0, memcache['rejected'])
+        self.assertTrue(memcache['peak'] <= 11)
+        requests = memcache['allowed'] + memcache['rejected']
+        self.assertTrue(memcache['memcache_ops'] >= requests)
+
+        local = simulate('local', 4, 2, 10, 10, sync_interval=1)
+        # the workers can each get up to a sync interval's worth of requests
+        # through before seeing the others'
+        self.assertTrue(100 <= local['allowed'] <= 101 + 3 * 10)
+        self.assertTrue(local['peak'] <= 4 * 10)
+        self.assertTrue(local['memcache_ops'] <= 4 * 11)
+
+    def test_simulate_max_sleep(self):
+        result = simulate('memcache', 4, 2, 10, 10, max_sleep=0.2)
+        self.assertTrue(result['rejected'] > 0)
+        self.assertTrue(result['allowed'] <= 101)
+
+    def test_main(self):
+        with mock.patch('sys.stdout', new=StringIO()) as stdout:
+            self.assertEqual(0, main(['--duration', '5', '--workers', '2',
+                                      'memcache', 'local', 'bogus']))
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(4, len(lines))
+        self.assertTrue(lines[1].startswith('memcache: '))
+        self.assertTrue(lines[1].endswith(' us/req'))
+        self.assertTrue(lines[2].startswith('local: '))
+        self.assertTrue(lines[3].startswith('Skipping bogus: '))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -609,6 +609,101 @@ class TestUntar(unittest.TestCase):
         self.assertTrue('&gt' in xml_body)
 
 
+class SlowPutApp(object):
+    """
+    PUTs take a little while (longer for any paths in delays) and respond
+    with any status given in statuses; keeps track of how many are in flight
+    at once.
+    """
+
+    def __init__(self):
+        self.delays = {}
+        self.statuses = {}
+        self.heads = []
+        self.put_bodies = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def __call__(self, env, start_response):
+        path = env['PATH_INFO']
+        if env['REQUEST_METHOD'] == 'HEAD':
+            self.heads.append(path)
+            return Response(status='204 No Content')(env, start_response)
+        body = env['wsgi.input'].read()
+        self.in_flight += 1
+        self.max_in_flight = max(self.in_flight, self.max_in_flight)
+        try:
+            sleep(self.delays.get(path, 0.001))
+        finally:
+            self.in_flight -= 1
+        self.put_bodies[path] = body
+        return Response(status=self.statuses.get(path, '201 Created'))(
+            env, start_response)
+
+
+class TestConcurrentUntar(unittest.TestCase):
+
+    def setUp(self):
+        self.app = SlowPutApp()
+        self.bulk = bulk.filter_factory({'extract_concurrency': '3'})(
+            self.app)
+
+    def extract(self, files):
+        tar_data = BytesIO()
+        with tarfile.open(mode='w', fileobj=tar_data) as tar:
+            for name, data in files:
+                tar_info = tarfile.TarInfo(name)
+                tar_info.size = len(data)
+                tar.addfile(tar_info, BytesIO(data))
+        req = Request.blank('/v1/AUTH_acc/', body=tar_data.getvalue(),
+                            headers={'Accept': 'application/json'})
+        req.method = 'PUT'
+        return utils.json.loads(''.join(self.bulk.handle_extract_iter(
+            req, '', out_content_type='application/json')))
+
+    def test_conf(self):
+        self.assertEqual(3, self.bulk.extract_concurrency)
+        self.assertEqual(8388608, self.bulk.extract_buffer_size)
+        mware = bulk.filter_factory({
+            'extract_buffer_size': '1024'})(self.app)
+        self.assertEqual(2, mware.extract_concurrency)
+        self.assertEqual(1024, mware.extract_buffer_size)
+
+    def test_puts_concurrently(self):
+        files = [('c%d/o%d' % (i % 2, i), 'data%d' % i) for i in range(10)]
+        resp_data = self.extract(files)
+        self.assertEqual(resp_data['Response Status'], '201 Created')
+        self.assertEqual(resp_data['Number Files Created'], 10)
+        self.assertEqual(self.app.max_in_flight, 3)
+        self.assertEqual(self.app.put_bodies, dict(
+            ('/v1/AUTH_acc/' + name, data) for name, data in files))
+        # each container is only checked once
+        self.assertEqual(self.app.heads,
+                         ['/v1/AUTH_acc/c0', '/v1/AUTH_acc/c1'])
+
+    def test_errors_in_archive_order(self):
+        self.app.delays['/v1/AUTH_acc/c/o0'] = 0.05
+        for i in range(3):
+            self.app.statuses['/v1/AUTH_acc/c/o%d' % i] = '500 Internal Error'
+        resp_data = self.extract(
+            [('c/o%d' % i, 'data%d' % i) for i in range(4)])
+        self.assertEqual(resp_data['Response Status'], '502 Bad Gateway')
+        self.assertEqual(resp_data['Number Files Created'], 1)
+        self.assertEqual(resp_data['Errors'], [
+            ['c/o%d' % i, '500 Internal Error'] for i in range(3)])
+
+    def test_big_file_put_from_archive(self):
+        self.bulk.extract_buffer_size = 10
+        files = [('c/small1', 'x' * 5), ('c/small2', 'y' * 5),
+                 ('c/big', 'z' * 20), ('c/small3', 'w' * 5)]
+        resp_data = self.extract(files)
+        self.assertEqual(resp_data['Number Files Created'], 4)
+        self.assertEqual(self.app.put_bodies, dict(
+            ('/v1/AUTH_acc/' + name, data) for name, data in files))
+        # never more than two small files buffered at once
+        self.assertEqual(self.app.max_in_flight, 2)
+
+
 class TestDelete(unittest.TestCase):
 
     def setUp(self):
@@ -893,6 +988,114 @@ class TestDelete(unittest.TestCase):
                               ['/c/f2', '401 Unauthorized']])
 
 
+class SlowDeleteApp(object):
+    """
+    Deletes take a little while; keeps track of how many are in flight at
+    once and of container info lookups, caching the info in the environ the
+    way the proxy does.
+    """
+
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.delete_paths = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.container_lookups = []
+        # paths to fail with 401, after how long
+        self.failures = {}
+
+    def __call__(self, env, start_response):
+        _junk, acc, cont, obj = utils.split_path(
+            env['PATH_INFO'], 3, 4, True)
+        if obj:
+            env_key = 'swift.container/%s/%s' % (acc, cont)
+            if env_key not in env:
+                self.container_lookups.append(cont)
+                env[env_key] = {'status': 204}
+        self.in_flight += 1
+        self.max_in_flight = max(self.in_flight, self.max_in_flight)
+        try:
+            sleep(self.failures.get(env['PATH_INFO'], self.delay))
+        finally:
+            self.in_flight -= 1
+        self.delete_paths.append(env['PATH_INFO'])
+        if env['PATH_INFO'] in self.failures:
+            return Response(status='401 Unauthorized')(env, start_response)
+        return Response(status='204 No Content')(env, start_response)
+
+
+class TestConcurrentDelete(unittest.TestCase):
+
+    def setUp(self):
+        self.app = SlowDeleteApp()
+        self.bulk = bulk.filter_factory({'delete_concurrency': '3'})(self.app)
+
+    def handle_delete_and_iter(self, body, objs_to_delete=None):
+        req = Request.blank('/v1/AUTH_Acc', body=body,
+                            headers={'Accept': 'application/json'})
+        req.method = 'POST'
+        return ''.join(self.bulk.handle_delete_iter(
+            req, objs_to_delete=objs_to_delete,
+            out_content_type='application/json'))
+
+    def test_conf(self):
+        self.assertEqual(3, self.bulk.delete_concurrency)
+        self.assertEqual(
+            2, bulk.filter_factory({})(self.app).delete_concurrency)
+
+    def test_deletes_concurrently(self):
+        body = '\n'.join('/c/o%d' % i for i in range(10))
+        resp_data = utils.json.loads(self.handle_delete_and_iter(body))
+        self.assertEqual(resp_data['Number Deleted'], 10)
+        self.assertEqual(resp_data['Response Status'], '200 OK')
+        self.assertEqual(self.app.max_in_flight, 3)
+        self.assertEqual(sorted(self.app.delete_paths),
+                         sorted('/v1/AUTH_Acc/c/o%d' % i for i in range(10)))
+
+    def test_container_info_reused(self):
+        body = '\n'.join(['/c1/o%d' % i for i in range(5)] +
+                         ['/c2/o%d' % i for i in range(5)])
+        resp_data = utils.json.loads(self.handle_delete_and_iter(body))
+        self.assertEqual(resp_data['Number Deleted'], 10)
+        self.assertEqual(self.app.container_lookups, ['c1', 'c2'])
+
+    def test_container_delete_waits(self):
+        body = '/c/o1\n/c/o2\n/c/o3\n/c\n/d/o1'
+        resp_data = utils.json.loads(self.handle_delete_and_iter(body))
+        self.assertEqual(resp_data['Number Deleted'], 5)
+        self.assertEqual(self.app.delete_paths[3:],
+                         ['/v1/AUTH_Acc/c', '/v1/AUTH_Acc/d/o1'])
+
+    def test_errors_in_listed_order(self):
+        self.app.failures = {'/v1/AUTH_Acc/c/o1': 0.05,
+                             '/v1/AUTH_Acc/c/o2': 0.03,
+                             '/v1/AUTH_Acc/c/o4': 0.001}
+        listed = []
+
+        def objs_to_delete():
+            # like SLO's, can only be iterated over once
+            for i in range(6):
+                listed.append(i)
+                yield {'name': '/c/o%d' % i}
+
+        resp_data = utils.json.loads(self.handle_delete_and_iter(
+            '', objs_to_delete()))
+        self.assertEqual(listed, range(6))
+        self.assertEqual(resp_data['Number Deleted'], 3)
+        self.assertEqual(resp_data['Errors'],
+                         [['/c/o1', '401 Unauthorized'],
+                          ['/c/o2', '401 Unauthorized'],
+                          ['/c/o4', '401 Unauthorized']])
+
+    def test_keep_alive_while_deleting(self):
+        self.bulk.yield_frequency = 0.005
+        body = '\n'.join('/c/o%d' % i for i in range(6))
+        resp_body = self.handle_delete_and_iter(body)
+        self.assertTrue(resp_body.startswith(' '))
+        resp_data = utils.json.loads(resp_body)
+        self.assertEqual(resp_data['Number Deleted'], 6)
+
+
 class TestSwiftInfo(unittest.TestCase):
     def setUp(self):
         utils._swift_info = {}
@@ -15,6 +15,7 @@
 # limitations under the License.
 
 import contextlib
+import eventlet
 import hashlib
 import json
 import mock
@@ -24,7 +25,9 @@ from textwrap import dedent
 import time
 import unittest
 
-from swift.common import exceptions, swob
+from six.moves import cStringIO as StringIO
+
+from swift.common import exceptions, swob, utils
 from swift.common.middleware import dlo
 from swift.common.utils import closing_if_possible
 from test.unit.common.middleware.helpers import FakeSwift
@@ -456,6 +459,38 @@ class TestDloGetManifest(DloTestCase):
         self.assertEqual(headers.get("Content-Length"), None)
         self.assertEqual(body, "aaaaabbbbbcccccdddddeeeee")
 
+    def test_get_multi_range_complete_listing(self):
+        req = swob.Request.blank('/v1/AUTH_test/mancon/manifest',
+                                 environ={'REQUEST_METHOD': 'GET'},
+                                 headers={'Range': 'bytes=3-6,21-22,4-5'})
+        status, headers, body = self.call_dlo(req)
+        headers = swob.HeaderKeyDict(headers)
+        self.assertEqual(status, "206 Partial Content")
+        self.assertEqual(headers["Content-Length"], str(len(body)))
+        content_type, boundary = headers['Content-Type'].split(';boundary=')
+        self.assertEqual(content_type, 'multipart/byteranges')
+        parts = [(first_byte, last_byte, body_file.read())
+                 for first_byte, last_byte, _length, _headers, body_file in
+                 utils.multipart_byteranges_to_document_iters(
+                     StringIO(body), boundary)]
+        self.assertEqual(parts, [(3, 6, 'aabb'), (21, 22, 'ee'),
+                                 (4, 5, 'ab')])
+        # only the segments in the ranges are fetched
+        self.assertEqual(
+            [c[1] for c in self.app.calls if 'seg_' in c[1]],
+            ['/v1/AUTH_test/c/seg_01?multipart-manifest=get',
+             '/v1/AUTH_test/c/seg_02?multipart-manifest=get',
+             '/v1/AUTH_test/c/seg_05?multipart-manifest=get',
+             '/v1/AUTH_test/c/seg_01?multipart-manifest=get',
+             '/v1/AUTH_test/c/seg_02?multipart-manifest=get'])
+
+    def test_get_multi_range_unsatisfiable(self):
+        req = swob.Request.blank('/v1/AUTH_test/mancon/manifest',
+                                 environ={'REQUEST_METHOD': 'GET'},
+                                 headers={'Range': 'bytes=25-30,40-50'})
+        status, headers, body = self.call_dlo(req)
+        self.assertEqual(status, "416 Requested Range Not Satisfiable")
+
     def test_get_suffix_range(self):
         req = swob.Request.blank('/v1/AUTH_test/mancon/manifest',
                                  environ={'REQUEST_METHOD': 'GET'},
@@ -479,8 +514,9 @@ class TestDloGetManifest(DloTestCase):
         self.assertEqual(body, "aaaaabbbbbcccccdddddeeeee")
 
     def test_get_multi_range(self):
-        # DLO doesn't support multi-range GETs. The way that you express that
-        # in HTTP is to return a 200 response containing the whole entity.
+        # Without the whole listing, DLO can't tell whether the ranges are
+        # satisfiable. The way that you express that in HTTP is to return a
+        # 200 response containing the whole entity.
         req = swob.Request.blank('/v1/AUTH_test/mancon/manifest-many-segments',
                                  environ={'REQUEST_METHOD': 'GET'},
                                  headers={'Range': 'bytes=5-9,15-19'})
@@ -804,6 +840,85 @@ class TestDloGetManifest(DloTestCase):
         self.assertTrue(auth_got_called[0] > 1)
 
 
+class TestDloGetManifestPrefetch(TestDloGetManifest):
+    """
+    Runs all of the DLO GET tests with segments fetched ahead, and a read
+    ahead budget small enough that some segments are only partly buffered.
+    """
+
+    def setUp(self):
+        super(TestDloGetManifestPrefetch, self).setUp()
+        self.dlo.prefetch_segments = 2
+        self.dlo.prefetch_buffer_size = 7
+
+    def test_get_oversize_segment(self):
+        self.app.register(
+            'GET', '/v1/AUTH_test/c/seg_03',
+            swob.HTTPOk, {'Content-Length': '20', 'Etag': 'seg03-etag'},
+            'cccccccccccccccccccc')
+
+        req = swob.Request.blank(
+            '/v1/AUTH_test/mancon/manifest',
+            environ={'REQUEST_METHOD': 'GET'})
+        status, headers, body, exc = self.call_dlo(req, expect_exception=True)
+        self.assertEqual(body, 'aaaaabbbbbccccccccccccccc')
+        self.assertTrue(isinstance(exc, exceptions.SegmentError))
+        # segments after seg_03 may have been prefetched, but their
+        # responses were closed (see tearDown)
+        self.assertEqual(
+            self.app.calls[:5],
+            [('GET', '/v1/AUTH_test/mancon/manifest'),
+             ('GET', '/v1/AUTH_test/c?format=json&prefix=seg'),
+             ('GET', '/v1/AUTH_test/c/seg_01?multipart-manifest=get'),
+             ('GET', '/v1/AUTH_test/c/seg_02?multipart-manifest=get'),
+             ('GET', '/v1/AUTH_test/c/seg_03?multipart-manifest=get')])
+
+    def test_segments_fetched_ahead(self):
+        req = swob.Request.blank('/v1/AUTH_test/mancon/manifest',
+                                 environ={'REQUEST_METHOD': 'GET'})
+        app_iter = self.dlo(req.environ, fake_start_response)
+        # the first segment is validated before the response starts; by
+        # then the next two are in flight
+        eventlet.sleep(0)
+        self.assertEqual(
+            self.app.calls[2:],
+            [('GET', '/v1/AUTH_test/c/seg_01?multipart-manifest=get'),
+             ('GET', '/v1/AUTH_test/c/seg_02?multipart-manifest=get'),
+             ('GET', '/v1/AUTH_test/c/seg_03?multipart-manifest=get')])
+        self.assertEqual(''.join(app_iter), 'aaaaabbbbbcccccdddddeeeee')
+        self.assertEqual(0, app_iter.prefetched_bytes)
+
+    def test_prefetch_resumes_when_buffer_freed(self):
+        self.dlo.prefetch_buffer_size = 5
+        req = swob.Request.blank('/v1/AUTH_test/mancon/manifest',
+                                 environ={'REQUEST_METHOD': 'GET'})
+        app_iter = self.dlo(req.environ, fake_start_response)
+        eventlet.sleep(0)
+        seg_02, seg_03 = app_iter.prefetches
+        # seg_02 filled the buffer, so seg_03 is waiting for room in it
+        self.assertEqual(['bbbbb'], list(seg_02.chunks))
+        self.assertEqual([], list(seg_03.chunks))
+        self.assertFalse(seg_03.thread.dead)
+        chunks = iter(app_iter)
+        self.assertEqual('aaaaa', next(chunks))
+        self.assertEqual('bbbbb', next(chunks))
+        eventlet.sleep(0)
+        # sending seg_02 freed the buffer for seg_03 to read ahead
+        self.assertEqual(['ccccc'], list(seg_03.chunks))
+        self.assertEqual('cccccdddddeeeee', ''.join(chunks))
+        self.assertEqual(0, app_iter.prefetched_bytes)
+
+    def test_close_abandons_prefetches(self):
+        req = swob.Request.blank('/v1/AUTH_test/mancon/manifest',
+                                 environ={'REQUEST_METHOD': 'GET'})
+        app_iter = self.dlo(req.environ, fake_start_response)
+        eventlet.sleep(0)
+        self.assertEqual(2, len(app_iter.prefetches))
+        app_iter.close()
+        self.assertEqual(0, len(app_iter.prefetches))
+        self.assertEqual(0, app_iter.prefetched_bytes)
+
+
 def fake_start_response(*args, **kwargs):
     pass
 
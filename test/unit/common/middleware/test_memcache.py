@@ -179,6 +179,18 @@ class TestCacheMiddleware(unittest.TestCase):
         self.assertEqual(
             app.memcache._client_cache['6.7.8.9:10'].max_size, 5)
 
+    def test_conf_coalesce_gets(self):
+        orig_parser = memcache.ConfigParser
+        memcache.ConfigParser = EmptyConfigParser
+        try:
+            app = memcache.MemcacheMiddleware(FakeApp(), {})
+            self.assertFalse(app.memcache._coalesce_gets)
+            app = memcache.MemcacheMiddleware(
+                FakeApp(), {'coalesce_gets': 'yes'})
+            self.assertTrue(app.memcache._coalesce_gets)
+        finally:
+            memcache.ConfigParser = orig_parser
+
     def test_conf_extra_no_section(self):
         orig_parser = memcache.ConfigParser
         memcache.ConfigParser = get_config_parser(section='foobar')
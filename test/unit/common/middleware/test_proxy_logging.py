@@ -16,12 +16,13 @@
 import unittest
 from logging.handlers import SysLogHandler
 
+import eventlet
 import mock
 from six import BytesIO
 from six.moves.urllib.parse import unquote
 
 from test.unit import FakeLogger
-from swift.common.utils import get_logger, split_path
+from swift.common.utils import get_logger, split_path, BufferedStatsdClient
 from swift.common.middleware import proxy_logging
 from swift.common.swob import Request, Response
 from swift.common import constraints
@@ -1041,6 +1042,73 @@ class TestProxyLogging(unittest.TestCase):
         log_parts = self._log_parts(app)
         self.assertEqual(log_parts[20], '1')
 
+    def test_log_queue(self):
+        app = proxy_logging.ProxyLoggingMiddleware(
+            FakeApp(), {'access_log_queue_size': '2'})
+        app.access_logger = FakeLogger()
+        for _junk in range(3):
+            req = Request.blank('/v1/a/c/o', environ={'REQUEST_METHOD': 'GET'})
+            ''.join(app(req.environ, start_response))
+        # the first two lines are queued, the queue is full for the third
+        info_calls = app.access_logger.log_dict['info']
+        self.assertEqual(1, len(info_calls))
+        eventlet.sleep(0)
+        self.assertEqual(3, len(info_calls))
+        for info_call in info_calls:
+            log_parts = info_call[0][0].split(' ')
+            self.assertEqual(log_parts[3], 'GET')
+            self.assertEqual(log_parts[6], '200')
+        # metrics are not held up
+        self.assertTiming('object.GET.200.timing', app)
+
+    def test_log_queue_survives_errors(self):
+        app = proxy_logging.ProxyLoggingMiddleware(
+            FakeApp(), {'access_log_queue_size': '10'})
+        app.access_logger = FakeLogger()
+        logged = []
+
+        def fake_log_line(log_fields):
+            logged.append(log_fields)
+            if len(logged) == 1:
+                raise Exception('kaboom')
+
+        with mock.patch.object(app, '_log_line', fake_log_line):
+            for _junk in range(2):
+                req = Request.blank('/', environ={'REQUEST_METHOD': 'GET'})
+                ''.join(app(req.environ, start_response))
+            eventlet.sleep(0)
+        self.assertEqual(2, len(logged))
+        self.assertEqual(['Error writing access log'],
+                         app.access_logger.get_lines_for_level('error'))
+
+    def test_buffered_statsd_flushed(self):
+        app = proxy_logging.ProxyLoggingMiddleware(
+            FakeApp(), {'access_log_statsd_host': 'example.com',
+                        'access_log_statsd_flush_interval': '0.01'})
+        statsd_client = app.access_logger.logger.statsd_client
+        self.assertTrue(isinstance(statsd_client, BufferedStatsdClient))
+        sent = []
+        with mock.patch.object(statsd_client, '_open_socket') as mock_open:
+            mock_open.return_value.sendto.side_effect = \
+                lambda packet, target: sent.append(packet)
+            req = Request.blank('/v1/a/c/o',
+                                environ={'REQUEST_METHOD': 'PUT'})
+            ''.join(app(req.environ, start_response))
+            for _junk in range(100):
+                if sent:
+                    break
+                eventlet.sleep(0.01)
+        self.assertEqual(1, len(sent))
+        lines = sorted(sent[0].split('\n'))
+        self.assertEqual(
+            ['proxy-server.object.PUT.200.xfer:8|c',
+             'proxy-server.object.policy.0.PUT.200.xfer:8|c'],
+            [line for line in lines if line.endswith('|c')])
+        self.assertEqual(
+            ['proxy-server.object.PUT.200.timing',
+             'proxy-server.object.policy.0.PUT.200.timing'],
+            [line.split(':')[0] for line in lines if line.endswith('|ms')])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -584,6 +584,98 @@ class TestRateLimit(unittest.TestCase):
             time_took = time.time() - begin
             self.assertEqual(round(time_took, 1), 0)  # no memcache, no limit
 
+    def test_invalid_engine(self):
+        self.assertRaises(ValueError, ratelimit.RateLimitMiddleware,
+                          FakeApp(), {'engine': 'bogus'})
+        the_app = ratelimit.RateLimitMiddleware(FakeApp(), {})
+        self.assertEqual('memcache', the_app.engine)
+        self.assertEqual(1, the_app.sync_interval_seconds)
+
+    def test_local_engine_syncs_in_batches(self):
+        current_rate = 5
+        num_calls = 50
+        conf_dict = {'account_ratelimit': current_rate, 'engine': 'local',
+                     'sync_interval_seconds': 2}
+        self.test_ratelimit = ratelimit.filter_factory(conf_dict)(FakeApp())
+        req = Request.blank('/v/a/c')
+        req.method = 'PUT'
+        memcache = req.environ['swift.cache'] = FakeMemcache()
+        make_app_call = lambda: self.test_ratelimit(req.environ,
+                                                    start_response)
+        with mock.patch('swift.common.middleware.ratelimit.get_account_info',
+                        lambda *args, **kwargs: {}), \
+                mock.patch.object(memcache, 'incr',
+                                  side_effect=memcache.incr) as mock_incr:
+            self._run(make_app_call, num_calls, current_rate)
+        # one sync every two seconds instead of one incr per request
+        self.assertEqual(5, mock_incr.call_count)
+        # the requests since the last sync are only known to the worker
+        bucket = self.test_ratelimit.buckets['ratelimit/a']
+        self.assertTrue(0 < bucket.unsynced_m <= 10 * 200)
+        self.assertEqual(num_calls * 200,
+                         memcache.store['ratelimit/a'] + bucket.unsynced_m)
+
+    def test_local_engine_sees_other_workers(self):
+        conf_dict = {'engine': 'local', 'sync_interval_seconds': 1}
+        memcache = FakeMemcache()
+        workers = [ratelimit.RateLimitMiddleware(FakeApp(), conf_dict)
+                   for _junk in range(2)]
+        for worker in workers:
+            worker.memcache_client = memcache
+        # twenty requests through the first worker are paced locally...
+        sleeps = [workers[0]._get_sleep_time('key', 10) for _junk in range(20)]
+        self.assertEqual([round(0.1 * i, 1) for i in range(20)],
+                         [round(s, 1) for s in sleeps])
+        # ... and the second worker can't see them until the first one syncs
+        self.assertEqual(0, workers[1]._get_sleep_time('key', 10))
+        self.assertEqual(0, memcache.store['key'])
+        mock_sleep(1)
+        self.assertEqual(1, workers[0]._get_sleep_time('key', 10))
+        self.assertEqual(2000, memcache.store['key'])
+        # then the second worker's next sync picks them up
+        self.assertEqual(1.1, workers[1]._get_sleep_time('key', 10))
+        self.assertEqual(2100, memcache.store['key'])
+        self.assertEqual(2200, workers[1].buckets['key'].running_time_m)
+
+    def test_local_engine_max_sleep(self):
+        conf_dict = {'engine': 'local', 'max_sleep_time_seconds': 1}
+        the_app = ratelimit.RateLimitMiddleware(FakeApp(), conf_dict)
+        the_app.memcache_client = FakeMemcache()
+        sleeps = [the_app._get_sleep_time('key', 5) for _junk in range(5)]
+        self.assertEqual([0, 0.2, 0.4, 0.6, 0.8], sleeps)
+        self.assertRaises(ratelimit.MaxSleepTimeHitError,
+                          the_app._get_sleep_time, 'key', 5)
+        # the rejected request didn't use anything up
+        bucket = the_app.buckets['key']
+        self.assertEqual(1000, bucket.running_time_m)
+        self.assertEqual(1000, bucket.unsynced_m)
+        mock_sleep(0.2)
+        self.assertEqual(0.8, the_app._get_sleep_time('key', 5))
+
+    def test_local_engine_restarting_memcache(self):
+        conf_dict = {'engine': 'local', 'sync_interval_seconds': 0}
+        the_app = ratelimit.RateLimitMiddleware(FakeApp(), conf_dict)
+        the_app.memcache_client = FakeMemcache()
+        the_app.memcache_client.error_on_incr = True
+        # still paced by what the worker knows
+        sleeps = [the_app._get_sleep_time('key', 5) for _junk in range(3)]
+        self.assertEqual([0, 0.2, 0.4], sleeps)
+        the_app.memcache_client.error_on_incr = False
+        self.assertEqual(0.6, the_app._get_sleep_time('key', 5))
+        self.assertEqual(600, the_app.memcache_client.store['key'])
+
+    def test_local_engine_prunes_idle_buckets(self):
+        conf_dict = {'engine': 'local', 'rate_buffer_seconds': 5}
+        the_app = ratelimit.RateLimitMiddleware(FakeApp(), conf_dict)
+        the_app.memcache_client = FakeMemcache()
+        the_app._get_sleep_time('idle', 5)
+        mock_sleep(3)
+        the_app._get_sleep_time('busy', 5)
+        self.assertEqual(['busy', 'idle'], sorted(the_app.buckets))
+        mock_sleep(3)
+        the_app._get_sleep_time('busy', 5)
+        self.assertEqual(['busy'], sorted(the_app.buckets))
+
 
 class TestSwiftInfo(unittest.TestCase):
     def setUp(self):
@@ -14,8 +14,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from six.moves import range
+from six.moves import range, cStringIO as StringIO
 
+import eventlet
 import hashlib
 import time
 import unittest
@@ -30,6 +31,19 @@ from swift.common.utils import quote, json, closing_if_possible
 from test.unit.common.middleware.helpers import FakeSwift
 
 
+def parse_byteranges(headers, body):
+    """
+    Returns the (first byte, last byte, data) of each part of a
+    multipart/byteranges response body.
+    """
+    content_type, boundary = headers['Content-Type'].split(';boundary=')
+    assert content_type == 'multipart/byteranges'
+    return [(first_byte, last_byte, body_file.read())
+            for first_byte, last_byte, _length, _headers, body_file in
+            utils.multipart_byteranges_to_document_iters(
+                StringIO(body), boundary)]
+
+
 test_xml_data = '''<?xml version="1.0" encoding="UTF-8"?>
 <static_large_object>
 <object_segment>
@@ -695,6 +709,119 @@ class TestSloPutManifest(SloTestCase):
         self.assertEqual('etagoftheobjectsegment', manifest_data[3]['hash'])
         self.assertEqual('10-40', manifest_data[3]['range'])
 
+    def _slow_heads(self, delays):
+        # wraps the app so that HEADs take as long as delays says, and keeps
+        # track of how many are in flight at once
+        in_flight = [0, 0]
+
+        def slow_app(env, start_response):
+            if env['REQUEST_METHOD'] == 'HEAD':
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+                try:
+                    eventlet.sleep(delays.get(env['PATH_INFO'], 0.001))
+                finally:
+                    in_flight[0] -= 1
+            return self.app(env, start_response)
+
+        self.slo = slo.filter_factory({})(slow_app)
+        self.slo.min_segment_size = 1
+        self.slo.logger = self.app.logger
+        return in_flight
+
+    def test_handle_multipart_put_concurrent_heads(self):
+        in_flight = self._slow_heads({
+            # the first segment is the slowest; the rest still get HEADed
+            '/v1/AUTH_test/checktest/a_1': 0.01})
+        self.slo.concurrency = 3
+        data = json.dumps(
+            [{'path': '/checktest/a_1', 'etag': 'a', 'size_bytes': '2'},
+             {'path': '/checktest/badreq', 'etag': 'a', 'size_bytes': '1'},
+             {'path': '/checktest/b_2', 'etag': 'not-b', 'size_bytes': '2'},
+             {'path': '/checktest/b_2', 'etag': 'b', 'size_bytes': '2'},
+             {'path': '/checktest/slob', 'etag': 'not-slob',
+              'size_bytes': '2'}])
+        req = Request.blank(
+            '/v1/AUTH_test/checktest/man?multipart-manifest=put',
+            environ={'REQUEST_METHOD': 'PUT'},
+            headers={'Accept': 'application/json'},
+            body=data)
+        status, headers, body = self.call_slo(req)
+        self.assertEqual(status, '400 Bad Request')
+        self.assertEqual(3, in_flight[1])
+        # each distinct segment is HEADed just once
+        heads = [call for call in self.app.calls if call[0] == 'HEAD']
+        self.assertEqual(sorted(heads), [
+            ('HEAD', '/v1/AUTH_test/checktest/a_1'),
+            ('HEAD', '/v1/AUTH_test/checktest/b_2'),
+            ('HEAD', '/v1/AUTH_test/checktest/badreq'),
+            ('HEAD', '/v1/AUTH_test/checktest/slob')])
+        # errors are still reported in manifest order
+        self.assertEqual(json.loads(body)['Errors'], [
+            ['/checktest/a_1', 'Size Mismatch'],
+            ['/checktest/badreq', '400 Bad Request'],
+            ['/checktest/b_2', 'Etag Mismatch'],
+            ['/checktest/slob', 'Size Mismatch'],
+            ['/checktest/slob', 'Etag Mismatch']])
+
+    def test_handle_multipart_put_validation_timeout(self):
+        self._slow_heads({'/v1/AUTH_test/checktest/a_1': 1})
+        self.slo.max_manifest_validation_time = 0.05
+        data = json.dumps(
+            [{'path': '/checktest/a_1', 'etag': 'a', 'size_bytes': '1'},
+             {'path': '/checktest/b_2', 'etag': 'b', 'size_bytes': '2'}])
+        req = Request.blank(
+            '/v1/AUTH_test/checktest/man?multipart-manifest=put',
+            environ={'REQUEST_METHOD': 'PUT'},
+            headers={'Accept': 'application/json'},
+            body=data)
+        start = time.time()
+        status, headers, body = self.call_slo(req)
+        self.assertTrue(time.time() - start < 0.5)
+        self.assertEqual(status, '400 Bad Request')
+        # b_2 finished in time so it isn't a problem
+        self.assertEqual(json.loads(body)['Errors'],
+                         [['/checktest/a_1', 'Timed Out']])
+
+    def test_handle_multipart_put_validation_timeout_full_pool(self):
+        # with the pool full of slow HEADs, the segments still waiting for a
+        # free slot at the deadline are never HEADed
+        self._slow_heads({'/v1/AUTH_test/checktest/a_1': 1,
+                          '/v1/AUTH_test/checktest/badreq': 1})
+        self.slo.max_manifest_validation_time = 0.05
+        self.assertEqual(2, self.slo.concurrency)
+        data = json.dumps(
+            [{'path': '/checktest/a_1', 'etag': 'a', 'size_bytes': '1'},
+             {'path': '/checktest/badreq', 'etag': 'a', 'size_bytes': '1'},
+             {'path': '/checktest/b_2', 'etag': 'b', 'size_bytes': '2'},
+             {'path': '/checktest/slob', 'etag': 'slob',
+              'size_bytes': '2'}])
+        req = Request.blank(
+            '/v1/AUTH_test/checktest/man?multipart-manifest=put',
+            environ={'REQUEST_METHOD': 'PUT'},
+            headers={'Accept': 'application/json'},
+            body=data)
+        start = time.time()
+        status, headers, body = self.call_slo(req)
+        self.assertTrue(time.time() - start < 0.5)
+        self.assertEqual(status, '400 Bad Request')
+        self.assertEqual(json.loads(body)['Errors'], [
+            ['/checktest/a_1', 'Timed Out'],
+            ['/checktest/badreq', 'Timed Out'],
+            ['/checktest/b_2', 'Timed Out'],
+            ['/checktest/slob', 'Timed Out']])
+        self.assertEqual(self.app.calls_with_headers, [])
+
+    def test_conf_validation(self):
+        mware = slo.filter_factory({})('fake app')
+        self.assertEqual(2, mware.concurrency)
+        self.assertEqual(0, mware.max_manifest_validation_time)
+        mware = slo.filter_factory({
+            'concurrency': '10',
+            'max_manifest_validation_time': '30'})('fake app')
+        self.assertEqual(10, mware.concurrency)
+        self.assertEqual(30.0, mware.max_manifest_validation_time)
+
 
 class TestSloDeleteManifest(SloTestCase):
 
@@ -925,16 +1052,20 @@ class TestSloDeleteManifest(SloTestCase):
                      'HTTP_ACCEPT': 'application/json'})
         status, headers, body = self.call_slo(req)
         resp_data = json.loads(body)
+        # segment deletes run concurrently with reading the sub-manifest
         self.assertEqual(
-            self.app.calls,
-            [('GET', '/v1/AUTH_test/deltest/' +
-              'manifest-missing-submanifest?multipart-manifest=get'),
-             ('DELETE', '/v1/AUTH_test/deltest/a_1?multipart-manifest=delete'),
-             ('GET', '/v1/AUTH_test/deltest/' +
-              'missing-submanifest?multipart-manifest=get'),
-             ('DELETE', '/v1/AUTH_test/deltest/d_3?multipart-manifest=delete'),
-             ('DELETE', '/v1/AUTH_test/deltest/' +
-              'manifest-missing-submanifest?multipart-manifest=delete')])
+            sorted(self.app.calls),
+            sorted([('GET', '/v1/AUTH_test/deltest/' +
+                     'manifest-missing-submanifest?multipart-manifest=get'),
+                    ('DELETE',
+                     '/v1/AUTH_test/deltest/a_1?multipart-manifest=delete'),
+                    ('GET', '/v1/AUTH_test/deltest/' +
+                     'missing-submanifest?multipart-manifest=get'),
+                    ('DELETE',
+                     '/v1/AUTH_test/deltest/d_3?multipart-manifest=delete'),
+                    ('DELETE', '/v1/AUTH_test/deltest/' +
+                     'manifest-missing-submanifest?multipart-manifest=delete'
+                     )]))
         self.assertEqual(resp_data['Response Status'], '200 OK')
         self.assertEqual(resp_data['Response Body'], '')
         self.assertEqual(resp_data['Number Deleted'], 3)
@@ -1585,8 +1716,6 @@ class TestSloGetManifest(SloTestCase):
         self.assertEqual(status, '416 Requested Range Not Satisfiable')
 
     def test_multi_range_get_manifest(self):
-        # SLO doesn't support multi-range GETs. The way that you express
-        # "unsupported" in HTTP is to return a 200 and the whole entity.
         req = Request.blank(
             '/v1/AUTH_test/gettest/manifest-abcd',
             environ={'REQUEST_METHOD': 'GET'},
@@ -1594,10 +1723,71 @@ class TestSloGetManifest(SloTestCase):
         status, headers, body = self.call_slo(req)
         headers = swob.HeaderKeyDict(headers)
 
-        self.assertEqual(status, '200 OK')
-        self.assertEqual(headers['Content-Length'], '50')
+        self.assertEqual(status, '206 Partial Content')
+        self.assertEqual(headers['Content-Length'], str(len(body)))
+        self.assertEqual(parse_byteranges(headers, body),
+                         [(0, 0, 'a'), (2, 2, 'a')])
+        # both ranges come from one GET of the segment
         self.assertEqual(
-            body, 'aaaaabbbbbbbbbbcccccccccccccccdddddddddddddddddddd')
+            self.app.calls,
+            [('GET', '/v1/AUTH_test/gettest/manifest-abcd'),
+             ('GET', '/v1/AUTH_test/gettest/manifest-abcd'),
+             ('GET', '/v1/AUTH_test/gettest/a_5?multipart-manifest=get')])
+        self.assertEqual(self.app.calls_with_headers[2][2]['Range'],
+                         'bytes=0-0,2-2')
+
+    def test_multi_range_get_manifest_across_segments(self):
+        req = Request.blank(
+            '/v1/AUTH_test/gettest/manifest-abcd',
+            environ={'REQUEST_METHOD': 'GET'},
+            headers={'Range': 'bytes=3-6,30-31,4-5'})
+        status, headers, body = self.call_slo(req)
+        headers = swob.HeaderKeyDict(headers)
+
+        self.assertEqual(status, '206 Partial Content')
+        self.assertEqual(headers['Content-Length'], str(len(body)))
+        self.assertNotIn('Etag', headers)
+        self.assertEqual(parse_byteranges(headers, body),
+                         [(3, 6, 'aabb'), (30, 31, 'dd'), (4, 5, 'ab')])
+        # segments outside the ranges aren't fetched, and the submanifest
+        # is only fetched once
+        self.assertEqual(
+            self.app.calls,
+            [('GET', '/v1/AUTH_test/gettest/manifest-abcd'),
+             ('GET', '/v1/AUTH_test/gettest/manifest-abcd'),
+             ('GET', '/v1/AUTH_test/gettest/manifest-bc'),
+             ('GET', '/v1/AUTH_test/gettest/a_5?multipart-manifest=get'),
+             ('GET', '/v1/AUTH_test/gettest/b_10?multipart-manifest=get'),
+             ('GET', '/v1/AUTH_test/gettest/d_20?multipart-manifest=get'),
+             ('GET', '/v1/AUTH_test/gettest/a_5?multipart-manifest=get'),
+             ('GET', '/v1/AUTH_test/gettest/b_10?multipart-manifest=get')])
+
+    def test_multi_range_get_manifest_overlapping(self):
+        req = Request.blank(
+            '/v1/AUTH_test/gettest/manifest-abcd',
+            environ={'REQUEST_METHOD': 'GET'},
+            headers={'Range': 'bytes=30-39,35-44'})
+        status, headers, body = self.call_slo(req)
+        headers = swob.HeaderKeyDict(headers)
+
+        self.assertEqual(status, '206 Partial Content')
+        self.assertEqual(parse_byteranges(headers, body),
+                         [(30, 39, 'd' * 10), (35, 44, 'd' * 10)])
+        self.assertEqual(
+            self.app.calls,
+            [('GET', '/v1/AUTH_test/gettest/manifest-abcd'),
+             ('GET', '/v1/AUTH_test/gettest/manifest-abcd'),
+             ('GET', '/v1/AUTH_test/gettest/d_20?multipart-manifest=get')])
+        self.assertEqual(self.app.calls_with_headers[2][2]['Range'],
+                         'bytes=0-9,5-14')
+
+    def test_multi_range_get_manifest_unsatisfiable(self):
+        req = Request.blank(
+            '/v1/AUTH_test/gettest/manifest-abcd',
+            environ={'REQUEST_METHOD': 'GET'},
+            headers={'Range': 'bytes=100-200,300-400'})
+        status, headers, body = self.call_slo(req)
+        self.assertEqual(status, '416 Requested Range Not Satisfiable')
 
     def test_get_segment_with_non_ascii_name(self):
         segment_body = u"a møøse once bit my sister".encode("utf-8")
@@ -1841,21 +2031,19 @@ class TestSloGetManifest(SloTestCase):
                          ['SLO'] * (len(self.app.swift_sources) - 1))
 
     def test_multi_range_get_range_manifest(self):
-        # SLO doesn't support multi-range GETs. The way that you express
-        # "unsupported" in HTTP is to return a 200 and the whole entity.
         req = Request.blank(
             '/v1/AUTH_test/gettest/manifest-abcd-ranges',
             environ={'REQUEST_METHOD': 'GET'},
-            headers={'Range': 'bytes=0-0,2-2'})
+            headers={'Range': 'bytes=0-0,2-2,10-17'})
         status, headers, body = self.call_slo(req)
         headers = swob.HeaderKeyDict(headers)
 
-        self.assertEqual(status, '200 OK')
-        self.assertEqual(headers['Content-Type'], 'application/json')
-        self.assertEqual(body, 'aaaaaaaaccccccccbbbbbbbbdddddddd')
+        self.assertEqual(status, '206 Partial Content')
         self.assertNotIn('Transfer-Encoding', headers)
         self.assertNotIn('Content-Range', headers)
-        self.assertEqual(headers['Content-Length'], '32')
+        self.assertEqual(headers['Content-Length'], str(len(body)))
+        self.assertEqual(parse_byteranges(headers, body),
+                         [(0, 0, 'a'), (2, 2, 'a'), (10, 17, 'ccccccbb')])
 
     def test_get_bogus_manifest(self):
         req = Request.blank(
@@ -2290,6 +2478,54 @@ class TestSloGetManifest(SloTestCase):
             'ERROR: An error occurred while retrieving segments'))
 
 
+class TestSloGetManifestPrefetch(TestSloGetManifest):
+    """
+    Runs all of the SLO GET tests with segments fetched ahead, and a read
+    ahead budget small enough that some segments are only partly buffered.
+    """
+
+    def setUp(self):
+        super(TestSloGetManifestPrefetch, self).setUp()
+        self.slo.prefetch_segments = 2
+        self.slo.prefetch_buffer_size = 12
+
+    def _assert_calls_in_any_order(self, req):
+        # with prefetching, sub-manifests are fetched as the listing is
+        # read ahead, so the order of calls differs; what's fetched doesn't
+        unprefetched = slo.filter_factory({})(self.app)
+        unprefetched.logger = self.app.logger
+        expected = self.call_app(req.copy_get(), app=unprefetched)
+        expected_calls = self.app.calls_with_headers
+        self.app._calls = []
+        self.assertEqual(expected, self.call_slo(req))
+
+        def key(call):
+            return call[0], call[1], call[2].get('Range')
+        self.assertEqual(sorted(map(key, expected_calls)),
+                         sorted(map(key, self.app.calls_with_headers)))
+
+    def test_get_subrange_manifest(self):
+        self._assert_calls_in_any_order(Request.blank(
+            '/v1/AUTH_test/gettest/manifest-abcd-subranges',
+            environ={'REQUEST_METHOD': 'GET'}))
+
+    def test_range_get_subrange_manifest(self):
+        self._assert_calls_in_any_order(Request.blank(
+            '/v1/AUTH_test/gettest/manifest-abcd-subranges',
+            environ={'REQUEST_METHOD': 'GET'},
+            headers={'Range': 'bytes=7-26'}))
+
+    def test_conf(self):
+        mware = slo.filter_factory({})('fake app')
+        self.assertEqual(0, mware.prefetch_segments)
+        self.assertEqual(8388608, mware.prefetch_buffer_size)
+        mware = slo.filter_factory({
+            'prefetch_segments': '4',
+            'prefetch_buffer_size': '1048576'})('fake app')
+        self.assertEqual(4, mware.prefetch_segments)
+        self.assertEqual(1048576, mware.prefetch_buffer_size)
+
+
 class TestSloBulkLogger(unittest.TestCase):
     def test_reused_logger(self):
         slo_mware = slo.filter_factory({})('fake app')
@@ -16,7 +16,7 @@
 import json
 import unittest
 
-from swift.common.swob import Request, Response
+from swift.common.swob import Request, Response, HTTPUnauthorized
 from swift.common.middleware import staticweb
 
 
@@ -702,5 +702,212 @@ class TestStaticWeb(unittest.TestCase):
         self.assertEqual(self.app.calls, 1)
 
 
+class FakeMemcache(object):
+
+    def __init__(self):
+        self.store = {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value, serialize=True, time=0):
+        self.store[key] = value
+
+
+class TestStaticWebCache(unittest.TestCase):
+
+    def setUp(self):
+        self.app = FakeApp()
+        self.test_staticweb = staticweb.filter_factory(
+            {'cache_ttl': '60'})(self.app)
+        self.memcache = FakeMemcache()
+        self._orig_get_container_info = staticweb.get_container_info
+        staticweb.get_container_info = mock_get_container_info
+
+    def tearDown(self):
+        staticweb.get_container_info = self._orig_get_container_info
+
+    def _request(self, path, method='GET', headers=None, memcache=True):
+        environ = {'REQUEST_METHOD': method}
+        if memcache:
+            environ['swift.cache'] = self.memcache
+        self.app.calls = 0
+        return Request.blank(path, environ=environ,
+                             headers=headers).get_response(self.test_staticweb)
+
+    def test_cache_off_by_default(self):
+        sw = staticweb.filter_factory({})(self.app)
+        self.assertEqual(0, sw.cache_ttl)
+        for _junk in range(2):
+            self.app.calls = 0
+            resp = Request.blank(
+                '/v1/a/c3/subdir/', environ={'swift.cache': self.memcache}
+            ).get_response(sw)
+            self.assertEqual(resp.status_int, 200)
+            self.assertEqual(self.app.calls, 3)
+        self.assertEqual({}, self.memcache.store)
+
+    def test_listing_cached(self):
+        resp = self._request('/v1/a/c3/subdir/')
+        self.assertEqual(resp.status_int, 200)
+        # the object, its index file and the container listing
+        self.assertEqual(self.app.calls, 3)
+        body = resp.body
+        resp = self._request('/v1/a/c3/subdir/')
+        self.assertEqual(resp.status_int, 200)
+        self.assertEqual(resp.body, body)
+        self.assertEqual(resp.content_type, 'text/html')
+        self.assertEqual(self.app.calls, 0)
+        # another worker finds the results in memcache
+        self.test_staticweb = staticweb.filter_factory(
+            {'cache_ttl': '60'})(self.app)
+        resp = self._request('/v1/a/c3/subdir/')
+        self.assertEqual(resp.body, body)
+        self.assertEqual(self.app.calls, 0)
+
+    def test_container_listing_cached(self):
+        resp = self._request('/v1/a/c4/')
+        self.assertEqual(resp.status_int, 200)
+        self.assertEqual(self.app.calls, 2)
+        resp = self._request('/v1/a/c4/')
+        self.assertEqual(resp.status_int, 200)
+        self.assertTrue('Listing of /v1/a/c4/' in resp.body)
+        self.assertEqual(self.app.calls, 0)
+
+    def test_index_resolution_cached(self):
+        resp = self._request('/v1/a/c3/subdir3/subsubdir/')
+        self.assertEqual(resp.body, 'index file')
+        self.assertEqual(self.app.calls, 2)
+        resp = self._request('/v1/a/c3/subdir3/subsubdir/')
+        self.assertEqual(resp.body, 'index file')
+        # just the index file
+        self.assertEqual(self.app.calls, 1)
+
+    def test_redirect_and_not_found_cached(self):
+        for path, status in (('/v1/a/c3/subdirz', 301),
+                             ('/v1/a/c3/subdir3/subsubdir', 301),
+                             ('/v1/a/c4/unknown', 404)):
+            resp = self._request(path)
+            self.assertEqual(resp.status_int, status)
+            self.assertTrue(self.app.calls > 1)
+            resp = self._request(path)
+            self.assertEqual(resp.status_int, status)
+            if status == 404:
+                # just the custom error page
+                self.assertEqual(self.app.calls, 1)
+                self.assertTrue("Chrome's 404 fancy-page sucks." in resp.body)
+            else:
+                self.assertEqual(self.app.calls, 0)
+                self.assertEqual(resp.headers['location'],
+                                 'http://localhost%s/' % path)
+
+    def test_objects_not_cached(self):
+        for _junk in range(2):
+            resp = self._request('/v1/a/c4/one.txt')
+            self.assertEqual(resp.body, '1')
+            self.assertEqual(self.app.calls, 1)
+
+    def test_write_changes_generation(self):
+        self._request('/v1/a/c4/subdir/')
+        self.assertEqual(self.app.calls, 3)
+        key = 'staticweb/generation/a/c4'
+        generation = self.memcache.store[key]
+        # failed writes don't
+        resp = self._request('/v1/a/c4/two.txt', method='PUT')
+        self.assertEqual(resp.status_int, 503)
+        self.assertEqual(generation, self.memcache.store[key])
+        self._request('/v1/a/c4/subdir/')
+        self.assertEqual(self.app.calls, 0)
+        resp = self._request('/v1/a/c4/one.txt', method='PUT')
+        self.assertEqual(resp.status_int, 200)
+        self.assertNotEqual(generation, self.memcache.store[key])
+        self._request('/v1/a/c4/subdir/')
+        self.assertEqual(self.app.calls, 3)
+
+    def test_copy_changes_destination_generation(self):
+        self._request('/v1/a/c3/subdir/')
+        self._request('/v1/a/c4/subdir/')
+        c3_generation = self.memcache.store['staticweb/generation/a/c3']
+        c4_generation = self.memcache.store['staticweb/generation/a/c4']
+        resp = self._request('/v1/a/c4/one.txt', method='COPY',
+                             headers={'Destination': 'c3/one.txt'})
+        self.assertEqual(resp.status_int, 200)
+        self.assertNotEqual(c3_generation,
+                            self.memcache.store['staticweb/generation/a/c3'])
+        self.assertEqual(c4_generation,
+                         self.memcache.store['staticweb/generation/a/c4'])
+
+    def test_metadata_in_key(self):
+        self._request('/v1/a/c3/subdir/')
+        self.assertEqual(self.app.calls, 3)
+        meta = meta_map['c3']['meta']
+        meta_map['c3']['meta'] = dict(meta, **{'web-listings-css': 'a.css'})
+        try:
+            resp = self._request('/v1/a/c3/subdir/')
+        finally:
+            meta_map['c3']['meta'] = meta
+        self.assertEqual(self.app.calls, 3)
+        self.assertTrue('a.css' in resp.body)
+
+    def test_local_cache_without_memcache(self):
+        self._request('/v1/a/c3/subdir/', memcache=False)
+        self.assertEqual(self.app.calls, 3)
+        self._request('/v1/a/c3/subdir/', memcache=False)
+        self.assertEqual(self.app.calls, 0)
+        self._request('/v1/a/c3/index.html', method='DELETE',
+                      memcache=False)
+        self._request('/v1/a/c3/subdir/', memcache=False)
+        self.assertEqual(self.app.calls, 3)
+        self.assertEqual({}, self.memcache.store)
+
+    def test_cached_results_need_authorization(self):
+        def authorize(req):
+            if req.remote_user or '.r:*' in (req.acl or ''):
+                return None
+            return HTTPUnauthorized(request=req)
+
+        def authorizing_app(env, start_response):
+            # Checks the client's own GETs the way the proxy would.
+            denied = env['swift.authorize'](Request(env))
+            if denied:
+                return denied(env, start_response)
+            return self.app(env, start_response)
+
+        self.test_staticweb = staticweb.filter_factory(
+            {'cache_ttl': '60'})(authorizing_app)
+
+        def request(user=None):
+            environ = {'swift.cache': self.memcache,
+                       'swift.authorize': authorize}
+            headers = {}
+            if user:
+                environ['REMOTE_USER'] = user
+                headers['X-Web-Mode'] = 'true'
+            self.app.calls = 0
+            return Request.blank(
+                '/v1/a/c3/subdir/', environ=environ,
+                headers=headers).get_response(self.test_staticweb)
+
+        meta_map['c3']['read_acl'] = ''
+        try:
+            self.assertEqual(request().status_int, 401)
+            resp = request('a')
+            self.assertEqual(resp.status_int, 200)
+            self.assertEqual(self.app.calls, 3)
+            resp = request('a')
+            self.assertEqual(resp.status_int, 200)
+            self.assertEqual(self.app.calls, 0)
+            resp = request()
+            self.assertEqual(resp.status_int, 401)
+            self.assertFalse('Listing of' in resp.body)
+        finally:
+            meta_map['c3']['read_acl'] = '.r:*'
+        # anyone may be served what is cached for a public container
+        resp = request()
+        self.assertEqual(resp.status_int, 200)
+        self.assertTrue('Listing of /v1/a/c3/subdir/' in resp.body)
+        self.assertEqual(self.app.calls, 0)
+
+
 if __name__ == '__main__':
     unittest.main()
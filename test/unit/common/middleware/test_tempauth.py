@@ -1613,6 +1613,102 @@ class TestTokenHandling(unittest.TestCase):
         self.assertEqual(resp.status_int, 401)
 
 
+class TestTokenCache(unittest.TestCase):
+
+    def setUp(self):
+        self.memcache = FakeMemcache()
+        self.env = {'swift.cache': self.memcache}
+        self.now = time()
+        self.memcache.set('AUTH_/token/AUTH_t',
+                          (self.now + 3600, 'acct,acct:joe,AUTH_acct'))
+
+    def _get_groups(self, test_auth, token, now=None):
+        with mock.patch('swift.common.middleware.tempauth.time',
+                        lambda: self.now if now is None else now), \
+                mock.patch.object(self.memcache, 'get',
+                                  side_effect=self.memcache.get) as mock_get:
+            groups = test_auth.get_groups(self.env, token)
+        return groups, mock_get.call_count
+
+    def test_disabled_by_default(self):
+        test_auth = auth.filter_factory({})(FakeApp())
+        for _junk in range(2):
+            self.assertEqual(('acct,acct:joe,AUTH_acct', 1),
+                             self._get_groups(test_auth, 'AUTH_t'))
+            self.assertEqual((None, 1),
+                             self._get_groups(test_auth, 'AUTH_bad'))
+
+    def test_valid_token_cached(self):
+        test_auth = auth.filter_factory({'token_cache_ttl': '60'})(FakeApp())
+        self.assertEqual(('acct,acct:joe,AUTH_acct', 1),
+                         self._get_groups(test_auth, 'AUTH_t'))
+        self.memcache.delete('AUTH_/token/AUTH_t')
+        self.assertEqual(('acct,acct:joe,AUTH_acct', 0),
+                         self._get_groups(test_auth, 'AUTH_t',
+                                          now=self.now + 59))
+        # after the ttl memcache has the final say again
+        self.assertEqual((None, 1),
+                         self._get_groups(test_auth, 'AUTH_t',
+                                          now=self.now + 61))
+        # invalid tokens are not cached unless asked for
+        self.assertEqual((None, 1),
+                         self._get_groups(test_auth, 'AUTH_t',
+                                          now=self.now + 61))
+
+    def test_ttl_capped_at_token_expiry(self):
+        test_auth = auth.filter_factory({'token_cache_ttl': '60'})(FakeApp())
+        self.memcache.set('AUTH_/token/AUTH_t',
+                          (self.now + 10, 'acct,acct:joe,AUTH_acct'))
+        self.assertEqual(('acct,acct:joe,AUTH_acct', 1),
+                         self._get_groups(test_auth, 'AUTH_t'))
+        self.assertEqual(('acct,acct:joe,AUTH_acct', 0),
+                         self._get_groups(test_auth, 'AUTH_t',
+                                          now=self.now + 9))
+        self.assertEqual((None, 1),
+                         self._get_groups(test_auth, 'AUTH_t',
+                                          now=self.now + 11))
+
+    def test_invalid_token_cached(self):
+        test_auth = auth.filter_factory(
+            {'invalid_token_cache_ttl': '5'})(FakeApp())
+        self.assertEqual((None, 1), self._get_groups(test_auth, 'AUTH_bad'))
+        self.assertEqual((None, 0), self._get_groups(test_auth, 'AUTH_bad'))
+        self.memcache.set('AUTH_/token/AUTH_bad',
+                          (self.now + 3600, 'acct,acct:joe,AUTH_acct'))
+        self.assertEqual((None, 0),
+                         self._get_groups(test_auth, 'AUTH_bad',
+                                          now=self.now + 4))
+        self.assertEqual(('acct,acct:joe,AUTH_acct', 1),
+                         self._get_groups(test_auth, 'AUTH_bad',
+                                          now=self.now + 6))
+        # valid tokens are not cached unless asked for
+        self.assertEqual(('acct,acct:joe,AUTH_acct', 1),
+                         self._get_groups(test_auth, 'AUTH_bad',
+                                          now=self.now + 6))
+
+    def test_cache_size(self):
+        test_auth = auth.filter_factory(
+            {'token_cache_ttl': '60', 'invalid_token_cache_ttl': '60',
+             'token_cache_size': '2'})(FakeApp())
+        for token in ('AUTH_t', 'AUTH_bad1', 'AUTH_bad2'):
+            self._get_groups(test_auth, token)
+        self.assertEqual(2, len(test_auth.token_cache.mapping))
+        self.assertEqual(('acct,acct:joe,AUTH_acct', 1),
+                         self._get_groups(test_auth, 'AUTH_t'))
+        self.assertEqual((None, 0), self._get_groups(test_auth, 'AUTH_bad2'))
+
+    def test_s3_not_cached(self):
+        test_auth = auth.filter_factory(
+            {'token_cache_ttl': '60', 'invalid_token_cache_ttl': '60',
+             'user_test_tester': 'testing'})(FakeApp())
+        self.env['HTTP_AUTHORIZATION'] = 'AWS test:tester:bogus-signature'
+        self.env['PATH_INFO'] = '/v1/test:tester/c'
+        for _junk in range(2):
+            self.assertEqual((None, 1),
+                             self._get_groups(test_auth, 'dG9rZW4='))
+        self.assertEqual(0, len(test_auth.token_cache.mapping))
+
+
 class TestUtilityMethods(unittest.TestCase):
     def test_account_acls_bad_path_raises_exception(self):
         auth_inst = auth.filter_factory({})(FakeApp())
@@ -30,6 +30,7 @@
 
 import hmac
 import itertools
+import mock
 import unittest
 from hashlib import sha1
 from time import time
@@ -1005,6 +1006,109 @@ class TestTempURL(unittest.TestCase):
                 1, [('abc', 'account')], request_method='GET'),
             [('026d7f7cc25256450423c7ad03fc9f5ffc1dab6d', 'account')])
 
+    def test_get_hmacs_reuses_keyed_hmac(self):
+        env = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/v1/a/c/o'}
+        expected = [
+            ('026d7f7cc25256450423c7ad03fc9f5ffc1dab6d', 'account'),
+            (hmac.new('def', 'GET\n1\n/v1/a/c/o', sha1).hexdigest(),
+             'container')]
+        with mock.patch('swift.common.middleware.tempurl.hmac.new',
+                        side_effect=hmac.new) as mock_new:
+            for _junk in range(3):
+                self.assertEqual(
+                    self.tempurl._get_hmacs(
+                        env, 1, [('abc', 'account'), ('def', 'container')]),
+                    expected)
+        self.assertEqual(2, mock_new.call_count)
+
+    def _signed_request(self, method, sig_method, keys, sig=None):
+        expires = int(time() + 86400)
+        path = '/v1/a/c/o'
+        if sig is None:
+            sig = hmac.new(keys[0], '%s\n%s\n%s' % (sig_method, expires, path),
+                           sha1).hexdigest()
+        return self._make_request(
+            path, keys=keys,
+            environ={'REQUEST_METHOD': method,
+                     'QUERY_STRING': 'temp_url_sig=%s&temp_url_expires=%s' % (
+                         sig, expires)})
+
+    def test_request_method_checked_first(self):
+        with mock.patch.object(self.tempurl, '_get_hmacs',
+                               side_effect=self.tempurl._get_hmacs) as mocked:
+            req = self._signed_request('HEAD', 'HEAD', ['abc'])
+            resp = req.get_response(self.tempurl)
+            self.assertEqual(resp.status_int, 404)
+            self.assertEqual(['HEAD'], [call[1]['request_method']
+                                        for call in mocked.call_args_list])
+            mocked.reset_mock()
+            req = self._signed_request('HEAD', 'POST', ['abc'])
+            resp = req.get_response(self.tempurl)
+            self.assertEqual(resp.status_int, 404)
+            self.assertEqual(['HEAD', 'GET', 'POST'],
+                             [call[1]['request_method']
+                              for call in mocked.call_args_list])
+
+    def test_key_cache(self):
+        self.tempurl = tempurl.filter_factory(
+            {'key_cache_ttl': '30'})(self.auth)
+        with mock.patch.object(self.tempurl, '_get_keys',
+                               side_effect=self.tempurl._get_keys) as mocked:
+            for _junk in range(2):
+                req = self._signed_request('GET', 'GET', ['abc'])
+                resp = req.get_response(self.tempurl)
+                self.assertEqual(resp.status_int, 404)
+            self.assertEqual(1, mocked.call_count)
+            # the cache still answers with the old key
+            req = self._signed_request('GET', 'GET', ['new'])
+            resp = req.get_response(self.tempurl)
+            self.assertEqual(resp.status_int, 401)
+            self.assertEqual(1, mocked.call_count)
+            # until it times out
+            the_future = time() + 31
+            with mock.patch('time.time', lambda: the_future):
+                req = self._signed_request('GET', 'GET', ['new'])
+                resp = req.get_response(self.tempurl)
+            self.assertEqual(resp.status_int, 404)
+            self.assertEqual(2, mocked.call_count)
+
+    def test_key_cache_disabled_by_default(self):
+        with mock.patch.object(self.tempurl, '_get_keys',
+                               side_effect=self.tempurl._get_keys) as mocked:
+            for _junk in range(2):
+                req = self._signed_request('GET', 'GET', ['abc'])
+                resp = req.get_response(self.tempurl)
+                self.assertEqual(resp.status_int, 404)
+            self.assertEqual(2, mocked.call_count)
+        self.assertEqual(0, len(self.tempurl.key_cache.mapping))
+        self.assertEqual(0, len(self.tempurl.invalid_signature_cache.mapping))
+
+    def test_invalid_signature_cache(self):
+        self.tempurl = tempurl.filter_factory(
+            {'invalid_signature_cache_ttl': '5'})(self.auth)
+        with mock.patch.object(self.tempurl, '_get_keys',
+                               side_effect=self.tempurl._get_keys) as mocked:
+            for _junk in range(2):
+                req = self._signed_request('GET', 'GET', ['abc'],
+                                           sig='bogus')
+                resp = req.get_response(self.tempurl)
+                self.assertEqual(resp.status_int, 401)
+                self.assertTrue('Temp URL invalid' in resp.body)
+            self.assertEqual(1, mocked.call_count)
+            # good signatures are still checked
+            for _junk in range(2):
+                req = self._signed_request('GET', 'GET', ['abc'])
+                resp = req.get_response(self.tempurl)
+                self.assertEqual(resp.status_int, 404)
+            self.assertEqual(3, mocked.call_count)
+            the_future = time() + 6
+            with mock.patch('time.time', lambda: the_future):
+                req = self._signed_request('GET', 'GET', ['abc'],
+                                           sig='bogus')
+                resp = req.get_response(self.tempurl)
+            self.assertEqual(resp.status_int, 401)
+            self.assertEqual(4, mocked.call_count)
+
     def test_invalid(self):
 
         def _start_response(status, headers, exc_info=None):
@@ -337,6 +337,173 @@ class TestMemcached(unittest.TestCase):
             ('some_key2', 'some_key1', 'not_exists'), 'multi_key'),
             [[4, 5, 6], [1, 2, 3], None])
 
+    def test_get_many(self):
+        servers = ['1.2.3.4:11211', '1.2.3.5:11211']
+        memcache_client = memcached.MemcacheRing(servers)
+        mocks = {}
+        for server in servers:
+            mocks[server] = MockMemcached()
+            memcache_client._client_cache[server] = MockedMemcachePool(
+                [(mocks[server], mocks[server])] * 2)
+        keys = ['some_key%d' % i for i in range(20)]
+        for i, key in enumerate(keys):
+            memcache_client.set(key, [i])
+        # sanity, the keys are spread over both servers
+        for mock in mocks.values():
+            self.assertTrue(mock.cache)
+        got = []
+
+        def capture_sendall(mock):
+            orig_sendall = mock.sendall
+
+            def sendall(string):
+                got.append(string)
+                return orig_sendall(string)
+            return sendall
+
+        for mock in mocks.values():
+            mock.sendall = capture_sendall(mock)
+        self.assertEqual(
+            memcache_client.get_many(keys + ['not_exists']),
+            [[i] for i in range(20)] + [None])
+        # one multi-get per server
+        self.assertEqual(2, len(got))
+        self.assertEqual([None, None], memcache_client.get_many(
+            ['not_exists', 'not_exists_either']))
+        self.assertEqual([], memcache_client.get_many([]))
+
+    def test_get_many_error(self):
+        logging.getLogger().addHandler(NullLoggingHandler())
+        memcache_client = memcached.MemcacheRing(['1.2.3.4:11211'])
+        mock = ExplodingMockMemcached()
+        memcache_client._client_cache['1.2.3.4:11211'] = MockedMemcachePool(
+            [(mock, mock)] * 2)
+        self.assertEqual([None, None],
+                         memcache_client.get_many(['key1', 'key2']))
+        self.assertTrue(mock.exploded)
+
+    def _failover_ring(self, **kwargs):
+        servers = ['1.2.3.4:11211', '1.2.3.5:11211', '1.2.3.6:11211']
+        memcache_client = memcached.MemcacheRing(servers, **kwargs)
+        mocks = {}
+        for server in servers:
+            mocks[server] = MockMemcached()
+            memcache_client._client_cache[server] = MockedMemcachePool(
+                [(mocks[server], mocks[server])] * 100)
+        return memcache_client, mocks
+
+    def test_get_many_error_limited(self):
+        logging.getLogger().addHandler(NullLoggingHandler())
+        memcache_client, mocks = self._failover_ring()
+        memcache_client._error_limited['1.2.3.4:11211'] = time.time() + 60
+        keys = ['some_key%d' % i for i in range(30)]
+        for i, key in enumerate(keys):
+            memcache_client.set(key, [i])
+        self.assertFalse(mocks['1.2.3.4:11211'].cache)
+        # each key is read from the server it was written to
+        self.assertEqual(memcache_client.get_many(keys),
+                         [[i] for i in range(30)])
+
+        memcache_client._coalesce_gets = True
+        p = GreenPool()
+        results = {}
+
+        def do_get(key):
+            results[key] = memcache_client.get(key)
+
+        for key in keys:
+            p.spawn(do_get, key)
+        p.waitall()
+        self.assertEqual(results, dict((key, [i])
+                                       for i, key in enumerate(keys)))
+
+    def test_get_many_failover(self):
+        logging.getLogger().addHandler(NullLoggingHandler())
+        memcache_client, mocks = self._failover_ring()
+        keys = ['some_key%d' % i for i in range(30)]
+        mocks['1.2.3.4:11211'].down = True
+        for i, key in enumerate(keys):
+            memcache_client.set(key, [i])
+        # the failed server is not error limited (yet), so gets try it first
+        for server in mocks:
+            memcache_client._errors[server] = []
+            memcache_client._error_limited[server] = 0
+        self.assertFalse(mocks['1.2.3.4:11211'].cache)
+        # the keys of the failed server fall back to their own next server
+        self.assertEqual(memcache_client.get_many(keys),
+                         [[i] for i in range(30)])
+
+        memcache_client._errors['1.2.3.4:11211'] = []
+        memcache_client._coalesce_gets = True
+        p = GreenPool()
+        results = {}
+
+        def do_get(key):
+            results[key] = memcache_client.get(key)
+
+        for key in keys:
+            p.spawn(do_get, key)
+        p.waitall()
+        self.assertEqual(results, dict((key, [i])
+                                       for i, key in enumerate(keys)))
+
+    def test_coalesce_gets(self):
+        memcache_client = memcached.MemcacheRing(['1.2.3.4:11211'],
+                                                 coalesce_gets=True)
+        mock = MockMemcached()
+        memcache_client._client_cache['1.2.3.4:11211'] = MockedMemcachePool(
+            [(mock, mock)] * 2)
+        for i in range(10):
+            memcache_client.set('some_key%d' % i, [i])
+        # a lone get still works
+        self.assertEqual(memcache_client.get('some_key1'), [1])
+        self.assertEqual(memcache_client.get('not_exists'), None)
+
+        got = []
+        orig_sendall = mock.sendall
+
+        def sendall(string):
+            got.append(string)
+            return orig_sendall(string)
+        mock.sendall = sendall
+
+        p = GreenPool()
+        results = {}
+
+        def do_get(key):
+            results[key] = memcache_client.get(key)
+
+        keys = ['some_key%d' % i for i in range(10)] + ['some_key3']
+        for key in keys:
+            p.spawn(do_get, key)
+        p.waitall()
+        self.assertEqual(
+            results, dict(('some_key%d' % i, [i]) for i in range(10)))
+        # all the concurrent gets went out in a single request
+        self.assertEqual(1, len(got))
+        self.assertTrue(got[0].startswith('get '))
+        self.assertEqual(10, len(got[0].split()) - 1)
+        self.assertEqual({}, memcache_client._pending_gets)
+
+    def test_coalesce_gets_error(self):
+        logging.getLogger().addHandler(NullLoggingHandler())
+        memcache_client = memcached.MemcacheRing(['1.2.3.4:11211'],
+                                                 coalesce_gets=True)
+        mock = ExplodingMockMemcached()
+        memcache_client._client_cache['1.2.3.4:11211'] = MockedMemcachePool(
+            [(mock, mock)] * 2)
+        p = GreenPool()
+        results = {}
+
+        def do_get(key):
+            results[key] = memcache_client.get(key)
+
+        for key in ('key1', 'key2'):
+            p.spawn(do_get, key)
+        p.waitall()
+        self.assertEqual({'key1': None, 'key2': None}, results)
+        self.assertTrue(mock.exploded)
+
     def test_serialization(self):
         memcache_client = memcached.MemcacheRing(['1.2.3.4:11211'],
                                                  allow_pickle=True)
@@ -24,8 +24,9 @@ from test.unit import patch_policies, FakeRing, temptree
 from swift.common.storage_policy import (
     StoragePolicyCollection, POLICIES, PolicyError, parse_storage_policies,
     reload_storage_policies, get_policy_string, split_policy_string,
-    BaseStoragePolicy, StoragePolicy, ECStoragePolicy, REPL_POLICY, EC_POLICY,
-    VALID_EC_TYPES, DEFAULT_EC_OBJECT_SEGMENT_SIZE, BindPortsCache)
+    BaseStoragePolicy, StoragePolicy, ECStoragePolicy, PackedStoragePolicy,
+    REPL_POLICY, EC_POLICY, PACKED_POLICY, VALID_EC_TYPES,
+    DEFAULT_EC_OBJECT_SEGMENT_SIZE, BindPortsCache)
 from swift.common.ring import RingData
 from swift.common.exceptions import RingValidationError
 
@@ -297,6 +298,7 @@ class TestStoragePolicies(unittest.TestCase):
             StoragePolicy(3, 'three', is_deprecated=True),
             ECStoragePolicy(10, 'ten', ec_type='jerasure_rs_vand',
                             ec_ndata=10, ec_nparity=3),
+            PackedStoragePolicy(11, 'eleven'),
         ]
         policies = StoragePolicyCollection(test_policies)
         self.assertEqual(policies.get_by_index(0).policy_type,
@@ -309,6 +311,8 @@ class TestStoragePolicies(unittest.TestCase):
                          REPL_POLICY)
         self.assertEqual(policies.get_by_index(10).policy_type,
                          EC_POLICY)
+        self.assertEqual(policies.get_by_index(11).policy_type,
+                         PACKED_POLICY)
 
     def test_names_are_normalized(self):
         test_policies = [StoragePolicy(0, 'zero', True),
@@ -2987,10 +2987,11 @@ cluster_dfw1 = http://dfw1.host/v1/
             _m_fsync_dir = mock.Mock()
             with patch('os.rename', _m_os_rename):
                 with patch('swift.common.utils.fsync_dir', _m_fsync_dir):
-                    utils.renamer("fake_path", obj_path)
+                    created = utils.renamer("fake_path", obj_path)
             _m_os_rename.assert_called_once_with('fake_path', obj_path)
             # fsync_dir on parents of all newly create dirs
             self.assertEqual(_m_fsync_dir.call_count, 3)
+            self.assertEqual(2, created)
 
             # Object dir existed
             _m_os_rename.reset_mock()
@@ -3013,7 +3014,9 @@ cluster_dfw1 = http://dfw1.host/v1/
             with patch('swift.common.utils.fsync_dir', _m_fsync_dir):
                 with patch('swift.common.utils.makedirs_count',
                            _m_makedirs_count):
-                    utils.renamer("fake_path", "/a/b/c.data", fsync=False)
+                    created = utils.renamer("fake_path", "/a/b/c.data",
+                                            fsync=False)
+        self.assertEqual(2, created)
         _m_makedirs_count.assert_called_once_with("/a/b")
         _m_os_rename.assert_called_once_with('fake_path', "/a/b/c.data")
         self.assertFalse(_m_fsync_dir.called)
@@ -3636,6 +3639,182 @@ class TestStatsdLogging(unittest.TestCase):
         self.assertTrue(payload.endswith("|@%s" % effective_sample_rate),
                         payload)
 
+    def _buffered_client(self, **kwargs):
+        conf = {'log_statsd_host': 'some.host.com',
+                'log_statsd_flush_interval': '10'}
+        conf.update(kwargs)
+        logger = utils.get_logger(conf, 'some-name')
+        statsd_client = logger.logger.statsd_client
+        mock_socket = MockUdpSocket()
+        statsd_client._open_socket = lambda *_: mock_socket
+        return logger, statsd_client, mock_socket
+
+    def test_get_logger_buffered_statsd_client(self):
+        logger, statsd_client, _junk = self._buffered_client()
+        self.assertTrue(isinstance(statsd_client, utils.BufferedStatsdClient))
+        self.assertEqual(10, statsd_client.flush_interval)
+        self.assertEqual(statsd_client._prefix, 'some-name.')
+        logger = utils.get_logger({'log_statsd_host': 'some.host.com',
+                                   'log_statsd_flush_interval': '0'})
+        self.assertFalse(isinstance(logger.logger.statsd_client,
+                                    utils.BufferedStatsdClient))
+
+    def test_buffered_counters_summed(self):
+        logger, statsd_client, mock_socket = self._buffered_client()
+        for _junk in range(5):
+            logger.increment('tribbles', sample_rate=0.01)
+        logger.decrement('tribbles')
+        logger.update_stats('xfer', 1000)
+        logger.update_stats('xfer', 24)
+        logger.set_statsd_prefix('other')
+        logger.increment('tribbles')
+        self.assertEqual([], mock_socket.sent)
+        statsd_client.flush()
+        self.assertEqual(1, len(mock_socket.sent))
+        payload, target = mock_socket.sent[0]
+        self.assertEqual(('some.host.com', 8125), target)
+        self.assertEqual(sorted(payload.split('\n')),
+                         ['other.tribbles:1|c', 'some-name.tribbles:4|c',
+                          'some-name.xfer:1024|c'])
+        # nothing more to send
+        statsd_client.flush()
+        self.assertEqual(1, len(mock_socket.sent))
+
+    def test_buffered_flushes_after_interval(self):
+        logger, statsd_client, mock_socket = self._buffered_client()
+        now = time.time()
+        with patch('time.time', lambda: now + 9):
+            logger.increment('tribbles')
+        self.assertEqual([], mock_socket.sent)
+        with patch('time.time', lambda: now + 11):
+            logger.increment('tribbles')
+        self.assertEqual([('some-name.tribbles:2|c', ('some.host.com', 8125))],
+                         mock_socket.sent)
+
+    def test_buffered_flushes_when_idle(self):
+        logger, statsd_client, mock_socket = self._buffered_client(
+            log_statsd_flush_interval='0.01')
+        logger.increment('tribbles')
+        logger.increment('tribbles')
+        self.assertEqual([], mock_socket.sent)
+        # no more calls come, but the metrics are still sent
+        eventlet.sleep(0.05)
+        self.assertEqual([('some-name.tribbles:2|c', ('some.host.com', 8125))],
+                         mock_socket.sent)
+        self.assertEqual(None, statsd_client._flusher)
+        # a flush made before then cancels the greenthread
+        statsd_client.flush_interval = 10
+        statsd_client.flush()
+        logger.increment('tribbles')
+        self.assertTrue(statsd_client._flusher is not None)
+        statsd_client.flush()
+        self.assertEqual(None, statsd_client._flusher)
+        self.assertEqual(2, len(mock_socket.sent))
+        eventlet.sleep(0.05)
+        self.assertEqual(2, len(mock_socket.sent))
+
+    def test_buffered_flushed_at_exit(self):
+        logger, statsd_client, mock_socket = self._buffered_client()
+        logger.increment('tribbles')
+        self.assertEqual([], mock_socket.sent)
+        utils.flush_buffered_statsd_clients()
+        self.assertEqual([('some-name.tribbles:1|c', ('some.host.com', 8125))],
+                         mock_socket.sent)
+
+    def test_buffered_timings(self):
+        logger, statsd_client, mock_socket = self._buffered_client(
+            log_statsd_sample_rate_factor='0.5')
+        statsd_client.random = lambda: 0.49999
+        logger.timing('kept', 1.5)
+        logger.timing('kept', 2.5)
+        statsd_client.random = lambda: 0.50001
+        logger.timing('dropped', 3.5)
+        statsd_client.flush()
+        self.assertEqual(sorted(mock_socket.sent[0][0].split('\n')),
+                         ['some-name.kept:1.5|ms|@0.5',
+                          'some-name.kept:2.5|ms|@0.5'])
+
+    def test_buffered_timings_sampled(self):
+        logger, statsd_client, mock_socket = self._buffered_client()
+        statsd_client.max_timings = 4
+        for i in range(8):
+            # every other timing after the fourth replaces a kept one
+            statsd_client.random = lambda: 0.4 if i % 2 else 0.9
+            logger.timing('t', i)
+        statsd_client.flush()
+        lines = mock_socket.sent[0][0].split('\n')
+        self.assertEqual(4, len(lines))
+        self.assertTrue(all(line.endswith('|ms|@0.5') for line in lines))
+        self.assertEqual(['0', '1', '5', '7'],
+                         sorted(line.split(':')[1].split('|')[0]
+                                for line in lines))
+
+    def test_buffered_packets_split(self):
+        logger, statsd_client, mock_socket = self._buffered_client()
+        statsd_client.max_packet_size = 100
+        for i in range(20):
+            logger.increment('counter-%02d' % i)
+        statsd_client.flush()
+        self.assertTrue(len(mock_socket.sent) > 1)
+        lines = []
+        for payload, _junk in mock_socket.sent:
+            self.assertTrue(len(payload) < 100)
+            lines.extend(payload.split('\n'))
+        self.assertEqual(sorted(lines), ['some-name.counter-%02d:1|c' % i
+                                         for i in range(20)])
+
+    def test_buffered_send_error(self):
+        logger, statsd_client, _junk = self._buffered_client()
+        fl = FakeLogger()
+        statsd_client.logger = fl
+        mock_socket = MockUdpSocket(sendto_errno=errno.EPERM)
+        statsd_client._open_socket = lambda *_: mock_socket
+        logger.increment('tunafish')
+        statsd_client.flush()
+        expected = ["Error sending UDP message to ('some.host.com', 8125): "
+                    "[Errno 1] test errno 1"]
+        self.assertEqual(fl.get_lines_for_level('warning'), expected)
+
+    def test_buffered_timing_percentiles(self):
+        logger, statsd_client, mock_socket = self._buffered_client(
+            log_statsd_timing_percentiles='50, 99.9')
+        self.assertEqual([50.0, 99.9], statsd_client.percentiles)
+        for timing in (0.5, 3, 4, 150):
+            logger.timing('t', timing)
+        statsd_client.flush()
+        # 3 and 4 fall in the (2, 5] bucket, 150 in the (100, 200] bucket,
+        # which is capped by the longest timing
+        self.assertEqual(sorted(mock_socket.sent[0][0].split('\n')),
+                         ['some-name.t.count:4|c',
+                          'some-name.t.max:150|g',
+                          'some-name.t.p50:3.5|g',
+                          'some-name.t.p99_9:149.8|g'])
+        # the histogram starts again after a flush
+        logger.timing('t', 200000)
+        statsd_client.flush()
+        self.assertEqual(sorted(mock_socket.sent[1][0].split('\n')),
+                         ['some-name.t.count:1|c',
+                          'some-name.t.max:200000|g',
+                          'some-name.t.p50:150000.0|g',
+                          'some-name.t.p99_9:199900.0|g'])
+
+    def test_buffered_timing_percentiles_sampled(self):
+        logger, statsd_client, mock_socket = self._buffered_client(
+            log_statsd_timing_percentiles='90')
+        statsd_client.random = lambda: 0.4
+        logger.timing('t', 10, sample_rate=0.5)
+        logger.timing('t', 10, sample_rate=0.5)
+        logger.increment('c', sample_rate=0.5)
+        statsd_client.random = lambda: 0.6
+        logger.timing('t', 1000, sample_rate=0.5)
+        statsd_client.flush()
+        # each kept timing stands for two
+        self.assertEqual(sorted(mock_socket.sent[0][0].split('\n')),
+                         ['some-name.c:1|c',
+                          'some-name.t.count:4|c',
+                          'some-name.t.max:10|g',
+                          'some-name.t.p90:9.5|g'])
+
     def test_timing_stats(self):
         class MockController(object):
             def __init__(self, status):
@@ -4213,6 +4392,39 @@ class TestStatsdLoggingDelegation(unittest.TestCase):
                 utils.fsync(12345)
                 self.assertEqual(called, [12345])
 
+    def test_start_writeback(self):
+        called = []
+
+        def sync_file_range(fd, offset, nbytes, flags):
+            called.append((fd, offset.value, nbytes.value, flags))
+            return 0
+
+        with patch('swift.common.utils._sync_file_range', sync_file_range):
+            utils.start_writeback(12345)
+        self.assertEqual(called, [(12345, 0, 0, 2)])
+
+        # works on a real file, or is a no-op where libc lacks the call
+        with NamedTemporaryFile() as f:
+            f.write('data')
+            f.flush()
+            utils.start_writeback(f.fileno())
+
+    def test_prefetch_buffer_cache(self):
+        called = []
+
+        def posix_fadvise(fd, offset, length, advice):
+            called.append((fd, offset.value, length.value, advice))
+            return 0
+
+        with patch('swift.common.utils._posix_fadvise', posix_fadvise):
+            utils.prefetch_buffer_cache(12345, 4096, 65536)
+        self.assertEqual(called, [(12345, 4096, 65536, 3)])
+
+        with NamedTemporaryFile() as f:
+            f.write('data')
+            f.flush()
+            utils.prefetch_buffer_cache(f.fileno(), 0, 4)
+
 
 class TestThreadPool(unittest.TestCase):
 
@@ -4731,6 +4943,47 @@ class TestLRUCache(unittest.TestCase):
             f(i)
         self.assertEqual(f.size(), 4)
 
+    def test_get_set(self):
+        cache = utils.LRUCache(maxsize=2, maxtime=30)
+        self.assertEqual(None, cache.get('a'))
+        self.assertEqual('missing', cache.get('a', 'missing'))
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(1, cache.get('a'))
+        # 'b' is now the least recently used
+        cache.set('c', 3)
+        self.assertEqual(None, cache.get('b'))
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
+        the_future = time.time() + 31
+        with patch('time.time', lambda: the_future):
+            self.assertEqual(None, cache.get('a'))
+
+    def test_set_existing_key(self):
+        cache = utils.LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('a', 2)
+        self.assertEqual(1, len(cache.mapping))
+        self.assertEqual(2, cache.get('a'))
+        cache.set('b', 3)
+        cache.set('c', 4)
+        self.assertEqual(['b', 'c'], sorted(k for k, in cache.mapping))
+        cache.set('d', 5)
+        self.assertEqual(['c', 'd'], sorted(k for k, in cache.mapping))
+
+    def test_delete(self):
+        cache = utils.LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.delete('a')
+        cache.delete('missing')
+        self.assertEqual(None, cache.get('a'))
+        self.assertEqual(2, cache.get('b'))
+        # the freed slot is reused without evicting 'b'
+        cache.set('c', 3)
+        self.assertEqual(2, cache.get('b'))
+        self.assertEqual(3, cache.get('c'))
+
 
 class TestParseContentRange(unittest.TestCase):
     def test_good(self):
@@ -311,10 +311,11 @@ class TestContainerController(unittest.TestCase):
         req.content_length = 0
         resp = server_handler.OPTIONS(req)
         self.assertEqual(200, resp.status_int)
-        for verb in 'OPTIONS GET POST PUT DELETE HEAD REPLICATE'.split():
+        for verb in 'OPTIONS GET POST PUT DELETE HEAD REPLICATE ' \
+                'UPDATE'.split():
             self.assertTrue(
                 verb in resp.headers['Allow'].split(', '))
-        self.assertEqual(len(resp.headers['Allow'].split(', ')), 7)
+        self.assertEqual(len(resp.headers['Allow'].split(', ')), 8)
         self.assertEqual(resp.headers['Server'],
                          (self.controller.server_type + '/' + swift_version))
 
@@ -379,6 +380,63 @@ class TestContainerController(unittest.TestCase):
         resp = req.get_response(self.controller)
         self.assertEqual(resp.status_int, 404)
 
+    def test_UPDATE(self):
+        policy = random.choice(list(POLICIES))
+        items = [{'name': u'o\u2603', 'created_at': '2', 'size': 3,
+                  'content_type': 'text/plain', 'etag': 'e',
+                  'deleted': 0, 'storage_policy_index': int(policy)},
+                 {'name': 'gone', 'created_at': '3', 'size': 0,
+                  'content_type': 'application/deleted', 'etag': 'noetag',
+                  'deleted': 1, 'storage_policy_index': int(policy)},
+                 # an older PUT of the deleted object in the same batch
+                 {'name': 'gone', 'created_at': '2', 'size': 1,
+                  'content_type': 'text/plain', 'etag': 'e',
+                  'deleted': 0, 'storage_policy_index': int(policy)}]
+
+        req = Request.blank('/sda1/p/a/c', method='UPDATE',
+                            body=simplejson.dumps(items))
+        resp = req.get_response(self.controller)
+        self.assertEqual(resp.status_int, 404)
+
+        req = Request.blank('/sda1/p/a/c', method='PUT', headers={
+            'X-Timestamp': '1',
+            'X-Backend-Storage-Policy-Index': int(policy)})
+        self.assertEqual(req.get_response(self.controller).status_int, 201)
+        req = Request.blank('/sda1/p/a/c', method='UPDATE',
+                            body=simplejson.dumps(items))
+        resp = req.get_response(self.controller)
+        self.assertEqual(resp.status_int, 204)
+        broker = self.controller._get_container_broker('sda1', 'p', 'a', 'c')
+        self.assertEqual(
+            [('o\xe2\x98\x83', Timestamp(2).internal, 3, 'text/plain', 'e')],
+            [tuple(row[:5]) for row in broker.list_objects_iter(
+                10, '', None, None, '', storage_policy_index=int(policy))])
+        self.assertEqual(1, broker.get_info()['object_count'])
+
+        # an empty batch is fine, and bad ones are rejected
+        req = Request.blank('/sda1/p/a/c', method='UPDATE', body='[]')
+        self.assertEqual(req.get_response(self.controller).status_int, 204)
+        for bad in ("not json", simplejson.dumps({}), simplejson.dumps([{}]),
+                    simplejson.dumps([dict(items[0], name='')]),
+                    simplejson.dumps([dict(items[0], deleted=2)]),
+                    simplejson.dumps([dict(items[0], created_at='x')]),
+                    simplejson.dumps([dict(items[0],
+                                           storage_policy_index=99)])):
+            req = Request.blank('/sda1/p/a/c', method='UPDATE', body=bad)
+            resp = req.get_response(self.controller)
+            self.assertEqual(resp.status_int, 400, bad)
+
+    def test_UPDATE_auto_create(self):
+        items = [{'name': 'o', 'created_at': '2', 'size': 3,
+                  'content_type': 'text/plain', 'etag': 'e',
+                  'deleted': 0, 'storage_policy_index': 0}]
+        req = Request.blank('/sda1/p/.a/c', method='UPDATE',
+                            body=simplejson.dumps(items))
+        resp = req.get_response(self.controller)
+        self.assertEqual(resp.status_int, 204)
+        broker = self.controller._get_container_broker('sda1', 'p', '.a', 'c')
+        self.assertEqual(1, broker.get_info()['object_count'])
+
     def test_PUT_good_policy_specified(self):
         policy = random.choice(list(POLICIES))
         # Set metadata header
@@ -2464,7 +2522,7 @@ class TestContainerController(unittest.TestCase):
 
     def test_list_allowed_methods(self):
         # Test list of allowed_methods
-        obj_methods = ['DELETE', 'PUT', 'HEAD', 'GET', 'POST']
+        obj_methods = ['DELETE', 'PUT', 'HEAD', 'GET', 'POST', 'UPDATE']
         repl_methods = ['REPLICATE']
         for method_name in obj_methods:
             method = getattr(self.controller, method_name)
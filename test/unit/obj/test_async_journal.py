@@ -0,0 +1,128 @@
+# Copyright (c) 2015 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import fcntl
+import mock
+import os
+import unittest
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from swift.obj import async_journal
+from swift.obj.async_journal import AsyncPendingJournal
+from test.unit import debug_logger
+
+
+class TestAsyncPendingJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        self.async_dir = os.path.join(self.tmpdir, 'async_pending')
+        self.logger = debug_logger()
+        self.journal = AsyncPendingJournal(self.async_dir, self.logger)
+
+    def tearDown(self):
+        rmtree(self.tmpdir, ignore_errors=True)
+
+    def _records(self, segment):
+        return [(obj_hash, timestamp, update) for
+                _junk, obj_hash, timestamp, update in
+                self.journal.iter_records(segment)]
+
+    def test_append_and_iter_records(self):
+        self.journal.append('a' * 32, '0000000001.00000', {'op': 'PUT'})
+        self.journal.append('b' * 32, '0000000002.00000', {'op': 'DELETE'})
+        self.assertEqual(['journal'], os.listdir(self.async_dir))
+        self.assertEqual([('a' * 32, '0000000001.00000', {'op': 'PUT'}),
+                          ('b' * 32, '0000000002.00000', {'op': 'DELETE'})],
+                         self._records(self.journal.path))
+        self.assertEqual(2, self.journal.count(self.journal.path))
+
+    def test_index_newest_wins(self):
+        self.journal.append('a' * 32, '0000000002.00000', {'op': 'PUT'})
+        self.journal.append('a' * 32, '0000000001.00000', {'op': 'DELETE'})
+        self.journal.append('b' * 32, '0000000003.00000', {'op': 'PUT'})
+        self.journal.append('b' * 32, '0000000003.00000', {'op': 'DELETE'})
+        offsets = dict(
+            (update['op'] + obj_hash[0], offset) for
+            offset, obj_hash, _junk, update in
+            self.journal.iter_records(self.journal.path))
+        self.assertEqual({'a' * 32: offsets['PUTa'],
+                          'b' * 32: offsets['DELETEb']},
+                         self.journal.index(self.journal.path))
+
+    def test_rotate(self):
+        self.assertEqual([], self.journal.rotate())
+        self.journal.append('a' * 32, '0000000001.00000', {})
+        with mock.patch('time.time', return_value=1):
+            first = self.journal.rotate()
+        self.assertEqual([self.journal.path + '.0000000001.00000'], first)
+        self.assertFalse(os.path.exists(self.journal.path))
+        # a segment left by an interrupted sweep is processed first
+        self.journal.append('b' * 32, '0000000002.00000', {})
+        with mock.patch('time.time', return_value=2):
+            second = self.journal.rotate()
+        self.assertEqual(first + [self.journal.path + '.0000000002.00000'],
+                         second)
+        self.assertEqual([('b' * 32, '0000000002.00000', {})],
+                         self._records(second[1]))
+
+    def test_append_after_rotate(self):
+        self.journal.append('a' * 32, '0000000001.00000', {})
+        orig_flock = fcntl.flock
+        rotated = []
+
+        def rotate_then_flock(fd, op):
+            if not rotated:
+                # the updater sets the journal aside after the appender
+                # opened it, but before it was locked
+                rotated.extend(self.journal.rotate())
+            return orig_flock(fd, op)
+
+        with mock.patch('fcntl.flock', rotate_then_flock):
+            self.journal.append('b' * 32, '0000000002.00000', {})
+        self.assertEqual([('a' * 32, '0000000001.00000', {})],
+                         self._records(rotated[0]))
+        self.assertEqual([('b' * 32, '0000000002.00000', {})],
+                         self._records(self.journal.path))
+
+    def test_corrupt_records_are_skipped(self):
+        for i in range(3):
+            self.journal.append('%032d' % i, '0000000001.00000', {'i': i})
+        with open(self.journal.path, 'rb') as fp:
+            data = fp.read()
+        record_size = len(data) // 3
+        # flip a byte in the middle record's payload, then tear off the end
+        # of the last record as a crash would
+        corrupt = bytearray(data)
+        corrupt[record_size + record_size // 2] ^= 0xff
+        with open(self.journal.path, 'wb') as fp:
+            fp.write(str(corrupt[:-5]))
+        self.journal.append('%032d' % 3, '0000000001.00000', {'i': 3})
+        self.assertEqual([{'i': 0}, {'i': 3}],
+                         [update for _junk, _junk, update in
+                          self._records(self.journal.path)])
+        self.assertEqual(2, self.journal.count(self.journal.path))
+        self.assertEqual(4, self.logger.get_increment_counts()['errors'])
+
+    def test_is_journal_file(self):
+        self.assertTrue(async_journal.is_journal_file('journal'))
+        self.assertTrue(async_journal.is_journal_file(
+            'journal.0000000001.00000'))
+        self.assertFalse(async_journal.is_journal_file('abc'))
+
+
+if __name__ == '__main__':
+    unittest.main()
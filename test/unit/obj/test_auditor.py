@@ -15,10 +15,13 @@
 
 from test import unit
 import unittest
+import eventlet
 import mock
 import os
 import time
+import sqlite3
 import string
+from contextlib import closing
 from shutil import rmtree
 from hashlib import md5
 from tempfile import mkdtemp
@@ -321,6 +324,189 @@ class TestAuditor(unittest.TestCase):
         self.assertEqual(auditor_worker.stats_buckets[10240], 0)
         self.assertEqual(auditor_worker.stats_buckets['OVER'], 1)
 
+    def test_audit_index(self):
+        conf = dict(self.conf, audit_index='true')
+        auditor_worker = auditor.AuditorWorker(conf, self.logger,
+                                               self.rcache, self.devices)
+        self.assertTrue(auditor_worker.use_audit_index)
+        self.assertFalse(auditor.AuditorWorker(
+            conf, self.logger, self.rcache, self.devices,
+            zero_byte_only_at_fps=50).use_audit_index)
+        timestamp = normalize_timestamp(time.time())
+        data = '0' * 10
+        datadirs = {}
+
+        def write_file(obj, data=data):
+            df = self.df_mgr.get_diskfile('sda', '0', 'a', 'c', obj,
+                                          policy=POLICIES.legacy)
+            with df.create() as writer:
+                writer.write(data)
+                writer.put({'ETag': md5(data).hexdigest(),
+                            'X-Timestamp': timestamp,
+                            'Content-Length': str(len(data))})
+            datadirs[obj] = df._datadir
+
+        for obj in ('o0', 'o1', 'o2', 'o3'):
+            write_file(obj)
+        audited = []
+        orig_object_audit = auditor_worker.object_audit
+
+        def capture_audit(location):
+            audited.append(location.path)
+            orig_object_audit(location)
+
+        db_file = os.path.join(self.devices, 'sda', auditor.AUDIT_INDEX_FILE)
+
+        def indexed():
+            with closing(sqlite3.connect(db_file)) as conn:
+                return dict(conn.execute(
+                    'SELECT path, last_audited FROM audited').fetchall())
+
+        with mock.patch.object(auditor_worker, 'object_audit',
+                               capture_audit):
+            auditor_worker.audit_all_objects(device_dirs=['sda'])
+        self.assertEqual(sorted(datadirs.values()), sorted(audited))
+        self.assertEqual(4, len(indexed()))
+        self.assertEqual(['sdb'], [
+            device for device in os.listdir(self.devices)
+            if not os.path.exists(os.path.join(
+                self.devices, device, auditor.AUDIT_INDEX_FILE))])
+
+        # pretend the objects were audited in the past, o2 longest ago, and
+        # have not changed since
+        with closing(sqlite3.connect(db_file)) as conn:
+            for i, obj in enumerate(('o2', 'o0', 'o3', 'o1')):
+                conn.execute(
+                    'UPDATE audited SET last_audited = ? WHERE path = ?',
+                    (i + 1, os.path.relpath(
+                        datadirs[obj], os.path.join(self.devices, 'sda'))))
+            conn.commit()
+        for datadir in datadirs.values():
+            os.utime(datadir, (0, 0))
+        # a changed object comes first, a gone one is forgotten
+        write_file('o3', data='1' * 10)
+        gone = datadirs.pop('o1')
+        rmtree(gone)
+        del audited[:]
+        with mock.patch.object(auditor_worker, 'object_audit',
+                               capture_audit):
+            locations = auditor_worker.indexed_audit_location_generator(
+                device_dirs=['sda'])
+            for location in locations:
+                auditor_worker.failsafe_object_audit(location)
+                if len(audited) == 2:
+                    break
+            # the pass is interrupted
+            locations.close()
+        self.assertEqual([datadirs['o3'], datadirs['o2']], audited)
+
+        # and resumed
+        auditor_worker.logger = FakeLogger()
+        del audited[:]
+        with mock.patch.object(auditor_worker, 'object_audit',
+                               capture_audit):
+            auditor_worker.audit_all_objects(device_dirs=['sda'])
+        self.assertEqual([datadirs['o0'], gone], audited)
+        self.assertTrue(auditor_worker.logger.get_lines_for_level(
+            'info')[1].startswith('Resuming audit pass of sda'))
+        self.assertEqual(0, auditor_worker.quarantines)
+        self.assertEqual(sorted(datadirs.values()), sorted(
+            os.path.join(self.devices, 'sda', path) for path in indexed()))
+
+    def test_audit_index_waits_for_audits(self):
+        conf = dict(self.conf, audit_index='true', checksum_threads='2',
+                    bytes_per_second='0')
+        auditor_worker = auditor.AuditorWorker(conf, self.logger,
+                                               self.rcache, self.devices)
+        timestamp = normalize_timestamp(time.time())
+        for i in range(3):
+            df = self.df_mgr.get_diskfile('sda', '0', 'a', 'c', 'o%d' % i,
+                                          policy=POLICIES.legacy)
+            data = str(i) * 10
+            with df.create() as writer:
+                writer.write(data)
+                writer.put({'ETag': md5(data).hexdigest(),
+                            'X-Timestamp': timestamp,
+                            'Content-Length': str(len(data))})
+        orig_object_audit = auditor_worker.object_audit
+
+        def slow_audit(location):
+            eventlet.sleep(0.01)
+            orig_object_audit(location)
+
+        auditor_worker.pool = eventlet.GreenPool(2)
+        with mock.patch.object(auditor_worker, 'object_audit', slow_audit):
+            locations = auditor_worker.indexed_audit_location_generator(
+                device_dirs=['sda'])
+            for i, location in enumerate(locations):
+                auditor_worker.pool.spawn_n(
+                    auditor_worker.timed_object_audit, location)
+                if i == 1:
+                    break
+            # the pass is interrupted with two audits in flight
+            locations.close()
+            self.assertEqual(0, auditor_worker.pool.running())
+        self.assertEqual(0, auditor_worker.errors)
+        db_file = os.path.join(self.devices, 'sda', auditor.AUDIT_INDEX_FILE)
+        with closing(sqlite3.connect(db_file)) as conn:
+            self.assertEqual(2, conn.execute(
+                'SELECT COUNT(*) FROM audited').fetchone()[0])
+
+    def test_checksum_threads(self):
+        conf = dict(self.conf, checksum_threads='3', bytes_per_second='0')
+        auditor_worker = auditor.AuditorWorker(conf, self.logger,
+                                               self.rcache, self.devices)
+        self.assertEqual(3, auditor_worker.checksum_threads)
+        self.assertEqual(auditor.CHECKSUM_CHUNK_SIZE,
+                         auditor_worker.diskfile_mgr.disk_chunk_size)
+        self.assertEqual(3, auditor_worker.diskfile_mgr.threadpools[
+            'sda'].nthreads)
+        # the zero byte files auditor does not checksum objects
+        self.assertEqual(0, auditor.AuditorWorker(
+            conf, self.logger, self.rcache, self.devices,
+            zero_byte_only_at_fps=50).checksum_threads)
+
+        timestamp = normalize_timestamp(time.time())
+        for i in range(6):
+            df = self.df_mgr.get_diskfile('sda', '0', 'a', 'c', 'o%d' % i,
+                                          policy=POLICIES.legacy)
+            data = str(i) * 1024
+            with df.create() as writer:
+                writer.write(data)
+                writer.put({'ETag': md5(data).hexdigest(),
+                            'X-Timestamp': timestamp,
+                            'Content-Length': str(len(data))})
+                if i == 4:
+                    os.write(writer._fd, 'extra_data')
+
+        audits = []
+        running = [0]
+        orig_object_audit = auditor_worker.object_audit
+
+        def object_audit(location):
+            running[0] += 1
+            audits.append(running[0])
+            try:
+                orig_object_audit(location)
+            finally:
+                running[0] -= 1
+
+        with mock.patch.object(auditor_worker, 'object_audit',
+                               object_audit), \
+                mock.patch('swift.obj.diskfile.prefetch_buffer_cache') \
+                as mock_prefetch:
+            auditor_worker.audit_all_objects(device_dirs=['sda'])
+        self.assertEqual(6, len(audits))
+        # several objects were being checksummed at once, but no more than
+        # there are threads
+        self.assertEqual(3, max(audits))
+        # the object with extra data is quarantined when it is opened
+        self.assertEqual(5, mock_prefetch.call_count)
+        self.assertEqual(1, auditor_worker.quarantines)
+        self.assertEqual(6, auditor_worker.passes)
+        self.assertEqual(5 * 1024, auditor_worker.total_bytes_processed)
+        self.assertIsNone(auditor_worker.pool)
+
     def test_object_run_logging(self):
         logger = FakeLogger()
         auditor_worker = auditor.AuditorWorker(self.conf, logger,
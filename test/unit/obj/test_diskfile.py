@@ -36,7 +36,8 @@ from hashlib import md5
 from contextlib import closing, nested, contextmanager
 from gzip import GzipFile
 
-from eventlet import hubs, timeout, tpool
+import eventlet
+from eventlet import GreenPool, hubs, timeout, tpool
 from test.unit import (FakeLogger, mock as unit_mock, temptree,
                        patch_policies, debug_logger, EMPTY_ETAG,
                        make_timestamp_iter)
@@ -253,6 +254,79 @@ class TestDiskFileModuleMethods(unittest.TestCase):
             # check tempdir
             self.assertTrue(os.path.isdir(tmp_path))
 
+    def test_pickle_async_update_journal(self):
+        self.conf['async_pending_journal'] = 'true'
+        df_mgr = diskfile.DiskFileManager(self.conf, FakeLogger())
+        for policy in POLICIES:
+            df_mgr.pickle_async_update(self.existing_device, 'a', 'c', 'o',
+                                       {'op': 'PUT'}, 1.0, policy)
+            async_dir = os.path.join(self.devices, self.existing_device,
+                                     diskfile.get_async_dir(policy))
+            self.assertEqual(['journal'], os.listdir(async_dir))
+            journal = diskfile.AsyncPendingJournal(async_dir)
+            self.assertEqual(
+                [(0, hash_path('a', 'c', 'o'), '0000000001.00000',
+                  {'op': 'PUT'})],
+                list(journal.iter_records(journal.path)))
+        self.assertEqual(len(POLICIES), df_mgr.logger.get_increment_counts()[
+            'async_pendings'])
+
+    def test_compact_metadata(self):
+        metadata = {'name': '/a/c/o', 'X-Timestamp': '1381679759.90941',
+                    'Content-Length': 10, 'ETag': 'd41d8cd98f00b204',
+                    'X-Object-Meta-Color': 'blue',
+                    'X-Object-Meta-Unicode': u'\u2603'}
+        encoded = diskfile.encode_compact_metadata(metadata)
+        self.assertTrue(encoded.startswith(diskfile.COMPACT_METADATA_MAGIC))
+        self.assertEqual(metadata, diskfile.decode_compact_metadata(encoded))
+        # an int Content-Length is left to the pickle so it stays an int
+        self.assertEqual({'name': '/a/c/o', 'X-Timestamp': '1381679759.90941',
+                          'ETag': 'd41d8cd98f00b204'},
+                         diskfile.decode_compact_metadata(encoded, True))
+        with mock.patch('swift.obj.diskfile.pickle.loads') as mock_loads:
+            diskfile.decode_compact_metadata(encoded, hot_only=True)
+            diskfile.decode_compact_metadata(
+                diskfile.encode_compact_metadata({'name': '/a/c/o'}))
+        self.assertFalse(mock_loads.called)
+        # a prefix of the header can't be decoded
+        self.assertEqual(None, diskfile.decode_compact_metadata(encoded[:12]))
+        self.assertRaises(ValueError, diskfile.decode_compact_metadata,
+                          diskfile.COMPACT_METADATA_MAGIC + '\x02\x00')
+
+    def test_read_write_compact_metadata(self):
+        path = os.path.join(self.testdir, 'file')
+        with open(path, 'wb'):
+            pass
+        metadata = {'name': '/a/c/o', 'X-Timestamp': '1381679759.90941',
+                    'Content-Length': '10', 'X-Object-Meta-Big': 'x' * 100}
+        diskfile.write_metadata(path, metadata, xattr_size=32, compact=True)
+        self.assertEqual(metadata, diskfile.read_metadata(path))
+
+        # the hot keys are read from just the xattrs that hold the header
+        with mock.patch('xattr.getxattr', wraps=xattr.getxattr) as mock_get:
+            self.assertEqual(
+                {'name': '/a/c/o', 'X-Timestamp': '1381679759.90941',
+                 'Content-Length': '10'},
+                diskfile.read_metadata(path, hot_only=True))
+        self.assertEqual(2, mock_get.call_count)
+
+        # pickled metadata is still read, in full even if only hot keys are
+        # wanted
+        diskfile.write_metadata(path, metadata)
+        self.assertEqual(metadata, diskfile.read_metadata(path))
+        self.assertEqual(metadata,
+                         diskfile.read_metadata(path, hot_only=True))
+
+        # truncated metadata is reported like a truncated pickle
+        path = os.path.join(self.testdir, 'truncated')
+        with open(path, 'wb'):
+            pass
+        xattr.setxattr(path, diskfile.METADATA_KEY,
+                       diskfile.encode_compact_metadata(metadata)[:12])
+        self.assertRaises(EOFError, diskfile.read_metadata, path)
+        self.assertRaises(EOFError, diskfile.read_metadata, path,
+                          hot_only=True)
+
 
 @patch_policies
 class TestObjectAuditLocationGenerator(unittest.TestCase):
@@ -452,6 +526,113 @@ class TestDiskFileRouter(unittest.TestCase):
                 self.assertTrue(isinstance(manager, TestDiskFileManager))
 
 
+class TestIOScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.threadpool = utils.ThreadPool(nthreads=0)
+        self.caps = dict((io_class, 0) for io_class in diskfile.IO_CLASSES)
+        self.started = []
+        self.running = defaultdict(int)
+        self.max_running = defaultdict(int)
+
+    def _scheduler(self, concurrency, **caps):
+        self.caps.update(caps)
+        return diskfile.IOScheduler(self.threadpool, concurrency,
+                                    dict(diskfile.DEFAULT_IO_WEIGHTS),
+                                    self.caps)
+
+    def _op(self, io_class, duration=0):
+        self.started.append(io_class)
+        self.running[io_class] += 1
+        self.running[None] += 1
+        for key in (io_class, None):
+            self.max_running[key] = max(self.max_running[key],
+                                        self.running[key])
+        eventlet.sleep(duration)
+        self.running[io_class] -= 1
+        self.running[None] -= 1
+        return io_class
+
+    def _run_ops(self, scheduler, ops):
+        pool = GreenPool()
+        results = []
+        for io_class in ops:
+            threadpool = scheduler.get_threadpool(io_class)
+            results.append(pool.spawn(threadpool.run_in_thread, self._op,
+                                      io_class, 0.001))
+        pool.waitall()
+        return [result.wait() for result in results]
+
+    def test_weighted_sharing(self):
+        scheduler = self._scheduler(1)
+        ops = ['audit'] * 40 + ['replication'] * 40 + ['client'] * 40
+        self.assertEqual(ops, self._run_ops(scheduler, ops))
+        self.assertEqual(1, self.max_running[None])
+        # the first to arrive got straight in, but the device was then
+        # shared in proportion to the weights while all three had operations
+        # waiting
+        self.assertEqual('audit', self.started[0])
+        first = self.started[:23]
+        self.assertEqual(17, first.count('client'))
+        self.assertEqual(4, first.count('replication'))
+        self.assertEqual(2, first.count('audit'))
+        self.assertEqual(0, scheduler.running)
+        self.assertEqual({'client': 0, 'replication': 0, 'audit': 0},
+                         scheduler.class_running)
+
+    def test_idle_class_does_not_bank_turns(self):
+        scheduler = self._scheduler(1)
+        self._run_ops(scheduler, ['replication'] * 20)
+        del self.started[:]
+        self._run_ops(scheduler, ['client'] * 10 + ['replication'] * 10)
+        # replication ran alone for a while, but that earned it nothing
+        # over client once it had company
+        self.assertEqual(8, self.started[1:11].count('client'))
+
+    def test_concurrency_and_caps(self):
+        scheduler = self._scheduler(4, replication=1)
+        self._run_ops(scheduler, ['replication'] * 10 + ['client'] * 10)
+        self.assertEqual(4, self.max_running[None])
+        self.assertEqual(1, self.max_running['replication'])
+        # client got the other slots (and the last one too, if replication
+        # finished first)
+        self.assertTrue(self.max_running['client'] >= 3)
+
+    def test_force_run_in_thread(self):
+        scheduler = self._scheduler(1)
+        threadpool = scheduler.get_threadpool('audit')
+        self.assertTrue(threadpool is scheduler.get_threadpool('audit'))
+        with mock.patch.object(self.threadpool, 'force_run_in_thread',
+                               side_effect=lambda f, *a: f(*a)) as mock_run:
+            self.assertEqual('audit', threadpool.force_run_in_thread(
+                self._op, 'audit'))
+        self.assertEqual(1, mock_run.call_count)
+        self.assertRaises(ValueError, scheduler.get_threadpool, 'bogus')
+
+    def test_errors(self):
+        scheduler = self._scheduler(1)
+        threadpool = scheduler.get_threadpool('client')
+
+        def fail():
+            raise OSError(errno.EIO, 'EIO')
+
+        self.assertRaises(OSError, threadpool.run_in_thread, fail)
+        self.assertEqual(0, scheduler.running)
+
+        # a waiting operation that times out gives up its place
+        pool = GreenPool()
+        pool.spawn(threadpool.run_in_thread, self._op, 'client', 0.05)
+        eventlet.sleep(0)
+        self.assertEqual(1, scheduler.running)
+        with timeout.Timeout(0.01):
+            self.assertRaises(timeout.Timeout, threadpool.run_in_thread,
+                              self._op, 'client')
+        self.assertEqual(0, len(scheduler.queues['client']))
+        pool.waitall()
+        self.assertEqual(0, scheduler.running)
+        self.assertEqual(['client'], self.started)
+
+
 class BaseDiskFileTestMixin(object):
     """
     Bag of helpers that are useful in the per-policy DiskFile test classes.
@@ -625,6 +806,48 @@ class DiskFileManagerMixin(BaseDiskFileTestMixin):
         locations = list(self.df_mgr.object_audit_location_generator())
         self.assertEqual(locations, [])
 
+    def test_get_threadpool(self):
+        # no scheduling by default
+        self.assertTrue(self.df_mgr.get_threadpool(self.existing_device1) is
+                        self.df_mgr.threadpools[self.existing_device1])
+        df = self._get_diskfile(POLICIES.default, frag_index=2)
+        self.assertTrue(df._threadpool is self.df_router[
+            POLICIES.default].threadpools[self.existing_device1])
+
+        self.conf.update({'io_scheduler_concurrency': '2',
+                          'replication_io_weight': '3',
+                          'audit_io_concurrency': '1'})
+        df_mgr = self.mgr_cls(self.conf, self.logger)
+        self.assertEqual({'client': 8, 'replication': 3, 'audit': 1},
+                         df_mgr.io_weights)
+        self.assertEqual({'client': 0, 'replication': 0, 'audit': 1},
+                         df_mgr.io_caps)
+        threadpool = df_mgr.get_threadpool(self.existing_device1)
+        self.assertTrue(isinstance(threadpool, diskfile.IOClassThreadPool))
+        self.assertEqual('client', threadpool.io_class)
+        scheduler = threadpool.scheduler
+        self.assertEqual(2, scheduler.concurrency)
+        self.assertTrue(scheduler.threadpool is
+                        df_mgr.threadpools[self.existing_device1])
+        self.assertTrue(scheduler.get_threadpool('replication') is
+                        df_mgr.get_threadpool(self.existing_device1,
+                                              'replication'))
+        self.assertFalse(scheduler is df_mgr.get_threadpool(
+            self.existing_device2).scheduler)
+
+        df = df_mgr.get_diskfile(self.existing_device1, '0', 'a', 'c', 'o',
+                                 policy=POLICIES.default, frag_index=2,
+                                 io_class='replication')
+        self.assertEqual('replication', df._threadpool.io_class)
+        with mock.patch.object(scheduler, 'run',
+                               wraps=scheduler.run) as mock_run:
+            df_mgr.get_hashes(self.existing_device1, '0', [],
+                              POLICIES.default)
+        self.assertEqual('replication', mock_run.call_args[0][0])
+
+        self.conf['audit_io_weight'] = '0'
+        self.assertRaises(ValueError, self.mgr_cls, self.conf, self.logger)
+
     def test_replication_lock_on(self):
         # Double check settings
         self.df_mgr.replication_one_per_device = True
@@ -833,7 +1056,7 @@ class DiskFileManagerMixin(BaseDiskFileTestMixin):
                 604800)
             readmeta.assert_called_once_with(
                 '/srv/dev/objects/9/900/9a7175077c01a23ade5956b8a2bba900/'
-                '1381679759.90941.data')
+                '1381679759.90941.data', hot_only=True)
 
     def test_listdir_enoent(self):
         oserror = OSError()
@@ -2385,6 +2608,30 @@ class DiskFileMixin(BaseDiskFileTestMixin):
                 pass
             self.assertTrue(goo.called)
 
+    def test_readahead_and_hash_in_thread(self):
+        df = self._get_open_disk_file(fsize=1024, csize=64)
+        with mock.patch('swift.obj.diskfile.READAHEAD_WINDOW', 256), \
+                mock.patch('swift.obj.diskfile.prefetch_buffer_cache') \
+                as mock_prefetch:
+            reader = df.reader(_readahead=True, _hash_in_thread=True)
+            body = ''.join(reader)
+        self.assertEqual('0' * 1024, body)
+        self.assertEqual([0, 256, 512, 768],
+                         [call[0][1] for call in mock_prefetch.call_args_list])
+        self.assertEqual(md5(body).hexdigest(), reader._md5_of_sent_bytes)
+
+        # the md5 computed in the thread pool is still checked
+        df = self._get_open_disk_file(invalid_type='ETag')
+        quarantined = []
+        reader = df.reader(_quarantine_hook=quarantined.append,
+                           _hash_in_thread=True)
+        with mock.patch('swift.obj.diskfile.prefetch_buffer_cache') \
+                as mock_prefetch:
+            ''.join(reader)
+        self.assertFalse(mock_prefetch.called)
+        self.assertEqual(1, len(quarantined))
+        self.assertTrue('ETag' in quarantined[0])
+
     def test_quarantine_valids(self):
 
         def verify(*args, **kwargs):
@@ -2663,6 +2910,244 @@ class DiskFileMixin(BaseDiskFileTestMixin):
             else:
                 pass
 
+    def _group_commit_puts(self, objs, window=0.01, io_classes=None):
+        self.conf['group_commit_window'] = window
+        io_classes = io_classes or {}
+        df_router = diskfile.DiskFileRouter(self.conf, self.logger)
+        df_mgr = df_router[POLICIES.default]
+        results = {}
+
+        def do_put(obj):
+            df = df_mgr.get_diskfile(
+                self.existing_device, '0', 'a', 'c', obj,
+                policy=POLICIES.default, frag_index=2,
+                io_class=io_classes.get(obj, diskfile.CLIENT_IO))
+            timestamp = self.ts()
+            try:
+                with df.create() as writer:
+                    writer.write(obj)
+                    writer.put({'ETag': md5(obj).hexdigest(),
+                                'X-Timestamp': timestamp.internal,
+                                'Content-Length': str(len(obj))})
+                    writer.commit(timestamp)
+            except Exception as err:
+                results[obj] = err
+            else:
+                results[obj] = df
+
+        pool = GreenPool()
+        for obj in objs:
+            pool.spawn(do_put, obj)
+        pool.waitall()
+        return df_mgr, results
+
+    def test_group_commit_disabled_by_default(self):
+        self.assertEqual(0, self.df_mgr.group_commit_window)
+        self.assertEqual(None, self.df_mgr.get_group_committer(
+            self.testdir, None))
+
+    def test_group_commit(self):
+        objs = ['o%d' % i for i in range(10)]
+        with mock.patch('swift.obj.diskfile.fsync',
+                        wraps=utils.fsync) as mock_fsync, \
+                mock.patch('swift.obj.diskfile.fsync_dir',
+                           wraps=utils.fsync_dir) as mock_fsync_dir, \
+                mock.patch('swift.common.utils.fsync_dir') as renamer_fsync:
+            df_mgr, results = self._group_commit_puts(objs)
+        committer = df_mgr.get_group_committer(
+            os.path.join(self.testdir, self.existing_device),
+            df_mgr.get_threadpool(self.existing_device))
+        self.assertTrue(isinstance(committer, diskfile.GroupCommitter))
+        self.assertEqual(0.01, committer.window)
+        self.assertFalse(committer.committing)
+        self.assertEqual([], committer.pending)
+        # EC's commit() then syncs a .durable file (and its dir) per object
+        syncs_per_object = 1
+        if POLICIES.default.policy_type == EC_POLICY:
+            syncs_per_object = 2
+        self.assertEqual(10 * syncs_per_object, mock_fsync.call_count)
+        self.assertFalse(renamer_fsync.called)
+        # each new directory is fsync'd once for the whole batch
+        synced = [call[0][0] for call in mock_fsync_dir.call_args_list]
+        datadirs = set(results[obj]._datadir for obj in objs)
+        for dirpath in set(synced):
+            if dirpath in datadirs:
+                self.assertEqual(syncs_per_object, synced.count(dirpath))
+            else:
+                self.assertEqual(1, synced.count(dirpath))
+        for obj in objs:
+            df = results[obj]
+            self.assertTrue(os.path.dirname(df._datadir) in synced)
+            with df.open():
+                self.assertEqual(obj, ''.join(df.reader()))
+        self.assertEqual(0, len(os.listdir(os.path.join(
+            self.testdir, self.existing_device,
+            diskfile.get_tmp_dir(POLICIES.default)))))
+
+    def test_group_commit_per_io_class(self):
+        self.conf['io_scheduler_concurrency'] = 2
+        batches = []
+        orig_run = diskfile.IOScheduler.run
+
+        def mock_run(scheduler, io_class, run_func, func, *args, **kwargs):
+            if getattr(func, '__name__', None) == '_commit_batch':
+                batches.append((io_class, len(args[0])))
+            return orig_run(scheduler, io_class, run_func, func, *args,
+                            **kwargs)
+
+        objs = ['c%d' % i for i in range(4)] + ['r%d' % i for i in range(4)]
+        io_classes = dict(('r%d' % i, diskfile.REPLICATION_IO)
+                          for i in range(4))
+        with mock.patch.object(diskfile.IOScheduler, 'run', mock_run):
+            df_mgr, results = self._group_commit_puts(
+                objs, io_classes=io_classes)
+        for obj in objs:
+            with results[obj].open():
+                self.assertEqual(obj, ''.join(results[obj].reader()))
+        # each class's PUTs are batched apart and committed as that class
+        committed = {}
+        for io_class, size in batches:
+            committed[io_class] = committed.get(io_class, 0) + size
+        self.assertEqual({diskfile.CLIENT_IO: 4,
+                          diskfile.REPLICATION_IO: 4}, committed)
+        self.assertEqual(2, len(df_mgr.group_committers))
+        device_path = os.path.join(self.testdir, self.existing_device)
+        client_committer = df_mgr.get_group_committer(
+            device_path, df_mgr.get_threadpool(self.existing_device))
+        replication_committer = df_mgr.get_group_committer(
+            device_path, df_mgr.get_threadpool(self.existing_device,
+                                               diskfile.REPLICATION_IO))
+        self.assertFalse(client_committer is replication_committer)
+        self.assertEqual(diskfile.REPLICATION_IO,
+                         replication_committer.threadpool.io_class)
+
+    def test_group_commit_errors(self):
+        def mock_write_metadata(fd, metadata, *args, **kwargs):
+            if metadata['Content-Length'] == '3':
+                raise DiskFileNoSpace()
+            return orig_write_metadata(fd, metadata, *args, **kwargs)
+
+        orig_write_metadata = diskfile.write_metadata
+        with mock.patch('swift.obj.diskfile.write_metadata',
+                        mock_write_metadata):
+            _junk, results = self._group_commit_puts(['bad', 'good'])
+        self.assertTrue(isinstance(results['bad'], DiskFileNoSpace))
+        with results['good'].open():
+            self.assertEqual('good', ''.join(results['good'].reader()))
+
+        # a failure of the whole batch is raised by every writer
+        with mock.patch.object(diskfile.GroupCommitter, '_commit_batch',
+                               side_effect=OSError(errno.EIO, 'EIO')):
+            _junk, results = self._group_commit_puts(['o1', 'o2'])
+        self.assertEqual(errno.EIO, results['o1'].errno)
+        self.assertTrue(results['o1'] is results['o2'])
+
+    def test_metadata_cache(self):
+        device_path = os.path.join(self.testdir, self.existing_device)
+        self.assertEqual(None, self.df_mgr.get_metadata_cache(device_path))
+        self.conf['metadata_cache_size'] = 10
+        df_mgr = diskfile.DiskFileRouter(
+            self.conf, self.logger)[POLICIES.default]
+        cache = df_mgr.get_metadata_cache(device_path)
+        self.assertEqual(10, cache.maxsize)
+
+        def get_diskfile():
+            return df_mgr.get_diskfile(self.existing_device, '0', 'a', 'c',
+                                       'o', policy=POLICIES.default,
+                                       frag_index=2)
+
+        def open_diskfile():
+            df = get_diskfile()
+            with mock.patch('swift.obj.diskfile.read_metadata',
+                            wraps=diskfile.read_metadata) as mock_read:
+                with df.open():
+                    return (df.get_datafile_metadata(), df.get_metadata(),
+                            mock_read.call_count)
+
+        timestamp = self.ts()
+        with get_diskfile().create() as writer:
+            writer.write('body')
+            writer.put({'ETag': md5('body').hexdigest(),
+                        'X-Timestamp': timestamp.internal,
+                        'Content-Length': '4'})
+            writer.commit(timestamp)
+        datadir = get_diskfile()._datadir
+
+        # the files were only just written, so they are not cached yet
+        self.assertEqual(1, open_diskfile()[2])
+        self.assertEqual(None, cache.get(datadir))
+
+        with mock.patch.object(diskfile, 'METADATA_CACHE_RACY_WINDOW', 0):
+            self.assertEqual(1, open_diskfile()[2])
+            datafile_metadata, metadata, reads = open_diskfile()
+            self.assertEqual(0, reads)
+            self.assertEqual(timestamp.internal, metadata['X-Timestamp'])
+            # callers get their own copy of the cached metadata
+            datafile_metadata['X-Timestamp'] = 'mutated'
+            self.assertEqual(timestamp.internal,
+                             open_diskfile()[0]['X-Timestamp'])
+
+            # a POST by another process is noticed through the hash dir's
+            # stat; make sure its mtime moves on whatever the filesystem's
+            # timestamp granularity
+            mtime = os.stat(datadir).st_mtime
+            self._simple_get_diskfile().write_metadata(
+                {'X-Timestamp': self.ts().internal,
+                 'X-Object-Meta-Test': 'posted'})
+            os.utime(datadir, (mtime - 1, mtime - 1))
+            _junk, metadata, reads = open_diskfile()
+            self.assertEqual(2, reads)
+            self.assertEqual('posted', metadata['X-Object-Meta-Test'])
+            self.assertEqual(0, open_diskfile()[2])
+
+            # and a POST through this manager drops the hash dir's entry
+            get_diskfile().write_metadata(
+                {'X-Timestamp': self.ts().internal,
+                 'X-Object-Meta-Test': 'posted again'})
+            self.assertEqual(None, cache.get(datadir))
+            _junk, metadata, reads = open_diskfile()
+            self.assertEqual('posted again', metadata['X-Object-Meta-Test'])
+
+    def test_compact_metadata(self):
+        self.assertFalse(self.df_mgr.compact_metadata)
+        self.conf['compact_metadata'] = 'true'
+        df_mgr = diskfile.DiskFileRouter(
+            self.conf, self.logger)[POLICIES.default]
+        self.assertTrue(df_mgr.compact_metadata)
+        df = df_mgr.get_diskfile(self.existing_device, '0', 'a', 'c', 'o',
+                                 policy=POLICIES.default, frag_index=2)
+        timestamp = self.ts()
+        with df.create() as writer:
+            writer.write('body')
+            writer.put({'ETag': md5('body').hexdigest(),
+                        'X-Timestamp': timestamp.internal,
+                        'Content-Length': '4',
+                        'X-Object-Meta-Color': 'blue'})
+            writer.commit(timestamp)
+        df.write_metadata({'X-Timestamp': self.ts().internal,
+                           'X-Object-Meta-Color': 'red'})
+        for filename in os.listdir(df._datadir):
+            if filename.endswith('.durable'):
+                continue
+            self.assertTrue(xattr.getxattr(
+                os.path.join(df._datadir, filename),
+                diskfile.METADATA_KEY).startswith(
+                    diskfile.COMPACT_METADATA_MAGIC))
+
+        # which managers that write pickles can read too
+        df = self._simple_get_diskfile()
+        with df.open():
+            self.assertEqual('4', df.get_datafile_metadata()[
+                'Content-Length'])
+            self.assertEqual('blue', df.get_datafile_metadata()[
+                'X-Object-Meta-Color'])
+            self.assertEqual('red', df.get_metadata()['X-Object-Meta-Color'])
+            self.assertEqual('/a/c/o', df.get_metadata()['name'])
+        df = self.df_mgr.get_diskfile_from_hash(
+            self.existing_device, '0', os.path.basename(df._datadir),
+            POLICIES.default)
+        self.assertEqual('o', df.obj)
+
     def test_write_metadata(self):
         df = self._create_test_file('1234567890')
         file_count = len(os.listdir(df._datadir))
@@ -20,8 +20,10 @@ from copy import deepcopy
 from tempfile import mkdtemp
 from shutil import rmtree
 
+import json
 import mock
 import six
+from eventlet import sleep
 from six.moves import urllib
 
 from swift.common import internal_client, utils
@@ -184,6 +186,100 @@ class TestObjectExpirer(TestCase):
         self.assertEqual(containers, deleted_objects)
         self.assertEqual(len(set(x.obj_containers_in_order[:4])), 4)
 
+    def _fake_swift(self, containers, listing_log=None):
+
+        class InternalClient(object):
+
+            def get_account_info(self, *a, **kw):
+                return len(containers), \
+                    sum(len(objs) for objs in containers.values())
+
+            def iter_containers(self, *a, **kw):
+                return [{'name': six.text_type(c)}
+                        for c in sorted(containers)]
+
+            def iter_objects(self, account, container):
+                for o in sorted(containers[container]):
+                    if listing_log is not None:
+                        listing_log.append(container)
+                    # a listing page boundary
+                    sleep(0)
+                    yield {'name': six.text_type(o)}
+
+            def delete_container(*a, **kw):
+                pass
+
+        return InternalClient()
+
+    def test_shard_queue_containers(self):
+        containers = dict(
+            (str(c), set('%d-a/c/o%d' % (c, i) for i in range(3)))
+            for c in range(8))
+        deleted = []
+        listed = []
+        for process in range(3):
+            x = expirer.ObjectExpirer(
+                dict(self.conf, processes=3, process=process,
+                     shard_queue_containers='yes'),
+                logger=self.logger, swift=self._fake_swift(containers,
+                                                           listed))
+            x.delete_object = lambda actual_obj, timestamp, container, obj: \
+                deleted.append((container, obj))
+            x.run_once()
+        # every queue container is listed by just one of the processes
+        self.assertEqual(sorted(containers), sorted(set(listed)))
+        self.assertEqual(3 * len(containers), len(listed))
+        self.assertEqual(sorted((c, o) for c in containers
+                                for o in containers[c]),
+                         sorted(deleted))
+
+    def test_listing_concurrency(self):
+        self.assertRaises(ValueError, expirer.ObjectExpirer,
+                          {'listing_concurrency': '0'})
+        base = int(time()) - 86400
+        containers = dict(
+            (str(base + c), set('%d-a/c%d/o%d' % (base, c, i)
+                                for i in range(3)))
+            for c in range(4))
+        # entries not due yet are neither listed on nor deleted
+        containers[str(base + 3)].add('%d-a/c3/later' % (time() + 86400))
+        containers[str(int(time() + 86400))] = set(['not-listed'])
+        listed = []
+        x = expirer.ObjectExpirer(
+            dict(self.conf, listing_concurrency='2'), logger=self.logger,
+            swift=self._fake_swift(containers, listed))
+        deleted = []
+        x.delete_object = lambda actual_obj, timestamp, container, obj: \
+            deleted.append((container, obj))
+        x.run_once()
+        # the listings of two queue containers are paged in at once
+        self.assertEqual([str(base), str(base + 1)] * 2, listed[:4])
+        self.assertEqual([str(base + c) for c in range(4)],
+                         sorted(set(listed)))
+        self.assertEqual(13, len(listed))
+        self.assertEqual(12, len(deleted))
+        self.assertFalse(any(o.endswith('later') for _junk, o in deleted))
+        self.assertEqual({'elapsed': mock.ANY, 'listed': 12,
+                          'expired': 0, 'errors': 0, 'pending': 12},
+                         x.get_progress())
+
+    def test_listing_concurrency_errors(self):
+        containers = {'0': set(['0-a/c/o'])}
+        swift = self._fake_swift(containers)
+
+        def iter_objects(account, container):
+            raise Exception('listing failed')
+
+        swift.iter_objects = iter_objects
+        x = expirer.ObjectExpirer(
+            dict(self.conf, listing_concurrency='4'), logger=self.logger,
+            swift=swift)
+        x.run_once()
+        self.assertEqual(['Unhandled exception: '],
+                         x.logger.get_lines_for_level('error'))
+        log_args, log_kwargs = x.logger.log_dict['error'][0]
+        self.assertEqual('listing failed', str(log_kwargs['exc_info'][1]))
+
     def test_delete_object(self):
         class InternalClient(object):
 
@@ -253,6 +349,27 @@ class TestObjectExpirer(TestCase):
         self.assertTrue(
             'so far' in str(x.logger.get_lines_for_level('info')))
 
+    def test_report_progress(self):
+        x = expirer.ObjectExpirer(self.conf, logger=self.logger)
+        x.report_listed = 10
+        x.report_objects = 6
+        x.report_errors = 1
+        x.report_last_time = time() - x.report_interval
+        x.report()
+        self.assertEqual(
+            ['Pass so far 0s; 6 objects expired, 1 errors, 3 of 10 listed '
+             'pending'], x.logger.get_lines_for_level('info'))
+        with open(x.rcache) as f:
+            recon = json.load(f)
+        self.assertEqual({'elapsed': mock.ANY, 'listed': 10, 'expired': 6,
+                          'errors': 1, 'pending': 3},
+                         recon['object_expiration_progress'])
+        x.report(final=True)
+        with open(x.rcache) as f:
+            recon = json.load(f)
+        self.assertEqual(6, recon['expired_last_pass'])
+        self.assertEqual(1, recon['expiration_errors_last_pass'])
+
     def test_run_once_nothing_to_do(self):
         x = expirer.ObjectExpirer(self.conf, logger=self.logger)
         x.swift = 'throw error because a string does not have needed methods'
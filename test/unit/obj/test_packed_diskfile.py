@@ -0,0 +1,512 @@
+# Copyright (c) 2015 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for swift.obj.packed_diskfile"""
+
+import errno
+import os
+import time
+import unittest
+from contextlib import closing
+from hashlib import md5
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import mock
+from eventlet import tpool
+
+from test.unit import patch_policies, debug_logger, make_timestamp_iter
+from swift.common import utils
+from swift.common.exceptions import DiskFileNotExist, DiskFileDeleted
+from swift.common.storage_policy import POLICIES, StoragePolicy, \
+    PackedStoragePolicy
+from swift.obj import diskfile, packed_diskfile
+from swift.obj.auditor import AuditorWorker
+
+
+@patch_policies([StoragePolicy(0, 'zero', True),
+                 PackedStoragePolicy(1, 'packed')])
+class TestPackedDiskFile(unittest.TestCase):
+
+    def setUp(self):
+        utils.HASH_PATH_SUFFIX = 'endcap'
+        utils.HASH_PATH_PREFIX = ''
+        self.tmpdir = mkdtemp()
+        self.devices = os.path.join(self.tmpdir, 'node')
+        utils.mkdirs(os.path.join(self.devices, 'sda1'))
+        self._orig_tpool_exc = tpool.execute
+        tpool.execute = lambda f, *args, **kwargs: f(*args, **kwargs)
+        self.conf = dict(devices=self.devices, mount_check='false')
+        self.logger = debug_logger('test-packed-diskfile')
+        self.df_router = diskfile.DiskFileRouter(self.conf, self.logger)
+        self.policy = POLICIES[1]
+        self.df_mgr = self.df_router[self.policy]
+        self.part_path = os.path.join(self.devices, 'sda1', 'objects-1', '0')
+        self.ts = make_timestamp_iter()
+
+    def tearDown(self):
+        tpool.execute = self._orig_tpool_exc
+        rmtree(self.tmpdir, ignore_errors=1)
+
+    def _get_diskfile(self, obj='o', df_mgr=None, policy=None):
+        df_mgr = df_mgr or self.df_mgr
+        return df_mgr.get_diskfile('sda1', '0', 'a', 'c', obj,
+                                   policy=policy or self.policy)
+
+    def _put(self, df, body, timestamp=None, etag=None, **extra):
+        timestamp = timestamp or next(self.ts)
+        metadata = {'X-Timestamp': timestamp.internal,
+                    'Content-Length': str(len(body)),
+                    'ETag': etag or md5(body).hexdigest()}
+        metadata.update(extra)
+        with df.create() as writer:
+            writer.write(body)
+            writer.put(metadata)
+        return timestamp
+
+    def _read(self, df):
+        with df.open():
+            reader = df.reader()
+        with closing(reader):
+            return ''.join(reader)
+
+    def _volumes(self):
+        return sorted(name for name in os.listdir(self.part_path)
+                      if name.endswith(packed_diskfile.VOLUME_EXT))
+
+    def test_router(self):
+        self.assertTrue(isinstance(
+            self.df_mgr, packed_diskfile.PackedDiskFileManager))
+        self.assertTrue(isinstance(
+            self._get_diskfile(), packed_diskfile.PackedDiskFile))
+        self.assertFalse(self.df_mgr.use_splice)
+
+    def test_put_and_get(self):
+        df = self._get_diskfile()
+        timestamp = self._put(df, 'body', **{'X-Object-Meta-Color': 'blue'})
+        df = self._get_diskfile()
+        self.assertEqual('body', self._read(df))
+        metadata = df.get_metadata()
+        self.assertEqual(timestamp.internal, metadata['X-Timestamp'])
+        self.assertEqual('blue', metadata['X-Object-Meta-Color'])
+        self.assertEqual('/a/c/o', metadata['name'])
+        self.assertEqual(4, df.content_length)
+        # no hash dirs, just a volume (and the partition's lock)
+        self.assertEqual(['.lock', 'packed-00000000.vol'],
+                         sorted(os.listdir(self.part_path)))
+
+    def test_ranged_read(self):
+        df = self._get_diskfile()
+        self._put(self._get_diskfile('other'), 'x' * 100)
+        self._put(df, '0123456789')
+        with df.open():
+            reader = df.reader()
+        self.assertEqual('2345', ''.join(reader.app_iter_range(2, 6)))
+
+    def test_not_found(self):
+        self.assertRaises(DiskFileNotExist, self._get_diskfile().open)
+
+    def test_overwrite_delete_and_post(self):
+        self._put(self._get_diskfile(), 'old')
+        new = self._put(self._get_diskfile(), 'new')
+        self.assertEqual('new', self._read(self._get_diskfile()))
+        hsh = utils.hash_path('a', 'c', 'o')
+        partition = self.df_mgr.get_partition(self.part_path)
+        self.assertEqual([new.internal + '.data'], partition.listdir(hsh))
+
+        self._get_diskfile().write_metadata({
+            'X-Timestamp': next(self.ts).internal,
+            'X-Object-Meta-Shape': 'round'})
+        df = self._get_diskfile()
+        with df.open():
+            self.assertEqual('round',
+                             df.get_metadata()['X-Object-Meta-Shape'])
+            self.assertEqual('3', df.get_metadata()['Content-Length'])
+
+        deleted = next(self.ts)
+        self._get_diskfile().delete(deleted)
+        try:
+            self._get_diskfile().open()
+        except DiskFileDeleted as err:
+            self.assertEqual(deleted, err.timestamp)
+        else:
+            self.fail('Expected DiskFileDeleted')
+        self.assertEqual([deleted.internal + '.ts'], partition.listdir(hsh))
+
+        # an older PUT arriving late is not stored at all
+        self._put(self._get_diskfile(), 'stale',
+                  timestamp=utils.Timestamp(new.internal, offset=1))
+        self.assertEqual([deleted.internal + '.ts'], partition.listdir(hsh))
+
+    def test_other_processes_see_appends(self):
+        other_mgr = packed_diskfile.PackedDiskFileManager(self.conf,
+                                                          self.logger)
+        self._put(self._get_diskfile('o1'), 'one')
+        self.assertEqual('one', self._read(
+            self._get_diskfile('o1', df_mgr=other_mgr)))
+        self._put(self._get_diskfile('o2'), 'two')
+        self.assertEqual('two', self._read(
+            self._get_diskfile('o2', df_mgr=other_mgr)))
+        self._put(self._get_diskfile('o1', df_mgr=other_mgr), 'uno')
+        self.assertEqual('uno', self._read(self._get_diskfile('o1')))
+
+    def test_reload_from_checkpoint(self):
+        index_path = os.path.join(self.part_path, packed_diskfile.INDEX_FILE)
+        with mock.patch.object(packed_diskfile, 'CHECKPOINT_INTERVAL', 1):
+            for i in range(3):
+                self._put(self._get_diskfile('o%d' % i), 'body%d' % i)
+            # PUTs leave checkpointing to the replicator
+            self.assertFalse(os.path.exists(index_path))
+            packed_diskfile.PackedDiskFileManager(
+                self.conf, self.logger)._get_hashes(self.part_path)
+        self.assertTrue(os.path.exists(index_path))
+        self._put(self._get_diskfile('o3'), 'body3')
+
+        other_mgr = packed_diskfile.PackedDiskFileManager(self.conf,
+                                                          self.logger)
+        with mock.patch.object(packed_diskfile.PackedPartition,
+                               '_read_record',
+                               wraps=packed_diskfile.PackedPartition(
+                                   self.part_path, 0,
+                                   self.logger)._read_record) as read:
+            for i in range(4):
+                self.assertEqual('body%d' % i, self._read(
+                    self._get_diskfile('o%d' % i, df_mgr=other_mgr)))
+        # only the record appended after the checkpoint was read
+        self.assertEqual(1, read.call_count)
+
+    def test_torn_record_is_truncated(self):
+        self._put(self._get_diskfile('o1'), 'one')
+        volume = os.path.join(self.part_path, self._volumes()[0])
+        size = os.path.getsize(volume)
+        with open(volume, 'ab') as fp:
+            fp.write(packed_diskfile.pack_record_header(
+                packed_diskfile.PUT_RECORD, 'x' * 32 + '/1.data',
+                {'name': '/a/c/x'}, 100) + 'partial')
+        other_mgr = packed_diskfile.PackedDiskFileManager(self.conf,
+                                                          self.logger)
+        self.assertEqual('one', self._read(
+            self._get_diskfile('o1', df_mgr=other_mgr)))
+        self.assertEqual(size, os.path.getsize(volume))
+        self.assertTrue(self.logger.get_lines_for_level('warning'))
+        self._put(self._get_diskfile('o2', df_mgr=other_mgr), 'two')
+        self.assertEqual('two', self._read(self._get_diskfile('o2')))
+
+    def test_corrupt_record_is_skipped(self):
+        self._put(self._get_diskfile('o1'), 'one')
+        volume = os.path.join(self.part_path, self._volumes()[0])
+        with open(volume, 'r+b') as fp:
+            fp.seek(packed_diskfile.RECORD_HEADER_SIZE + 5)
+            fp.write('X')
+        other_mgr = packed_diskfile.PackedDiskFileManager(self.conf,
+                                                          self.logger)
+        self.assertRaises(DiskFileNotExist,
+                          self._get_diskfile('o1', df_mgr=other_mgr).open)
+        self.assertTrue(self.logger.get_lines_for_level('error'))
+        partition = other_mgr.get_partition(self.part_path)
+        self.assertEqual(set([0]), partition.damaged)
+        self.assertTrue(partition.needs_compaction(1))
+        # new objects go to a new volume
+        self._put(self._get_diskfile('o2', df_mgr=other_mgr), 'two')
+        self.assertEqual(2, len(self._volumes()))
+        self.assertEqual('two', self._read(self._get_diskfile('o2')))
+
+    def test_volume_rotation(self):
+        self.df_mgr.volume_size = 1
+        self.df_mgr.partitions.reset()
+        for i in range(3):
+            self._put(self._get_diskfile('o%d' % i), 'body%d' % i)
+        self.assertEqual(3, len(self._volumes()))
+        for i in range(3):
+            self.assertEqual('body%d' % i, self._read(
+                self._get_diskfile('o%d' % i)))
+
+    def test_compaction(self):
+        for i in range(10):
+            self._put(self._get_diskfile('o1'), 'x' * 1000)
+        self._put(self._get_diskfile('o2'), 'two')
+        self._get_diskfile('o3').delete(next(self.ts))
+        partition = self.df_mgr.get_partition(self.part_path)
+        _junk, hashes = self.df_mgr._get_hashes(self.part_path)
+        # not worth it yet
+        self.assertEqual(['packed-00000000.vol'], self._volumes())
+        before = partition.total_bytes
+        with mock.patch.object(packed_diskfile, 'MIN_COMPACT_BYTES', 1):
+            self.assertEqual(
+                hashes, self.df_mgr._get_hashes(self.part_path)[1])
+        self.assertEqual(['packed-00000001.vol'], self._volumes())
+        self.assertTrue(partition.total_bytes < before / 5)
+        self.assertEqual(partition.live_bytes, partition.total_bytes)
+        self.assertTrue(self.logger.get_lines_for_level('info'))
+        # other processes notice the volumes changed under them
+        other_mgr = packed_diskfile.PackedDiskFileManager(self.conf,
+                                                          self.logger)
+        for df_mgr in (self.df_mgr, other_mgr):
+            self.assertEqual('x' * 1000, self._read(
+                self._get_diskfile('o1', df_mgr=df_mgr)))
+            self.assertEqual('two', self._read(
+                self._get_diskfile('o2', df_mgr=df_mgr)))
+            self.assertRaises(DiskFileDeleted, self._get_diskfile(
+                'o3', df_mgr=df_mgr).open)
+        self._put(self._get_diskfile('o4'), 'four')
+        self.assertEqual(['packed-00000001.vol'], self._volumes())
+        self.assertEqual('four', self._read(
+            self._get_diskfile('o4', df_mgr=other_mgr)))
+
+    def test_compaction_does_not_block_writes(self):
+        for i in range(3):
+            for _junk in range(5):
+                self._put(self._get_diskfile('o%d' % i), 'x' * 1000)
+            self._put(self._get_diskfile('o%d' % i), 'body%d' % i)
+        partition = self.df_mgr.get_partition(self.part_path)
+        orig_copy = packed_diskfile.CompactedVolumes.copy
+        written = []
+
+        def copy_while_writing(new_volumes, record, source):
+            if not written:
+                written.append(True)
+                # the partition is not locked while records are copied
+                with utils.lock_path(self.part_path, timeout=0.1):
+                    pass
+                self._put(self._get_diskfile('o1'), 'uno')
+                self._get_diskfile('o2').delete(next(self.ts))
+                self._put(self._get_diskfile('o3'), 'three')
+            return orig_copy(new_volumes, record, source)
+
+        with mock.patch.object(packed_diskfile.CompactedVolumes, 'copy',
+                               copy_while_writing):
+            self.assertTrue(partition.compact() > 0)
+        self.assertEqual(['packed-00000001.vol'], self._volumes())
+        other_mgr = packed_diskfile.PackedDiskFileManager(self.conf,
+                                                          self.logger)
+        for df_mgr in (self.df_mgr, other_mgr):
+            self.assertEqual('body0', self._read(
+                self._get_diskfile('o0', df_mgr=df_mgr)))
+            self.assertEqual('uno', self._read(
+                self._get_diskfile('o1', df_mgr=df_mgr)))
+            self.assertRaises(DiskFileDeleted, self._get_diskfile(
+                'o2', df_mgr=df_mgr).open)
+            self.assertEqual('three', self._read(
+                self._get_diskfile('o3', df_mgr=df_mgr)))
+
+    def test_compaction_gives_way_to_another(self):
+        for _junk in range(5):
+            self._put(self._get_diskfile('o1'), 'x' * 1000)
+        self._put(self._get_diskfile('o1'), 'one')
+        partition = self.df_mgr.get_partition(self.part_path)
+        other_partition = packed_diskfile.PackedDiskFileManager(
+            self.conf, self.logger).get_partition(self.part_path)
+        orig_copy = packed_diskfile.CompactedVolumes.copy
+
+        def copy_while_compacting(new_volumes, record, source):
+            if new_volumes.partition is partition and \
+                    not other_partition.positions:
+                self.assertTrue(other_partition.compact() > 0)
+            return orig_copy(new_volumes, record, source)
+
+        with mock.patch.object(packed_diskfile.CompactedVolumes, 'copy',
+                               copy_while_compacting):
+            self.assertEqual(0, partition.compact())
+        self.assertEqual(['packed-00000001.vol'], self._volumes())
+        self.assertEqual([], [name for name in os.listdir(self.part_path)
+                              if name.startswith('compacting-')])
+        self.assertEqual('one', self._read(self._get_diskfile('o1')))
+
+    def test_failed_compaction_changes_nothing(self):
+        for i in range(3):
+            self._put(self._get_diskfile('o%d' % i), 'x' * 1000)
+            self._put(self._get_diskfile('o%d' % i), 'body%d' % i)
+        partition = self.df_mgr.get_partition(self.part_path)
+        partition.refresh()
+        positions = dict(partition.positions)
+        orig_copy = packed_diskfile.CompactedVolumes.copy
+        copies = []
+
+        def failing_copy(new_volumes, record, source):
+            if copies:
+                raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+            copies.append(record)
+            return orig_copy(new_volumes, record, source)
+
+        with mock.patch.object(packed_diskfile.CompactedVolumes, 'copy',
+                               failing_copy):
+            self.assertRaises(OSError, partition.compact)
+        self.assertEqual(['.lock', 'packed-00000000.vol'],
+                         sorted(os.listdir(self.part_path)))
+        self.assertEqual(positions, partition.positions)
+        other_mgr = packed_diskfile.PackedDiskFileManager(self.conf,
+                                                          self.logger)
+        for df_mgr in (self.df_mgr, other_mgr):
+            for i in range(3):
+                self.assertEqual('body%d' % i, self._read(
+                    self._get_diskfile('o%d' % i, df_mgr=df_mgr)))
+        # and it can be compacted once the problem is gone
+        self.assertTrue(partition.compact() > 0)
+        self.assertEqual(['.lock', 'packed-00000001.vol', 'packed.idx'],
+                         sorted(os.listdir(self.part_path)))
+        for df_mgr in (self.df_mgr, other_mgr):
+            for i in range(3):
+                self.assertEqual('body%d' % i, self._read(
+                    self._get_diskfile('o%d' % i, df_mgr=df_mgr)))
+
+    def test_stale_compactions_removed(self):
+        self._put(self._get_diskfile('o1'), 'one')
+        stale = os.path.join(self.part_path, 'compacting-old.tmp')
+        recent = os.path.join(self.part_path, 'compacting-new.tmp')
+        for path in (stale, recent):
+            with open(path, 'w') as fp:
+                fp.write('junk')
+        os.utime(stale, (0, 0))
+        self.df_mgr.get_partition(self.part_path).compact()
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(recent))
+        self.assertEqual('one', self._read(self._get_diskfile('o1')))
+
+    def test_hashes_match_replication_policy(self):
+        repl_mgr = self.df_router[POLICIES[0]]
+        repl_part_path = os.path.join(self.devices, 'sda1', 'objects', '0')
+        old = next(self.ts)
+        for df_mgr, policy in ((repl_mgr, POLICIES[0]),
+                               (self.df_mgr, self.policy)):
+            for i in range(20):
+                self._put(self._get_diskfile('o%d' % i, df_mgr, policy),
+                          'body', timestamp=old)
+            for i in range(0, 20, 3):
+                self._get_diskfile('o%d' % i, df_mgr, policy).delete(
+                    utils.Timestamp(old, offset=1))
+            for i in range(1, 20, 5):
+                self._get_diskfile('o%d' % i, df_mgr,
+                                   policy).write_metadata({
+                                       'X-Timestamp':
+                                       utils.Timestamp(old, offset=2).internal,
+                                       'X-Object-Meta-Test': 'yes'})
+        repl_hashes = repl_mgr._get_hashes(repl_part_path)[1]
+        packed_hashes = self.df_mgr._get_hashes(self.part_path)[1]
+        self.assertTrue(len(repl_hashes) > 1)
+        self.assertEqual(repl_hashes, packed_hashes)
+        self.assertEqual(repl_hashes, self.df_mgr.get_hashes(
+            'sda1', '0', [], self.policy))
+        # hashes are cached until something changes in the suffix
+        hashed, again = self.df_mgr._get_hashes(self.part_path)
+        self.assertEqual((0, packed_hashes), (hashed, again))
+        hashed, again = self.df_mgr._get_hashes(
+            self.part_path, recalculate=[sorted(packed_hashes)[0]])
+        self.assertEqual((1, packed_hashes), (hashed, again))
+
+        # tombstones are reclaimed alike
+        repl_hashes = repl_mgr._get_hashes(
+            repl_part_path, recalculate=list(repl_hashes), reclaim_age=0)[1]
+        packed_hashes = self.df_mgr._get_hashes(
+            self.part_path, recalculate=list(packed_hashes),
+            reclaim_age=0)[1]
+        self.assertEqual(repl_hashes, packed_hashes)
+
+    def test_yield_hashes_and_get_diskfile_from_hash(self):
+        timestamps = {}
+        for obj in ('o1', 'o2'):
+            timestamps[obj] = self._put(self._get_diskfile(obj), obj)
+        meta = next(self.ts)
+        self._get_diskfile('o2').write_metadata({'X-Timestamp':
+                                                 meta.internal})
+        suffixes = [suffix for _junk, suffix in
+                    self.df_mgr.yield_suffixes('sda1', '0', self.policy)]
+        expected = {}
+        for obj in ('o1', 'o2'):
+            hsh = utils.hash_path('a', 'c', obj)
+            self.assertTrue(hsh[-3:] in suffixes)
+            expected[hsh] = {'ts_data': timestamps[obj]}
+        expected[utils.hash_path('a', 'c', 'o2')]['ts_meta'] = meta
+        found = dict((hsh, timestamps) for _junk, hsh, timestamps in
+                     self.df_mgr.yield_hashes('sda1', '0', self.policy))
+        self.assertEqual(expected, found)
+        found = dict((hsh, timestamps) for _junk, hsh, timestamps in
+                     self.df_mgr.yield_hashes('sda1', '0', self.policy,
+                                              suffixes=['abc']))
+        self.assertEqual({}, found)
+
+        hsh = utils.hash_path('a', 'c', 'o1')
+        df = self.df_mgr.get_diskfile_from_hash('sda1', '0', hsh,
+                                                self.policy)
+        self.assertEqual('o1', self._read(df))
+        self.assertRaises(DiskFileNotExist,
+                          self.df_mgr.get_diskfile_from_hash,
+                          'sda1', '0', 'f' * 32, self.policy)
+
+    def test_quarantine(self):
+        self._put(self._get_diskfile(), 'body', etag='bad')
+        df = self._get_diskfile()
+        with df.open():
+            reader = df.reader()
+        self.assertEqual('body', ''.join(reader))
+        self.assertRaises(DiskFileNotExist, self._get_diskfile().open)
+        hsh = utils.hash_path('a', 'c', 'o')
+        quarantined = os.path.join(self.devices, 'sda1', 'quarantined',
+                                   'objects-1', hsh)
+        files = os.listdir(quarantined)
+        self.assertEqual(1, len(files))
+        path = os.path.join(quarantined, files[0])
+        with open(path) as fp:
+            self.assertEqual('body', fp.read())
+        self.assertEqual('bad', diskfile.read_metadata(path)['ETag'])
+        self.assertEqual(['quarantines'],
+                         self.logger.get_increments())
+
+    def test_auditor(self):
+        self._put(self._get_diskfile('good'), 'good')
+        self._put(self._get_diskfile('bad'), 'bad', etag='nope')
+        repl_mgr = self.df_router[POLICIES[0]]
+        self._put(self._get_diskfile('o', repl_mgr, POLICIES[0]),
+                  'replicated')
+        locations = list(self.df_mgr.object_audit_location_generator())
+        self.assertEqual(
+            sorted(utils.hash_path('a', 'c', obj) for obj in ('good', 'bad')),
+            sorted(os.path.basename(loc.path) for loc in locations))
+        # the walk of the hash dirs of other policies leaves them alone
+        with mock.patch('swift.obj.diskfile.listdir',
+                        wraps=utils.listdir) as mock_listdir:
+            locations = list(diskfile.object_audit_location_generator(
+                self.devices, mount_check=False))
+        self.assertEqual([utils.hash_path('a', 'c', 'o')],
+                         [os.path.basename(loc.path) for loc in locations])
+        self.assertFalse([call for call in mock_listdir.call_args_list
+                          if 'objects-1' in call[0][0]])
+
+        auditor = AuditorWorker(self.conf, self.logger, None, ['sda1'])
+        auditor.audit_all_objects()
+        self.assertEqual(3, auditor.total_files_processed)
+        self.assertEqual(1, auditor.quarantines)
+        self.assertEqual('good', self._read(self._get_diskfile('good')))
+        self.assertRaises(DiskFileNotExist,
+                          self._get_diskfile('bad').open)
+        self.assertEqual('replicated', self._read(
+            self._get_diskfile('o', repl_mgr, POLICIES[0])))
+
+    def test_reader_quarantine_hook(self):
+        hook_calls = []
+        self._put(self._get_diskfile(), 'body', etag='bad')
+        df = self._get_diskfile()
+        with df.open():
+            reader = df.reader(_quarantine_hook=hook_calls.append)
+        ''.join(reader)
+        self.assertEqual(1, len(hook_calls))
+
+    def test_expired(self):
+        self._put(self._get_diskfile(), 'body',
+                  **{'X-Delete-At': str(int(time.time()) - 1)})
+        self.assertRaises(DiskFileNotExist, self._get_diskfile().open)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -35,7 +35,8 @@ from swift.common.utils import (hash_path, mkdirs, normalize_timestamp,
                                 storage_directory)
 from swift.common import ring
 from swift.obj import diskfile, replicator as object_replicator
-from swift.common.storage_policy import StoragePolicy, POLICIES
+from swift.common.storage_policy import StoragePolicy, POLICIES, \
+    PackedStoragePolicy
 
 
 def _ips(*args, **kwargs):
@@ -1485,9 +1486,18 @@ class TestObjectReplicator(unittest.TestCase):
 
     def test_sync_just_calls_sync_method(self):
         self.replicator.sync_method = mock.MagicMock()
-        self.replicator.sync('node', 'job', 'suffixes')
+        job = {'policy': POLICIES[0]}
+        self.replicator.sync('node', job, 'suffixes')
         self.replicator.sync_method.assert_called_once_with(
-            'node', 'job', 'suffixes')
+            'node', job, 'suffixes')
+
+    def test_sync_packed_policy_always_uses_ssync(self):
+        self.replicator.sync_method = mock.MagicMock()
+        job = {'policy': PackedStoragePolicy(1, 'packed')}
+        with mock.patch.object(self.replicator, 'ssync') as mock_ssync:
+            self.replicator.sync('node', job, 'suffixes')
+        mock_ssync.assert_called_once_with('node', job, 'suffixes')
+        self.assertFalse(self.replicator.sync_method.called)
 
     @mock.patch('swift.obj.replicator.tpool_reraise', autospec=True)
     @mock.patch('swift.obj.replicator.http_connect', autospec=True)
@@ -2468,6 +2468,33 @@ class TestObjectController(unittest.TestCase):
         self.assertTrue(os.path.isfile(ts_1003_file))
         self.assertEqual(len(os.listdir(os.path.dirname(ts_1003_file))), 1)
 
+    def test_io_class(self):
+        io_classes = []
+        orig_get_diskfile = self.object_controller.get_diskfile
+
+        def get_diskfile(*args, **kwargs):
+            io_classes.append(kwargs['io_class'])
+            return orig_get_diskfile(*args, **kwargs)
+
+        timestamp = normalize_timestamp(time())
+        with mock.patch.object(self.object_controller, 'get_diskfile',
+                               get_diskfile):
+            for method, extra_headers in (
+                    ('PUT', {}), ('HEAD', {}), ('GET', {}),
+                    ('PUT', {'X-Backend-Replication': 'True'}),
+                    ('DELETE', {'X-Backend-Replication': 'True'})):
+                headers = {'X-Timestamp': timestamp,
+                           'Content-Type': 'text/plain',
+                           'Content-Length': '0'}
+                headers.update(extra_headers)
+                req = Request.blank('/sda1/p/a/c/o', headers=headers,
+                                    environ={'REQUEST_METHOD': method})
+                req.body = ''
+                req.get_response(self.object_controller)
+                timestamp = normalize_timestamp(float(timestamp) + 1)
+        self.assertEqual(['client', 'client', 'client', 'replication',
+                          'replication'], io_classes)
+
     def test_DELETE_succeeds_with_later_POST(self):
         ts_iter = make_timestamp_iter()
         t_put = next(ts_iter).internal
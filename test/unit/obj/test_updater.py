@@ -31,12 +31,13 @@ from eventlet import spawn, Timeout, listen
 from six.moves import range
 
 from swift.obj import updater as object_updater
+from swift.obj.async_journal import AsyncPendingJournal
 from swift.obj.diskfile import (ASYNCDIR_BASE, get_async_dir, DiskFileManager,
                                 get_tmp_dir)
 from swift.common.ring import RingData
 from swift.common import utils
 from swift.common.utils import hash_path, normalize_timestamp, mkdirs, \
-    write_pickle
+    write_pickle, json
 from swift.common import swob
 from test.unit import debug_logger, patch_policies, mocked_http_conn
 from swift.common.storage_policy import StoragePolicy, POLICIES
@@ -487,6 +488,192 @@ class TestObjectUpdater(unittest.TestCase):
         self.assertEqual(daemon.logger.get_increment_counts(),
                          {'successes': 1, 'unlinks': 1, 'async_pendings': 1})
 
+    def test_obj_put_journaled_updates(self):
+        ts = (normalize_timestamp(t) for t in
+              itertools.count(int(time())))
+        policy = random.choice(list(POLICIES))
+        conf = {
+            'devices': self.devices_dir,
+            'mount_check': 'false',
+            'swift_dir': self.testdir,
+            'async_pending_journal': 'true',
+        }
+        daemon = object_updater.ObjectUpdater(conf, logger=self.logger)
+        dfmanager = DiskFileManager(conf, daemon.logger)
+        async_dir = os.path.join(self.sda1, get_async_dir(policy))
+
+        def write_async(obj, op):
+            headers_out = swob.HeaderKeyDict({
+                'x-size': 0,
+                'x-content-type': 'text/plain',
+                'x-etag': 'd41d8cd98f00b204e9800998ecf8427e',
+                'x-timestamp': next(ts),
+            })
+            data = {'op': op, 'account': 'a', 'container': 'c',
+                    'obj': obj, 'headers': headers_out}
+            dfmanager.pickle_async_update(self.sda1, 'a', 'c', obj, data,
+                                          headers_out['x-timestamp'], policy)
+
+        # the PUT of o1 is superseded by its DELETE
+        write_async('o1', 'PUT')
+        write_async('o1', 'DELETE')
+        write_async('o2', 'PUT')
+        self.assertEqual(['journal'], os.listdir(async_dir))
+
+        request_log = []
+
+        def capture(*args, **kwargs):
+            request_log.append((args, kwargs))
+
+        # o1's update succeeds, o2's only on one node
+        with mocked_http_conn(200, 200, 200, 201, 500, 500,
+                              give_connect=capture):
+            daemon.run_once()
+        self.assertEqual(6, len(request_log))
+        self.assertEqual(
+            [('DELETE', 'o1')] * 3 + [('PUT', 'o2')] * 3,
+            [(request_args[2], request_args[3].rsplit('/', 1)[1])
+             for request_args, _junk in request_log])
+        self.assertEqual({'successes': 1, 'failures': 1,
+                          'async_pendings': 3},
+                         daemon.logger.get_increment_counts())
+
+        # the failed update was appended to a new journal, with its successes
+        self.assertEqual(['journal'], os.listdir(async_dir))
+        journal = AsyncPendingJournal(async_dir)
+        records = list(journal.iter_records(journal.path))
+        self.assertEqual(1, len(records))
+        _junk, _junk, _junk, update = records[0]
+        self.assertEqual('o2', update['obj'])
+        self.assertEqual(1, len(update['successes']))
+
+        # and is only sent to the nodes it failed on next time
+        request_log = []
+        with mocked_http_conn(201, 201, give_connect=capture):
+            daemon.run_once()
+        self.assertEqual(2, len(request_log))
+        self.assertEqual([], os.listdir(async_dir))
+
+    def _write_asyncs(self, daemon, policy, objs, container='c'):
+        ts = (normalize_timestamp(t) for t in
+              itertools.count(int(time())))
+        dfmanager = DiskFileManager(daemon.conf, daemon.logger)
+        for obj, op in objs:
+            headers_out = swob.HeaderKeyDict({
+                'x-size': 3,
+                'x-content-type': 'text/plain',
+                'x-etag': 'd41d8cd98f00b204e9800998ecf8427e',
+                'x-timestamp': next(ts),
+            })
+            data = {'op': op, 'account': 'a', 'container': container,
+                    'obj': obj, 'headers': headers_out}
+            dfmanager.pickle_async_update(self.sda1, 'a', container, obj,
+                                          data, headers_out['x-timestamp'],
+                                          policy)
+        return os.path.join(self.sda1, get_async_dir(policy))
+
+    def test_obj_put_concurrent_updates(self):
+        policy = random.choice(list(POLICIES))
+        conf = {
+            'devices': self.devices_dir,
+            'mount_check': 'false',
+            'swift_dir': self.testdir,
+            'update_concurrency': '4',
+            'updates_per_second': '1000',
+        }
+        daemon = object_updater.ObjectUpdater(conf, logger=self.logger)
+        self.assertEqual(4, daemon.update_concurrency)
+        self.assertEqual(1000, daemon.updates_per_second)
+        async_dir = self._write_asyncs(
+            daemon, policy, [('o%d' % i, 'PUT') for i in range(5)])
+        with mocked_http_conn(*([201] * 15)) as fake_conn:
+            with mock.patch.object(object_updater, 'ratelimit_sleep',
+                                   return_value=0) as mock_ratelimit:
+                daemon.run_once()
+        self.assertEqual(['PUT'] * 15,
+                         [req['method'] for req in fake_conn.requests])
+        self.assertEqual(5, mock_ratelimit.call_count)
+        self.assertEqual({'successes': 5, 'unlinks': 5,
+                          'async_pendings': 5},
+                         daemon.logger.get_increment_counts())
+        self.assertEqual([], os.listdir(async_dir))
+
+    def test_obj_put_batched_updates(self):
+        policy = random.choice(list(POLICIES))
+        conf = {
+            'devices': self.devices_dir,
+            'mount_check': 'false',
+            'swift_dir': self.testdir,
+            'update_batch_size': '10',
+        }
+        daemon = object_updater.ObjectUpdater(conf, logger=self.logger)
+        async_dir = self._write_asyncs(
+            daemon, policy, [('o1', 'PUT'), ('o2', 'DELETE')])
+        bodies = {}
+
+        def capture_send(connection_id, data):
+            bodies[connection_id] = data
+
+        # one UPDATE to each node of the container, one of them failing
+        with mocked_http_conn(204, 204, 500,
+                              give_send=capture_send) as fake_conn:
+            daemon.run_once()
+        self.assertEqual(['UPDATE'] * 3,
+                         [req['method'] for req in fake_conn.requests])
+        for req in fake_conn.requests:
+            self.assertEqual('a/c', req['path'].split('/', 3)[3])
+            self.assertEqual('application/json',
+                             req['headers']['Content-Type'])
+        self.assertEqual(3, len(bodies))
+        items = dict((item['name'], item) for body in bodies.values()
+                     for item in json.loads(body))
+        self.assertEqual(['o1', 'o2'], sorted(items))
+        self.assertEqual((3, 0, 'text/plain', int(policy)),
+                         (items['o1']['size'], items['o1']['deleted'],
+                          items['o1']['content_type'],
+                          items['o1']['storage_policy_index']))
+        self.assertEqual((0, 1, 'application/deleted'),
+                         (items['o2']['size'], items['o2']['deleted'],
+                          items['o2']['content_type']))
+        self.assertEqual({'failures': 2, 'async_pendings': 2},
+                         daemon.logger.get_increment_counts())
+
+        # the updates of c are only sent on to the node that failed, while
+        # those of another container go in a batch of their own
+        self.logger.clear()
+        self._write_asyncs(daemon, policy, [('o3', 'PUT')], container='c2')
+        with mocked_http_conn(204, 204, 204, 204) as fake_conn:
+            daemon.run_once()
+        self.assertEqual(['UPDATE'] * 4, [req['method']
+                                          for req in fake_conn.requests])
+        self.assertEqual(['a/c'] + ['a/c2'] * 3, sorted(
+            req['path'].split('/', 3)[3] for req in fake_conn.requests))
+        self.assertEqual({'successes': 3, 'unlinks': 3,
+                          'async_pendings': 1},
+                         daemon.logger.get_increment_counts())
+        self.assertEqual([], os.listdir(async_dir))
+
+    def test_obj_put_batched_updates_old_container_server(self):
+        policy = random.choice(list(POLICIES))
+        conf = {
+            'devices': self.devices_dir,
+            'mount_check': 'false',
+            'swift_dir': self.testdir,
+            'update_batch_size': '10',
+        }
+        daemon = object_updater.ObjectUpdater(conf, logger=self.logger)
+        async_dir = self._write_asyncs(
+            daemon, policy, [('o1', 'PUT'), ('o2', 'DELETE')])
+        # a node that does not know UPDATE is sent each update on its own
+        with mocked_http_conn(204, 405, 204, 201, 204) as fake_conn:
+            daemon.run_once()
+        self.assertEqual(sorted(['UPDATE'] * 3 + ['PUT', 'DELETE']),
+                         sorted(req['method'] for req in fake_conn.requests))
+        self.assertEqual({'successes': 2, 'unlinks': 2,
+                          'async_pendings': 2},
+                         daemon.logger.get_increment_counts())
+        self.assertEqual([], os.listdir(async_dir))
+
 
 if __name__ == '__main__':
     unittest.main()
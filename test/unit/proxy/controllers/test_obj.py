@@ -25,7 +25,7 @@ import json
 from hashlib import md5
 
 import mock
-from eventlet import Timeout
+from eventlet import Timeout, sleep
 from six import BytesIO
 from six.moves import range
 
@@ -1091,6 +1091,45 @@ class TestECObjController(BaseObjectControllerMixin, unittest.TestCase):
         got = controller._determine_chunk_destinations(putters)
         self.assertEqual(got, expected)
 
+    def test_chunk_transformer(self):
+        segment_size = self.policy.ec_segment_size
+        nstreams = self.replicas()
+        body = ''.join(chr(i % 256) for i in range(segment_size * 5 + 123))
+        expected = [self.policy.pyeclib_driver.encode(
+            body[i:i + segment_size])
+            for i in range(0, len(body), segment_size)]
+
+        for chunk_size in (1, 7, segment_size - 1, segment_size,
+                           segment_size + 1, segment_size * 2 + 5,
+                           len(body)):
+            transform = obj.chunk_transformer(self.policy, nstreams)
+            transform.send(None)
+            got = []
+            for i in range(0, len(body), chunk_size):
+                frags_by_byte_order = transform.send(
+                    body[i:i + chunk_size])
+                if frags_by_byte_order is not None:
+                    got.extend(frags_by_byte_order)
+            got.extend(transform.send(''))
+            self.assertEqual(got, expected,
+                             'mismatch with chunk size %d' % chunk_size)
+
+    def test_chunk_transformer_no_data(self):
+        nstreams = self.replicas()
+        transform = obj.chunk_transformer(self.policy, nstreams)
+        transform.send(None)
+        self.assertEqual([[''] * nstreams], transform.send(''))
+
+    def test_chunk_transformer_exact_segments(self):
+        segment_size = self.policy.ec_segment_size
+        transform = obj.chunk_transformer(self.policy, self.replicas())
+        transform.send(None)
+        self.assertEqual(None, transform.send('a' * (segment_size - 1)))
+        self.assertEqual(2, len(transform.send('a' * (segment_size + 1))))
+        # the buffer was emptied, so the end of input just gives the
+        # fragments of an empty object
+        self.assertEqual([[''] * self.replicas()], transform.send(''))
+
     def test_GET_simple(self):
         req = swift.common.swob.Request.blank('/v1/a/c/o')
         get_resp = [200] * self.policy.ec_ndata
@@ -2068,6 +2107,76 @@ class TestECObjController(BaseObjectControllerMixin, unittest.TestCase):
         self.assertEqual(1, len(error_lines))
         self.assertTrue('retrying' in error_lines[0])
 
+    def test_GET_hedges_stalled_fragment_request(self):
+        segment_size = self.policy.ec_segment_size
+        test_data = ('test' * segment_size)[:-333]
+        etag = md5(test_data).hexdigest()
+        ec_archive_bodies = self._make_ec_archive_bodies(test_data)
+        headers = {'X-Object-Sysmeta-Ec-Etag': etag,
+                   'X-Object-Sysmeta-Ec-Content-Length': str(len(test_data))}
+        self.app.ec_fragment_stall_timeout = 0.01
+
+        def slow_first_connect(*args, **kwargs):
+            if kwargs['connection_id'] == 0:
+                sleep(0.2)
+
+        # the first connection stalls, so one more than ec_ndata are made
+        responses = [(200, body, headers)
+                     for body in ec_archive_bodies[:self.policy.ec_ndata + 1]]
+        status_codes, body_iter, headers = zip(*responses)
+        req = swob.Request.blank('/v1/a/c/o')
+        with set_http_connect(*status_codes, body_iter=body_iter,
+                              headers=headers,
+                              give_connect=slow_first_connect):
+            resp = req.get_response(self.app)
+            self.assertEqual(resp.status_int, 200)
+            self.assertEqual(md5(resp.body).hexdigest(), etag)
+        self.assertEqual(
+            1, self.app.logger.get_increment_counts()['ec_fragment_stalls'])
+
+    def test_GET_no_hedge_without_stall_timeout(self):
+        segment_size = self.policy.ec_segment_size
+        test_data = ('test' * segment_size)[:-333]
+        etag = md5(test_data).hexdigest()
+        ec_archive_bodies = self._make_ec_archive_bodies(test_data)
+        headers = {'X-Object-Sysmeta-Ec-Etag': etag,
+                   'X-Object-Sysmeta-Ec-Content-Length': str(len(test_data))}
+        self.assertEqual(0, self.app.ec_fragment_stall_timeout)
+
+        def slow_first_connect(*args, **kwargs):
+            if kwargs['connection_id'] == 0:
+                sleep(0.05)
+
+        responses = [(200, body, headers)
+                     for body in ec_archive_bodies[:self.policy.ec_ndata]]
+        status_codes, body_iter, headers = zip(*responses)
+        req = swob.Request.blank('/v1/a/c/o')
+        with set_http_connect(*status_codes, body_iter=body_iter,
+                              headers=headers,
+                              give_connect=slow_first_connect):
+            resp = req.get_response(self.app)
+            self.assertEqual(resp.status_int, 200)
+            self.assertEqual(md5(resp.body).hexdigest(), etag)
+        self.assertFalse(
+            'ec_fragment_stalls' in self.app.logger.get_increment_counts())
+
+    def test_GET_prefer_data_fragments(self):
+        self.app.ec_prefer_data_fragments = True
+        ports = []
+
+        def capture_port(ipaddr, port, *args, **kwargs):
+            ports.append(port)
+
+        req = swob.Request.blank('/v1/a/c/o')
+        codes = [200] * self.policy.ec_ndata
+        with set_http_connect(*codes, give_connect=capture_port):
+            resp = req.get_response(self.app)
+        self.assertEqual(resp.status_int, 200)
+        # FakeRing hands out primaries with index == port - base_port
+        base_port = self.policy.object_ring._base_port
+        self.assertEqual(sorted(port - base_port for port in ports),
+                         list(range(self.policy.ec_ndata)))
+
     def test_fix_response_HEAD(self):
         headers = {'X-Object-Sysmeta-Ec-Content-Length': '10',
                    'X-Object-Sysmeta-Ec-Etag': 'foo'}
@@ -2253,5 +2362,67 @@ class TestECObjController(BaseObjectControllerMixin, unittest.TestCase):
         self.assertEqual(resp.body, range_not_satisfiable_body)
 
 
+class TestECObjControllerThreaded(TestECObjController):
+    """
+    Runs all of the EC controller tests with encode and decode offloaded to
+    a threadpool.
+    """
+
+    def setUp(self):
+        super(TestECObjControllerThreaded, self).setUp()
+        self.app.ec_encode_threads = 2
+
+    def test_ec_threadpool(self):
+        self.assertEqual(2, self.app.ec_threadpool.nthreads)
+        self.assertEqual(3, self.app.ec_threadpool.run_in_thread(sum, [1, 2]))
+        # only ever one pool per app
+        self.assertTrue(self.app.ec_threadpool is self.app.ec_threadpool)
+        self.app.ec_encode_threads = 0
+        self.app._ec_threadpool = None
+        self.assertEqual(None, self.app.ec_threadpool)
+
+    def test_PUT_encodes_in_threadpool(self):
+        segment_size = self.policy.ec_segment_size
+        req = swift.common.swob.Request.blank(
+            '/v1/a/c/o', method='PUT', body='a' * (segment_size * 3 + 10))
+        codes = [201] * self.replicas()
+        expect_headers = {
+            'X-Obj-Metadata-Footer': 'yes',
+            'X-Obj-Multiphase-Commit': 'yes'
+        }
+        encoded = []
+        orig_run_in_thread = self.app.ec_threadpool.run_in_thread
+
+        def run_in_thread(func, *args):
+            encoded.append(len(args[0]))
+            return orig_run_in_thread(func, *args)
+
+        with mock.patch.object(self.app.ec_threadpool, 'run_in_thread',
+                               run_in_thread), \
+                set_http_connect(*codes, expect_headers=expect_headers):
+            resp = req.get_response(self.app)
+        self.assertEqual(resp.status_int, 201)
+        self.assertEqual(sorted(encoded), [10] + [segment_size] * 3)
+
+    def test_PUT_encoder_error(self):
+        segment_size = self.policy.ec_segment_size
+        req = swift.common.swob.Request.blank(
+            '/v1/a/c/o', method='PUT', body='a' * (segment_size * 3 + 10))
+        codes = [201] * self.replicas()
+        expect_headers = {
+            'X-Obj-Metadata-Footer': 'yes',
+            'X-Obj-Multiphase-Commit': 'yes'
+        }
+
+        def explode(func, *args):
+            raise ECDriverError('kaboom')
+
+        with mock.patch.object(self.app.ec_threadpool, 'run_in_thread',
+                               explode), \
+                set_http_connect(*codes, expect_headers=expect_headers):
+            resp = req.get_response(self.app)
+        self.assertEqual(resp.status_int, 499)
+
+
 if __name__ == '__main__':
     unittest.main()